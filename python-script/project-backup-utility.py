@@ -39,16 +39,162 @@ import base64
 import sqlite3
 import random
 import string
+import struct
+import time
+import argparse
+import threading
+import heapq
+import bisect
+import stat
+import zlib
+import fnmatch
+import tempfile
+import errno
+import ctypes
+import platform
+import tarfile
+import json
+import cProfile
+import pstats
+import io
+import tracemalloc
+import collections
+import contextlib
+import hashlib
+import statistics
+import socket
+import hmac
+import urllib.parse
+import subprocess
+import mmap
+import concurrent.futures
+import functools
+import ipaddress
+import ssl
+import shutil
+import array
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+try:
+    from argon2 import low_level as argon2_low_level
+except ImportError:
+    argon2_low_level = None
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms as cipher_algorithms
+except ImportError:
+    Cipher = None
+
+class _ThreadConnection:
+    """Holds a thread's connection in its local storage and closes it once the thread has finished"""
+    def __init__(self, database, conn):
+        self.database = database
+        self.conn = conn
+
+    def __del__(self):
+        if self.conn is not None:
+            try:
+                self.database._forget(self.conn)
+            except Exception:
+                pass
 
 class Database:
     """Database class for managing SQLite operations"""
+    # Seconds a connection waits for another thread or process to release the database
+    BUSY_TIMEOUT = 30.0
+    # Prepared statements kept per connection
+    CACHED_STATEMENTS = 256
+
     def __init__(self, db_file="backup_projects.db"):
         """Initialize database connection and create tables if they don't exist"""
         self.db_file = db_file
-        self.conn = sqlite3.connect(self.db_file)
-        self.cursor = self.conn.cursor()
+        # One connection and cursor per thread, opened on first use
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.RLock()
         self._create_tables()
 
+    @property
+    def conn(self):
+        """The calling thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_file,
+                timeout=self.BUSY_TIMEOUT,
+                cached_statements=self.CACHED_STATEMENTS,
+                # Only ever used by its own thread, but close() may run on another
+                check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.BUSY_TIMEOUT * 1000)}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+            self._local.depth = 0
+            # Dropped with the thread's local storage when the thread ends, which closes the connection
+            self._local.owner = _ThreadConnection(self, conn)
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _forget(self, conn):
+        """Close one connection and stop tracking it"""
+        with self._connections_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def release(self):
+        """Close the calling thread's connection; the next use opens a new one"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        if self._local.depth:
+            raise RuntimeError("Can't release a connection inside a transaction")
+        self._local.owner.conn = None
+        del self._local.conn, self._local.cursor, self._local.depth, self._local.owner
+        self._forget(conn)
+
+    @property
+    def cursor(self):
+        """The calling thread's cursor"""
+        self.conn
+        return self._local.cursor
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group writes into one IMMEDIATE transaction; nested uses join the outer one"""
+        conn = self.conn
+        if self._local.depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.depth += 1
+        try:
+            yield self._local.cursor
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.rollback()
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.commit()
+
+    def _commit(self):
+        """Commit unless an explicit transaction is open on this thread"""
+        conn = self.conn
+        if self._local.depth == 0:
+            conn.commit()
+
     def _create_tables(self):
         """Create database tables if they don't exist"""
         # Create projects table
@@ -62,7 +208,119 @@ class Database:
                 folder_exclusions TEXT
             )
         ''')
-        self.conn.commit()
+        # Create checkpoints table for resumable backups
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backup_checkpoints (
+                id TEXT PRIMARY KEY,
+                project_id TEXT NOT NULL,
+                source_dir TEXT NOT NULL,
+                dest_file TEXT NOT NULL,
+                archive_rel TEXT,
+                file_exclusions TEXT,
+                folder_exclusions TEXT,
+                zip_offset INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'running',
+                started_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        # Members fully written to the archive as of the last checkpoint
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS checkpoint_members (
+                checkpoint_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                header_offset INTEGER NOT NULL,
+                external_attr INTEGER NOT NULL,
+                PRIMARY KEY (checkpoint_id, name)
+            )
+        ''')
+        # Delta signatures of the members in checkpoint_members, moved to file_signatures when the run completes
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS checkpoint_signatures (
+                checkpoint_id TEXT NOT NULL,
+                rel_path TEXT NOT NULL,
+                member_name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                block_size INTEGER NOT NULL,
+                chain_depth INTEGER NOT NULL,
+                weak BLOB NOT NULL,
+                strong BLOB NOT NULL,
+                PRIMARY KEY (checkpoint_id, rel_path)
+            )
+        ''')
+        # Catalog of every archive written, in any format
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backups (
+                id TEXT PRIMARY KEY,
+                project_id TEXT NOT NULL,
+                archive_path TEXT NOT NULL,
+                format TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                started_at TEXT NOT NULL,
+                finished_at TEXT,
+                files INTEGER,
+                archive_bytes INTEGER,
+                source_bytes INTEGER
+            )
+        ''')
+        # Every destination a fanned-out backup was written to, with its own outcome
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backup_copies (
+                backup_id TEXT NOT NULL,
+                archive_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                archive_bytes INTEGER,
+                error TEXT,
+                PRIMARY KEY (backup_id, archive_path)
+            )
+        ''')
+        # Backups that can only be restored together with another one (delta bases)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backup_dependencies (
+                backup_id TEXT NOT NULL,
+                depends_on TEXT NOT NULL,
+                PRIMARY KEY (backup_id, depends_on)
+            )
+        ''')
+        # Block signatures of each large file as stored in the project's latest backup
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS file_signatures (
+                project_id TEXT NOT NULL,
+                rel_path TEXT NOT NULL,
+                backup_id TEXT NOT NULL,
+                member_name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                block_size INTEGER NOT NULL,
+                chain_depth INTEGER NOT NULL,
+                weak BLOB NOT NULL,
+                strong BLOB NOT NULL,
+                PRIMARY KEY (project_id, rel_path)
+            )
+        ''')
+        # Per-project settings stored as JSON values (e.g. git_mode)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS project_options (
+                project_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (project_id, key)
+            )
+        ''')
+        # Git history bundled by each backup, so the next one can bundle only what is new
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS git_bundles (
+                backup_id TEXT PRIMARY KEY,
+                project_id TEXT NOT NULL,
+                tips TEXT NOT NULL,
+                chain_depth INTEGER NOT NULL,
+                base_backup_id TEXT
+            )
+        ''')
+        self._commit()
 
     def _encode_text(self, text):
         """Encode text to base64 to handle non-Latin characters"""
@@ -91,10 +349,27 @@ class Database:
                 'folder_path': self._decode_text(row[2]),
                 'description': self._decode_text(row[3]) if row[3] else "",
                 'file_exclusions': [self._decode_text(excl) for excl in row[4].rstrip(',').split(',')] if row[4] else [],
-                'folder_exclusions': [self._decode_text(excl) for excl in row[5].rstrip(',').split(',')] if row[5] else []
+                'folder_exclusions': [self._decode_text(excl) for excl in row[5].rstrip(',').split(',')] if row[5] else [],
+                'options': self.get_project_options(row[0])
             }
         return None
 
+    def get_project_options(self, project_id):
+        """Retrieve a project's settings as a dictionary"""
+        self.cursor.execute("SELECT key, value FROM project_options WHERE project_id = ?", (project_id,))
+        return {key: json.loads(value) for key, value in self.cursor.fetchall()}
+
+    def set_project_option(self, project_id, key, value):
+        """Store one project setting; None removes it"""
+        if value is None:
+            self.cursor.execute("DELETE FROM project_options WHERE project_id = ? AND key = ?", (project_id, key))
+        else:
+            self.cursor.execute(
+                "INSERT OR REPLACE INTO project_options (project_id, key, value) VALUES (?, ?, ?)",
+                (project_id, key, json.dumps(value))
+            )
+        self._commit()
+
     def update_project(self, project_id, name, folder_path, description="", file_exclusions=None, folder_exclusions=None):
         """Update project details"""
         encoded_name = self._encode_text(name)
@@ -109,7 +384,7 @@ class Database:
             "UPDATE projects SET name = ?, folder_path = ?, description = ?, file_exclusions = ?, folder_exclusions = ? WHERE id = ?",
             (encoded_name, encoded_path, encoded_desc, encoded_file_exclusions, encoded_folder_exclusions, project_id)
         )
-        self.conn.commit()
+        self._commit()
 
     def generate_random_id(self):
         """Generate a random ID of length 8 consisting of numbers, lowercase, and uppercase letters"""
@@ -123,21 +398,72 @@ class Database:
 
     def add_project(self, name, folder_path, description=""):
         """Add a new project to the database"""
-        project_id = self.generate_random_id()
-        while self.check_id_existence(project_id):
+        with self.transaction():
             project_id = self.generate_random_id()
-        encoded_name = self._encode_text(name)
-        encoded_path = self._encode_text(folder_path)
-        encoded_desc = self._encode_text(description)
-        encoded_file_exclusions = ""
-        encoded_folder_exclusions = self._encode_text("node_modules") + ","
-        self.cursor.execute(
-            "INSERT INTO projects (id, name, folder_path, description, file_exclusions, folder_exclusions) VALUES (?, ?, ?, ?, ?, ?)",
-            (project_id, encoded_name, encoded_path, encoded_desc, encoded_file_exclusions, encoded_folder_exclusions)
-        )
-        self.conn.commit()
+            while self.check_id_existence(project_id):
+                project_id = self.generate_random_id()
+            encoded_name = self._encode_text(name)
+            encoded_path = self._encode_text(folder_path)
+            encoded_desc = self._encode_text(description)
+            encoded_file_exclusions = ""
+            encoded_folder_exclusions = self._encode_text("node_modules") + ","
+            self.cursor.execute(
+                "INSERT INTO projects (id, name, folder_path, description, file_exclusions, folder_exclusions) VALUES (?, ?, ?, ?, ?, ?)",
+                (project_id, encoded_name, encoded_path, encoded_desc, encoded_file_exclusions, encoded_folder_exclusions)
+            )
         return project_id
 
+    def add_projects(self, projects):
+        """Insert many projects in one transaction; returns their IDs.
+
+        Each project is a dict like those from get_project. Projects that carry an 'id' replace the
+        project with that ID (options included); the others get a new random ID.
+        """
+        project_ids = []
+        project_rows = []
+        option_rows = []
+        with self.transaction():
+            self.cursor.execute("SELECT id FROM projects")
+            taken = {row[0] for row in self.cursor.fetchall()}
+            for project in projects:
+                project_id = project.get('id')
+                if not project_id:
+                    project_id = self.generate_random_id()
+                    while project_id in taken:
+                        project_id = self.generate_random_id()
+                taken.add(project_id)
+                project_ids.append(project_id)
+                project_rows.append((
+                    project_id,
+                    self._encode_text(project['name']),
+                    self._encode_text(project['folder_path']),
+                    self._encode_text(project.get('description') or ""),
+                    ''.join(self._encode_text(excl) + ',' for excl in project.get('file_exclusions') or ()),
+                    ''.join(self._encode_text(excl) + ',' for excl in project.get('folder_exclusions') or ())
+                ))
+                option_rows.extend(
+                    (project_id, key, json.dumps(value))
+                    for key, value in (project.get('options') or {}).items() if value is not None
+                )
+            self.cursor.executemany("DELETE FROM project_options WHERE project_id = ?", [(row[0],) for row in project_rows])
+            self.cursor.executemany(
+                "INSERT OR REPLACE INTO projects (id, name, folder_path, description, file_exclusions, folder_exclusions) VALUES (?, ?, ?, ?, ?, ?)",
+                project_rows
+            )
+            self.cursor.executemany("INSERT INTO project_options (project_id, key, value) VALUES (?, ?, ?)", option_rows)
+        return project_ids
+
+    def export_projects(self):
+        """All projects with their options, for export_projects_json"""
+        options = {}
+        self.cursor.execute("SELECT project_id, key, value FROM project_options")
+        for project_id, key, value in self.cursor.fetchall():
+            options.setdefault(project_id, {})[key] = json.loads(value)
+        projects = self.get_all_projects()
+        for project in projects:
+            project['options'] = options.get(project['id'], {})
+        return projects
+
     def get_all_projects(self):
         """Retrieve all projects from the database"""
         self.cursor.execute("SELECT id, name, folder_path, description, file_exclusions, folder_exclusions FROM projects")
@@ -154,204 +480,5736 @@ class Database:
         return projects
 
     def delete_project(self, project_id):
-        """Delete a project"""
-        self.cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
-        self.conn.commit()
+        """Delete a project with its catalog: backups, checkpoints, signatures, bundles and dependencies"""
+        with self.transaction():
+            self.cursor.execute("SELECT id FROM backups WHERE project_id = ?", (project_id,))
+            backup_ids = [row[0] for row in self.cursor.fetchall()]
+            self.cursor.executemany("DELETE FROM backup_dependencies WHERE depends_on = ?", [(b,) for b in backup_ids])
+            self.delete_backup_records(backup_ids)
+            # Checkpoints of runs that never reached the catalog, and rows no backup points at any more
+            for table in ("checkpoint_members", "checkpoint_signatures"):
+                self.cursor.execute(
+                    f"DELETE FROM {table} WHERE checkpoint_id IN (SELECT id FROM backup_checkpoints WHERE project_id = ?)",
+                    (project_id,)
+                )
+            self.cursor.execute("DELETE FROM backup_checkpoints WHERE project_id = ?", (project_id,))
+            self.cursor.execute("DELETE FROM file_signatures WHERE project_id = ?", (project_id,))
+            self.cursor.execute("DELETE FROM git_bundles WHERE project_id = ?", (project_id,))
+            self.cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+            self.cursor.execute("DELETE FROM project_options WHERE project_id = ?", (project_id,))
 
-    def close(self):
-        """Close the database connection"""
-        if self.conn:
-            self.conn.close()
+    def create_checkpoint(self, project_id, source_dir, dest_file, archive_rel, excluded_files, excluded_folders,
+                          checkpoint_id=None):
+        """Register a new backup run so it can be resumed later"""
+        with self.transaction():
+            while checkpoint_id is None or self._checkpoint_exists(checkpoint_id):
+                checkpoint_id = self.generate_random_id()
+            now = datetime.datetime.now().isoformat()
+            self.cursor.execute(
+                "INSERT INTO backup_checkpoints (id, project_id, source_dir, dest_file, archive_rel, file_exclusions, folder_exclusions, zip_offset, status, started_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, 0, 'running', ?, ?)",
+                (
+                    checkpoint_id,
+                    project_id,
+                    self._encode_text(source_dir),
+                    self._encode_text(dest_file),
+                    self._encode_text(archive_rel),
+                    ''.join(self._encode_text(excl) + ',' for excl in sorted(excluded_files)),
+                    ''.join(self._encode_text(excl) + ',' for excl in sorted(excluded_folders)),
+                    now,
+                    now
+                )
+            )
+        return checkpoint_id
 
-class BackupManager:
-    """Manages the backup creation process"""
-    def __init__(self, database):
-        """Initialize the backup manager with database access"""
-        self.db = database
+    def _checkpoint_exists(self, checkpoint_id):
+        """Check if a checkpoint ID is already taken"""
+        self.cursor.execute("SELECT 1 FROM backup_checkpoints WHERE id = ?", (checkpoint_id,))
+        return self.cursor.fetchone() is not None
 
-    def create_backup(self, project_id):
-        """Create a backup for the specified project, with verbose debug output."""
-        import datetime
-        import os
-        # Get project details
-        project = self.db.get_project(project_id)
-        if not project:
-            print("DEBUG: Project not found for id:", project_id)
-            return False, "Project not found"
-        # Get exclusions directly from the project dictionary
-        file_exclusions = set(project['file_exclusions'] or [])
-        folder_exclusions = set(project['folder_exclusions'] or [])
-        print("\n========== DEBUG: RAW EXCLUSIONS ==========")
-        print("File exclusions (raw):", file_exclusions)
-        print("Folder exclusions (raw):", folder_exclusions)
-        # Normalize exclusions: all paths relative to project root, forward slashes, no leading/trailing slashes
-        excluded_files = set(os.path.normpath(f).replace("\\", "/").strip("/") for f in file_exclusions)
-        excluded_folders = set(os.path.normpath(f).replace("\\", "/").strip("/") for f in folder_exclusions)
-        print("\n========== DEBUG: NORMALIZED EXCLUSIONS ==========")
-        print("Excluded files (normalized):", excluded_files)
-        for f in excluded_files:
-            print("  Excluded file:", f)
-        print("Excluded folders (normalized):", excluded_folders)
-        for f in excluded_folders:
-            print("  Excluded folder:", f)
-        # Create timestamp for filename
-        timestamp = datetime.datetime.now().strftime("%b-%d-%Y-%I-%M-%S-%p").upper()
-        safe_name = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in project['name'])
-        default_filename = f"{safe_name}-{timestamp}.zip"
-        # Ask user where to save the backup
-        from tkinter import filedialog
-        save_path = filedialog.asksaveasfilename(
-            defaultextension=".zip",
-            filetypes=[("ZIP files", "*.zip")],
-            initialfile=default_filename
-        )
-        print("DEBUG: User chose save path:", save_path)
-        if not save_path:
-            print("DEBUG: Backup cancelled by user.")
-            return False, "Backup cancelled by user"
-        # Print source and destination info
-        print("DEBUG: Source folder:", project['folder_path'])
-        print("DEBUG: Destination archive:", save_path)
-        # Make sure the archive doesn't end up inside itself
-        archive_rel = os.path.relpath(save_path, project['folder_path']).replace("\\", "/").strip("/")
-        try:
-            # Create the backup
-            return self._create_zip_backup(
-                project['folder_path'],
-                save_path,
-                excluded_files,
-                excluded_folders,
-                archive_rel
+    def save_checkpoint(self, checkpoint_id, zip_offset, members, signatures=()):
+        """Persist newly completed members, their delta signatures and the ZIP offset right after the last one"""
+        with self.transaction():
+            self.cursor.executemany(
+                "INSERT OR REPLACE INTO checkpoint_members (checkpoint_id, name, header_offset, external_attr) VALUES (?, ?, ?, ?)",
+                [(checkpoint_id, self._encode_text(name), offset, attr) for name, offset, attr in members]
+            )
+            self.cursor.executemany(
+                "INSERT OR REPLACE INTO checkpoint_signatures (checkpoint_id, rel_path, member_name, size, mtime_ns, sha256, block_size, chain_depth, weak, strong) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (checkpoint_id, self._encode_text(sig['rel_path']), self._encode_text(sig['member_name']),
+                     sig['size'], sig['mtime_ns'], sig['sha256'], sig['block_size'], sig['chain_depth'],
+                     sig['weak'], sig['strong'])
+                    for sig in signatures
+                ]
+            )
+            self.cursor.execute(
+                "UPDATE backup_checkpoints SET zip_offset = ?, updated_at = ? WHERE id = ?",
+                (zip_offset, datetime.datetime.now().isoformat(), checkpoint_id)
             )
-        except Exception as e:
-            import traceback
-            print("DEBUG: Exception during backup!\n", traceback.format_exc())
-            return False, f"Backup failed: {str(e)}"
 
-    def _show_progress_popup(self, root, initial_text=""):
-        popup = tk.Toplevel(root)
-        popup.title("Backup Progress")
-        popup.geometry("500x100")
-        popup.configure(bg=ModernUITheme.BG_COLOR)
-        popup.transient(root)
-        popup.grab_set()
-        popup.focus_set()
-        # Center the popup
-        popup.update_idletasks()
-        x = root.winfo_rootx() + (root.winfo_width() // 2) - 250
-        y = root.winfo_rooty() + (root.winfo_height() // 2) - 50
-        popup.geometry(f"+{x}+{y}")
-        # Label for folder path
-        label = tk.Label(
-            popup,
-            text=initial_text,
-            font=("Helvetica", 12, "bold"),
-            bg=ModernUITheme.BG_COLOR,
-            fg=ModernUITheme.THEME_COLOR1,
-            wraplength=480,
-            anchor="w",
-            justify="left"
+    def set_checkpoint_status(self, checkpoint_id, status):
+        """Mark a checkpoint as running, interrupted or complete"""
+        self.cursor.execute(
+            "UPDATE backup_checkpoints SET status = ?, updated_at = ? WHERE id = ?",
+            (status, datetime.datetime.now().isoformat(), checkpoint_id)
         )
-        label.pack(fill=tk.BOTH, expand=True, padx=20, pady=30)
-        popup.update()
-        return popup, label
+        self._commit()
+
+    def get_checkpoint(self, checkpoint_id):
+        """Retrieve a checkpoint together with the members written so far and their delta signatures"""
+        self.cursor.execute(
+            "SELECT id, project_id, source_dir, dest_file, archive_rel, file_exclusions, folder_exclusions, zip_offset, status, started_at, updated_at FROM backup_checkpoints WHERE id = ?",
+            (checkpoint_id,)
+        )
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        checkpoint = self._checkpoint_from_row(row)
+        self.cursor.execute(
+            "SELECT name, header_offset, external_attr FROM checkpoint_members WHERE checkpoint_id = ? ORDER BY header_offset",
+            (checkpoint_id,)
+        )
+        checkpoint['members'] = [
+            {'name': self._decode_text(r[0]), 'header_offset': r[1], 'external_attr': r[2]}
+            for r in self.cursor.fetchall()
+        ]
+        self.cursor.execute(
+            "SELECT rel_path, member_name, size, mtime_ns, sha256, block_size, chain_depth, weak, strong FROM checkpoint_signatures WHERE checkpoint_id = ?",
+            (checkpoint_id,)
+        )
+        checkpoint['signatures'] = [
+            {'rel_path': self._decode_text(r[0]), 'member_name': self._decode_text(r[1]), 'size': r[2], 'mtime_ns': r[3],
+             'sha256': r[4], 'block_size': r[5], 'chain_depth': r[6], 'weak': r[7], 'strong': r[8]}
+            for r in self.cursor.fetchall()
+        ]
+        return checkpoint
+
+    def get_incomplete_checkpoints(self):
+        """Retrieve all backup runs that did not finish, newest first"""
+        self.cursor.execute(
+            "SELECT id, project_id, source_dir, dest_file, archive_rel, file_exclusions, folder_exclusions, zip_offset, status, started_at, updated_at FROM backup_checkpoints WHERE status != 'complete' ORDER BY updated_at DESC"
+        )
+        return [self._checkpoint_from_row(row) for row in self.cursor.fetchall()]
+
+    def _checkpoint_from_row(self, row):
+        """Decode a backup_checkpoints row into a dictionary"""
+        return {
+            'id': row[0],
+            'project_id': row[1],
+            'source_dir': self._decode_text(row[2]),
+            'dest_file': self._decode_text(row[3]),
+            'archive_rel': self._decode_text(row[4]),
+            'file_exclusions': [self._decode_text(excl) for excl in row[5].rstrip(',').split(',')] if row[5] else [],
+            'folder_exclusions': [self._decode_text(excl) for excl in row[6].rstrip(',').split(',')] if row[6] else [],
+            'zip_offset': row[7],
+            'status': row[8],
+            'started_at': row[9],
+            'updated_at': row[10]
+        }
+
+    def delete_checkpoint(self, checkpoint_id):
+        """Delete a checkpoint and its member and signature records"""
+        with self.transaction():
+            self.cursor.execute("DELETE FROM checkpoint_members WHERE checkpoint_id = ?", (checkpoint_id,))
+            self.cursor.execute("DELETE FROM checkpoint_signatures WHERE checkpoint_id = ?", (checkpoint_id,))
+            self.cursor.execute("DELETE FROM backup_checkpoints WHERE id = ?", (checkpoint_id,))
+
+    def create_backup_record(self, project_id, archive_path, archive_format, backup_id=None):
+        """Add a running backup to the catalog and return its ID"""
+        with self.transaction():
+            while backup_id is None or self.get_backup_record(backup_id) is not None:
+                backup_id = self.generate_random_id()
+            self.cursor.execute(
+                "INSERT INTO backups (id, project_id, archive_path, format, status, started_at) VALUES (?, ?, ?, ?, 'running', ?)",
+                (backup_id, project_id, self._encode_text(archive_path), archive_format, datetime.datetime.now().isoformat())
+            )
+        return backup_id
+
+    def finish_backup_record(self, backup_id, status, files=None, archive_bytes=None, source_bytes=None):
+        """Record the outcome of a backup run"""
+        self.cursor.execute(
+            "UPDATE backups SET status = ?, finished_at = ?, files = ?, archive_bytes = ?, source_bytes = ? WHERE id = ?",
+            (status, datetime.datetime.now().isoformat(), files, archive_bytes, source_bytes, backup_id)
+        )
+        self._commit()
+
+    def get_backup_record(self, backup_id):
+        """Retrieve one catalog entry"""
+        self.cursor.execute(
+            "SELECT id, project_id, archive_path, format, status, started_at, finished_at, files, archive_bytes, source_bytes FROM backups WHERE id = ?",
+            (backup_id,)
+        )
+        row = self.cursor.fetchone()
+        return self._backup_from_row(row) if row else None
+
+    def _backup_from_row(self, row):
+        """Decode a backups row into a dictionary"""
+        return {
+            'id': row[0],
+            'project_id': row[1],
+            'archive_path': self._decode_text(row[2]),
+            'format': row[3],
+            'status': row[4],
+            'started_at': row[5],
+            'finished_at': row[6],
+            'files': row[7],
+            'archive_bytes': row[8],
+            'source_bytes': row[9]
+        }
+
+    def get_file_signature(self, project_id, rel_path):
+        """Retrieve the block signature of a file from the latest completed backup that stored it"""
+        self.cursor.execute(
+            "SELECT s.backup_id, b.archive_path, s.member_name, s.size, s.mtime_ns, s.sha256, s.block_size, s.chain_depth, s.weak, s.strong "
+            "FROM file_signatures s JOIN backups b ON b.id = s.backup_id "
+            "WHERE s.project_id = ? AND s.rel_path = ? AND b.status = 'complete'",
+            (project_id, self._encode_text(rel_path))
+        )
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        return {
+            'backup_id': row[0],
+            'archive_path': self._decode_text(row[1]),
+            'member_name': self._decode_text(row[2]),
+            'size': row[3],
+            'mtime_ns': row[4],
+            'sha256': row[5],
+            'block_size': row[6],
+            'chain_depth': row[7],
+            'weak': row[8],
+            'strong': row[9]
+        }
+
+    def save_file_signatures(self, project_id, backup_id, signatures):
+        """Replace the stored signatures of the given files"""
+        with self.transaction():
+            self.cursor.executemany(
+                "INSERT OR REPLACE INTO file_signatures (project_id, rel_path, backup_id, member_name, size, mtime_ns, sha256, block_size, chain_depth, weak, strong) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (project_id, self._encode_text(sig['rel_path']), backup_id, self._encode_text(sig['member_name']),
+                     sig['size'], sig['mtime_ns'], sig['sha256'], sig['block_size'], sig['chain_depth'],
+                     sig['weak'], sig['strong'])
+                    for sig in signatures
+                ]
+            )
+
+    def save_backup_copies(self, backup_id, copies):
+        """Record the outcome of each destination of a backup"""
+        with self.transaction():
+            self.cursor.executemany(
+                "INSERT OR REPLACE INTO backup_copies (backup_id, archive_path, status, archive_bytes, error) VALUES (?, ?, ?, ?, ?)",
+                [(backup_id, self._encode_text(copy['path']), 'complete' if copy['ok'] else 'failed', copy['bytes'], copy['error'])
+                 for copy in copies]
+            )
+
+    def get_backup_copies(self, backup_id):
+        """Destinations of a backup with their outcome"""
+        self.cursor.execute(
+            "SELECT archive_path, status, archive_bytes, error FROM backup_copies WHERE backup_id = ? ORDER BY rowid",
+            (backup_id,)
+        )
+        return [{'path': self._decode_text(row[0]), 'status': row[1], 'archive_bytes': row[2], 'error': row[3]}
+                for row in self.cursor.fetchall()]
+
+    def set_backup_archive_path(self, backup_id, archive_path):
+        """Point a catalog entry at another copy of its archive"""
+        self.cursor.execute("UPDATE backups SET archive_path = ? WHERE id = ?", (self._encode_text(archive_path), backup_id))
+        self._commit()
+
+    def get_backups(self, project_id):
+        """All catalog entries of a project, oldest first"""
+        self.cursor.execute(
+            "SELECT id, project_id, archive_path, format, status, started_at, finished_at, files, archive_bytes, source_bytes "
+            "FROM backups WHERE project_id = ? ORDER BY started_at",
+            (project_id,)
+        )
+        return [self._backup_from_row(row) for row in self.cursor.fetchall()]
+
+    def get_backup_dependencies(self, project_id):
+        """(backup_id, depends_on) pairs for a project's backups"""
+        self.cursor.execute(
+            "SELECT d.backup_id, d.depends_on FROM backup_dependencies d JOIN backups b ON b.id = d.backup_id WHERE b.project_id = ?",
+            (project_id,)
+        )
+        return self.cursor.fetchall()
+
+    def delete_backup_records(self, backup_ids):
+        """Remove backups from the catalog together with the signatures, bundles and checkpoints that point at them"""
+        rows = [(backup_id,) for backup_id in backup_ids]
+        with self.transaction():
+            self.cursor.executemany("DELETE FROM backup_dependencies WHERE backup_id = ?", rows)
+            self.cursor.executemany("DELETE FROM file_signatures WHERE backup_id = ?", rows)
+            self.cursor.executemany("DELETE FROM git_bundles WHERE backup_id = ?", rows)
+            self.cursor.executemany("DELETE FROM backup_copies WHERE backup_id = ?", rows)
+            self.cursor.executemany("DELETE FROM checkpoint_members WHERE checkpoint_id = ?", rows)
+            self.cursor.executemany("DELETE FROM checkpoint_signatures WHERE checkpoint_id = ?", rows)
+            self.cursor.executemany("DELETE FROM backup_checkpoints WHERE id = ?", rows)
+            self.cursor.executemany("DELETE FROM backups WHERE id = ?", rows)
+
+    def add_backup_dependency(self, backup_id, depends_on):
+        """Record that a backup cannot be restored without another one"""
+        self.cursor.execute(
+            "INSERT OR IGNORE INTO backup_dependencies (backup_id, depends_on) VALUES (?, ?)",
+            (backup_id, depends_on)
+        )
+        self._commit()
+
+    def save_git_bundle(self, backup_id, project_id, meta):
+        """Record the refs a completed backup bundled"""
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO git_bundles (backup_id, project_id, tips, chain_depth, base_backup_id) VALUES (?, ?, ?, ?, ?)",
+            (backup_id, project_id, json.dumps(meta['tips']), meta['chain_depth'], meta['base_backup_id'])
+        )
+        self._commit()
+
+    def get_last_git_bundle(self, project_id):
+        """Retrieve the bundle of the project's most recent completed backup that has one"""
+        self.cursor.execute(
+            "SELECT g.backup_id, b.archive_path, g.tips, g.chain_depth FROM git_bundles g JOIN backups b ON b.id = g.backup_id "
+            "WHERE g.project_id = ? AND b.status = 'complete' AND b.format != ? ORDER BY b.finished_at DESC LIMIT 1",
+            (project_id, BackupManager.STREAM_FORMAT)
+        )
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        return {
+            'backup_id': row[0],
+            'archive_path': self._decode_text(row[1]),
+            'tips': json.loads(row[2]),
+            'chain_depth': row[3]
+        }
+
+    def close(self):
+        """Close the database connections of all threads"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+class ProjectDiscovery:
+    """Find project roots under a parent folder and register them in bulk"""
+    # Ecosystem: (marker entries, folders excluded when present at the root, skipped extensions)
+    ECOSYSTEMS = {
+        'git': ((".git",), (), ()),
+        'node': (("package.json",), ("node_modules", ".next", ".nuxt", ".parcel-cache", "coverage", "dist", "build"), ()),
+        'python': (("pyproject.toml",), (".venv", "venv", ".tox", ".nox", "__pycache__", ".mypy_cache", ".pytest_cache",
+                                         ".ruff_cache", "build", "dist"), (".pyc", ".pyo"))
+    }
+    EXPORT_FORMAT = "project-backup-utility/projects"
+    EXPORT_VERSION = 1
+
+    def __init__(self, max_depth=4):
+        self.max_depth = max_depth
+        # Folders never searched for projects: dependency and cache trees of every ecosystem
+        self.pruned = {name for _, folders, _ in self.ECOSYSTEMS.values() for name in folders}
+
+    def find(self, parent):
+        """Return a proposed project dict for every project root under parent, sorted by path.
+
+        A folder holding any ecosystem's marker is a root and is not searched further; hidden folders,
+        dependency folders and symlinks are never entered.
+        """
+        found = []
+        pending = [(os.path.abspath(parent), 0)]
+        while pending:
+            folder, depth = pending.pop()
+            try:
+                with os.scandir(folder) as it:
+                    entries = list(it)
+            except OSError as e:
+                print(f"DEBUG: Cannot scan {folder}: {e}")
+                continue
+            names = {entry.name for entry in entries}
+            ecosystems = [name for name, (markers, _, _) in self.ECOSYSTEMS.items() if names.intersection(markers)]
+            if ecosystems:
+                found.append(self._propose(folder, names, ecosystems))
+                continue
+            if depth >= self.max_depth:
+                continue
+            for entry in entries:
+                if entry.name.startswith(".") or entry.name in self.pruned:
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((entry.path, depth + 1))
+                except OSError:
+                    continue
+        return sorted(found, key=lambda project: project['folder_path'])
+
+    def _propose(self, folder, names, ecosystems):
+        """A project for one root with the default exclusions of its ecosystems"""
+        folder_exclusions = []
+        extensions = []
+        for ecosystem in ecosystems:
+            _, folders, skipped = self.ECOSYSTEMS[ecosystem]
+            folder_exclusions.extend(f for f in folders if f in names and f not in folder_exclusions)
+            extensions.extend(e for e in skipped if e not in extensions)
+        options = {'exclusion_rules': {'extensions': extensions}} if extensions else {}
+        return {
+            'name': os.path.basename(folder) or folder,
+            'folder_path': folder,
+            'description': f"Discovered {' + '.join(ecosystems)} project",
+            'file_exclusions': [],
+            'folder_exclusions': folder_exclusions,
+            'options': options
+        }
+
+    @staticmethod
+    def register(db, candidates):
+        """Add the candidates whose folder isn't registered yet, in one transaction; returns (added IDs, skipped)"""
+        registered = {os.path.normcase(os.path.abspath(p['folder_path'])) for p in db.get_all_projects()}
+        new = []
+        for candidate in candidates:
+            key = os.path.normcase(os.path.abspath(candidate['folder_path']))
+            if key not in registered:
+                registered.add(key)
+                new.append(candidate)
+        return db.add_projects(new), len(candidates) - len(new)
+
+    @classmethod
+    def export_json(cls, db, fileobj):
+        """Write every project with its options as JSON; returns the number written"""
+        projects = db.export_projects()
+        json.dump({'format': cls.EXPORT_FORMAT, 'version': cls.EXPORT_VERSION, 'projects': projects}, fileobj, indent=2)
+        fileobj.write("\n")
+        return len(projects)
+
+    @classmethod
+    def import_json(cls, db, fileobj, keep_ids=True):
+        """Load projects written by export_json in one transaction; returns their IDs.
+
+        With keep_ids, projects replace those with the same ID, so importing the same file again
+        is idempotent; otherwise every project is added under a new ID.
+        """
+        data = json.load(fileobj)
+        if not isinstance(data, dict) or data.get('format') != cls.EXPORT_FORMAT:
+            raise ValueError("Not a project export file")
+        if data.get('version', 0) > cls.EXPORT_VERSION:
+            raise ValueError(f"Project export version {data['version']} is newer than this program supports")
+        projects = []
+        for project in data.get('projects') or ():
+            if not project.get('name') or not project.get('folder_path'):
+                raise ValueError(f"Project entry without a name or folder: {project!r}")
+            project = dict(project)
+            if not keep_ids:
+                project.pop('id', None)
+            projects.append(project)
+        return db.add_projects(projects)
+
+def parse_size(text):
+    """Parse a byte count such as 512K, 20M or 1.5G"""
+    if text is None:
+        return None
+    text = str(text).strip().upper().rstrip("B").rstrip("I")
+    multipliers = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    if text and text[-1] in multipliers:
+        return int(float(text[:-1]) * multipliers[text[-1]])
+    return int(float(text))
+
+def parse_deadline(text):
+    """Parse a deadline as seconds from now: a duration such as 90m, 2h30m or 3600, or a clock time such as 06:00"""
+    text = str(text).strip().lower()
+    if ":" in text:
+        hour, minute = (int(part) for part in text.split(":", 1))
+        now = datetime.datetime.now()
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= now:
+            target += datetime.timedelta(days=1)
+        return (target - now).total_seconds()
+    units = {"h": 3600, "m": 60, "s": 1}
+    seconds = 0.0
+    number = ""
+    for char in text:
+        if char in units:
+            if not number:
+                raise ValueError(f"Invalid duration: {text}")
+            seconds += float(number) * units[char]
+            number = ""
+        else:
+            number += char
+    if number:
+        seconds += float(number)
+    return seconds
+
+class CompressionPacer:
+    """Picks a deflate level per member so a ZIP backup finishes by a deadline or keeps a target rate.
+
+    The rate each level achieves (read + compress + write) is measured as members are written. Before
+    each member the pacer takes the highest level whose rate covers what the rest of the run needs;
+    levels not measured yet are estimated from measured ones with SPEED_HINT. Level 0 stores.
+    Small members are left out of the measurements, and the next higher level is probed every
+    PROBE_INTERVAL bytes so the choice can go back up once the run gets faster.
+    """
+    LEVELS = (9, 6, 3, 1, 0)
+    # Rough speed of each level relative to level 9, until it has been measured
+    SPEED_HINT = {9: 1.0, 6: 2.0, 3: 4.0, 1: 5.0, 0: 40.0}
+    # Level used before anything has been measured
+    START_LEVEL = 6
+    # Safety margin on the required rate
+    HEADROOM = 1.15
+    # Bytes a level needs before its own measurement is trusted, and the window measurements decay over
+    MIN_SAMPLE = 4 * 1024 * 1024
+    WINDOW = 256 * 1024 * 1024
+    # Members smaller than this are not measured
+    MIN_MEMBER = 64 * 1024
+    # Bytes written between probes of the next higher level
+    PROBE_INTERVAL = 64 * 1024 * 1024
+
+    def __init__(self, deadline=None, target_rate=None, total_bytes=None, done_bytes=0):
+        """deadline is seconds from now; target_rate is source bytes per second; done_bytes are already archived"""
+        if deadline is None and target_rate is None:
+            raise ValueError("A deadline or a target rate is required")
+        self.deadline = deadline
+        self.target_rate = target_rate
+        self.total_bytes = total_bytes or 0
+        self.started = time.monotonic()
+        self.done_bytes = done_bytes
+        # level -> [bytes, seconds] over the recent window
+        self._measured = {}
+        self._since_probe = 0
+        self._probe = None
+        # level -> [members, bytes] over the whole run
+        self.mix = {}
+        self.level = None
+        self.prediction = None
+        self.finished = None
+
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def rate(self, level):
+        """Estimated bytes per second at a level, or None before a deflate level has been measured"""
+        sample = self._measured.get(level)
+        if sample and sample[0] >= self.MIN_SAMPLE and sample[1] > 0:
+            return sample[0] / sample[1]
+        # Scale from the nearest trusted level; storing is bound by I/O, so it says nothing about deflate speed
+        candidates = [lvl for lvl, s in self._measured.items()
+                      if s[0] >= self.MIN_SAMPLE and s[1] > 0 and (lvl or not level)]
+        if not candidates:
+            return None
+        base_level = min(candidates, key=lambda lvl: (abs(lvl - level), lvl))
+        base = self._measured[base_level]
+        return base[0] / base[1] * self.SPEED_HINT[level] / self.SPEED_HINT[base_level]
+
+    def required_rate(self, member_size):
+        """Source bytes per second the rest of the run needs"""
+        if self.target_rate is not None:
+            return self.target_rate
+        remaining = max(self.total_bytes - self.done_bytes, member_size)
+        time_left = self.deadline - self.elapsed()
+        return float('inf') if time_left <= 0 else remaining / time_left
+
+    def choose(self, member_size):
+        """Return the level for the next member"""
+        if self.rate(self.START_LEVEL) is None:
+            # No deflate level has a trusted measurement yet
+            return self.START_LEVEL
+        if self._probe is not None:
+            sample = self._measured.get(self._probe)
+            if not sample or sample[0] < self.MIN_SAMPLE:
+                return self._probe
+            self._probe = None
+        needed = self.required_rate(member_size) * self.HEADROOM
+        level = next((lvl for lvl in self.LEVELS if self.rate(lvl) >= needed), self.LEVELS[-1])
+        if level != self.LEVELS[0] and self._since_probe >= self.PROBE_INTERVAL:
+            # Re-measure the next higher level from scratch, so a slow early measurement cannot pin the choice down
+            self._since_probe = 0
+            self._probe = self.LEVELS[self.LEVELS.index(level) - 1]
+            self._measured.pop(self._probe, None)
+            return self._probe
+        return level
+
+    def apply(self, zipf, member_size):
+        """Set the archive's compression for the next member"""
+        self.level = self.choose(member_size)
+        zipf.compression = zipfile.ZIP_DEFLATED if self.level else zipfile.ZIP_STORED
+        zipf.compresslevel = self.level or None
+
+    def record(self, member_size, seconds):
+        """Account for a member written at the current level"""
+        if member_size >= self.MIN_MEMBER:
+            # Small members are dominated by per-file overhead and would skew the rate
+            sample = self._measured.setdefault(self.level, [0, 0.0])
+            sample[0] += member_size
+            sample[1] += seconds
+            if sample[0] > self.WINDOW:
+                sample[0] /= 2
+                sample[1] /= 2
+            self._since_probe += member_size
+        mix = self.mix.setdefault(self.level, [0, 0])
+        mix[0] += 1
+        mix[1] += member_size
+        self.done_bytes += member_size
+        if self.prediction is None and self.total_bytes and (
+                self.done_bytes >= self.total_bytes * 0.05 or self.elapsed() >= 2.0):
+            rate = self.rate(self.level)
+            if rate:
+                remaining = max(self.total_bytes - self.done_bytes, 0)
+                self.prediction = (self.elapsed() + remaining / rate, 100.0 * self.done_bytes / self.total_bytes)
+
+    def credit(self, member_size):
+        """Account for a member a special handler wrote, without measuring the current level"""
+        self.done_bytes += member_size
+
+    def finish(self):
+        self.finished = time.monotonic()
+
+    def summary_lines(self):
+        """Level mix and predicted versus actual duration"""
+        lines = ["Compression levels: " + ", ".join(
+            f"{'store' if level == 0 else level} {members} files {ExclusionAnalyzer.format_size(size)}"
+            for level, (members, size) in sorted(self.mix.items(), reverse=True)
+        )]
+        timing = f"Duration {self.elapsed():.1f} s"
+        if self.prediction is not None:
+            timing += f", predicted {self.prediction[0]:.1f} s at {self.prediction[1]:.0f}% done"
+        if self.deadline is not None:
+            met = "met" if self.elapsed() <= self.deadline else "missed"
+            timing += f", deadline {self.deadline:.1f} s ({met})"
+        else:
+            timing += (f", {self.done_bytes / max(self.elapsed(), 1e-9) / 1024 / 1024:.2f} MB/s "
+                       f"for a target of {self.target_rate / 1024 / 1024:.2f} MB/s")
+        lines.append(timing)
+        return lines
+
+class ResourceGovernor:
+    """Limits how hard a backup run hits the host: read rate, workers, CPU and I/O priority"""
+    IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+    # ioprio_set syscall numbers per architecture (Linux only)
+    IOPRIO_SET_SYSCALL = {"x86_64": 251, "amd64": 251, "i386": 289, "i686": 289, "aarch64": 30, "arm64": 30, "armv7l": 314}
+    ADAPT_INTERVAL = 1.0
+    # Niceness of the first thread that applied a priority; nice settings count from here, not cumulatively
+    _base_nice = None
+    _nice_lock = threading.Lock()
+
+    def __init__(self, read_rate=None, burst_seconds=1.0, workers=None, nice=None, ioprio_class=None,
+                 ioprio_level=4, adaptive=False, load_threshold=1.0, latency_threshold_ms=50.0, min_factor=0.05):
+        """Configure limits; every limit defaults to off"""
+        self.read_rate = read_rate
+        self.burst_seconds = burst_seconds
+        self.workers = max(1, min(workers or os.cpu_count() or 1, os.cpu_count() or 1))
+        self.nice = nice
+        self.ioprio_class = ioprio_class
+        self.ioprio_level = ioprio_level
+        self.adaptive = adaptive
+        self.load_threshold = load_threshold
+        self.latency_threshold_ms = latency_threshold_ms
+        self.min_factor = min_factor
+        # Throttle state
+        self.factor = 1.0
+        self._tokens = 0.0
+        self._last_refill = time.monotonic()
+        # Accounting
+        self.started = time.monotonic()
+        self.bytes_read = 0
+        self.read_seconds = 0.0
+        self.sleep_seconds = 0.0
+        self.backoffs = 0
+        self.peak_rate = 0.0
+        self._window_start = self.started
+        self._window_bytes = 0
+        self._window_reads = 0
+        self._window_read_seconds = 0.0
+
+    def apply_process_priority(self):
+        """Apply nice and ioprio settings before the run starts its worker threads.
+
+        nice is an offset from the niceness the process had when a priority was first applied, so
+        repeated runs in one process (the GUI) don't keep raising it. Linux applies both niceness
+        and I/O priority to the calling thread only; threads it starts afterwards inherit them,
+        which covers the walker, hashing and fan-out threads of a run.
+        """
+        if self.nice:
+            try:
+                with self._nice_lock:
+                    current = os.nice(0)
+                    if ResourceGovernor._base_nice is None:
+                        ResourceGovernor._base_nice = current
+                    target = ResourceGovernor._base_nice + self.nice
+                    # Niceness can only be raised without privileges; never lower it
+                    new_nice = os.nice(target - current) if target > current else current
+                print(f"DEBUG: Process niceness now {new_nice}")
+            except (AttributeError, OSError) as e:
+                print(f"DEBUG: Could not change niceness: {e}")
+        if self.ioprio_class:
+            syscall_number = self.IOPRIO_SET_SYSCALL.get(platform.machine().lower())
+            if not sys.platform.startswith("linux") or syscall_number is None:
+                print("DEBUG: ioprio is only supported on Linux, ignoring")
+                return
+            io_class = self.IOPRIO_CLASSES[self.ioprio_class]
+            level = 0 if io_class == 3 else self.ioprio_level
+            libc = ctypes.CDLL(None, use_errno=True)
+            # IOPRIO_WHO_PROCESS with pid 0 means the calling thread
+            if libc.syscall(syscall_number, 1, 0, (io_class << 13) | level) != 0:
+                print(f"DEBUG: ioprio_set failed: {os.strerror(ctypes.get_errno())}")
+            else:
+                print(f"DEBUG: I/O priority set to {self.ioprio_class} {level}")
+
+    def current_rate(self):
+        """Effective read rate in bytes per second, or None when unthrottled"""
+        if self.factor >= 1.0:
+            return self.read_rate
+        base = self.read_rate or self.peak_rate
+        return max(base * self.factor, 1.0) if base else None
+
+    def read(self, fileobj, size):
+        """Read from a file object, accounting latency and honoring the rate limit"""
+        start = time.monotonic()
+        data = fileobj.read(size)
+        self._account(len(data), time.monotonic() - start)
+        return data
+
+    def read_fd(self, fd, size):
+        """Read from a raw file descriptor, accounting latency and honoring the rate limit"""
+        start = time.monotonic()
+        data = os.read(fd, size)
+        self._account(len(data), time.monotonic() - start)
+        return data
+
+    def _account(self, nbytes, seconds):
+        """Record a read and sleep as long as the token bucket requires"""
+        self.bytes_read += nbytes
+        self.read_seconds += seconds
+        self._window_bytes += nbytes
+        self._window_reads += 1
+        self._window_read_seconds += seconds
+        now = time.monotonic()
+        if now - self._window_start >= self.ADAPT_INTERVAL:
+            self._end_window(now)
+        rate = self.current_rate()
+        if not rate or not nbytes:
+            return
+        self._tokens = min(rate * self.burst_seconds, self._tokens + (now - self._last_refill) * rate)
+        self._last_refill = now
+        self._tokens -= nbytes
+        if self._tokens < 0:
+            delay = -self._tokens / rate
+            time.sleep(delay)
+            self.sleep_seconds += delay
+            self._tokens = 0.0
+            self._last_refill = time.monotonic()
+
+    def _end_window(self, now):
+        """Update peak throughput and, in adaptive mode, back off or recover"""
+        elapsed = now - self._window_start
+        if self._window_bytes and self.factor >= 1.0:
+            self.peak_rate = max(self.peak_rate, self._window_bytes / elapsed)
+        if self.adaptive:
+            pressure = []
+            if hasattr(os, 'getloadavg'):
+                load = os.getloadavg()[0] / (os.cpu_count() or 1)
+                if load > self.load_threshold:
+                    pressure.append(f"load {load:.2f}/cpu")
+            if self._window_reads:
+                latency_ms = 1000.0 * self._window_read_seconds / self._window_reads
+                if latency_ms > self.latency_threshold_ms:
+                    pressure.append(f"read latency {latency_ms:.1f} ms")
+            if pressure:
+                self.factor = max(self.min_factor, self.factor * 0.5)
+                self.backoffs += 1
+                print(f"DEBUG: Backing off to {self.factor:.0%} ({', '.join(pressure)})")
+            elif self.factor < 1.0:
+                self.factor = min(1.0, self.factor * 1.25)
+        self._window_start = now
+        self._window_bytes = 0
+        self._window_reads = 0
+        self._window_read_seconds = 0.0
+
+    def summary(self):
+        """Throughput report for sizing backup windows"""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            'bytes_read': self.bytes_read,
+            'elapsed_seconds': elapsed,
+            'throughput': self.bytes_read / elapsed,
+            'read_seconds': self.read_seconds,
+            'throttled_seconds': self.sleep_seconds,
+            'backoffs': self.backoffs,
+            'workers': self.workers
+        }
+
+class _Crc32Hash:
+    """hashlib-style wrapper around zlib.crc32"""
+    digest_size = 4
+
+    def __init__(self, data=b""):
+        self.value = zlib.crc32(data)
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def digest(self):
+        return struct.pack(">I", self.value)
+
+    def hexdigest(self):
+        return f"{self.value:08x}"
+
+def _gf2_matrix_times(matrix, vector):
+    """Multiply a 32x32 GF(2) matrix (one int per column) by a vector"""
+    result = 0
+    index = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[index]
+        vector >>= 1
+        index += 1
+    return result
+
+@functools.lru_cache(maxsize=64)
+def _crc32_shift_operator(length):
+    """GF(2) operator that advances a CRC-32 over `length` zero bytes (as in zlib's crc32_combine)"""
+    # Operator for one zero bit, then squared up to one zero byte
+    operator = [0xEDB88320] + [1 << n for n in range(31)]
+    for _ in range(3):
+        operator = [_gf2_matrix_times(operator, column) for column in operator]
+    result = None
+    while length:
+        if length & 1:
+            result = operator if result is None else [_gf2_matrix_times(operator, column) for column in result]
+        length >>= 1
+        if length:
+            operator = [_gf2_matrix_times(operator, column) for column in operator]
+    return tuple(result) if result is not None else None
+
+def crc32_combine(crc1, crc2, length2):
+    """CRC-32 of A+B from crc32(A), crc32(B) and len(B)"""
+    operator = _crc32_shift_operator(length2)
+    if operator is None:
+        return crc1
+    return _gf2_matrix_times(operator, crc1) ^ crc2
+
+class ContentHasher:
+    """Content digests for manifests, verification and dedup, with parallel tree hashing of large files
+
+    Files larger than one chunk are mapped with mmap and their chunks hashed on a thread pool (zlib,
+    hashlib and blake3 all release the GIL). Every result carries the per-chunk digests and a whole-file
+    digest. For crc32 the chunk CRCs are combined into the plain CRC-32 of the file, so it matches ZIP
+    entries. For the cryptographic algorithms a file of one chunk gets the plain digest; larger files get
+    a tree root: the digest of a header (chunk size, file size) followed by the chunk digests. A tree
+    root is not what sha256sum prints, so results say which kind they carry and label() names it.
+    """
+    ALGORITHMS = {
+        'crc32': _Crc32Hash,
+        'sha256': hashlib.sha256,
+        'blake3': blake3.blake3 if blake3 is not None else None
+    }
+    DEFAULT_ALGORITHM = "sha256"
+    DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+    TREE_MAGIC = b"PCTREE1"
+
+    def __init__(self, algorithm=DEFAULT_ALGORITHM, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+        """Select an algorithm; workers defaults to the CPU count"""
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError(f"Unknown hash algorithm: {algorithm}")
+        if self.ALGORITHMS[algorithm] is None:
+            raise ValueError(f"Hash algorithm {algorithm} is not available (pip install {algorithm})")
+        if chunk_size < 4096:
+            raise ValueError("Chunk size must be at least 4K")
+        self.algorithm = algorithm
+        self.chunk_size = chunk_size
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self._pool = None
+
+    @classmethod
+    def available(cls):
+        """Names of the algorithms usable in this environment"""
+        return [name for name, factory in cls.ALGORITHMS.items() if factory is not None]
+
+    def new(self, data=b""):
+        """Fresh streaming hash object for the selected algorithm"""
+        return self.ALGORITHMS[self.algorithm](data)
+
+    def _chunk_digest(self, view):
+        if self.algorithm == "crc32":
+            return zlib.crc32(view)
+        return self.new(view).digest()
+
+    def _pool_map(self, function, items):
+        if self.workers == 1 or len(items) == 1:
+            return [function(item) for item in items]
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash")
+        return list(self._pool.map(function, items))
+
+    def _result(self, size, chunk_digests):
+        """Whole-file digest plus hex chunk digests"""
+        if self.algorithm == "crc32":
+            value = 0
+            for index, crc in enumerate(chunk_digests):
+                length = min(self.chunk_size, size - index * self.chunk_size)
+                value = crc32_combine(value, crc, length)
+            digest = f"{value:08x}"
+            chunks = [f"{crc:08x}" for crc in chunk_digests]
+        else:
+            if len(chunk_digests) == 1:
+                digest = chunk_digests[0].hex()
+            else:
+                root = self.new(self.TREE_MAGIC + struct.pack("<QQ", self.chunk_size, size))
+                for chunk_digest in chunk_digests:
+                    root.update(chunk_digest)
+                digest = root.hexdigest()
+            chunks = [chunk_digest.hex() for chunk_digest in chunk_digests]
+        return {
+            'algorithm': self.algorithm,
+            'size': size,
+            'chunk_size': self.chunk_size,
+            'digest': digest,
+            'tree': self.algorithm != "crc32" and len(chunk_digests) > 1,
+            'chunks': chunks
+        }
+
+    @staticmethod
+    def label(result):
+        """The algorithm of a result, e.g. sha256, or sha256-tree:4M for a tree root over 4 MiB chunks"""
+        if not result['tree']:
+            return result['algorithm']
+        chunk_size = result['chunk_size']
+        for suffix, unit in (("G", 1 << 30), ("M", 1 << 20), ("K", 1 << 10)):
+            if chunk_size % unit == 0:
+                return f"{result['algorithm']}-tree:{chunk_size // unit}{suffix}"
+        return f"{result['algorithm']}-tree:{chunk_size}"
+
+    def hash_bytes(self, data):
+        """Hash an in-memory buffer the same way hash_file hashes a file"""
+        view = memoryview(data).cast("B")
+        if len(view) <= self.chunk_size:
+            return self._result(len(view), [self._chunk_digest(view)])
+        ranges = range(0, len(view), self.chunk_size)
+        return self._result(len(view), self._pool_map(lambda start: self._chunk_digest(view[start:start + self.chunk_size]), ranges))
+
+    def hash_file(self, file_path):
+        """Hash a file, in parallel chunks over an mmap when it spans more than one chunk"""
+        with open(file_path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            if not stat.S_ISREG(st.st_mode) or st.st_size <= self.chunk_size:
+                return self._hash_stream(f)
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as e:
+                print(f"DEBUG: Cannot map {file_path} ({e}), hashing sequentially")
+                return self._hash_stream(f)
+        with mapped:
+            if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                return self._result(len(mapped), self._pool_map(
+                    lambda start: self._chunk_digest(view[start:start + self.chunk_size]),
+                    range(0, len(mapped), self.chunk_size)
+                ))
+            finally:
+                view.release()
+
+    def _hash_stream(self, f):
+        """Sequential fallback for small files and anything that cannot be mapped"""
+        chunk_digests = []
+        size = 0
+        while True:
+            chunk = f.read(self.chunk_size)
+            if not chunk and chunk_digests:
+                break
+            chunk_digests.append(self._chunk_digest(chunk))
+            size += len(chunk)
+            if len(chunk) < self.chunk_size:
+                break
+        return self._result(size, chunk_digests)
+
+    def close(self):
+        """Stop the worker threads"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @classmethod
+    def benchmark(cls, size=256 * 1024 * 1024, algorithms=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, repeat=3):
+        """Throughput in GB/s of each algorithm, single-stream and tree-parallel, on a temporary file"""
+        results = []
+        with tempfile.NamedTemporaryFile(prefix="pbu-hash-bench-") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(max(1, size // len(block))):
+                f.write(block)
+            f.flush()
+            size = os.fstat(f.fileno()).st_size
+            for algorithm in algorithms or cls.available():
+                row = {'algorithm': algorithm, 'size': size}
+                for mode, mode_workers in (("single", 1), ("tree", workers)):
+                    with cls(algorithm, chunk_size=chunk_size, workers=mode_workers) as hasher:
+                        best = None
+                        for _ in range(repeat):
+                            started = time.perf_counter()
+                            if mode == "single":
+                                # One streaming hash over the mapped file, no chunking
+                                with open(f.name, 'rb') as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                                    hasher.new(mapped)
+                            else:
+                                hasher.hash_file(f.name)
+                            elapsed = time.perf_counter() - started
+                            best = elapsed if best is None else min(best, elapsed)
+                        row[mode] = size / best / 1e9
+                        if mode == "tree":
+                            row['workers'] = hasher.workers
+                results.append(row)
+        return results
+
+class MemberHandlerRegistry:
+    """Registry of special handlers for archive members, matched by glob pattern"""
+    # Handler results; returning None falls back to the default write path, which reports COPIED
+    WRITTEN = "written"
+    SKIPPED = "skipped"
+    COPIED = "copied"
+
+    def __init__(self):
+        """Initialize an empty registry"""
+        self._handlers = []
+
+    def register(self, pattern, handler, name=None, before=None):
+        """Register handler(zipf, file_path, rel_path, st, stats, governor) for paths or file names matching pattern.
+
+        Handlers are tried in registration order; before= inserts ahead of the handlers with that name.
+        """
+        entry = (pattern, handler, name or getattr(handler, '__name__', pattern))
+        for position, (_, _, existing) in enumerate(self._handlers):
+            if before is not None and existing == before:
+                self._handlers.insert(position, entry)
+                return
+        self._handlers.append(entry)
+
+    def copy(self):
+        """Return an independent registry with the same handlers, e.g. to add per-run handlers"""
+        registry = MemberHandlerRegistry()
+        registry._handlers = list(self._handlers)
+        return registry
+
+    def unregister(self, name):
+        """Remove all handlers registered under the given name"""
+        self._handlers = [h for h in self._handlers if h[2] != name]
+
+    def find(self, rel_path):
+        """Return the handlers whose pattern matches the member path or its file name"""
+        base_name = rel_path.rpartition("/")[2]
+        return [
+            (handler, name) for pattern, handler, name in self._handlers
+            if fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(base_name, pattern)
+        ]
+
+def _member_info(zipf, file_path, rel_path, st):
+    """Build a ZipInfo for a file that will be streamed into the archive"""
+    info = zipfile.ZipInfo.from_file(file_path, rel_path)
+    info.compress_type = zipf.compression
+    info._compresslevel = zipf.compresslevel
+    info.file_size = st.st_size
+    return info
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+def _sqlite_readonly_uri(file_path):
+    """Read-only SQLite URI for a path; '#', '?' and '%' in the path must be percent-encoded"""
+    path = os.path.abspath(file_path).replace(os.sep, "/")
+    return "file://" + ("" if path.startswith("/") else "/") + urllib.parse.quote(path, safe="/:") + "?mode=ro"
+
+def snapshot_sqlite_member(zipf, file_path, rel_path, st, stats, governor):
+    """Store a consistent copy of a live SQLite database taken with the online backup API"""
+    with open(file_path, 'rb') as f:
+        if f.read(len(SQLITE_MAGIC)) != SQLITE_MAGIC:
+            return None
+    fd, snapshot_path = tempfile.mkstemp(suffix=".sqlite-snapshot")
+    os.close(fd)
+    try:
+        source = sqlite3.connect(_sqlite_readonly_uri(file_path), uri=True)
+        try:
+            target = sqlite3.connect(snapshot_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+        # Keep the original timestamp and permissions on the stored member
+        info = _member_info(zipf, file_path, rel_path, os.stat(snapshot_path))
+        with open(snapshot_path, 'rb') as src, zipf.open(info, 'w') as dst:
+            while True:
+                chunk = governor.read(src, 1024 * 1024)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        stats['sqlite_snapshots'] = stats.get('sqlite_snapshots', 0) + 1
+        # Its -wal/-journal content is inside the snapshot, so those sidecars can be left out
+        stats.setdefault('sqlite_snapshotted', []).append(rel_path)
+        print(f"DEBUG: Stored online SQLite snapshot of {rel_path}")
+        return MemberHandlerRegistry.WRITTEN
+    except sqlite3.Error as e:
+        print(f"DEBUG: SQLite snapshot of {rel_path} failed ({e}), copying file as-is")
+        return None
+    finally:
+        os.remove(snapshot_path)
+
+def skip_sqlite_sidecar(zipf, file_path, rel_path, st, stats, governor):
+    """Skip -wal/-shm/-journal files whose database was stored as a snapshot earlier in this run.
+
+    A database sorts before its sidecars, so the snapshot has been taken by the time they come up. When
+    it failed, or the database is excluded, the sidecar is kept: it may hold committed transactions.
+    """
+    for suffix in ("-wal", "-shm", "-journal"):
+        if rel_path.endswith(suffix):
+            database_rel = rel_path[:-len(suffix)]
+            break
+    else:
+        return None
+    if database_rel not in stats.get('sqlite_snapshotted', ()):
+        return None
+    print(f"DEBUG: Skipping SQLite sidecar covered by snapshot: {rel_path}")
+    return MemberHandlerRegistry.SKIPPED
+
+def write_sparse_member(zipf, file_path, rel_path, st, stats, governor):
+    """Stream a sparse file, reading only its data regions and synthesizing zeros for holes"""
+    if not hasattr(os, 'SEEK_DATA') or st.st_size < BackupManager.SPARSE_MIN_SIZE:
+        return None
+    if getattr(st, 'st_blocks', None) is None or st.st_blocks * 512 >= st.st_size:
+        return None
+    chunk_size = 1024 * 1024
+    zeros = bytes(chunk_size)
+    hole_bytes = 0
+    info = _member_info(zipf, file_path, rel_path, st)
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        # Probe first so filesystems without SEEK_DATA support fall back cleanly
+        try:
+            os.lseek(fd, 0, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                return None
+        with zipf.open(info, 'w') as dst:
+            pos = 0
+            while pos < st.st_size:
+                try:
+                    data_start = os.lseek(fd, pos, os.SEEK_DATA)
+                except OSError as e:
+                    if e.errno != errno.ENXIO:
+                        raise
+                    data_start = st.st_size  # Only a hole remains
+                data_start = min(data_start, st.st_size)
+                # Write the hole as zeros without touching the disk
+                remaining = data_start - pos
+                hole_bytes += remaining
+                while remaining > 0:
+                    n = min(remaining, chunk_size)
+                    dst.write(zeros[:n] if n < chunk_size else zeros)
+                    remaining -= n
+                if data_start >= st.st_size:
+                    break
+                data_end = min(os.lseek(fd, data_start, os.SEEK_HOLE), st.st_size)
+                os.lseek(fd, data_start, os.SEEK_SET)
+                remaining = data_end - data_start
+                while remaining > 0:
+                    chunk = governor.read_fd(fd, min(remaining, chunk_size))
+                    if not chunk:
+                        raise IOError(f"{rel_path} shrank while being archived")
+                    dst.write(chunk)
+                    remaining -= len(chunk)
+                pos = data_end
+    finally:
+        os.close(fd)
+    stats['sparse_files'] = stats.get('sparse_files', 0) + 1
+    stats['sparse_hole_bytes'] = stats.get('sparse_hole_bytes', 0) + hole_bytes
+    print(f"DEBUG: Sparse file {rel_path}: skipped reading {hole_bytes} bytes of holes")
+    return MemberHandlerRegistry.WRITTEN
+
+def benchmark_sparse(size=1024 ** 3, data_fraction=0.05, repeat=3):
+    """Time archiving a sparse image of the given size with and without hole detection.
+
+    The image holds 1 MiB data extents spread evenly so they cover data_fraction of it. Each way is run
+    repeat times into a stored ZIP in a temporary folder; the fastest run and the bytes read are reported.
+    """
+    extent = 1024 * 1024
+    workdir = tempfile.mkdtemp(prefix="sparse-bench-")
+    try:
+        image = os.path.join(workdir, "disk.img")
+        with open(image, 'wb') as f:
+            f.truncate(size)
+            extents = max(1, int(size * data_fraction) // extent)
+            for i in range(extents):
+                f.seek(i * (size - extent) // max(extents - 1, 1))
+                f.write(os.urandom(extent))
+        st = os.stat(image)
+        results = {'size': size, 'allocated': st.st_blocks * 512 if hasattr(st, 'st_blocks') else size}
+        plain = MemberHandlerRegistry()
+        sparse = MemberHandlerRegistry()
+        sparse.register("*", write_sparse_member, name="sparse")
+        for label, handlers in (("plain", plain), ("sparse", sparse)):
+            best = None
+            for _ in range(repeat):
+                governor = ResourceGovernor()
+                started = time.perf_counter()
+                with zipfile.ZipFile(os.path.join(workdir, "out.zip"), 'w', zipfile.ZIP_STORED) as zipf, \
+                        contextlib.redirect_stdout(io.StringIO()):
+                    BackupManager(None)._write_member(zipf, image, "disk.img", {}, governor, handlers)
+                seconds = time.perf_counter() - started
+                best = seconds if best is None else min(best, seconds)
+            results[label + '_seconds'] = best
+            results[label + '_bytes_read'] = governor.summary()['bytes_read']
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# Default handlers; plugins can add their own with MEMBER_HANDLERS.register(pattern, handler)
+MEMBER_HANDLERS = MemberHandlerRegistry()
+for _pattern in ("*.db", "*.sqlite", "*.sqlite3", "*.db3"):
+    MEMBER_HANDLERS.register(_pattern, snapshot_sqlite_member, name="sqlite")
+for _pattern in ("*-wal", "*-shm", "*-journal"):
+    MEMBER_HANDLERS.register(_pattern, skip_sqlite_sidecar, name="sqlite-sidecar")
+MEMBER_HANDLERS.register("*", write_sparse_member, name="sparse")
+
+class GitSource:
+    """Enumerates and bundles a git working tree through the git command line"""
+    # Per-project git modes: plain walk, git-listed working tree, plus a history bundle, plus the raw .git folder
+    MODES = ("walk", "worktree", "worktree+bundle", "raw")
+    MEMBER_DIR = ".plumcave-git/"
+    BUNDLE_MEMBER = MEMBER_DIR + "repo.bundle"
+    META_MEMBER = MEMBER_DIR + "bundle.json"
+    # A full bundle is stored again once this many incremental ones depend on each other
+    MAX_CHAIN = 10
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def open(cls, path):
+        """Return a GitSource for a folder inside a git working tree, or None"""
+        try:
+            result = subprocess.run(["git", "-C", path, "rev-parse", "--is-inside-work-tree"],
+                                    capture_output=True, check=False)
+        except OSError:
+            return None
+        if result.returncode != 0 or result.stdout.strip() != b"true":
+            return None
+        return cls(path)
+
+    def _git(self, *args, check=True):
+        result = subprocess.run(["git", "-C", self.path, *args], capture_output=True, check=False)
+        if check and result.returncode != 0:
+            raise RuntimeError(f"git {args[0]} failed: {os.fsdecode(result.stderr).strip()}")
+        return result
+
+    def list_files(self):
+        """Tracked plus untracked-but-not-ignored files, relative to the folder, sorted"""
+        output = self._git("ls-files", "-z", "--cached", "--others", "--exclude-standard").stdout
+        # Unmerged files are listed once per stage
+        return sorted({os.fsdecode(name) for name in output.split(b"\0") if name})
+
+    def git_dir(self):
+        """Absolute path of the repository's .git folder"""
+        return os.path.realpath(os.fsdecode(self._git("rev-parse", "--absolute-git-dir").stdout.strip()))
+
+    def tips(self):
+        """Object IDs of all refs and HEAD, the basis for the next incremental bundle"""
+        tips = {os.fsdecode(tip) for tip in self._git("for-each-ref", "--format=%(objectname)").stdout.split()}
+        head = self.head_commit()
+        return sorted(tips | {head} if head else tips)
+
+    def head_ref(self):
+        """The branch HEAD points to, or None when detached"""
+        result = self._git("symbolic-ref", "-q", "HEAD", check=False)
+        return os.fsdecode(result.stdout.strip()) or None
+
+    def head_commit(self):
+        """The commit HEAD resolves to, or None in a repository without commits"""
+        result = self._git("rev-parse", "--verify", "-q", "HEAD", check=False)
+        return os.fsdecode(result.stdout.strip()) or None
+
+    def create_bundle(self, bundle_path, basis=()):
+        """Bundle all refs, leaving out history reachable from basis; returns False when nothing is new"""
+        # Tips that were since garbage collected can't serve as prerequisites
+        known = [tip for tip in basis if self._git("cat-file", "-e", tip + "^{commit}", check=False).returncode == 0]
+        args = ["bundle", "create", "-q", bundle_path, "--all"] + (["--not"] + known if known else [])
+        result = self._git(*args, check=False)
+        if result.returncode != 0:
+            if b"empty bundle" in result.stderr.lower():
+                return False
+            raise RuntimeError(f"git bundle failed: {os.fsdecode(result.stderr).strip()}")
+        return True
+
+    @classmethod
+    def restore_repository(cls, archive_path, dest_dir, restorer):
+        """Rebuild .git in dest_dir from the bundle chain ending in archive_path; the files must already be restored"""
+        chain = []
+        while True:
+            with restorer._open_member(archive_path, cls.META_MEMBER) as (stream, size):
+                meta = json.loads(restorer._read_exact(stream, size))
+            chain.append((archive_path, meta))
+            if not meta['base_backup_id']:
+                break
+            archive_path = restorer._resolve_base(meta, archive_path)
+        subprocess.run(["git", "init", "-q", dest_dir], check=True)
+        for archive_path, meta in reversed(chain):
+            if not meta['bundle']:
+                continue
+            fd, bundle_path = tempfile.mkstemp(suffix=".bundle")
+            os.close(fd)
+            try:
+                restorer.materialize(archive_path, cls.BUNDLE_MEMBER, bundle_path)
+                subprocess.run(["git", "-C", dest_dir, "fetch", "-q", "--update-head-ok", bundle_path, "+refs/*:refs/*"],
+                               check=True)
+            finally:
+                os.remove(bundle_path)
+        head, head_commit = chain[0][1]['head'], chain[0][1].get('head_commit')
+        if head:
+            subprocess.run(["git", "-C", dest_dir, "symbolic-ref", "HEAD", head], check=True)
+        elif head_commit:
+            subprocess.run(["git", "-C", dest_dir, "update-ref", "--no-deref", "HEAD", head_commit], check=True)
+        # Point the index at HEAD without touching the restored files
+        subprocess.run(["git", "-C", dest_dir, "reset", "-q"], check=False)
+        return len(chain)
+
+class TarZstdWriter:
+    """Streams a tar archive through multithreaded zstd, with a seekable index sidecar.
+
+    Implements the subset of the ZipFile writing API that BackupManager and the member
+    handlers use (open(info, 'w') with a ZipInfo whose file_size is set), so the same
+    walk can produce either format.
+    """
+    # Frames are cut between members once this much tar data has been written,
+    # so a single member can be restored by decompressing from its frame only
+    DEFAULT_FRAME_SIZE = 32 * 1024 * 1024
+    # Skippable frame magic used to embed the trained dictionary
+    DICT_FRAME_MAGIC = 0x184D2A5D
+    INDEX_SUFFIX = ".idx.json"
+
+    def __init__(self, dest_file, level=12, threads=1, window_log=27, long_distance=True,
+                 dictionary=None, frame_size=None):
+        """Open the output and configure the zstd compressor"""
+        if zstandard is None:
+            raise RuntimeError("The tar.zst format requires the 'zstandard' package (pip install zstandard)")
+        self.dest_file = dest_file
+        # Mirrors ZipFile so _member_info() can fill in ZipInfo fields
+        self.compression = zipfile.ZIP_STORED
+        self.compresslevel = None
+        self.level = level
+        self.window_log = window_log
+        self.frame_size = frame_size or self.DEFAULT_FRAME_SIZE
+        params = zstandard.ZstdCompressionParameters.from_level(
+            level,
+            window_log=window_log,
+            enable_ldm=1 if long_distance else 0,
+            threads=threads if threads > 1 else 0
+        )
+        self._dictionary = dictionary
+        self._cctx = zstandard.ZstdCompressor(
+            compression_params=params,
+            dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        )
+        self.fp = open(dest_file, 'wb')
+        if dictionary:
+            self.fp.write(struct.pack('<II', self.DICT_FRAME_MAGIC, len(dictionary)))
+            self.fp.write(dictionary)
+        self._tar_offset = 0
+        self._frames = []
+        self._members = []
+        self._compressor = None
+        self._frame_start_tar = 0
+        self._writing = False
+        self._start_frame()
+
+    def _start_frame(self):
+        """Begin a new independent zstd frame at the current position"""
+        self._compressor = self._cctx.compressobj()
+        self._frame_start_tar = self._tar_offset
+        self._frames.append([self.fp.tell(), self._tar_offset])
+
+    def _end_frame(self):
+        """Finish the current zstd frame"""
+        self.fp.write(self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH))
+
+    def _write_tar(self, data):
+        """Append raw tar bytes to the current frame"""
+        if data:
+            self.fp.write(self._compressor.compress(data))
+            self._tar_offset += len(data)
+
+    def open(self, info, mode='w', force_zip64=False):
+        """Start a member described by a ZipInfo and return a writable stream for its data"""
+        if mode != 'w':
+            raise ValueError("TarZstdWriter only supports writing")
+        if self._writing:
+            raise ValueError("Can't write a member while another one is open")
+        if self._tar_offset - self._frame_start_tar >= self.frame_size:
+            self._end_frame()
+            self._start_frame()
+        tarinfo = tarfile.TarInfo(info.filename)
+        tarinfo.size = info.file_size
+        tarinfo.mtime = int(time.mktime(info.date_time + (0, 0, -1)))
+        tarinfo.mode = (info.external_attr >> 16) & 0o7777 or 0o644
+        header_offset = self._tar_offset
+        self._write_tar(tarinfo.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+        member = {
+            'name': info.filename,
+            'size': info.file_size,
+            'mtime': tarinfo.mtime,
+            'mode': tarinfo.mode,
+            'header_offset': header_offset,
+            'data_offset': self._tar_offset
+        }
+        self._writing = True
+        return _TarZstdMemberStream(self, member)
+
+    def _finish_member(self, member, written):
+        """Pad the member to a tar block and record it in the index"""
+        if written != member['size']:
+            raise IOError(f"{member['name']} changed size while being archived ({member['size']} -> {written} bytes)")
+        remainder = written % tarfile.BLOCKSIZE
+        if remainder:
+            self._write_tar(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+        self._members.append(member)
+        self._writing = False
+
+    def close(self):
+        """Write the end-of-archive blocks, finish the last frame and write the index sidecar"""
+        if self.fp is None:
+            return
+        self._write_tar(tarfile.NUL * (tarfile.BLOCKSIZE * 2))
+        self._end_frame()
+        self.fp.close()
+        self.fp = None
+        index = {
+            'format': 'tar.zst',
+            'version': 1,
+            'archive_size': os.path.getsize(self.dest_file),
+            'window_log': self.window_log,
+            'dictionary': base64.b64encode(self._dictionary).decode('ascii') if self._dictionary else None,
+            'frames': self._frames,
+            'members': self._members
+        }
+        with open(self.dest_file + self.INDEX_SUFFIX, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def train_dictionary(paths, dict_size=112 * 1024, max_sample_bytes=64 * 1024):
+        """Train a zstd dictionary from sample files; returns None when there is too little data"""
+        if zstandard is None:
+            return None
+        samples = []
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read(max_sample_bytes)
+            except OSError:
+                continue
+            if data:
+                samples.append(data)
+        if len(samples) < 8:
+            return None
+        try:
+            return zstandard.train_dictionary(dict_size, samples).as_bytes()
+        except zstandard.ZstdError as e:
+            print(f"DEBUG: Dictionary training failed: {e}")
+            return None
+
+class _TarZstdMemberStream:
+    """Writable stream for one member of a TarZstdWriter"""
+    def __init__(self, writer, member):
+        self._writer = writer
+        self._member = member
+        self._written = 0
+
+    def write(self, data):
+        self._writer._write_tar(data)
+        self._written += len(data)
+        return len(data)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer._finish_member(self._member, self._written)
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class TarZstdReader:
+    """Lists and extracts single members of a tar.zst archive using its index sidecar"""
+    def __init__(self, archive_path):
+        """Load the index written next to the archive"""
+        if zstandard is None:
+            raise RuntimeError("Reading tar.zst archives requires the 'zstandard' package (pip install zstandard)")
+        self.archive_path = archive_path
+        with open(archive_path + TarZstdWriter.INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        if self.index['archive_size'] != os.path.getsize(archive_path):
+            raise ValueError("Index sidecar does not match the archive size")
+        self._frame_tar_offsets = [frame[1] for frame in self.index['frames']]
+        self._members = {member['name']: member for member in self.index['members']}
+        dictionary = self.index.get('dictionary')
+        self._dctx = zstandard.ZstdDecompressor(
+            dict_data=zstandard.ZstdCompressionDict(base64.b64decode(dictionary)) if dictionary else None,
+            max_window_size=1 << max(self.index.get('window_log') or 27, 27)
+        )
+
+    def names(self):
+        """Names of all members in archive order"""
+        return [member['name'] for member in self.index['members']]
+
+    def open_member(self, name):
+        """Return (reader, size) positioned at the start of a member's data"""
+        member = self._members[name]
+        frame = self.index['frames'][bisect.bisect_right(self._frame_tar_offsets, member['data_offset']) - 1]
+        f = open(self.archive_path, 'rb')
+        f.seek(frame[0])
+        reader = self._dctx.stream_reader(f, read_across_frames=True, closefd=True)
+        to_skip = member['data_offset'] - frame[1]
+        while to_skip:
+            skipped = len(reader.read(min(to_skip, 1024 * 1024)))
+            if not skipped:
+                raise EOFError(f"Archive ended before member {name}")
+            to_skip -= skipped
+        return reader, member['size']
+
+    def extract(self, name, dest_dir):
+        """Extract one member without decompressing the frames before it"""
+        member = self._members[name]
+        target = safe_member_path(dest_dir, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        reader, remaining = self.open_member(name)
+        with reader, open(target, 'wb') as out:
+            while remaining:
+                chunk = reader.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    raise EOFError(f"Archive ended inside member {name}")
+                out.write(chunk)
+                remaining -= len(chunk)
+        os.chmod(target, member['mode'])
+        os.utime(target, (member['mtime'], member['mtime']))
+        return target
+
+class _ZipMemberReader:
+    """Reads one stored or deflated member straight from its local header, checking the CRC at the end"""
+    def __init__(self, f, size, packed, method, crc):
+        self._f = f
+        self._size = size
+        self._left = packed
+        self._decompressor = zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None
+        self._pending = b""
+        self._produced = 0
+        self._expected_crc = crc
+        self._crc = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._size - self._produced
+        out = bytearray()
+        while len(out) < size and self._produced + len(out) < self._size:
+            wanted = size - len(out)
+            if self._decompressor is None:
+                data = self._f.read(min(wanted, self._left))
+                self._left -= len(data)
+            else:
+                if not self._pending and self._left:
+                    self._pending = self._f.read(min(BackupManager.COPY_CHUNK, self._left))
+                    self._left -= len(self._pending)
+                data = self._decompressor.decompress(self._pending, wanted)
+                self._pending = self._decompressor.unconsumed_tail
+            if not data and not self._pending and not self._left:
+                raise EOFError("Archive ended inside a member")
+            out += data
+        self._produced += len(out)
+        self._crc = zlib.crc32(out, self._crc)
+        if self._produced == self._size and self._crc != self._expected_crc:
+            raise zipfile.BadZipFile("Bad CRC-32 for member")
+        return bytes(out)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class ArchiveIndex:
+    """Member listing of a .zip or .tar.zst backup, read from the central directory or the index sidecar only.
+
+    Members are kept in flat arrays instead of ZipInfo objects so archives with millions of entries
+    load quickly, and each listing is cached in memory and on disk, keyed by the archive's size and
+    mtime. It also works as a read-only mapping of member name to (mtime, mode), which is what
+    DeltaRestorer expects.
+    """
+    # Field name, array typecode; for zip archives mtime holds the packed DOS date and time
+    FIELDS = (('size', 'Q'), ('packed', 'Q'), ('offset', 'Q'), ('mtime', 'q'), ('mode', 'L'), ('method', 'H'),
+              ('flags', 'H'), ('crc', 'L'))
+    CACHE_VERSION = 1
+    CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "project-backup-utility", "archive-index")
+    # Smaller archives parse in milliseconds and are only cached in memory
+    DISK_CACHE_MIN_MEMBERS = 10000
+    MEMORY_SLOTS = 4
+    _memory = collections.OrderedDict()
+    _memory_lock = threading.Lock()
+
+    def __init__(self, archive_path, archive_format, names, fields, concat=0):
+        self.archive_path = archive_path
+        self.format = archive_format
+        self.names = names
+        self.fields = fields
+        # Bytes prepended to the zip, which shift every stored offset
+        self.concat = concat
+        self._positions = None
+        self._lowered = None
+        # Where the listing came from: 'memory', 'disk' or 'archive'
+        self.source = 'archive'
+
+    @classmethod
+    def load(cls, archive_path):
+        """Return the index of an archive, rebuilding it only when the archive's size or mtime changed"""
+        archive_path = os.path.abspath(archive_path)
+        st = os.stat(archive_path)
+        key = (archive_path, st.st_size, st.st_mtime_ns)
+        with cls._memory_lock:
+            index = cls._memory.get(key)
+            if index is not None:
+                cls._memory.move_to_end(key)
+                index.source = 'memory'
+                return index
+        cache_path = cls._cache_path(archive_path)
+        index = cls._read_cache(cache_path, archive_path, st)
+        if index is None:
+            if BackupManager.archive_format_for(archive_path) == "tar.zst":
+                index = cls._from_tar_index(archive_path)
+            else:
+                index = cls._from_central_directory(archive_path, st.st_size)
+            if len(index) >= cls.DISK_CACHE_MIN_MEMBERS:
+                index._write_cache(cache_path, st)
+        with cls._memory_lock:
+            cls._memory[key] = index
+            while len(cls._memory) > cls.MEMORY_SLOTS:
+                cls._memory.popitem(last=False)
+        return index
+
+    @classmethod
+    def _empty_fields(cls):
+        return {name: array.array(typecode) for name, typecode in cls.FIELDS}
+
+    @classmethod
+    def _from_tar_index(cls, archive_path):
+        """Build the listing from the tar.zst index sidecar"""
+        with open(archive_path + TarZstdWriter.INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+        if sidecar['archive_size'] != os.path.getsize(archive_path):
+            raise ValueError("Index sidecar does not match the archive size")
+        names = []
+        fields = cls._empty_fields()
+        for member in sidecar['members']:
+            names.append(member['name'])
+            fields['size'].append(member['size'])
+            fields['packed'].append(0)
+            fields['offset'].append(member['data_offset'])
+            fields['mtime'].append(int(member['mtime']))
+            fields['mode'].append(member['mode'])
+            fields['method'].append(0)
+            fields['flags'].append(0)
+            fields['crc'].append(0)
+        return cls(archive_path, "tar.zst", names, fields)
+
+    @classmethod
+    def _from_central_directory(cls, archive_path, archive_size):
+        """Parse the end records and central directory of a zip without building ZipInfo objects"""
+        with open(archive_path, 'rb') as f:
+            tail_size = min(archive_size, zipfile.sizeEndCentDir + 0xFFFF)
+            f.seek(archive_size - tail_size)
+            tail = f.read(tail_size)
+            end = tail.rfind(zipfile.stringEndArchive)
+            while end >= 0 and end + zipfile.sizeEndCentDir > len(tail):
+                end = tail.rfind(zipfile.stringEndArchive, 0, end)
+            if end < 0:
+                raise zipfile.BadZipFile(f"{archive_path} is not a zip file")
+            end_pos = archive_size - tail_size + end
+            _, _, _, _, count, cd_size, cd_offset, _ = struct.unpack(
+                zipfile.structEndArchive, tail[end:end + zipfile.sizeEndCentDir])
+            record_pos = end_pos
+            locator_pos = end_pos - zipfile.sizeEndCentDir64Locator
+            if locator_pos >= 0:
+                f.seek(locator_pos)
+                locator = f.read(zipfile.sizeEndCentDir64Locator)
+                if locator[:4] == zipfile.stringEndArchive64Locator:
+                    record_pos = locator_pos - zipfile.sizeEndCentDir64
+                    f.seek(record_pos)
+                    record = f.read(zipfile.sizeEndCentDir64)
+                    if record[:4] != zipfile.stringEndArchive64:
+                        raise zipfile.BadZipFile("ZIP64 end record is missing")
+                    _, _, _, _, _, _, _, count, cd_size, cd_offset = struct.unpack(zipfile.structEndArchive64, record)
+            concat = record_pos - cd_size - cd_offset
+            f.seek(cd_offset + concat)
+            directory = f.read(cd_size)
+        if len(directory) != cd_size:
+            raise zipfile.BadZipFile("Central directory is truncated")
+        header = struct.Struct(zipfile.structCentralDir)
+        names = []
+        fields = cls._empty_fields()
+        add_size, add_packed, add_offset = fields['size'].append, fields['packed'].append, fields['offset'].append
+        add_mtime, add_mode, add_method = fields['mtime'].append, fields['mode'].append, fields['method'].append
+        add_flags, add_crc = fields['flags'].append, fields['crc'].append
+        pos = 0
+        while pos < cd_size:
+            (signature, _, _, _, _, flags, method, dostime, dosdate, crc, packed, size,
+             name_len, extra_len, comment_len, _, _, external_attr, offset) = header.unpack_from(directory, pos)
+            if signature != zipfile.stringCentralDir:
+                raise zipfile.BadZipFile(f"Bad central directory entry at {pos}")
+            pos += zipfile.sizeCentralDir
+            names.append(directory[pos:pos + name_len].decode('utf-8' if flags & 0x800 else 'cp437'))
+            pos += name_len
+            if size == 0xFFFFFFFF or packed == 0xFFFFFFFF or offset == 0xFFFFFFFF:
+                extra = directory[pos:pos + extra_len]
+                i = 0
+                while i + 4 <= len(extra):
+                    tag, length = struct.unpack_from('<HH', extra, i)
+                    if tag == 1:
+                        # Only the fields that overflowed are present, in this order
+                        values = iter(struct.unpack_from(f'<{length // 8}Q', extra, i + 4))
+                        if size == 0xFFFFFFFF:
+                            size = next(values)
+                        if packed == 0xFFFFFFFF:
+                            packed = next(values)
+                        if offset == 0xFFFFFFFF:
+                            offset = next(values)
+                        break
+                    i += 4 + length
+            pos += extra_len + comment_len
+            add_size(size)
+            add_packed(packed)
+            add_offset(offset)
+            add_mtime(dosdate << 16 | dostime)
+            add_mode(external_attr >> 16 & 0o7777)
+            add_method(method)
+            add_flags(flags)
+            add_crc(crc)
+        if count != len(names):
+            print(f"DEBUG: {archive_path} declares {count} members but its central directory lists {len(names)}")
+        return cls(archive_path, "zip", names, fields, concat)
+
+    @classmethod
+    def _cache_path(cls, archive_path):
+        return os.path.join(cls.CACHE_DIR, hashlib.sha256(archive_path.encode('utf-8')).hexdigest()[:32] + ".idx")
+
+    @classmethod
+    def _read_cache(cls, cache_path, archive_path, st):
+        """Load a cached listing if it was made from this exact archive; None otherwise"""
+        try:
+            with open(cache_path, 'rb') as f:
+                meta = json.loads(f.readline())
+                if (meta.get('version') != cls.CACHE_VERSION or meta['archive_path'] != archive_path
+                        or meta['archive_size'] != st.st_size or meta['archive_mtime_ns'] != st.st_mtime_ns
+                        or meta['byteorder'] != sys.byteorder):
+                    return None
+                count = meta['count']
+                names = f.read(meta['names_bytes']).decode('utf-8').split("\0") if count else []
+                fields = cls._empty_fields()
+                for name, _ in cls.FIELDS:
+                    fields[name].frombytes(f.read(count * fields[name].itemsize))
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"DEBUG: Ignoring archive index cache {cache_path}: {e}")
+            return None
+        if len(names) != count or any(len(values) != count for values in fields.values()):
+            return None
+        index = cls(archive_path, meta['format'], names, fields, meta['concat'])
+        index.source = 'disk'
+        return index
+
+    def _write_cache(self, cache_path, st):
+        """Save the listing next to other cached indexes; failures only cost a reparse next time"""
+        if any("\0" in name for name in self.names):
+            return
+        names = "\0".join(self.names).encode('utf-8')
+        meta = {
+            'version': self.CACHE_VERSION,
+            'archive_path': self.archive_path,
+            'archive_size': st.st_size,
+            'archive_mtime_ns': st.st_mtime_ns,
+            'byteorder': sys.byteorder,
+            'format': self.format,
+            'concat': self.concat,
+            'count': len(self.names),
+            'names_bytes': len(names)
+        }
+        try:
+            os.makedirs(self.CACHE_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.CACHE_DIR, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(meta).encode('utf-8') + b"\n")
+                f.write(names)
+                for name, _ in self.FIELDS:
+                    self.fields[name].tofile(f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"DEBUG: Could not cache the index of {self.archive_path}: {e}")
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def position(self, name):
+        """Index of a member by name, or None"""
+        if self._positions is None:
+            self._positions = {name: i for i, name in enumerate(self.names)}
+        return self._positions.get(name)
+
+    def __contains__(self, name):
+        return self.position(name) is not None
+
+    def __getitem__(self, name):
+        """(mtime, mode) of a member"""
+        i = self.position(name)
+        if i is None:
+            raise KeyError(name)
+        return self.modified(i), self.fields['mode'][i]
+
+    def modified(self, i):
+        """Modification time of a member as a timestamp"""
+        value = self.fields['mtime'][i]
+        if self.format != "zip":
+            return value
+        date, time_ = value >> 16, value & 0xFFFF
+        return time.mktime((
+            (date >> 9) + 1980, (date >> 5) & 0xF, date & 0x1F,
+            time_ >> 11, (time_ >> 5) & 0x3F, (time_ & 0x1F) * 2, 0, 0, -1
+        ))
+
+    def search(self, text, limit=None):
+        """Positions of members whose path contains text, or matches it as a glob; case-insensitive"""
+        if self._lowered is None:
+            self._lowered = [name.lower() for name in self.names]
+        text = text.strip().lower()
+        if not text:
+            matches = range(len(self.names))
+        elif any(c in text for c in "*?["):
+            pattern = text if "/" in text or text.startswith("*") else "*" + text
+            matches = [i for i, name in enumerate(self._lowered) if fnmatch.fnmatchcase(name, pattern)]
+        else:
+            matches = [i for i, name in enumerate(self._lowered) if text in name]
+        return list(matches[:limit] if limit is not None else matches), len(matches)
+
+    def open_member(self, name):
+        """Return (reader, size) for one member, seeking straight to its data"""
+        i = self.position(name)
+        if i is None:
+            raise KeyError(f"There is no item named {name!r} in the archive")
+        if self.format == "tar.zst":
+            return TarZstdReader(self.archive_path).open_member(name)
+        size = self.fields['size'][i]
+        method = self.fields['method'][i]
+        if self.fields['flags'][i] & 0x1 or method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            # Encrypted or unusual members go through zipfile, which reads the whole directory again
+            zipf = zipfile.ZipFile(self.archive_path)
+            try:
+                return _ZipFileMemberReader(zipf, zipf.open(name)), size
+            except Exception:
+                zipf.close()
+                raise
+        f = open(self.archive_path, 'rb')
+        try:
+            f.seek(self.fields['offset'][i] + self.concat)
+            header = f.read(zipfile.sizeFileHeader)
+            if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+                raise zipfile.BadZipFile(f"Bad local header for {name}")
+            *_, name_len, extra_len = struct.unpack(zipfile.structFileHeader, header)
+            f.seek(name_len + extra_len, os.SEEK_CUR)
+        except Exception:
+            f.close()
+            raise
+        return _ZipMemberReader(f, size, self.fields['packed'][i], method, self.fields['crc'][i]), size
+
+class _ZipFileMemberReader:
+    """Keeps a ZipFile open for as long as one of its member streams is read"""
+    def __init__(self, zipf, stream):
+        self._zipf = zipf
+        self._stream = stream
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+    def close(self):
+        self._stream.close()
+        self._zipf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class DeltaEncoder:
+    """rsync-style delta encoding of large files against their version in the project's previous backup.
+
+    Registered per run as a member handler. Block signatures (Adler-32 + BLAKE2b per block) of every
+    large file are kept in the database, so encoding never has to open the previous archive. A changed
+    file is stored as a member under MEMBER_PREFIX that holds COPY (from the base) and DATA operations
+    plus a header naming its base backup and member. A file that is unchanged since its base is stored
+    as a single copy of that base, and its signature keeps pointing there, so its chain doesn't grow.
+    """
+    MAGIC = b"PCDELTA1"
+    MEMBER_PREFIX = ".plumcave-delta/"
+    # Rolling checksum modulus (Adler-32)
+    ADLER_MOD = 65521
+    # Longest COPY operation written; lengths are stored as 32-bit unsigned integers
+    MAX_COPY = 1 << 30
+    DEFAULT_OPTIONS = {
+        # Files smaller than this are always stored whole
+        'min_size': 16 * 1024 * 1024,
+        # A file is stored whole again once its delta chain reaches this length
+        'max_chain': 5,
+        # Deltas larger than this fraction of the file are not worth the restore cost
+        'max_ratio': 0.5,
+        'block_size': 64 * 1024,
+        # Bytes scanned byte-by-byte per file to re-synchronize after insertions
+        'roll_budget': 4 * 1024 * 1024
+    }
+
+    def __init__(self, database, project_id, backup_id, options=None):
+        """Prepare a delta run for one backup"""
+        self.db = database
+        self.project_id = project_id
+        self.backup_id = backup_id
+        self.options = dict(self.DEFAULT_OPTIONS, **{k: v for k, v in (options or {}).items() if k in self.DEFAULT_OPTIONS})
+        self.signatures = []
+        # Signatures up to here are already stored with a checkpoint
+        self._checkpointed = 0
+        self.dependencies = set()
+        # (rel_path, file_size, stored_bytes) for each file stored as a delta
+        self.savings = []
+
+    @staticmethod
+    def _digest(data):
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def handle(self, zipf, file_path, rel_path, st, stats, governor):
+        """Member handler: store large files as a delta when a usable base exists, else whole"""
+        if not stat.S_ISREG(st.st_mode) or st.st_size < self.options['min_size']:
+            return None
+        previous = self.db.get_file_signature(self.project_id, rel_path)
+        if previous is not None:
+            if previous['chain_depth'] >= self.options['max_chain']:
+                print(f"DEBUG: Delta chain of {rel_path} reached {previous['chain_depth']}, storing whole file")
+            elif not os.path.exists(previous['archive_path']):
+                print(f"DEBUG: Base archive of {rel_path} is missing, storing whole file")
+            else:
+                if st.st_size == previous['size'] and st.st_mtime_ns == previous['mtime_ns']:
+                    result = self._write_unchanged(zipf, file_path, rel_path, st, stats, governor, previous)
+                    if result is not None:
+                        return result
+                return self._write_delta(zipf, file_path, rel_path, st, stats, governor, previous)
+        return self._write_full(zipf, file_path, rel_path, st, governor, _BlockSignature(self.options['block_size']))
+
+    def _write_full(self, zipf, file_path, rel_path, st, governor, signature):
+        """Store the whole file, computing its signature unless one was already built"""
+        building = not signature.finished
+        info = _member_info(zipf, file_path, rel_path, st)
+        with open(file_path, 'rb') as src, zipf.open(info, 'w') as dst:
+            while True:
+                chunk = governor.read(src, BackupManager.COPY_CHUNK)
+                if not chunk:
+                    break
+                if building:
+                    signature.update(chunk)
+                dst.write(chunk)
+        if building:
+            signature.finish()
+        self._add_signature(rel_path, rel_path, st, signature, 0)
+        return MemberHandlerRegistry.WRITTEN
+
+    def _add_signature(self, rel_path, member_name, st, signature, chain_depth):
+        """Queue a signature; checkpoints keep it for a resumed run, the catalog gets it when the backup completes"""
+        self.signatures.append({
+            'rel_path': rel_path,
+            'member_name': member_name,
+            'size': signature.size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': signature.sha256.hexdigest(),
+            'block_size': signature.block_size,
+            'chain_depth': chain_depth,
+            'weak': struct.pack(f'<{len(signature.weak)}I', *signature.weak),
+            'strong': b"".join(signature.strong)
+        })
+
+    def _write_unchanged(self, zipf, file_path, rel_path, st, stats, governor, previous):
+        """Store a file whose contents still match its signature as one copy of the base; None if they differ"""
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as src:
+            while True:
+                chunk = governor.read(src, BackupManager.COPY_CHUNK)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+        if sha256.hexdigest() != previous['sha256']:
+            return None
+        ops = io.BytesIO()
+        for offset in range(0, previous['size'], self.MAX_COPY):
+            ops.write(b"C" + struct.pack('<QI', offset, min(self.MAX_COPY, previous['size'] - offset)))
+        # No new signature: the next run compares against the same base, so the chain stays as it is
+        self._write_delta_member(zipf, file_path, rel_path, st, stats, previous, previous['size'], previous['sha256'], ops)
+        print(f"DEBUG: {rel_path} is unchanged since backup {previous['backup_id']}")
+        return MemberHandlerRegistry.WRITTEN
+
+    def _write_delta(self, zipf, file_path, rel_path, st, stats, governor, previous):
+        """Encode the file against its previous signature and store the delta if it is small enough"""
+        signature = _BlockSignature(previous['block_size'])
+        with tempfile.TemporaryFile() as ops:
+            with open(file_path, 'rb') as src:
+                self._encode(src, governor, previous, signature, ops)
+            header = self._delta_header(previous, signature.size, signature.sha256.hexdigest())
+            delta_size = len(self.MAGIC) + 4 + len(header) + ops.tell()
+            if delta_size > signature.size * self.options['max_ratio']:
+                print(f"DEBUG: Delta of {rel_path} is {delta_size/1024:.2f} KB, storing whole file instead")
+                return self._write_full(zipf, file_path, rel_path, st, governor, signature)
+            member_name = self._write_delta_member(zipf, file_path, rel_path, st, stats, previous,
+                                                   signature.size, signature.sha256.hexdigest(), ops)
+        self._add_signature(rel_path, member_name, st, signature, previous['chain_depth'] + 1)
+        return MemberHandlerRegistry.WRITTEN
+
+    def _delta_header(self, previous, target_size, target_sha256):
+        return json.dumps({
+            'base_backup_id': previous['backup_id'],
+            'base_archive': previous['archive_path'],
+            'base_member': previous['member_name'],
+            'base_size': previous['size'],
+            'base_sha256': previous['sha256'],
+            'chain_depth': previous['chain_depth'] + 1,
+            'block_size': previous['block_size'],
+            'target_size': target_size,
+            'target_sha256': target_sha256
+        }, separators=(',', ':')).encode('utf-8')
+
+    def _write_delta_member(self, zipf, file_path, rel_path, st, stats, previous, target_size, target_sha256, ops):
+        """Write the header and the operations in ops as the file's delta member; returns the member name"""
+        header = self._delta_header(previous, target_size, target_sha256)
+        delta_size = len(self.MAGIC) + 4 + len(header) + ops.tell()
+        member_name = self.MEMBER_PREFIX + rel_path
+        info = _member_info(zipf, file_path, member_name, st)
+        info.file_size = delta_size
+        ops.seek(0)
+        with zipf.open(info, 'w') as dst:
+            dst.write(self.MAGIC + struct.pack('<I', len(header)) + header)
+            while True:
+                chunk = ops.read(BackupManager.COPY_CHUNK)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        if previous['backup_id'] not in self.dependencies:
+            # Recorded right away so a resumed run still knows about members written before the interruption
+            self.db.add_backup_dependency(self.backup_id, previous['backup_id'])
+            self.dependencies.add(previous['backup_id'])
+        self.savings.append((rel_path, target_size, delta_size))
+        stats['delta_files'] = stats.get('delta_files', 0) + 1
+        stats['delta_saved_bytes'] = stats.get('delta_saved_bytes', 0) + target_size - delta_size
+        print(f"DEBUG: Stored {rel_path} as a {delta_size/1024:.2f} KB delta against backup {previous['backup_id']}")
+        return member_name
+
+    def _encode(self, src, governor, previous, signature, out):
+        """Write COPY/DATA operations turning the base into the file read from src"""
+        block_size = previous['block_size']
+        base_size = previous['size']
+        strong = [previous['strong'][i:i + 16] for i in range(0, len(previous['strong']), 16)]
+        weak = struct.unpack(f'<{len(previous["weak"]) // 4}I', previous['weak'])
+        # Position of each block in the base, first occurrence wins
+        strong_index = {}
+        for idx, digest in enumerate(strong):
+            strong_index.setdefault(digest, idx)
+        full_blocks = base_size // block_size
+        weak_index = {weak[idx] for idx in range(full_blocks)}
+        buf = bytearray()
+        buf_start = 0
+        eof = False
+        pending_copy = None
+        literal_from = 0
+        pos = 0
+        budget = self.options['roll_budget']
+
+        def fill(end):
+            nonlocal eof
+            while not eof and buf_start + len(buf) < end:
+                chunk = governor.read(src, BackupManager.COPY_CHUNK)
+                if not chunk:
+                    eof = True
+                    break
+                signature.update(chunk)
+                buf.extend(chunk)
+
+        def flush_copy():
+            nonlocal pending_copy
+            if pending_copy is not None:
+                out.write(b"C" + struct.pack('<QI', *pending_copy))
+                pending_copy = None
+
+        def emit_literal(start, end):
+            if end <= start:
+                return
+            flush_copy()
+            for offset in range(start, end, BackupManager.COPY_CHUNK):
+                piece = buf[offset - buf_start:min(end, offset + BackupManager.COPY_CHUNK) - buf_start]
+                out.write(b"D" + struct.pack('<I', len(piece)))
+                out.write(piece)
+
+        def emit_copy(base_offset, length):
+            nonlocal pending_copy
+            if pending_copy is not None and pending_copy[0] + pending_copy[1] == base_offset:
+                pending_copy[1] += length
+                if pending_copy[1] < 1 << 31:
+                    return
+                pending_copy[1] -= length
+            flush_copy()
+            pending_copy = [base_offset, length]
+
+        def block_length(idx):
+            return min(block_size, base_size - idx * block_size)
+
+        def roll(start):
+            """Slide a block-sized window byte by byte from start; return the first matching offset"""
+            rel = start - buf_start
+            shifts = min(block_size, len(buf) - rel - block_size)
+            if shifts <= 0:
+                return None, 0
+            checksum = zlib.adler32(buf[rel:rel + block_size])
+            a, b = checksum & 0xFFFF, checksum >> 16
+            mod = self.ADLER_MOD
+            for k in range(1, shifts + 1):
+                removed = buf[rel + k - 1]
+                a = (a - removed + buf[rel + k - 1 + block_size]) % mod
+                b = (b - block_size * removed - 1 + a) % mod
+                if (b << 16) | a in weak_index:
+                    idx = strong_index.get(self._digest(buf[rel + k:rel + k + block_size]))
+                    if idx is not None and block_length(idx) == block_size:
+                        return start + k, k
+            return None, shifts
+
+        while True:
+            fill(pos + block_size)
+            available = buf_start + len(buf) - pos
+            if available <= 0:
+                break
+            if available < block_size:
+                # Tail shorter than a block can only match the base's own tail
+                idx = strong_index.get(self._digest(buf[pos - buf_start:]))
+                if idx is not None and block_length(idx) == available:
+                    emit_literal(literal_from, pos)
+                    emit_copy(idx * block_size, available)
+                    literal_from = pos + available
+                pos += available
+                break
+            idx = strong_index.get(self._digest(buf[pos - buf_start:pos - buf_start + block_size]))
+            if idx is not None and block_length(idx) == block_size:
+                emit_literal(literal_from, pos)
+                emit_copy(idx * block_size, block_size)
+                pos += block_size
+                literal_from = pos
+            else:
+                found = None
+                if budget > 0:
+                    fill(pos + 2 * block_size)
+                    found, scanned = roll(pos)
+                    budget -= scanned
+                pos = found if found is not None else pos + block_size
+                if pos - literal_from >= BackupManager.COPY_CHUNK:
+                    emit_literal(literal_from, pos)
+                    literal_from = pos
+            # Keep only the bytes that may still be emitted as literals
+            if literal_from - buf_start >= 4 * BackupManager.COPY_CHUNK:
+                del buf[:literal_from - buf_start]
+                buf_start = literal_from
+        emit_literal(literal_from, pos)
+        flush_copy()
+        fill(float('inf'))
+        signature.finish()
+
+    def resume(self, signatures):
+        """Take over the signatures a checkpoint kept for the members written before the interruption"""
+        self.signatures = list(signatures) + self.signatures
+        self._checkpointed = len(signatures)
+
+    def uncheckpointed(self):
+        """Signatures queued since the last call, to be stored with the next checkpoint"""
+        signatures = self.signatures[self._checkpointed:]
+        self._checkpointed = len(self.signatures)
+        return signatures
+
+    def commit(self):
+        """Save the signatures of a completed backup so the next one can use it as a base"""
+        self.db.save_file_signatures(self.project_id, self.backup_id, self.signatures)
+
+class _BlockSignature:
+    """Incrementally computed per-block weak/strong checksums and SHA-256 of a file"""
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.weak = []
+        self.strong = []
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.finished = False
+        self._pending = bytearray()
+
+    def update(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        self._pending.extend(data)
+        usable = len(self._pending) - len(self._pending) % self.block_size
+        for offset in range(0, usable, self.block_size):
+            self._add(self._pending[offset:offset + self.block_size])
+        del self._pending[:usable]
+
+    def _add(self, block):
+        self.weak.append(zlib.adler32(block))
+        self.strong.append(DeltaEncoder._digest(block))
+
+    def finish(self):
+        if self._pending:
+            self._add(bytes(self._pending))
+            self._pending.clear()
+        self.finished = True
+
+def safe_member_path(dest_dir, name):
+    """Path below dest_dir for an archive member name; absolute names and .. components are refused, as zipfile does"""
+    parts = name.replace("\\", "/").split("/")
+    if name.startswith(("/", "\\")) or os.path.splitdrive(name)[0] or ".." in parts:
+        raise ValueError(f"Refusing to extract {name!r} outside {dest_dir}")
+    root = os.path.abspath(dest_dir)
+    target = os.path.abspath(os.path.join(root, *(part for part in parts if part not in ("", "."))))
+    if target == root or os.path.commonpath([root, target]) != root:
+        raise ValueError(f"Refusing to extract {name!r} outside {dest_dir}")
+    return target
+
+class DeltaRestorer:
+    """Extracts backups, rebuilding delta members from their chain of base backups"""
+    def __init__(self, database=None, max_depth=64):
+        """The database is used to find base archives that were moved since the delta was written"""
+        self.db = database
+        self.max_depth = max_depth
+
+    @staticmethod
+    def _members(archive_path):
+        """Map member names to (mtime, mode) for a .zip or .tar.zst archive"""
+        return ArchiveIndex.load(archive_path)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _open_member(archive_path, name):
+        """Yield (stream, size) for one member; tar streams continue past the member, so read only size bytes"""
+        reader, size = ArchiveIndex.load(archive_path).open_member(name)
+        with reader:
+            yield reader, size
+
+    def _resolve_base(self, header, archive_path=None):
+        """Find the archive a delta was encoded against"""
+        if os.path.exists(header['base_archive']):
+            return header['base_archive']
+        if archive_path is not None:
+            # Backups moved together, or recorded relative to another working directory
+            sibling = os.path.join(os.path.dirname(os.path.abspath(archive_path)), os.path.basename(header['base_archive']))
+            if os.path.exists(sibling):
+                return sibling
+        if self.db is not None:
+            record = self.db.get_backup_record(header['base_backup_id'])
+            if record and os.path.exists(record['archive_path']):
+                return record['archive_path']
+            # Any other destination the base was written to will do
+            for copy in self.db.get_backup_copies(header['base_backup_id']):
+                if copy['status'] == 'complete' and os.path.exists(copy['path']):
+                    return copy['path']
+        raise FileNotFoundError(
+            f"Base backup {header['base_backup_id']} ({header['base_archive']}) is missing"
+        )
+
+    def _read_exact(self, stream, size):
+        data = stream.read(size)
+        while len(data) < size:
+            more = stream.read(size - len(data))
+            if not more:
+                raise EOFError("Delta member is truncated")
+            data += more
+        return data
+
+    def materialize(self, archive_path, name, out_path, depth=0):
+        """Write the full contents of a member to out_path, applying its delta chain if it has one"""
+        if not name.startswith(DeltaEncoder.MEMBER_PREFIX):
+            with self._open_member(archive_path, name) as (src, remaining), open(out_path, 'wb') as out:
+                while remaining:
+                    chunk = src.read(min(remaining, BackupManager.COPY_CHUNK))
+                    if not chunk:
+                        raise EOFError(f"Archive ended inside member {name}")
+                    out.write(chunk)
+                    remaining -= len(chunk)
+            return
+        if depth >= self.max_depth:
+            raise ValueError(f"Delta chain of {name} is longer than {self.max_depth}")
+        with self._open_member(archive_path, name) as (delta, delta_size):
+            if self._read_exact(delta, len(DeltaEncoder.MAGIC)) != DeltaEncoder.MAGIC:
+                raise ValueError(f"{name} is not a delta member")
+            header_size, = struct.unpack('<I', self._read_exact(delta, 4))
+            header = json.loads(self._read_exact(delta, header_size))
+            remaining = delta_size - len(DeltaEncoder.MAGIC) - 4 - header_size
+            fd, base_path = tempfile.mkstemp(suffix=".delta-base")
+            os.close(fd)
+            try:
+                self.materialize(self._resolve_base(header, archive_path), header['base_member'], base_path, depth + 1)
+                sha256 = hashlib.sha256()
+                with open(base_path, 'rb') as base, open(out_path, 'wb') as out:
+                    while remaining > 0:
+                        op = self._read_exact(delta, 1)
+                        if op == b"C":
+                            remaining -= 13
+                            offset, length = struct.unpack('<QI', self._read_exact(delta, 12))
+                            base.seek(offset)
+                            while length:
+                                chunk = base.read(min(length, BackupManager.COPY_CHUNK))
+                                if not chunk:
+                                    raise EOFError(f"Base of {name} is shorter than the delta expects")
+                                sha256.update(chunk)
+                                out.write(chunk)
+                                length -= len(chunk)
+                        elif op == b"D":
+                            length, = struct.unpack('<I', self._read_exact(delta, 4))
+                            remaining -= 5 + length
+                            chunk = self._read_exact(delta, length)
+                            sha256.update(chunk)
+                            out.write(chunk)
+                        else:
+                            raise ValueError(f"Unknown delta operation {op!r} in {name}")
+            finally:
+                os.remove(base_path)
+        if sha256.hexdigest() != header['target_sha256']:
+            raise ValueError(f"Checksum mismatch after applying delta {name}")
+
+    def extract(self, archive_path, rel_path, dest_dir, members=None):
+        """Extract one file by its project path, whether it was stored whole or as a delta"""
+        members = members if members is not None else self._members(archive_path)
+        name = rel_path if rel_path in members else DeltaEncoder.MEMBER_PREFIX + rel_path
+        if name not in members:
+            raise KeyError(f"There is no item named {rel_path!r} in the archive")
+        target = safe_member_path(dest_dir, rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        self.materialize(archive_path, name, target)
+        mtime, mode = members[name]
+        if mode:
+            os.chmod(target, mode)
+        os.utime(target, (mtime, mtime))
+        return target
+
+    def restore(self, archive_path, dest_dir):
+        """Extract every file of a backup, then rebuild .git from its bundles; returns the number of files written"""
+        members = self._members(archive_path)
+        count = 0
+        for name in members:
+            if name.endswith("/") or name.startswith(GitSource.MEMBER_DIR):
+                continue
+            rel_path = name[len(DeltaEncoder.MEMBER_PREFIX):] if name.startswith(DeltaEncoder.MEMBER_PREFIX) else name
+            self.extract(archive_path, rel_path, dest_dir, members)
+            count += 1
+        if GitSource.META_MEMBER in members:
+            links = GitSource.restore_repository(archive_path, dest_dir, self)
+            print(f"DEBUG: Rebuilt .git from a chain of {links} bundle(s)")
+        return count
+
+def _words_to_lanes(data, words):
+    """Split data into `words` integers; 32-bit lane i of integer w holds little-endian word w of record i"""
+    values = array.array('I')
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return [int.from_bytes(values[w::words].tobytes(), "little") for w in range(words)]
+
+def _lanes_to_words(lanes, count, lane_bytes=4):
+    """Inverse of _words_to_lanes; with lane_bytes=8 only the low 32 bits of each lane are kept"""
+    out = array.array('I', bytes(4 * len(lanes) * count))
+    step = lane_bytes // 4
+    for w, value in enumerate(lanes):
+        part = array.array('I')
+        part.frombytes(value.to_bytes(lane_bytes * count, "little"))
+        if sys.byteorder != "little":
+            part.byteswap()
+        out[w::len(lanes)] = part[::step]
+    if sys.byteorder != "little":
+        out.byteswap()
+    return out.tobytes()
+
+def _xor_bytes(a, b):
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+class RetentionPolicy:
+    """Decides which of a project's cataloged backups to keep: last N, grandfather-father-son and a size cap.
+
+    Planning works only on catalog rows and dependency edges, never on the output folders. Anything a
+    kept backup needs to restore (delta bases, earlier git bundles) is kept too, however old it is.
+    """
+    KEYS = ('keep_last', 'keep_daily', 'keep_weekly', 'keep_monthly', 'max_bytes')
+    # GFS rule -> period a backup falls in, from its finish time
+    PERIODS = {
+        'keep_daily': lambda when: when.date(),
+        'keep_weekly': lambda when: when.isocalendar()[:2],
+        'keep_monthly': lambda when: (when.year, when.month)
+    }
+
+    def __init__(self, config=None):
+        """Build a policy from a project's 'retention' option"""
+        config = config or {}
+        unknown = set(config) - set(self.KEYS)
+        if unknown:
+            raise ValueError(f"Unknown retention settings: {', '.join(sorted(unknown))}")
+        for key in self.KEYS:
+            value = config.get(key)
+            if value is not None and (not isinstance(value, int) or value < 0):
+                raise ValueError(f"{key} must be a non-negative whole number")
+        self.config = {key: config[key] for key in self.KEYS if config.get(key) is not None}
+
+    @property
+    def active(self):
+        return bool(self.config)
+
+    def describe(self):
+        """One line per setting"""
+        return [f"{key}: {ExclusionAnalyzer.format_size(value) if key == 'max_bytes' else value}"
+                for key, value in self.config.items()]
+
+    @staticmethod
+    def on_disk(backup):
+        """True for backups written to a file, as opposed to streamed to stdout or a pipe"""
+        return backup['format'] != BackupManager.STREAM_FORMAT and backup['archive_path'] != "-"
+
+    def plan(self, backups, dependencies, resumable=()):
+        """Return [(backup, keep, reason)] for the completed backups stored on disk, newest first.
+
+        backups are catalog records; dependencies are (backup_id, depends_on) pairs; resumable are the
+        IDs of runs with a live checkpoint, whose bases are kept so the run can still finish. Without
+        any setting everything is kept. The newest backup is never removed by the size cap.
+        """
+        backups = sorted((b for b in backups if b['status'] == 'complete' and self.on_disk(b)),
+                         key=lambda b: b['finished_at'] or b['started_at'], reverse=True)
+        if not self.active:
+            return [(backup, True, "no retention policy") for backup in backups]
+        reasons = {}
+        for index, backup in enumerate(backups[:self.config.get('keep_last', 0)]):
+            reasons.setdefault(backup['id'], f"last {index + 1}")
+        for key, period_of in self.PERIODS.items():
+            wanted = self.config.get(key, 0)
+            seen = []
+            for backup in backups:
+                if len(seen) >= wanted:
+                    break
+                period = period_of(datetime.datetime.fromisoformat(backup['finished_at'] or backup['started_at']))
+                if period not in seen:
+                    seen.append(period)
+                    reasons.setdefault(backup['id'], f"{key.split('_')[1]} {len(seen)}")
+        if not reasons and backups and 'max_bytes' in self.config:
+            # A size cap on its own keeps everything that fits
+            reasons = {backup['id']: "within size cap" for backup in backups}
+        depends_on = {}
+        for backup_id, base_id in dependencies:
+            depends_on.setdefault(backup_id, set()).add(base_id)
+        cataloged = {backup['id'] for backup in backups}
+
+        pending = list(reasons) + [backup_id for backup_id in resumable if backup_id not in reasons]
+        while pending:
+            backup_id = pending.pop()
+            for base_id in depends_on.get(backup_id, ()):
+                if base_id in cataloged and base_id not in reasons:
+                    reasons[base_id] = f"base of {backup_id}"
+                    pending.append(base_id)
+        dropped = {}
+        max_bytes = self.config.get('max_bytes')
+        if max_bytes is not None:
+            kept_bytes = sum(backup['archive_bytes'] or 0 for backup in backups if backup['id'] in reasons)
+            # Drop the oldest kept backups that nothing kept depends on until the rest fits. Dropping a
+            # backup can free its base, which an oldest-first pass has already gone past, so repeat
+            changed = True
+            while changed and kept_bytes > max_bytes:
+                changed = False
+                for backup in reversed(backups[1:]):
+                    if kept_bytes <= max_bytes:
+                        break
+                    if backup['id'] not in reasons:
+                        continue
+                    needed = any(backup['id'] in depends_on.get(other, ())
+                                 for other in (*reasons, *resumable) if other != backup['id'])
+                    if needed:
+                        continue
+                    del reasons[backup['id']]
+                    dropped[backup['id']] = "over size cap"
+                    kept_bytes -= backup['archive_bytes'] or 0
+                    changed = True
+            if kept_bytes > max_bytes:
+                print(f"DEBUG: Kept backups still take {ExclusionAnalyzer.format_size(kept_bytes)}, "
+                      f"over the {ExclusionAnalyzer.format_size(max_bytes)} cap")
+        return [(backup, backup['id'] in reasons, reasons.get(backup['id']) or dropped.get(backup['id'], "expired"))
+                for backup in backups]
+
+class _Serpent:
+    """Serpent-256 block cipher, bitsliced across whole batches of blocks
+
+    Word w of every block in a batch is packed into one integer (32-bit lanes), so each S-box and
+    linear transform step is a handful of big-integer operations for the whole batch. S-boxes are
+    evaluated from their algebraic normal form. Byte order follows the NESSIE test vectors.
+    """
+    SBOXES = (
+        (3, 8, 15, 1, 10, 6, 5, 11, 14, 13, 4, 2, 7, 0, 9, 12),
+        (15, 12, 2, 7, 9, 0, 5, 10, 1, 11, 14, 8, 6, 13, 3, 4),
+        (8, 6, 7, 9, 3, 12, 10, 15, 13, 1, 14, 4, 0, 11, 5, 2),
+        (0, 15, 11, 8, 12, 9, 6, 3, 13, 1, 2, 4, 10, 7, 5, 14),
+        (1, 15, 8, 3, 12, 0, 11, 6, 2, 5, 4, 10, 9, 14, 7, 13),
+        (15, 5, 2, 11, 4, 10, 9, 12, 0, 3, 14, 8, 13, 6, 7, 1),
+        (7, 2, 12, 5, 8, 4, 6, 11, 14, 9, 1, 15, 13, 3, 10, 0),
+        (1, 13, 15, 0, 14, 8, 2, 11, 7, 4, 12, 10, 9, 3, 5, 6)
+    )
+    PHI = 0x9E3779B9
+    ROUNDS = 32
+
+    def __init__(self, key):
+        """Expand a 32-byte key into the 33 round keys"""
+        if len(key) != 32:
+            raise ValueError("Serpent-256 needs a 32-byte key")
+        self._boxes = [self._compile(sbox) for sbox in self.SBOXES]
+        self._inverse_boxes = [self._compile([sbox.index(v) for v in range(16)]) for sbox in self.SBOXES]
+        self._masks = {}
+        prekeys = list(struct.unpack("<8I", key))
+        for i in range(4 * (self.ROUNDS + 1)):
+            value = prekeys[i] ^ prekeys[i + 3] ^ prekeys[i + 5] ^ prekeys[i + 7] ^ self.PHI ^ i
+            prekeys.append(((value << 11) | (value >> 21)) & 0xFFFFFFFF)
+        prekeys = prekeys[8:]
+        self.round_keys = [
+            self._sbox(self._boxes[(3 - i) % 8], prekeys[4 * i:4 * i + 4], 0xFFFFFFFF)
+            for i in range(self.ROUNDS + 1)
+        ]
+
+    @staticmethod
+    def _compile(sbox):
+        """Algebraic normal form of an S-box: the AND products to build, then the monomials XORed into each output bit"""
+        outputs = []
+        for bit in range(4):
+            coefficients = [(sbox[x] >> bit) & 1 for x in range(16)]
+            # Moebius transform from truth table to ANF; monomial m is the AND of the inputs whose bits are set in m
+            for i in range(4):
+                for x in range(16):
+                    if x & (1 << i):
+                        coefficients[x] ^= coefficients[x ^ (1 << i)]
+            outputs.append([m for m in range(16) if coefficients[m]])
+        needed = set()
+        for terms in outputs:
+            for m in terms:
+                while m & (m - 1):
+                    needed.add(m)
+                    m &= m - 1
+        # Clearing the lowest bit always gives a smaller monomial, so ascending order builds each from known parts
+        products = [(m, m & (m - 1), m & -m) for m in sorted(needed)]
+        return products, outputs
+
+    @staticmethod
+    def _sbox(box, x, ones):
+        products, outputs = box
+        monomials = {0: ones, 1: x[0], 2: x[1], 4: x[2], 8: x[3]}
+        for m, rest, low in products:
+            monomials[m] = monomials[rest] & monomials[low]
+        out = []
+        for terms in outputs:
+            value = 0
+            for m in terms:
+                value ^= monomials[m]
+            out.append(value)
+        return out
+
+    def _lane_masks(self, count):
+        """Replicated constants for a batch of `count` blocks"""
+        masks = self._masks.get(count)
+        if masks is None:
+            repeat = int.from_bytes(b"\x01\x00\x00\x00" * count, "little")
+            masks = {'repeat': repeat, 'ones': 0xFFFFFFFF * repeat}
+            for r in range(1, 32):
+                masks[('high', r)] = ((0xFFFFFFFF << r) & 0xFFFFFFFF) * repeat
+                masks[('low', r)] = ((1 << r) - 1) * repeat
+            self._masks = {count: masks}
+        return masks
+
+    @staticmethod
+    def _rotl(x, r, masks):
+        return ((x << r) & masks[('high', r)]) | ((x >> (32 - r)) & masks[('low', r)])
+
+    def _transform(self, x, masks):
+        rotl = self._rotl
+        x0 = rotl(x[0], 13, masks)
+        x2 = rotl(x[2], 3, masks)
+        x1 = x[1] ^ x0 ^ x2
+        x3 = x[3] ^ x2 ^ ((x0 << 3) & masks[('high', 3)])
+        x1 = rotl(x1, 1, masks)
+        x3 = rotl(x3, 7, masks)
+        x0 ^= x1 ^ x3
+        x2 ^= x3 ^ ((x1 << 7) & masks[('high', 7)])
+        return [rotl(x0, 5, masks), x1, rotl(x2, 22, masks), x3]
+
+    def _inverse_transform(self, x, masks):
+        rotl = self._rotl
+        x0, x1, x2, x3 = x
+        x2 = rotl(x2, 10, masks)
+        x0 = rotl(x0, 27, masks)
+        x2 ^= x3 ^ ((x1 << 7) & masks[('high', 7)])
+        x0 ^= x1 ^ x3
+        x3 = rotl(x3, 25, masks)
+        x1 = rotl(x1, 31, masks)
+        x3 ^= x2 ^ ((x0 << 3) & masks[('high', 3)])
+        x1 ^= x0 ^ x2
+        return [rotl(x0, 19, masks), x1, rotl(x2, 29, masks), x3]
+
+    def encrypt(self, data):
+        """ECB-encrypt a whole number of 16-byte blocks"""
+        count = len(data) // 16
+        masks = self._lane_masks(count)
+        repeat = masks['repeat']
+        x = _words_to_lanes(data, 4)
+        for r in range(self.ROUNDS):
+            x = [x[i] ^ (self.round_keys[r][i] * repeat) for i in range(4)]
+            x = self._sbox(self._boxes[r % 8], x, masks['ones'])
+            if r < self.ROUNDS - 1:
+                x = self._transform(x, masks)
+        x = [x[i] ^ (self.round_keys[self.ROUNDS][i] * repeat) for i in range(4)]
+        return _lanes_to_words(x, count)
+
+    def decrypt(self, data):
+        """ECB-decrypt a whole number of 16-byte blocks"""
+        count = len(data) // 16
+        masks = self._lane_masks(count)
+        repeat = masks['repeat']
+        x = _words_to_lanes(data, 4)
+        x = [x[i] ^ (self.round_keys[self.ROUNDS][i] * repeat) for i in range(4)]
+        for r in range(self.ROUNDS - 1, -1, -1):
+            if r < self.ROUNDS - 1:
+                x = self._inverse_transform(x, masks)
+            x = self._sbox(self._inverse_boxes[r % 8], x, masks['ones'])
+            x = [x[i] ^ (self.round_keys[r][i] * repeat) for i in range(4)]
+        return _lanes_to_words(x, count)
+
+def chacha20_xor(key, nonce, data, counter=0):
+    """Original (64-bit nonce, 64-bit counter) ChaCha20 keystream XORed into data
+
+    Uses the 'cryptography' package when installed; otherwise all blocks of data are computed at once
+    in 64-bit lanes of big integers, which keeps additions from carrying into the neighbouring block.
+    """
+    if len(key) != 32 or len(nonce) != 8:
+        raise ValueError("ChaCha20 needs a 32-byte key and an 8-byte nonce")
+    if not data:
+        return b""
+    if Cipher is not None:
+        encryptor = Cipher(cipher_algorithms.ChaCha20(key, struct.pack("<Q", counter) + nonce), mode=None).encryptor()
+        return encryptor.update(data)
+    count = (len(data) + 63) // 64
+    repeat = int.from_bytes((b"\x01" + bytes(7)) * count, "little")
+    mask = 0xFFFFFFFF * repeat
+    counters = array.array('Q', range(counter, counter + count))
+    if sys.byteorder != "little":
+        counters.byteswap()
+    counter_lanes = int.from_bytes(counters.tobytes(), "little")
+    state = [word * repeat for word in struct.unpack("<4I", b"expand 32-byte k") + struct.unpack("<8I", key)]
+    state += [counter_lanes & mask, (counter_lanes >> 32) & mask]
+    state += [word * repeat for word in struct.unpack("<2I", nonce)]
+    x = list(state)
+
+    def quarter(a, b, c, d):
+        x[a] = (x[a] + x[b]) & mask
+        v = x[d] ^ x[a]
+        x[d] = ((v << 16) | (v >> 16)) & mask
+        x[c] = (x[c] + x[d]) & mask
+        v = x[b] ^ x[c]
+        x[b] = ((v << 12) | (v >> 20)) & mask
+        x[a] = (x[a] + x[b]) & mask
+        v = x[d] ^ x[a]
+        x[d] = ((v << 8) | (v >> 24)) & mask
+        x[c] = (x[c] + x[d]) & mask
+        v = x[b] ^ x[c]
+        x[b] = ((v << 7) | (v >> 25)) & mask
+
+    for _ in range(10):
+        quarter(0, 4, 8, 12)
+        quarter(1, 5, 9, 13)
+        quarter(2, 6, 10, 14)
+        quarter(3, 7, 11, 15)
+        quarter(0, 5, 10, 15)
+        quarter(1, 6, 11, 12)
+        quarter(2, 7, 8, 13)
+        quarter(3, 4, 9, 14)
+    keystream = _lanes_to_words([(x[i] + state[i]) & mask for i in range(16)], count, lane_bytes=8)
+    return _xor_bytes(data, keystream[:len(data)])
+
+@functools.lru_cache(maxsize=1)
+def _whirlpool_tables():
+    """S-box derived lookup tables and round constants of the (final, ISO) Whirlpool"""
+    exp_box = (0x1, 0xB, 0x9, 0xC, 0xD, 0x6, 0xF, 0x3, 0xE, 0x8, 0x7, 0x4, 0xA, 0x2, 0x5, 0x0)
+    inv_box = tuple(exp_box.index(v) for v in range(16))
+    mix_box = (0x7, 0xC, 0xB, 0xD, 0xE, 0x4, 0x9, 0xF, 0x6, 0x3, 0x8, 0xA, 0x2, 0x5, 0x1, 0x0)
+    sbox = []
+    for u in range(256):
+        a, b = exp_box[u >> 4], inv_box[u & 15]
+        r = mix_box[a ^ b]
+        sbox.append((exp_box[a ^ r] << 4) | inv_box[b ^ r])
+
+    def multiply(a, b):
+        product = 0
+        while b:
+            if b & 1:
+                product ^= a
+            a <<= 1
+            if a & 0x100:
+                a ^= 0x11D
+            b >>= 1
+        return product
+
+    first = [int.from_bytes(bytes(multiply(s, c) for c in (1, 1, 4, 1, 8, 5, 2, 9)), "big") for s in sbox]
+    tables = [[((v >> (8 * t)) | (v << (64 - 8 * t))) & 0xFFFFFFFFFFFFFFFF for v in first] for t in range(8)]
+    constants = [int.from_bytes(bytes(sbox[8 * r:8 * r + 8]), "big") for r in range(10)]
+    return tables, constants
+
+def whirlpool(data):
+    """Whirlpool digest (64 bytes); hashlib only offers it with legacy OpenSSL providers"""
+    tables, constants = _whirlpool_tables()
+    bit_length = 8 * len(data)
+    data = bytes(data) + b"\x80" + bytes((32 - len(data) - 1) % 64) + bit_length.to_bytes(32, "big")
+
+    def layer(rows):
+        return [
+            tables[0][rows[i] >> 56] ^ tables[1][(rows[(i - 1) & 7] >> 48) & 0xFF]
+            ^ tables[2][(rows[(i - 2) & 7] >> 40) & 0xFF] ^ tables[3][(rows[(i - 3) & 7] >> 32) & 0xFF]
+            ^ tables[4][(rows[(i - 4) & 7] >> 24) & 0xFF] ^ tables[5][(rows[(i - 5) & 7] >> 16) & 0xFF]
+            ^ tables[6][(rows[(i - 6) & 7] >> 8) & 0xFF] ^ tables[7][rows[(i - 7) & 7] & 0xFF]
+            for i in range(8)
+        ]
+
+    digest = [0] * 8
+    for offset in range(0, len(data), 64):
+        block = list(struct.unpack(">8Q", data[offset:offset + 64]))
+        key = digest
+        state = [block[i] ^ key[i] for i in range(8)]
+        for constant in constants:
+            key = layer(key)
+            key[0] ^= constant
+            state = [value ^ key[i] for i, value in enumerate(layer(state))]
+        digest = [digest[i] ^ state[i] ^ block[i] for i in range(8)]
+    return struct.pack(">8Q", *digest)
+
+class PlumCaveDecryptor:
+    """Offline, constant-memory decryption of files encrypted by the Plum Cave web app
+
+    Outer layer: Serpent-256 CBC; the IV is stored Serpent-ECB encrypted in the first block and the
+    last block carries PKCS#7 padding. Inner layer: ChaCha20 over 256 KB chunks, each with a key
+    ratcheted as Whirlpool(SHA-512(hex(key))). The inner plaintext starts with an HMAC-SHA3-512 tag of
+    the data. Ciphertext is decrypted a batch at a time and written out as it goes; the tag is
+    checked at the end.
+    """
+    KEY_SIZE = 416
+    SALT_SIZE = 32
+    TAG_SIZE = 64
+    BLOCK_SIZE = 16
+    STREAM_CHUNK = 256 * 1024
+    # Ciphertext read per batch; a multiple of STREAM_CHUNK keeps stream cipher chunks whole
+    BATCH_SIZE = 1024 * 1024
+    ARGON2_MEMORY_KIB = 512
+    # A backup's file key is derived from the start of its random key followed by the start of the master key
+    RANDOM_KEY_PART = 302
+    MASTER_KEY_PART = 192
+
+    def __init__(self, derived_key, hmac_key_end=None, padded=True):
+        """derived_key is the 416-byte Argon2id output; backup file keys only use bytes 96-224 for the tag"""
+        if len(derived_key) != self.KEY_SIZE:
+            raise ValueError(f"The derived key must be {self.KEY_SIZE} bytes, got {len(derived_key)}")
+        self.stream_key = bytes(derived_key[:64])
+        self.block_cipher = _Serpent(bytes(derived_key[64:96]))
+        self.hmac_key = bytes(derived_key[96:hmac_key_end])
+        self.padded = padded
+
+    @classmethod
+    def derive_key(cls, secret, salt, iterations):
+        """Argon2id as the web app runs it: 1 lane, 512 KiB, 416 bytes of output"""
+        if argon2_low_level is None:
+            raise RuntimeError("Argon2id key derivation requires the 'argon2-cffi' package (pip install argon2-cffi)")
+        return argon2_low_level.hash_secret_raw(
+            bytes(secret), bytes(salt), time_cost=iterations, memory_cost=cls.ARGON2_MEMORY_KIB,
+            parallelism=1, hash_len=cls.KEY_SIZE, type=argon2_low_level.Type.ID
+        )
+
+    @classmethod
+    def for_backup(cls, master_key, random_key, file_salt, iterations):
+        """Decryptor for an uploaded backup, keyed like FileEncrypter does"""
+        secret = bytes(random_key[:cls.RANDOM_KEY_PART]) + bytes(master_key[:cls.MASTER_KEY_PART])
+        return cls(cls.derive_key(secret, file_salt, iterations), hmac_key_end=224)
+
+    @classmethod
+    def for_record(cls, src, password, iterations, padded=True):
+        """Decryptor for a salted record (silentlyEncryptDataWithTwoCiphersCBC); reads the salt from src"""
+        salt = src.read(cls.SALT_SIZE)
+        if len(salt) != cls.SALT_SIZE:
+            raise ValueError("The input is too short to hold a salt")
+        return cls(cls.derive_key(password, salt, iterations), padded=padded)
+
+    def _ratchet(self, key):
+        return whirlpool(hashlib.sha512(key.hex().encode("ascii")).digest())
+
+    def _unpad(self, block):
+        """Strip PKCS#7 padding the way pkcs7PaddingConsumed reads it"""
+        if not self.padded:
+            return block
+        length = block[-1]
+        if 1 <= length <= self.BLOCK_SIZE and block[-length:] == bytes([length]) * length:
+            return block[:-length]
+        raise ValueError("Invalid padding: wrong key or corrupted file")
+
+    def decrypt(self, src, dst):
+        """Decrypt src into dst; returns the plaintext size, raises ValueError if the tag does not match"""
+        first = src.read(self.BLOCK_SIZE)
+        if len(first) != self.BLOCK_SIZE:
+            raise ValueError("The input is too short to be a Plum Cave file")
+        previous = self.block_cipher.decrypt(first)
+        stream_key = self.stream_key
+        mac = hmac.new(self.hmac_key, digestmod=hashlib.sha3_512)
+        # Ciphertext waiting for more input (the last block may hold padding), inner stream waiting for a whole chunk
+        pending = b""
+        inner = bytearray()
+        tag = None
+        written = 0
+        while True:
+            data = src.read(self.BATCH_SIZE)
+            buffered = pending + data
+            if data:
+                cut = (len(buffered) - 1) // self.BLOCK_SIZE * self.BLOCK_SIZE
+            else:
+                if len(buffered) != self.BLOCK_SIZE:
+                    raise ValueError("The input is truncated or not a Plum Cave file")
+                cut = 0
+            if cut:
+                blocks = buffered[:cut]
+                inner += _xor_bytes(self.block_cipher.decrypt(blocks), previous + blocks[:-self.BLOCK_SIZE])
+                previous = blocks[-self.BLOCK_SIZE:]
+            pending = buffered[cut:]
+            if not data:
+                inner += self._unpad(_xor_bytes(self.block_cipher.decrypt(pending), previous))
+            while len(inner) >= self.STREAM_CHUNK or (not data and inner):
+                chunk = bytes(inner[:self.STREAM_CHUNK])
+                del inner[:self.STREAM_CHUNK]
+                stream_key = self._ratchet(stream_key)
+                plain = chacha20_xor(stream_key[:32], stream_key[32:40], chunk)
+                if tag is None:
+                    if len(plain) < self.TAG_SIZE:
+                        raise ValueError("The input is too short to hold an integrity tag")
+                    tag, plain = plain[:self.TAG_SIZE], plain[self.TAG_SIZE:]
+                mac.update(plain)
+                dst.write(plain)
+                written += len(plain)
+            if not data:
+                break
+        if tag is None:
+            raise ValueError("The input is too short to hold an integrity tag")
+        if not hmac.compare_digest(tag, mac.digest()):
+            raise ValueError("Integrity check failed: wrong key or the file was modified")
+        return written
+
+    @staticmethod
+    def read_key_material(path):
+        """Read key bytes from a file holding them raw, as hex or as base64"""
+        with open(path, 'rb') as f:
+            raw = f.read()
+        text = raw.strip()
+        try:
+            text = text.decode("ascii")
+            if len(text) % 2 == 0 and all(c in string.hexdigits for c in text):
+                return bytes.fromhex(text)
+            return base64.b64decode(text, validate=True)
+        except ValueError:
+            return raw
+
+class AgentProtocol:
+    """Framing shared by BackupAgent and RemoteAgentClient: 1-byte type, 4-byte big-endian length, payload"""
+    VERSION = 2
+    DEFAULT_PORT = 7470
+    # Environment variable holding the shared secret when none is given explicitly
+    TOKEN_ENV = "PBU_AGENT_TOKEN"
+    # Environment variable naming the CA bundle collectors trust for agent+tls:// (default: the system store)
+    CAFILE_ENV = "PBU_AGENT_CAFILE"
+    MAX_FRAME = 64 * 1024 * 1024
+    REQUEST = b"Q"
+    FOLDER = b"P"
+    MEMBER = b"M"
+    DATA = b"D"
+    END = b"E"
+    FINISHED = b"F"
+    ERROR = b"X"
+
+    @staticmethod
+    def send(wfile, kind, payload):
+        wfile.write(kind + struct.pack('>I', len(payload)))
+        wfile.write(payload)
+
+    @classmethod
+    def send_json(cls, wfile, kind, obj):
+        cls.send(wfile, kind, json.dumps(obj, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def recv(cls, rfile):
+        """Read one frame; returns (kind, payload)"""
+        header = rfile.read(5)
+        if len(header) < 5:
+            raise ConnectionError("Connection closed by the other end")
+        kind, size = header[:1], struct.unpack('>I', header[1:])[0]
+        if size > cls.MAX_FRAME:
+            raise ValueError(f"Frame of {size} bytes exceeds the protocol limit")
+        payload = rfile.read(size)
+        if len(payload) < size:
+            raise ConnectionError("Connection closed in the middle of a frame")
+        return kind, payload
+
+class _AgentArchiveWriter:
+    """ZipFile stand-in on the agent: compresses each member and sends it to the collector"""
+    # Compressed bytes collected before a DATA frame is sent
+    FRAME_SIZE = 256 * 1024
+
+    def __init__(self, wfile, compresslevel=None):
+        self.compression = zipfile.ZIP_DEFLATED
+        self.compresslevel = compresslevel
+        self.wfile = wfile
+
+    def open(self, info, mode='w', force_zip64=False):
+        """Announce a member and return a writable stream that compresses and sends its data"""
+        AgentProtocol.send_json(self.wfile, AgentProtocol.MEMBER, {
+            'name': info.filename,
+            'date_time': list(info.date_time),
+            'external_attr': info.external_attr,
+            'compress_type': info.compress_type,
+            'file_size': info.file_size
+        })
+        return _AgentMemberStream(self, info.compress_type)
+
+class _AgentMemberStream:
+    """Writable stream for one member sent by _AgentArchiveWriter"""
+    def __init__(self, writer, compress_type):
+        self._writer = writer
+        level = writer.compresslevel if writer.compresslevel is not None else zlib.Z_DEFAULT_COMPRESSION
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if compress_type == zipfile.ZIP_DEFLATED else None
+        self._pending = bytearray()
+        self._crc = 0
+        self._file_size = 0
+        self._compress_size = 0
+
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._file_size += len(data)
+        self._queue(self._compressor.compress(data) if self._compressor else data)
+        return len(data)
+
+    def _queue(self, data):
+        self._pending.extend(data)
+        self._compress_size += len(data)
+        if len(self._pending) >= _AgentArchiveWriter.FRAME_SIZE:
+            AgentProtocol.send(self._writer.wfile, AgentProtocol.DATA, self._pending)
+            self._pending = bytearray()
+
+    def close(self):
+        if self._writer is None:
+            return
+        if self._compressor:
+            self._queue(self._compressor.flush())
+        if self._pending:
+            AgentProtocol.send(self._writer.wfile, AgentProtocol.DATA, self._pending)
+        AgentProtocol.send_json(self._writer.wfile, AgentProtocol.END, {
+            'crc': self._crc,
+            'compress_size': self._compress_size,
+            'file_size': self._file_size
+        })
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class BackupAgent:
+    """Runs next to the data and serves backups of folders under root to remote collectors.
+
+    The walk, exclusions, member handlers and deflate all run here, so only compressed
+    members cross the network. The token and the data are only protected by TLS, so without
+    a certificate the agent listens on loopback addresses only (reach it through an ssh tunnel).
+    """
+    # Seconds a collector gets to complete the TLS handshake
+    HANDSHAKE_TIMEOUT = 30.0
+
+    def __init__(self, host, port, root, token, certfile=None, keyfile=None):
+        """Configure the listening address, the folder tree that may be served, the shared secret and TLS"""
+        if not token:
+            raise ValueError(f"The agent needs a token (--token or {AgentProtocol.TOKEN_ENV})")
+        self._tls = None
+        if certfile:
+            self._tls = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            try:
+                self._tls.load_cert_chain(certfile, keyfile)
+            except OSError as e:
+                raise ValueError(f"Cannot load the TLS certificate {certfile}: {e}")
+        elif not self.is_loopback(host):
+            raise ValueError(f"Refusing to listen on {host or 'every address'} without TLS: the token and the data "
+                             "would cross the network in the clear (give --tls-cert, or listen on 127.0.0.1)")
+        self.host = host
+        self.port = port
+        self.root = os.path.realpath(root)
+        self.token = token
+        self._server = None
+
+    @staticmethod
+    def is_loopback(host):
+        """True when every address host resolves to is a loopback address"""
+        if not host:
+            return False
+        try:
+            infos = socket.getaddrinfo(host, None)
+        except socket.gaierror:
+            return False
+        # Scoped IPv6 addresses carry a %interface suffix
+        return all(ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in infos)
+
+    def serve_forever(self):
+        """Accept collectors until shutdown(); each connection is served on its own thread"""
+        self._server = socket.create_server((self.host, self.port))
+        self.port = self._server.getsockname()[1]
+        print(f"DEBUG: Agent listening on {self.host}:{self.port}, serving {self.root}")
+        while True:
+            try:
+                conn, address = self._server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn, address), daemon=True).start()
+
+    def shutdown(self):
+        """Stop accepting connections"""
+        if self._server is not None:
+            self._server.close()
+
+    def _handle(self, conn, address):
+        """Serve one backup or scan request"""
+        print(f"DEBUG: Collector connected from {address[0]}:{address[1]}")
+        if self._tls is not None:
+            try:
+                conn.settimeout(self.HANDSHAKE_TIMEOUT)
+                conn = self._tls.wrap_socket(conn, server_side=True)
+                conn.settimeout(None)
+            except OSError as e:
+                print(f"DEBUG: TLS handshake with {address[0]} failed: {e}")
+                conn.close()
+                return
+        rfile = conn.makefile('rb')
+        wfile = conn.makefile('wb')
+        try:
+            kind, payload = AgentProtocol.recv(rfile)
+            request = json.loads(payload)
+            if kind != AgentProtocol.REQUEST or request.get('version') != AgentProtocol.VERSION:
+                raise ValueError("Unsupported request")
+            if not hmac.compare_digest(str(request.get('token') or ''), self.token):
+                raise PermissionError("Invalid agent token")
+            if request.get('op') == "scan":
+                self._scan(request, wfile)
+            else:
+                self._run(request, wfile)
+        except ConnectionError as e:
+            print(f"DEBUG: Collector {address[0]} disconnected: {e}")
+        except Exception as e:
+            print(f"DEBUG: Agent request from {address[0]} failed: {e}")
+            try:
+                AgentProtocol.send_json(wfile, AgentProtocol.ERROR, {'error': str(e)})
+                wfile.flush()
+            except OSError:
+                pass
+        finally:
+            # Closing flushes buffered frames, which fails if the collector is gone
+            for stream in (rfile, wfile):
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+            conn.close()
+
+    def _inside_root(self, path):
+        """True when path, with every symlink resolved, lies below root"""
+        return os.path.commonpath([self.root, os.path.realpath(path)]) == self.root
+
+    def _source_dir(self, request):
+        """The requested folder, once it is known to exist below root"""
+        source_dir = os.path.realpath(request['source_dir'])
+        if not self._inside_root(source_dir):
+            raise PermissionError(f"{request['source_dir']} is outside the folders served by this agent")
+        if not os.path.isdir(source_dir):
+            raise FileNotFoundError(f"Source directory not found: {request['source_dir']}")
+        return source_dir
+
+    def _scan(self, request, wfile):
+        """Walk the requested folder for a collector's dry-run estimate or tree browser"""
+        scan = ExclusionAnalyzer().scan(self._source_dir(request))
+        AgentProtocol.send_json(wfile, AgentProtocol.FINISHED, scan)
+        wfile.flush()
+
+    def _run(self, request, wfile):
+        """Walk and stream the requested folder"""
+        source_dir = self._source_dir(request)
+        # Niceness is process-wide, so only the agent's own setting applies
+        limits = {k: v for k, v in (request.get('resource_limits') or {}).items() if k != 'nice'}
+        manager = BackupManager(None, resource_limits=limits)
+        governor = ResourceGovernor(**limits)
+        governor.apply_process_priority()
+        writer = _AgentArchiveWriter(wfile, request.get('compresslevel'))
+        counts = {'files_skipped': 0, 'folders_skipped': 0, 'already_written': 0, 'source_bytes': 0}
+        handler_stats = {}
+        skip = set(request.get('skip') or ())
+        rules = ExclusionRules(request.get('exclusion_rules'))
+        walk, git = manager._enumerate_source(
+            source_dir,
+            set(request.get('excluded_files') or ()),
+            set(request.get('excluded_folders') or ()),
+            None,
+            counts,
+            BackupProfiler(),
+            request.get('git_mode'),
+            rules
+        )
+        for rootdir, file_path, rel_path, st in walk:
+            if file_path is None:
+                AgentProtocol.send_json(wfile, AgentProtocol.FOLDER, {'folder': os.path.relpath(rootdir, source_dir)})
+                wfile.flush()
+                continue
+            if rel_path in skip or DeltaEncoder.MEMBER_PREFIX + rel_path in skip:
+                counts['already_written'] += 1
+                continue
+            if not self._inside_root(file_path):
+                # A symlink would otherwise hand the collector a file the agent doesn't serve
+                print(f"DEBUG: Skipping {rel_path}: it links outside {self.root}")
+                counts['files_skipped'] += 1
+                continue
+            if st is None:
+                st = os.stat(file_path)
+            counts['source_bytes'] += st.st_size
+            if manager._write_member(writer, file_path, rel_path, handler_stats, governor, st=st) == MemberHandlerRegistry.SKIPPED:
+                counts['files_skipped'] += 1
+        if git is not None and request.get('bundle'):
+            counts['git_bundle'] = manager._write_git_bundle(writer, git, request.get('bundle_basis'), request.get('backup_id'))
+        counts['handler_stats'] = handler_stats
+        counts['rule_stats'] = rules.stats
+        counts['throughput'] = governor.summary()
+        AgentProtocol.send_json(wfile, AgentProtocol.FINISHED, counts)
+        wfile.flush()
+        print(f"DEBUG: Sent {counts['throughput']['bytes_read']/1024:.2f} KB of source data from {source_dir}")
+
+class RemoteAgentClient:
+    """Collector side of a remote backup: asks a BackupAgent for a folder and writes its members into a ZipFile"""
+    SCHEME = "agent"
+    TLS_SCHEME = "agent+tls"
+    # General purpose flag bit 3 and the optional descriptor signature (APPNOTE 4.3.9)
+    DATA_DESCRIPTOR_FLAG = 0x08
+    DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+
+    def __init__(self, host, port, source_dir, token=None, timeout=300.0, tls=False):
+        self.host = host
+        self.port = port
+        self.source_dir = source_dir
+        self.token = token if token is not None else os.environ.get(AgentProtocol.TOKEN_ENV, "")
+        self.timeout = timeout
+        self.tls = tls
+
+    @classmethod
+    def from_url(cls, url):
+        """Parse agent://[token@]host[:port]/path/on/agent (or agent+tls://); returns None for local paths"""
+        scheme = url.partition("://")[0].lower() if "://" in url else None
+        if scheme not in (cls.SCHEME, cls.TLS_SCHEME):
+            return None
+        parts = urllib.parse.urlsplit(url)
+        source_dir = urllib.parse.unquote(parts.path)
+        if len(source_dir) > 2 and source_dir[0] == "/" and source_dir[2] == ":":
+            # agent://host/C:/Projects/site
+            source_dir = source_dir[1:]
+        return cls(
+            parts.hostname,
+            parts.port or AgentProtocol.DEFAULT_PORT,
+            source_dir,
+            token=urllib.parse.unquote(parts.username) if parts.username else None,
+            tls=scheme == cls.TLS_SCHEME
+        )
+
+    def _connect(self):
+        """Open the connection to the agent, verifying its certificate for agent+tls://"""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        if not self.tls:
+            return sock
+        try:
+            context = ssl.create_default_context(cafile=os.environ.get(AgentProtocol.CAFILE_ENV) or None)
+            return context.wrap_socket(sock, server_hostname=self.host)
+        except (OSError, ValueError):
+            sock.close()
+            raise
+
+    def scan(self):
+        """Have the agent walk the folder; returns the same result as ExclusionAnalyzer.scan()"""
+        request = {'op': "scan", 'version': AgentProtocol.VERSION, 'token': self.token, 'source_dir': self.source_dir}
+        sock = self._connect()
+        try:
+            with sock.makefile('rb') as rfile, sock.makefile('wb') as wfile:
+                AgentProtocol.send_json(wfile, AgentProtocol.REQUEST, request)
+                wfile.flush()
+                kind, payload = AgentProtocol.recv(rfile)
+        finally:
+            sock.close()
+        if kind == AgentProtocol.ERROR:
+            raise RuntimeError(f"Agent error: {json.loads(payload)['error']}")
+        if kind != AgentProtocol.FINISHED:
+            raise ValueError(f"Unexpected {kind!r} frame from the agent")
+        return json.loads(payload)
+
+    def stream_into(self, zipf, request, counts):
+        """Send the request and write the streamed members into zipf.
+
+        Yields (folder, None) as the agent enters each folder and (None, info) after each member is
+        written; the agent's final statistics are stored in counts. Members arrive already
+        compressed, so their headers are written here instead of through ZipFile.open(); this relies
+        on ZipFile's _seekable flag and start_dir, the offset where close() writes the directory.
+        """
+        request = dict(request, version=AgentProtocol.VERSION, token=self.token, source_dir=self.source_dir)
+        sock = self._connect()
+        try:
+            with sock.makefile('rb') as rfile, sock.makefile('wb') as wfile:
+                AgentProtocol.send_json(wfile, AgentProtocol.REQUEST, request)
+                wfile.flush()
+                info = None
+                zip64 = False
+                while True:
+                    kind, payload = AgentProtocol.recv(rfile)
+                    if kind == AgentProtocol.DATA and info is not None:
+                        zipf.fp.write(payload)
+                    elif kind == AgentProtocol.FOLDER:
+                        yield json.loads(payload)['folder'], None
+                    elif kind == AgentProtocol.MEMBER and info is None:
+                        meta = json.loads(payload)
+                        info = zipfile.ZipInfo(meta['name'], tuple(meta['date_time']))
+                        info.external_attr = meta['external_attr']
+                        info.compress_type = meta['compress_type']
+                        info.file_size = meta['file_size']
+                        info.CRC = 0
+                        info.compress_size = 0
+                        info.header_offset = zipf.fp.tell()
+                        # Same rule ZipFile.open() uses when the final size is not known yet
+                        zip64 = info.file_size * 1.05 > zipfile.ZIP64_LIMIT
+                        if not zipf._seekable:
+                            # CRC and sizes follow the data in a descriptor
+                            info.flag_bits |= self.DATA_DESCRIPTOR_FLAG
+                        zipf.fp.write(info.FileHeader(zip64))
+                    elif kind == AgentProtocol.END and info is not None:
+                        end = json.loads(payload)
+                        info.CRC = end['crc']
+                        info.compress_size = end['compress_size']
+                        info.file_size = end['file_size']
+                        if not zip64 and max(info.file_size, info.compress_size) > zipfile.ZIP64_LIMIT:
+                            raise RuntimeError(f"{info.filename} grew past the ZIP64 limit while being archived")
+                        if zipf._seekable:
+                            # Rewrite the local header now that CRC and sizes are known
+                            data_end = zipf.fp.tell()
+                            zipf.fp.seek(info.header_offset)
+                            zipf.fp.write(info.FileHeader(zip64))
+                            zipf.fp.seek(data_end)
+                        else:
+                            zipf.fp.write(struct.pack('<LLQQ' if zip64 else '<LLLL', self.DATA_DESCRIPTOR_SIGNATURE,
+                                                      info.CRC, info.compress_size, info.file_size))
+                            data_end = zipf.fp.tell()
+                        zipf.filelist.append(info)
+                        zipf.NameToInfo[info.filename] = info
+                        zipf.start_dir = data_end
+                        yield None, info
+                        info = None
+                    elif kind == AgentProtocol.FINISHED and info is None:
+                        counts.update(json.loads(payload))
+                        return
+                    elif kind == AgentProtocol.ERROR:
+                        raise RuntimeError(f"Agent error: {json.loads(payload)['error']}")
+                    else:
+                        raise ValueError(f"Unexpected {kind!r} frame from the agent")
+        finally:
+            sock.close()
+
+class _FanOutSink:
+    """One destination of a FanOutFile: a file written by its own thread from a queue of operations"""
+    def __init__(self, path, condition):
+        self.path = path
+        self.condition = condition
+        self.ops = collections.deque()
+        # Bytes queued but not yet written, and operations not yet applied
+        self.buffered = 0
+        self.pending = 0
+        self.error = None
+        self.written = 0
+        self.fileobj = None
+        # (st_dev, st_ino) of the file this sink created, so only that file is ever removed
+        self.identity = None
+        self.thread = threading.Thread(target=self._run, name=f"fanout-{os.path.basename(path)}", daemon=True)
+
+    def _run(self):
+        """Apply queued writes and seeks in order until the close marker"""
+        try:
+            self.fileobj = open(self.path, 'wb')
+            st = os.fstat(self.fileobj.fileno())
+            self.identity = (st.st_dev, st.st_ino)
+        except OSError as e:
+            self.fail(e)
+        while True:
+            with self.condition:
+                while not self.ops:
+                    self.condition.wait()
+                op, arg = self.ops.popleft()
+            if op == "close":
+                break
+            if self.error is None:
+                try:
+                    if op == "write":
+                        self.fileobj.write(arg)
+                        self.written += len(arg)
+                    elif op == "seek":
+                        self.fileobj.seek(arg)
+                    elif op == "flush":
+                        self.fileobj.flush()
+                        os.fsync(self.fileobj.fileno())
+                except OSError as e:
+                    self.fail(e)
+            with self.condition:
+                if op == "write":
+                    self.buffered -= len(arg)
+                self.pending -= 1
+                self.condition.notify_all()
+        if self.fileobj is not None:
+            try:
+                self.fileobj.close()
+            except OSError as e:
+                self.fail(e)
+        if self.error is not None:
+            # A partial archive is worse than none
+            self.discard()
+
+    def discard(self):
+        """Remove the partial file this sink wrote, unless another file has replaced it; False if it's still there"""
+        identity = self.identity
+        if identity is None:
+            return True
+        try:
+            st = os.stat(self.path)
+            if (st.st_dev, st.st_ino) == identity:
+                os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False
+        return True
+
+    def fail(self, error):
+        if self.error is None:
+            self.error = str(error)
+            print(f"DEBUG: Destination {self.path} failed: {self.error}")
+
+class FanOutFile:
+    """Seekable write-only file that replays every write and seek onto several destination files.
+
+    Each destination is written by its own thread from a bounded queue, so ZipFile produces the
+    archive once and slow disks absorb it at their own pace. A destination that raises, or that
+    stays too far behind for stall_timeout seconds, is dropped without affecting the others and its
+    partial file is removed; writes fail only once every destination has.
+    """
+    def __init__(self, paths, max_buffer=64 * 1024 * 1024, stall_timeout=60.0):
+        self.max_buffer = max_buffer
+        self.stall_timeout = stall_timeout
+        self._condition = threading.Condition()
+        self._sinks = [_FanOutSink(path, self._condition) for path in paths]
+        self._pos = 0
+        self._size = 0
+        self._closed = False
+        for sink in self._sinks:
+            sink.thread.start()
+
+    def _live(self):
+        return [sink for sink in self._sinks if sink.error is None]
+
+    def _put(self, op, arg=None, size=0):
+        with self._condition:
+            for sink in self._live():
+                deadline = time.monotonic() + self.stall_timeout
+                while sink.error is None and sink.buffered and sink.buffered + size > self.max_buffer:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        sink.fail(f"stalled for more than {self.stall_timeout:g} s")
+                        break
+                    self._condition.wait(remaining)
+                sink.ops.append((op, arg))
+                sink.buffered += size
+                sink.pending += 1
+            self._condition.notify_all()
+        if not self._live():
+            raise OSError(errno.EIO, "Every backup destination failed: "
+                          + "; ".join(f"{sink.path}: {sink.error}" for sink in self._sinks))
+
+    def write(self, data):
+        data = bytes(data)
+        self._put("write", data, len(data))
+        self._pos += len(data)
+        self._size = max(self._size, self._pos)
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self._size
+        self._put("seek", offset)
+        self._pos = offset
+        return offset
+
+    def tell(self):
+        return self._pos
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        """Wait until every live destination has written and synced what was queued"""
+        self._put("flush")
+        with self._condition:
+            deadline = time.monotonic() + self.stall_timeout
+            last_pending = None
+            while any(sink.pending for sink in self._live()):
+                pending = sum(sink.pending for sink in self._live())
+                if pending != last_pending:
+                    # Any progress restarts the stall clock
+                    deadline = time.monotonic() + self.stall_timeout
+                    last_pending = pending
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    for sink in self._live():
+                        if sink.pending:
+                            sink.fail(f"stalled for more than {self.stall_timeout:g} s")
+                    break
+                self._condition.wait(remaining)
+
+    def close(self):
+        """Finish every destination; returns [{'path', 'ok', 'error', 'bytes'}] in destination order"""
+        if not self._closed:
+            self._closed = True
+            with self._condition:
+                for sink in self._sinks:
+                    sink.ops.append(("close", None))
+                self._condition.notify_all()
+            for sink in self._sinks:
+                # A destination dropped for stalling may never return from its last write
+                sink.thread.join(None if sink.error is None else 1.0)
+                if sink.thread.is_alive() and not sink.discard():
+                    # Windows won't remove a file its writer still holds open
+                    sink.error += f"; the partial file is left at {sink.path}"
+        return [{'path': sink.path, 'ok': sink.error is None, 'error': sink.error,
+                 'bytes': self._size if sink.error is None else sink.written}
+                for sink in self._sinks]
+
+class TimedFile:
+    """File proxy that charges time spent in write() to a profiler phase"""
+    def __init__(self, fileobj, profiler, phase="write"):
+        self._fileobj = fileobj
+        self._profiler = profiler
+        self._phase = phase
+
+    def write(self, data):
+        start = time.perf_counter()
+        result = self._fileobj.write(data)
+        self._profiler.add(self._phase, time.perf_counter() - start)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+class BackupProfiler:
+    """Per-phase timing for backup runs, with optional cProfile, tracemalloc and stack sampling"""
+    PHASES = ("scan", "exclude", "read", "compress", "write", "checkpoint")
+
+    def __init__(self, enabled=False, cprofile=False, tracemalloc=False, sample_interval=0.005, report_prefix=None):
+        """Phase timers always run; the rest only when enabled"""
+        self.enabled = enabled
+        self.use_cprofile = enabled and cprofile
+        self.use_tracemalloc = enabled and tracemalloc
+        self.sample_interval = sample_interval
+        self.report_prefix = report_prefix
+        self.times = collections.defaultdict(float)
+        self.stacks = collections.Counter()
+        self._profile = None
+        self._sampler = None
+        self._sampling = threading.Event()
+        self._started = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self._start_usage = None
+        self._start_io = None
+        self.usage = {}
+        self.io_counters = {}
+        self.tracemalloc_peak = None
+        self.tracemalloc_top = []
+
+    def add(self, phase, seconds):
+        """Charge time to a phase"""
+        self.times[phase] += seconds
+
+    def timed_iter(self, iterable, phase):
+        """Yield from an iterable, charging the time spent producing each item to a phase"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.times[phase] += time.perf_counter() - start
+                return
+            self.times[phase] += time.perf_counter() - start
+            yield item
+
+    @staticmethod
+    def _read_proc_io():
+        """Read syscall and byte counters from /proc/self/io where available"""
+        try:
+            with open("/proc/self/io") as f:
+                return {key: int(value) for key, value in (line.split(": ") for line in f.read().splitlines())}
+        except (OSError, ValueError):
+            return {}
+
+    def start(self):
+        """Start timers and any enabled profilers"""
+        self._start_io = self._read_proc_io()
+        self._start_usage = resource.getrusage(resource.RUSAGE_SELF) if resource else None
+        self._cpu_start = time.process_time()
+        if self.use_tracemalloc:
+            tracemalloc.start(25)
+        if self.enabled:
+            self._sampling.set()
+            self._sampler = threading.Thread(
+                target=self._sample_stacks, args=(threading.get_ident(),), daemon=True
+            )
+            self._sampler.start()
+        if self.use_cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._started = time.perf_counter()
+
+    def stop(self):
+        """Stop profilers and collect resource usage"""
+        if self._started is None:
+            return
+        self.wall_seconds = time.perf_counter() - self._started
+        self.cpu_seconds = time.process_time() - self._cpu_start
+        self._started = None
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampling.clear()
+            self._sampler.join()
+        if self.use_tracemalloc:
+            self.tracemalloc_peak = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot()
+            self.tracemalloc_top = [
+                (str(stat.traceback[0]), stat.size, stat.count)
+                for stat in snapshot.statistics('lineno')[:15]
+            ]
+            tracemalloc.stop()
+        if resource and self._start_usage:
+            end = resource.getrusage(resource.RUSAGE_SELF)
+            # ru_maxrss is in KB on Linux and bytes on macOS
+            scale = 1 if sys.platform == "darwin" else 1024
+            self.usage = {
+                'peak_rss_bytes': end.ru_maxrss * scale,
+                'user_seconds': end.ru_utime - self._start_usage.ru_utime,
+                'system_seconds': end.ru_stime - self._start_usage.ru_stime,
+                'voluntary_context_switches': end.ru_nvcsw - self._start_usage.ru_nvcsw,
+                'involuntary_context_switches': end.ru_nivcsw - self._start_usage.ru_nivcsw,
+                'block_inputs': end.ru_inblock - self._start_usage.ru_inblock,
+                'block_outputs': end.ru_oublock - self._start_usage.ru_oublock
+            }
+        end_io = self._read_proc_io()
+        self.io_counters = {key: end_io[key] - self._start_io.get(key, 0) for key in end_io}
+
+    def _sample_stacks(self, thread_id):
+        """Sample the backup thread's stack for collapsed-stack flamegraph output"""
+        while self._sampling.is_set():
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    def phase_summary(self, governor=None):
+        """Seconds per phase; compress is member time not spent reading or writing"""
+        phases = {phase: self.times.get(phase, 0.0) for phase in self.PHASES}
+        if governor is not None:
+            phases['read'] = governor.read_seconds
+            phases['throttled'] = governor.sleep_seconds
+        member = self.times.get('member', 0.0)
+        phases['compress'] = max(0.0, member - phases['read'] - phases.get('throttled', 0.0) - phases['write'])
+        phases['other'] = max(0.0, self.wall_seconds - sum(phases.values()))
+        return phases
+
+    def write_report(self, prefix, governor=None, extra=None):
+        """Write <prefix>.profile.json, a collapsed-stack file and, with cProfile, .pstats/.txt"""
+        written = []
+        report = {
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'phases': self.phase_summary(governor),
+            'rusage': self.usage,
+            'proc_io': self.io_counters,
+            'tracemalloc_peak_bytes': self.tracemalloc_peak,
+            'tracemalloc_top': self.tracemalloc_top,
+            'stack_samples': sum(self.stacks.values())
+        }
+        if extra:
+            report.update(extra)
+        with open(prefix + ".profile.json", 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        written.append(prefix + ".profile.json")
+        with open(prefix + ".collapsed", 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        written.append(prefix + ".collapsed")
+        if self._profile is not None:
+            self._profile.dump_stats(prefix + ".pstats")
+            written.append(prefix + ".pstats")
+            text = io.StringIO()
+            pstats.Stats(self._profile, stream=text).sort_stats("cumulative").print_stats(40)
+            with open(prefix + ".profile.txt", 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+            written.append(prefix + ".profile.txt")
+        return written
+
+class ConsoleProgress:
+    """Stand-in for the progress popup and label when no Tk root is available"""
+    def __init__(self, initial_text=""):
+        """Print the initial progress text"""
+        self.cancelled = False
+        self._last_text = None
+        if initial_text:
+            self.config(text=initial_text)
+
+    def config(self, text=""):
+        """Print progress text, skipping repeats"""
+        if text != self._last_text:
+            print(f"PROGRESS: {text}")
+            self._last_text = text
+
+    def update_idletasks(self):
+        pass
+
+    def update(self):
+        pass
+
+    def destroy(self):
+        pass
+
+class ParallelTreeWalker:
+    """Top-down directory walk that lists folders and stats files on a thread pool.
+
+    On network shares every listing and stat is a round trip, which a serial os.walk pays one at a
+    time. Here each finished listing queues its file stats and its subfolders' listings right away,
+    at most `workers` running at once, while results still come out in a fixed order: depth first
+    with sorted names. prune(rel_dir) decides about each subfolder before it is queued, so excluded
+    trees are never listed; it runs on the worker threads and must not change shared state. Like
+    os.walk, symlinked folders are reported but not entered, and unreadable folders are left out.
+    Any other exception on a worker, from prune for instance, is raised by walk() in the consumer.
+    """
+    DEFAULT_WORKERS = 8
+    # Files per stat task: a folder's stats are split over the workers, in batches within these bounds
+    MIN_STAT_BATCH = 8
+    MAX_STAT_BATCH = 256
+    # Folder listings allowed to run ahead of the consumer, per worker
+    AHEAD_PER_WORKER = 32
+
+    def __init__(self, workers=None, latency=0.0):
+        self.workers = max(1, workers or self.DEFAULT_WORKERS)
+        # Seconds added to every listing and stat, to stand in for a network filesystem in benchmarks
+        self.latency = latency
+
+    def _scandir(self, path):
+        """Return (dirs as (name, is_symlink), file names), both sorted"""
+        if self.latency:
+            time.sleep(self.latency)
+        dirs = []
+        files = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    dirs.append((entry.name, entry.is_symlink()))
+                else:
+                    files.append(entry.name)
+        dirs.sort()
+        files.sort()
+        return dirs, files
+
+    def _stat(self, paths):
+        """Stat files, following symlinks; broken links get their own lstat, vanished files None"""
+        results = []
+        for path in paths:
+            if self.latency:
+                time.sleep(self.latency)
+            try:
+                results.append(os.stat(path))
+            except OSError:
+                try:
+                    results.append(os.lstat(path))
+                except OSError:
+                    results.append(None)
+        return results
+
+    def walk(self, top, prune=None):
+        """Yield (dirpath, dirnames, filenames, stats) top-down, where stats maps each file name to its stat or None.
+
+        Work is taken in output order: depth first with sorted names is the lexicographic order of
+        the path components, so a heap keyed on them always serves the folder the consumer needs
+        next first. At most workers * AHEAD_PER_WORKER listed folders wait for the consumer.
+        """
+        max_ahead = self.workers * self.AHEAD_PER_WORKER
+        condition = threading.Condition()
+        # (key, sequence, rel_dir, file names to stat or None for the listing)
+        tasks = []
+        # rel_dir -> {'listing': (dirs, files) or None, 'children', 'stats', 'pending', 'error', 'failure'}
+        folders = {}
+        state = {'ahead': 0, 'waiting': (), 'stop': False, 'sequence': 0}
+
+        def new_folder():
+            return {'listing': None, 'children': (), 'stats': {}, 'pending': 0, 'error': None, 'failure': None}
+
+        def key_of(rel_dir):
+            return tuple(rel_dir.split("/")) if rel_dir else ()
+
+        def queue(rel_dir, names=None):
+            state['sequence'] += 1
+            heapq.heappush(tasks, (key_of(rel_dir), state['sequence'], rel_dir, names))
+            condition.notify()
+
+        def run(rel_dir, names):
+            path = os.path.join(top, rel_dir) if rel_dir else top
+            if names is not None:
+                stats = self._stat([os.path.join(path, name) for name in names])
+                with condition:
+                    folder = folders[rel_dir]
+                    folder['stats'].update(zip(names, stats))
+                    folder['pending'] -= 1
+                    condition.notify_all()
+                return
+            try:
+                dirs, files = self._scandir(path)
+            except OSError as e:
+                with condition:
+                    folders[rel_dir]['error'] = e
+                    condition.notify_all()
+                return
+            children = []
+            for name, is_link in dirs:
+                child = f"{rel_dir}/{name}" if rel_dir else name
+                if not is_link and not (prune is not None and prune(child)):
+                    children.append(child)
+            batch_size = min(self.MAX_STAT_BATCH, max(self.MIN_STAT_BATCH, -(-len(files) // self.workers)))
+            with condition:
+                folder = folders[rel_dir]
+                folder['listing'] = (dirs, files)
+                folder['children'] = children
+                state['ahead'] += 1
+                for i in range(0, len(files), batch_size):
+                    folder['pending'] += 1
+                    queue(rel_dir, files[i:i + batch_size])
+                for child in children:
+                    folders[child] = new_folder()
+                    queue(child)
+                condition.notify_all()
+
+        def worker():
+            while True:
+                with condition:
+                    while not state['stop'] and (not tasks or (
+                            state['ahead'] >= max_ahead and tasks[0][0] > state['waiting'])):
+                        condition.wait()
+                    if state['stop']:
+                        return
+                    _, _, rel_dir, names = heapq.heappop(tasks)
+                try:
+                    run(rel_dir, names)
+                except Exception as e:
+                    # A failing prune or stat would otherwise end this thread and leave the consumer
+                    # waiting for the folder forever; it is raised again when the consumer gets there
+                    with condition:
+                        folders[rel_dir]['failure'] = e
+                        condition.notify_all()
+
+        folders[""] = new_folder()
+        with condition:
+            queue("")
+        threads = [threading.Thread(target=worker, name=f"walk-{i}", daemon=True) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            stack = [""]
+            while stack:
+                rel_dir = stack.pop()
+                with condition:
+                    state['waiting'] = key_of(rel_dir)
+                    condition.notify_all()
+                    folder = folders[rel_dir]
+                    while folder['error'] is None and folder['failure'] is None and (
+                            folder['listing'] is None or folder['pending']):
+                        condition.wait()
+                    if folder['failure'] is not None:
+                        raise folder['failure']
+                    del folders[rel_dir]
+                    if folder['error'] is None:
+                        state['ahead'] -= 1
+                path = os.path.join(top, rel_dir) if rel_dir else top
+                if folder['error'] is not None:
+                    print(f"DEBUG: Cannot list {path}: {folder['error']}")
+                    continue
+                dirs, files = folder['listing']
+                stack.extend(reversed(folder['children']))
+                yield path, [name for name, _ in dirs], files, folder['stats']
+        finally:
+            with condition:
+                state['stop'] = True
+                condition.notify_all()
+            for thread in threads:
+                thread.join()
+
+    def total_size(self, top, prune=None):
+        """Bytes in the regular files under top"""
+        return sum(
+            st.st_size
+            for _, _, _, stats in self.walk(top, prune)
+            for st in stats.values()
+            if st is not None and stat.S_ISREG(st.st_mode)
+        )
+
+    @classmethod
+    def benchmark(cls, top, workers=None, latency=0.0):
+        """Time a serial os.walk + stat against the parallel walk, with `latency` seconds added per call"""
+        def serial():
+            found = []
+            for rootdir, dirs, files in os.walk(top):
+                if latency:
+                    time.sleep(latency)
+                dirs.sort()
+                for name in sorted(files):
+                    if latency:
+                        time.sleep(latency)
+                    try:
+                        os.stat(os.path.join(rootdir, name))
+                    except OSError:
+                        pass
+                    found.append(os.path.join(rootdir, name))
+            return found
+
+        started = time.perf_counter()
+        serial_files = serial()
+        serial_seconds = time.perf_counter() - started
+        walker = cls(workers, latency)
+        started = time.perf_counter()
+        parallel_files = [os.path.join(dirpath, name) for dirpath, _, files, _ in walker.walk(top) for name in files]
+        parallel_seconds = time.perf_counter() - started
+        return {
+            'files': len(parallel_files),
+            'same_files': sorted(serial_files) == sorted(parallel_files),
+            'latency_ms': latency * 1000,
+            'workers': walker.workers,
+            'serial_seconds': serial_seconds,
+            'parallel_seconds': parallel_seconds,
+            'speedup': serial_seconds / parallel_seconds if parallel_seconds else float('inf')
+        }
+
+class BackupManager:
+    """Manages the backup creation process"""
+    # Persist a checkpoint after this many members or seconds, whichever comes first
+    CHECKPOINT_EVERY_MEMBERS = 200
+    CHECKPOINT_EVERY_SECONDS = 5.0
+    # Deflate level for ZIP members unless archive_options['zip_level'] or the pacer says otherwise
+    ZIP_LEVEL = 9
+    # Files smaller than this are never treated as sparse
+    SPARSE_MIN_SIZE = 1024 * 1024
+
+    # Read size for streaming members into the archive
+    COPY_CHUNK = 1024 * 1024
+
+    # Output formats, chosen by the archive's file extension
+    ARCHIVE_FORMATS = {".zip": "zip", ".tar.zst": "tar.zst", ".tzst": "tar.zst"}
+    # Catalog format of ZIP archives streamed to stdout or a pipe, which leave no file behind
+    STREAM_FORMAT = "zip-stream"
+
+    def __init__(self, database, member_handlers=None, resource_limits=None, archive_options=None):
+        """Initialize the backup manager with database access"""
+        self.db = database
+        self.member_handlers = member_handlers or MEMBER_HANDLERS
+        # Keyword arguments for the ResourceGovernor created for each run
+        self.resource_limits = resource_limits or {}
+        # tar.zst settings: zstd_level, zstd_dictionary (bool), zstd_frame_size
+        self.archive_options = archive_options or {}
+        # Keyword arguments for the BackupProfiler; {'enabled': True} writes a profile report
+        self.profile_options = {}
+        # DeltaEncoder settings; {'enabled': True} stores large changed files as deltas
+        self.delta_options = {}
+        # CompressionPacer settings for ZIP runs: deadline (seconds from the start) or target_rate (bytes/s)
+        self.pace_options = {}
+        # Threads listing folders and stating files while scanning the source
+        self.scan_workers = ParallelTreeWalker.DEFAULT_WORKERS
+
+    @classmethod
+    def archive_format_for(cls, path):
+        """Return the output format implied by an archive path"""
+        lowered = path.lower()
+        for suffix, archive_format in cls.ARCHIVE_FORMATS.items():
+            if lowered.endswith(suffix):
+                return archive_format
+        return "zip"
+
+    def _expected_source_bytes(self, source_dir, project_id, excluded_folders):
+        """Bytes the project's last completed backup archived, or a quick size scan of the included folders when there is none"""
+        if project_id:
+            previous = [b for b in self.db.get_backups(project_id) if b['status'] == 'complete' and b['source_bytes']]
+            if previous:
+                return previous[-1]['source_bytes']
+        return ParallelTreeWalker(self.scan_workers).total_size(source_dir, lambda rel_dir: rel_dir in excluded_folders)
+
+    @staticmethod
+    def _written_source_bytes(source_dir, checkpoint):
+        """Current size of the source files a checkpoint's members were written from"""
+        if checkpoint is None:
+            return 0
+        total = 0
+        for member in checkpoint['members']:
+            name = member['name']
+            if name.startswith(DeltaEncoder.MEMBER_PREFIX):
+                name = name[len(DeltaEncoder.MEMBER_PREFIX):]
+            try:
+                total += os.path.getsize(os.path.join(source_dir, name))
+            except OSError:
+                # Git bundles and files removed since have no source file to count
+                continue
+        return total
+
+    def _sample_dictionary_files(self, source_dir, excluded_folders, limit=2000, max_size=64 * 1024):
+        """Collect small files to train a zstd dictionary on"""
+        paths = []
+        for rootdir, dirs, files in os.walk(source_dir):
+            rel_root = os.path.relpath(rootdir, source_dir).replace("\\", "/")
+            rel_root = "" if rel_root == "." else rel_root
+            dirs[:] = [d for d in dirs if not any(
+                (f"{rel_root}/{d}" if rel_root else d) == excl
+                or (f"{rel_root}/{d}" if rel_root else d).startswith(excl + "/")
+                for excl in excluded_folders
+            )]
+            for name in files:
+                path = os.path.join(rootdir, name)
+                try:
+                    if 0 < os.path.getsize(path) <= max_size:
+                        paths.append(path)
+                except OSError:
+                    continue
+                if len(paths) >= limit:
+                    return paths
+        return paths
+
+    def _write_member(self, zipf, file_path, rel_path, stats, governor, handlers=None, st=None):
+        """Write one file through the first matching special handler, or the default streaming path"""
+        if st is None:
+            st = os.stat(file_path)
+        for handler, name in (handlers or self.member_handlers).find(rel_path):
+            result = handler(zipf, file_path, rel_path, st, stats, governor)
+            if result is not None:
+                return result
+        info = _member_info(zipf, file_path, rel_path, st)
+        with open(file_path, 'rb') as src, zipf.open(info, 'w') as dst:
+            while True:
+                chunk = governor.read(src, self.COPY_CHUNK)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        return MemberHandlerRegistry.COPIED
+
+    @staticmethod
+    def _is_stream_target(path):
+        """True for pipes, sockets and devices, which can only be written front to back"""
+        try:
+            mode = os.stat(path).st_mode
+        except (OSError, TypeError, ValueError):
+            return False
+        return stat.S_ISFIFO(mode) or stat.S_ISCHR(mode) or stat.S_ISSOCK(mode)
+
+    def create_backup(self, project_id, save_path=None, output_stream=None, mirrors=None):
+        """Create a backup for the specified project, with verbose debug output.
+
+        With output_stream (or a pipe/device as save_path) the ZIP is streamed front to back using
+        data descriptors; such runs can't be checkpointed or resumed. mirrors (default: the project's
+        'mirrors' option) are further files or folders that receive the same ZIP from a single pass;
+        fanned-out runs aren't checkpointed either.
+        """
+        import datetime
+        import os
+        # Get project details
+        project = self.db.get_project(project_id)
+        if not project:
+            print("DEBUG: Project not found for id:", project_id)
+            return False, "Project not found"
+        # Get exclusions directly from the project dictionary
+        file_exclusions = set(project['file_exclusions'] or [])
+        folder_exclusions = set(project['folder_exclusions'] or [])
+        print("\n========== DEBUG: RAW EXCLUSIONS ==========")
+        print("File exclusions (raw):", file_exclusions)
+        print("Folder exclusions (raw):", folder_exclusions)
+        # Normalize exclusions: all paths relative to project root, forward slashes, no leading/trailing slashes
+        excluded_files = set(os.path.normpath(f).replace("\\", "/").strip("/") for f in file_exclusions)
+        excluded_folders = set(os.path.normpath(f).replace("\\", "/").strip("/") for f in folder_exclusions)
+        print("\n========== DEBUG: NORMALIZED EXCLUSIONS ==========")
+        print("Excluded files (normalized):", excluded_files)
+        for f in excluded_files:
+            print("  Excluded file:", f)
+        print("Excluded folders (normalized):", excluded_folders)
+        for f in excluded_folders:
+            print("  Excluded folder:", f)
+        # Create timestamp for filename
+        timestamp = datetime.datetime.now().strftime("%b-%d-%Y-%I-%M-%S-%p").upper()
+        safe_name = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in project['name'])
+        default_filename = f"{safe_name}-{timestamp}.zip"
+        if not save_path:
+            # Ask user where to save the backup
+            from tkinter import filedialog
+            save_path = filedialog.asksaveasfilename(
+                defaultextension=".zip",
+                filetypes=[("ZIP files", "*.zip"), ("Tar + Zstandard", "*.tar.zst")],
+                initialfile=default_filename
+            )
+            print("DEBUG: User chose save path:", save_path)
+        elif output_stream is None and os.path.isdir(save_path):
+            save_path = os.path.join(save_path, default_filename)
+        if not save_path:
+            print("DEBUG: Backup cancelled by user.")
+            return False, "Backup cancelled by user"
+        if output_stream is None:
+            # The catalog and delta/bundle headers must find the archive from any working directory
+            save_path = os.path.abspath(save_path)
+        # Print source and destination info
+        print("DEBUG: Source folder:", project['folder_path'])
+        print("DEBUG: Destination archive:", save_path)
+        # Make sure the archive doesn't end up inside itself
+        archive_rel = os.path.relpath(save_path, project['folder_path']).replace("\\", "/").strip("/")
+        streaming = output_stream is not None or self._is_stream_target(save_path)
+        if streaming and self.archive_format_for(save_path) != "zip":
+            return False, "Only ZIP archives can be streamed to a pipe"
+        if mirrors is None:
+            mirrors = project['options'].get('mirrors') or []
+            if mirrors and (streaming or self.archive_format_for(save_path) != "zip"):
+                print("DEBUG: Project mirrors skipped, they need a ZIP archive written to a file")
+                mirrors = []
+        # A mirror folder gets an archive with the same name as the main one
+        mirrors = [os.path.abspath(os.path.join(m, os.path.basename(save_path)) if os.path.isdir(m) else m)
+                   for m in mirrors]
+        if mirrors and (streaming or self.archive_format_for(save_path) != "zip"):
+            return False, "Mirror destinations need a ZIP archive written to a file"
+        for mirror in mirrors:
+            print("DEBUG: Mirror destination:", mirror)
+        try:
+            checkpoint_id = None
+            # Streamed archives are cataloged for their history but are not stored anywhere we can read back
+            backup_id = self.db.create_backup_record(
+                project_id, save_path, self.STREAM_FORMAT if streaming else self.archive_format_for(save_path)
+            )
+            print("DEBUG: Backup ID:", backup_id)
+            if self.archive_format_for(save_path) == "zip" and not streaming and not mirrors:
+                # Register the run so it can be resumed after a crash or cancel
+                checkpoint_id = self.db.create_checkpoint(
+                    project_id,
+                    project['folder_path'],
+                    save_path,
+                    archive_rel,
+                    excluded_files,
+                    excluded_folders,
+                    checkpoint_id=backup_id
+                )
+                print("DEBUG: Checkpoint ID:", checkpoint_id)
+            if streaming and output_stream is None:
+                with open(save_path, 'wb') as pipe:
+                    return self._create_zip_backup(
+                        project['folder_path'],
+                        save_path,
+                        excluded_files,
+                        excluded_folders,
+                        archive_rel,
+                        backup_id=backup_id,
+                        project_id=project_id,
+                        output_stream=pipe,
+                        git_mode=project['options'].get('git_mode'),
+                        exclusion_rules=project['options'].get('exclusion_rules')
+                    )
+            # Create the backup
+            return self._create_zip_backup(
+                project['folder_path'],
+                save_path,
+                excluded_files,
+                excluded_folders,
+                archive_rel,
+                checkpoint_id=checkpoint_id,
+                backup_id=backup_id,
+                project_id=project_id,
+                output_stream=output_stream,
+                git_mode=project['options'].get('git_mode'),
+                exclusion_rules=project['options'].get('exclusion_rules'),
+                mirrors=mirrors
+            )
+        except Exception as e:
+            import traceback
+            print("DEBUG: Exception during backup!\n", traceback.format_exc())
+            return False, f"Backup failed: {str(e)}"
+
+    def benchmark_streaming(self, project_id, consumer_rate=None):
+        """Time writing the archive and then sending it, against streaming it straight into the consumer.
+
+        The consumer drains a pipe at consumer_rate bytes per second (unlimited when None), standing in
+        for an uploader or ssh. Both runs leave the project's mirrors alone, and the backups they take
+        are removed from the catalog again. Returns seconds for both ways and the bytes sent.
+        """
+        before = {backup['id'] for backup in self.db.get_backups(project_id)}
+        workdir = tempfile.mkdtemp(prefix="stream-bench-")
+
+        def consume(read_fd):
+            received = 0
+            started = time.perf_counter()
+            while True:
+                chunk = os.read(read_fd, self.COPY_CHUNK)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if consumer_rate:
+                    delay = received / consumer_rate - (time.perf_counter() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+            os.close(read_fd)
+            return received
+
+        def through_consumer(write):
+            read_fd, write_fd = os.pipe()
+            result = {}
+            thread = threading.Thread(target=lambda: result.setdefault('bytes', consume(read_fd)), daemon=True)
+            thread.start()
+            try:
+                with os.fdopen(write_fd, 'wb') as pipe:
+                    success, message = write(pipe)
+            finally:
+                thread.join()
+            if not success:
+                raise RuntimeError(message)
+            return result['bytes']
+
+        def send_file(pipe):
+            with open(archive, 'rb') as f:
+                shutil.copyfileobj(f, pipe, self.COPY_CHUNK)
+            return True, None
+
+        archive = os.path.join(workdir, "stream-bench.zip")
+        try:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                success, message = self.create_backup(project_id, save_path=archive, mirrors=[])
+            if not success:
+                raise RuntimeError(message)
+            file_bytes = through_consumer(send_file)
+            file_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                stream_bytes = through_consumer(
+                    lambda pipe: self.create_backup(project_id, save_path="-", output_stream=pipe, mirrors=[]))
+            stream_seconds = time.perf_counter() - started
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+            taken = [backup['id'] for backup in self.db.get_backups(project_id) if backup['id'] not in before]
+            if taken:
+                self.db.delete_backup_records(taken)
+        return {
+            'file_seconds': file_seconds,
+            'file_bytes': file_bytes,
+            'stream_seconds': stream_seconds,
+            'stream_bytes': stream_bytes,
+            'saved_seconds': file_seconds - stream_seconds
+        }
+
+    def benchmark_formats(self, project_id, zip_levels=(9,), zstd_levels=(3, 12, 19)):
+        """Time a whole backup of the project as ZIP and as tar.zst at each level.
+
+        Every run writes to a scratch folder and leaves the project's mirrors alone; the backups are
+        removed from the catalog again. Returns one row per run with its seconds and archive bytes
+        (for tar.zst including the index sidecar). zstd levels are left out when zstandard is missing.
+        """
+        before = {backup['id'] for backup in self.db.get_backups(project_id)}
+        workdir = tempfile.mkdtemp(prefix="format-bench-")
+        runs = [("zip", level, {'zip_level': level}) for level in zip_levels]
+        if zstandard is not None:
+            runs += [("tar.zst", level, {'zstd_level': level}) for level in zstd_levels]
+        archive_options = self.archive_options
+        rows = []
+        try:
+            for archive_format, level, options in runs:
+                archive = os.path.join(workdir, f"format-bench-{level}.{archive_format}")
+                self.archive_options = dict(archive_options, **options)
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    success, message = self.create_backup(project_id, save_path=archive, mirrors=[])
+                seconds = time.perf_counter() - started
+                if not success:
+                    raise RuntimeError(message)
+                sidecar = archive + TarZstdWriter.INDEX_SUFFIX
+                rows.append({
+                    'format': archive_format,
+                    'level': level,
+                    'seconds': seconds,
+                    'archive_bytes': os.path.getsize(archive) + (os.path.getsize(sidecar) if os.path.exists(sidecar) else 0)
+                })
+        finally:
+            self.archive_options = archive_options
+            shutil.rmtree(workdir, ignore_errors=True)
+            taken = [backup['id'] for backup in self.db.get_backups(project_id) if backup['id'] not in before]
+            if taken:
+                self.db.delete_backup_records(taken)
+        return rows
+
+    def resume_backup(self, checkpoint_id=None):
+        """Resume an interrupted backup from its last checkpoint (the newest one if no ID is given)"""
+        if checkpoint_id is None:
+            incomplete = self.db.get_incomplete_checkpoints()
+            if not incomplete:
+                return False, "No interrupted backups to resume"
+            checkpoint_id = incomplete[0]['id']
+        checkpoint = self.db.get_checkpoint(checkpoint_id)
+        if not checkpoint:
+            print("DEBUG: Checkpoint not found for id:", checkpoint_id)
+            return False, "Checkpoint not found"
+        if checkpoint['status'] == 'complete':
+            return False, f"Backup {checkpoint_id} already completed"
+        print("\n========== DEBUG: RESUMING BACKUP ==========")
+        print("DEBUG: Checkpoint ID:", checkpoint_id)
+        print("DEBUG: Destination archive:", checkpoint['dest_file'])
+        print(f"DEBUG: Members already written: {len(checkpoint['members'])}")
+        print(f"DEBUG: Last good offset: {checkpoint['zip_offset']}")
+        try:
+            # Checkpoints share their ID with the catalog entry of the run
+            if self.db.get_backup_record(checkpoint_id) is None:
+                self.db.create_backup_record(checkpoint['project_id'], checkpoint['dest_file'], "zip", backup_id=checkpoint_id)
+            project = self.db.get_project(checkpoint['project_id'])
+            return self._create_zip_backup(
+                checkpoint['source_dir'],
+                checkpoint['dest_file'],
+                set(checkpoint['file_exclusions']),
+                set(checkpoint['folder_exclusions']),
+                checkpoint['archive_rel'],
+                checkpoint_id=checkpoint_id,
+                resume_from=checkpoint,
+                backup_id=checkpoint_id,
+                project_id=checkpoint['project_id'],
+                git_mode=project['options'].get('git_mode') if project else None,
+                exclusion_rules=project['options'].get('exclusion_rules') if project else None
+            )
+        except Exception as e:
+            import traceback
+            print("DEBUG: Exception during resume!\n", traceback.format_exc())
+            return False, f"Resume failed: {str(e)}"
+
+    def prune_backups(self, project_id, dry_run=False):
+        """Apply the project's retention policy; returns (plan, reclaimed bytes).
+
+        The plan is RetentionPolicy.plan's list. Archives are removed newest first, so a failure
+        part-way never leaves a kept backup without its base; a backup whose file can't be removed
+        stays in the catalog. Backups whose archives are all gone are reported as "archive missing"
+        and stay in the catalog too; only the bytes of files actually found count as reclaimed.
+        """
+        project = self.db.get_project(project_id)
+        if not project:
+            raise ValueError(f"Project not found: {project_id}")
+        policy = RetentionPolicy(project['options'].get('retention'))
+        # Runs that can still be resumed need their delta bases when they finish
+        resumable = [checkpoint['id'] for checkpoint in self.db.get_incomplete_checkpoints()
+                     if checkpoint['project_id'] == project_id]
+        plan = policy.plan(self.db.get_backups(project_id), self.db.get_backup_dependencies(project_id), resumable)
+        reclaimed = 0
+        removed = []
+        missing = set()
+        for backup, keep, reason in plan:
+            if keep:
+                continue
+            archives = [backup['archive_path']] + [copy['path'] for copy in self.db.get_backup_copies(backup['id'])]
+            # Relative paths come from old catalog rows and can't be located reliably
+            paths = [path for archive in dict.fromkeys(archives) if os.path.isabs(archive)
+                     for path in (archive, archive + TarZstdWriter.INDEX_SUFFIX) if os.path.isfile(path)]
+            if not paths:
+                print(f"DEBUG: Archive of backup {backup['id']} is missing: {backup['archive_path']}")
+                missing.add(backup['id'])
+                continue
+            size = sum(os.path.getsize(path) for path in paths)
+            if dry_run:
+                reclaimed += size
+                continue
+            try:
+                for path in paths:
+                    os.remove(path)
+            except OSError as e:
+                print(f"DEBUG: Could not remove {backup['archive_path']}: {e}")
+                break
+            print(f"DEBUG: Removed backup {backup['id']} ({reason}): {backup['archive_path']}")
+            reclaimed += size
+            removed.append(backup['id'])
+        if removed:
+            self.db.delete_backup_records(removed)
+        removed = set(removed)
+        updated = []
+        for backup, keep, reason in plan:
+            if backup['id'] in missing:
+                updated.append((backup, True, "archive missing"))
+            elif not dry_run and not keep and backup['id'] not in removed:
+                # Backups left in place after a failed removal are reported as kept
+                updated.append((backup, True, "removal failed"))
+            else:
+                updated.append((backup, keep, reason))
+        return updated, reclaimed
+
+    def _open_zip_writer(self, target):
+        """ZipFile writer for new and resumed archives, so both write members with the same settings"""
+        return zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED,
+                               compresslevel=self.archive_options.get('zip_level', self.ZIP_LEVEL))
+
+    def _reopen_zip_at_checkpoint(self, checkpoint):
+        """Truncate the archive to the last checkpoint and rebuild the ZipFile writer state"""
+        dest_file = checkpoint['dest_file']
+        offset = checkpoint['zip_offset']
+        if not os.path.exists(dest_file):
+            raise FileNotFoundError(f"Partial archive not found: {dest_file}")
+        fp = open(dest_file, 'r+b')
+        try:
+            fp.seek(0, os.SEEK_END)
+            if fp.tell() < offset:
+                raise ValueError(
+                    f"Partial archive is shorter ({fp.tell()} bytes) than its checkpoint ({offset} bytes)"
+                )
+            fp.truncate(offset)
+            infos = [self._read_local_header(fp, member, offset) for member in checkpoint['members']]
+            fp.seek(offset)
+            zipf = self._open_zip_writer(fp)
+        except Exception:
+            fp.close()
+            raise
+        for info in infos:
+            zipf.filelist.append(info)
+            zipf.NameToInfo[info.filename] = info
+        return zipf, fp
+
+    def _read_local_header(self, fp, member, limit):
+        """Rebuild a ZipInfo from the local file header of a member that was fully written"""
+        fp.seek(member['header_offset'])
+        header = fp.read(zipfile.sizeFileHeader)
+        if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad local header for {member['name']} at {member['header_offset']}")
+        (_, extract_version, _, flag_bits, compress_type, dostime, dosdate,
+         crc, compress_size, file_size, name_len, extra_len) = struct.unpack(zipfile.structFileHeader, header)
+        raw_name = fp.read(name_len)
+        extra = fp.read(extra_len)
+        name = raw_name.decode('utf-8' if flag_bits & 0x800 else 'cp437')
+        if name != member['name']:
+            raise zipfile.BadZipFile(f"Checkpoint expected {member['name']} at {member['header_offset']}, found {name}")
+        if file_size == 0xFFFFFFFF or compress_size == 0xFFFFFFFF:
+            # Sizes live in the ZIP64 extra field
+            pos = 0
+            while pos + 4 <= len(extra):
+                tag, size = struct.unpack('<HH', extra[pos:pos + 4])
+                if tag == 1:
+                    file_size, compress_size = struct.unpack('<QQ', extra[pos + 4:pos + 20])
+                    break
+                pos += 4 + size
+        date_time = (
+            (dosdate >> 9) + 1980, (dosdate >> 5) & 0xF, dosdate & 0x1F,
+            dostime >> 11, (dostime >> 5) & 0x3F, (dostime & 0x1F) * 2
+        )
+        info = zipfile.ZipInfo(name, date_time)
+        info.header_offset = member['header_offset']
+        info.external_attr = member['external_attr']
+        info.extract_version = extract_version
+        info.flag_bits = flag_bits
+        info.compress_type = compress_type
+        info.CRC = crc
+        info.compress_size = compress_size
+        info.file_size = file_size
+        info.extra = extra
+        end = member['header_offset'] + zipfile.sizeFileHeader + name_len + extra_len + compress_size
+        if end > limit:
+            raise zipfile.BadZipFile(f"Member {name} extends past the checkpoint offset")
+        return info
+
+    def _show_progress_popup(self, root, initial_text=""):
+        if root is None:
+            # Headless (command line) run
+            progress = ConsoleProgress(initial_text)
+            return progress, progress
+        popup = tk.Toplevel(root)
+        popup.title("Backup Progress")
+        popup.geometry("500x100")
+        popup.configure(bg=ModernUITheme.BG_COLOR)
+        popup.transient(root)
+        popup.grab_set()
+        popup.focus_set()
+        # Center the popup
+        popup.update_idletasks()
+        x = root.winfo_rootx() + (root.winfo_width() // 2) - 250
+        y = root.winfo_rooty() + (root.winfo_height() // 2) - 50
+        popup.geometry(f"+{x}+{y}")
+        # Closing the popup cancels the backup; it can be resumed later
+        popup.cancelled = False
+
+        def cancel():
+            popup.cancelled = True
+
+        popup.protocol("WM_DELETE_WINDOW", cancel)
+        # Label for folder path
+        label = tk.Label(
+            popup,
+            text=initial_text,
+            font=("Helvetica", 12, "bold"),
+            bg=ModernUITheme.BG_COLOR,
+            fg=ModernUITheme.THEME_COLOR1,
+            wraplength=480,
+            anchor="w",
+            justify="left"
+        )
+        label.pack(fill=tk.BOTH, expand=True, padx=20, pady=30)
+        popup.update()
+        return popup, label
+
+    def _walk_source(self, source_dir, excluded_files, excluded_folders, archive_rel, counts, profiler, rules=None):
+        """Walk the source folder applying the exclusions.
+
+        Yields (rootdir, None, None, None) on entering each folder and (rootdir, file_path, rel_path, st)
+        for each file to back up, where st is the stat taken while scanning; skipped files and folders
+        are counted in counts. Listings and stats run on a ParallelTreeWalker, and excluded folders
+        are pruned before they are listed.
+        """
+        def excluded(folder_rel):
+            return any(folder_rel == excl or folder_rel.startswith(excl + "/") for excl in excluded_folders)
+
+        walker = ParallelTreeWalker(self.scan_workers)
+        for rootdir, dirs, files, stats in profiler.timed_iter(walker.walk(source_dir, excluded), 'scan'):
+            rel_root = os.path.relpath(rootdir, source_dir).replace("\\", "/")
+            rel_root = "" if rel_root == "." else rel_root
+            yield rootdir, None, None, None
+            # The walker already left excluded folders out; report them
+            exclude_started = time.perf_counter()
+            for d in dirs:
+                folder_rel = f"{rel_root}/{d}" if rel_root else d
+                if excluded(folder_rel):
+                    print(f"DEBUG: Skipping excluded folder: {folder_rel}")
+                    counts['folders_skipped'] += 1
+            profiler.add('exclude', time.perf_counter() - exclude_started)
+            # Process files in current directory
+            for file in files:
+                exclude_started = time.perf_counter()
+                file_path = os.path.join(rootdir, file)
+                rel_path = os.path.relpath(file_path, source_dir).replace("\\", "/").strip("/")
+                skip_reason = self._skip_reason(rel_path, excluded_files, excluded_folders, archive_rel)
+                st = stats.get(file)
+                if not skip_reason and rules is not None:
+                    skip_reason, st = self._rule_skip_reason(rules, file_path, rel_path, st)
+                profiler.add('exclude', time.perf_counter() - exclude_started)
+                if skip_reason:
+                    print(f"DEBUG: {skip_reason}")
+                    counts['files_skipped'] += 1
+                    continue
+                yield rootdir, file_path, rel_path, st
+
+    @staticmethod
+    def _skip_reason(rel_path, excluded_files, excluded_folders, archive_rel):
+        """Return why a file is left out of the backup, or None to include it"""
+        if rel_path == archive_rel:
+            return f"Skipping output archive itself: {rel_path}"
+        if rel_path in excluded_files:
+            return f"Skipping excluded file: {rel_path}"
+        for excl in excluded_folders:
+            if rel_path.startswith(excl + "/"):
+                return f"Skipping file in excluded folder: {rel_path} (excluded folder: {excl})"
+        return None
+
+    @staticmethod
+    def _rule_skip_reason(rules, file_path, rel_path, st=None):
+        """Apply the attribute rules; returns (reason or None, the file's stat if known)"""
+        rule, st = rules.match(file_path, rel_path.rpartition("/")[2], st)
+        if rule is None:
+            return None, st
+        return f"Skipping file matching rule {rule}: {rel_path}", st
+
+    def _walk_git(self, source_dir, git, include_git_dir, excluded_files, excluded_folders, archive_rel, counts, profiler,
+                  rules=None):
+        """Yield the same events as _walk_source for the files git tracks or would track.
+
+        With include_git_dir the repository's .git folder is added file by file afterwards. The
+        project's file and folder exclusions apply to it as well, but the attribute rules don't:
+        leaving out packs or indexes by size, age or type would store a repository git can't read.
+        """
+        listed_started = time.perf_counter()
+        rel_paths = git.list_files()
+        profiler.add('scan', time.perf_counter() - listed_started)
+        print(f"DEBUG: git lists {len(rel_paths)} tracked and untracked files")
+        current_folder = None
+        for rel_path in rel_paths:
+            folder = rel_path.rpartition("/")[0]
+            rootdir = os.path.join(source_dir, *folder.split("/")) if folder else source_dir
+            if folder != current_folder:
+                current_folder = folder
+                yield rootdir, None, None, None
+            file_path = os.path.join(source_dir, *rel_path.split("/"))
+            # Deleted tracked files and submodule checkouts are not regular files here
+            if not os.path.isfile(file_path):
+                continue
+            exclude_started = time.perf_counter()
+            skip_reason = self._skip_reason(rel_path, excluded_files, excluded_folders, archive_rel)
+            st = None
+            if not skip_reason and rules is not None:
+                skip_reason, st = self._rule_skip_reason(rules, file_path, rel_path)
+            profiler.add('exclude', time.perf_counter() - exclude_started)
+            if skip_reason:
+                print(f"DEBUG: {skip_reason}")
+                counts['files_skipped'] += 1
+                continue
+            yield rootdir, file_path, rel_path, st
+        git_dir = git.git_dir()
+        if include_git_dir and os.path.dirname(git_dir) == os.path.realpath(source_dir):
+            for rootdir, dirs, files in profiler.timed_iter(os.walk(git_dir), 'scan'):
+                rel_root = os.path.relpath(rootdir, source_dir).replace("\\", "/")
+                for d in sorted(dirs):
+                    folder_rel = f"{rel_root}/{d}"
+                    if any(folder_rel == excl or folder_rel.startswith(excl + "/") for excl in excluded_folders):
+                        print(f"DEBUG: Skipping excluded folder: {folder_rel}")
+                        counts['folders_skipped'] += 1
+                        dirs.remove(d)
+                dirs.sort()
+                yield rootdir, None, None, None
+                for file in sorted(files):
+                    file_path = os.path.join(rootdir, file)
+                    rel_path = f"{rel_root}/{file}"
+                    skip_reason = self._skip_reason(rel_path, excluded_files, excluded_folders, archive_rel)
+                    if skip_reason:
+                        print(f"DEBUG: {skip_reason}")
+                        counts['files_skipped'] += 1
+                        continue
+                    yield rootdir, file_path, rel_path, None
+
+    def _enumerate_source(self, source_dir, excluded_files, excluded_folders, archive_rel, counts, profiler, git_mode=None,
+                          rules=None):
+        """Pick the walker for a project's git mode; returns (events, GitSource or None)"""
+        if rules is not None and not rules.active:
+            rules = None
+        git = None
+        if git_mode and git_mode != "walk":
+            git = GitSource.open(source_dir)
+            if git is None:
+                print(f"DEBUG: {source_dir} is not a git working tree (or git is missing), walking it instead")
+        if git is None:
+            return self._walk_source(source_dir, excluded_files, excluded_folders, archive_rel, counts, profiler, rules), None
+        print(f"DEBUG: Enumerating files with git ({git_mode})")
+        events = self._walk_git(source_dir, git, git_mode == "raw", excluded_files, excluded_folders,
+                                archive_rel, counts, profiler, rules)
+        return events, git
+
+    def _git_bundle_basis(self, project_id):
+        """The previous bundle to build on, or None when the next bundle must be a full one"""
+        previous = self.db.get_last_git_bundle(project_id) if project_id else None
+        if previous is None:
+            return None
+        if previous['chain_depth'] >= GitSource.MAX_CHAIN:
+            print(f"DEBUG: Git bundle chain reached {previous['chain_depth']}, storing a full bundle")
+            return None
+        if not os.path.exists(previous['archive_path']):
+            print("DEBUG: Archive with the previous git bundle is missing, storing a full bundle")
+            return None
+        return previous
+
+    def _write_git_bundle(self, zipf, git, previous, backup_id, on_member=None):
+        """Store the repository history as a git bundle, incremental on top of the previous backup's bundle.
+
+        Returns the bundle metadata, which is also stored in the archive next to the bundle.
+        """
+        incremental = previous is not None
+        fd, bundle_path = tempfile.mkstemp(suffix=".bundle")
+        os.close(fd)
+        try:
+            created = git.create_bundle(bundle_path, previous['tips'] if incremental else ())
+            meta = {
+                'backup_id': backup_id,
+                'base_backup_id': previous['backup_id'] if incremental else None,
+                'base_archive': previous['archive_path'] if incremental else None,
+                'chain_depth': previous['chain_depth'] + 1 if incremental else 0,
+                'tips': git.tips(),
+                'head': git.head_ref(),
+                'head_commit': git.head_commit(),
+                'bundle': created
+            }
+            members = [(GitSource.META_MEMBER, None, json.dumps(meta, indent=1).encode('utf-8'))]
+            if created:
+                members.append((GitSource.BUNDLE_MEMBER, bundle_path, None))
+            for name, path, data in members:
+                info = zipfile.ZipInfo(name, time.localtime()[:6])
+                info.external_attr = 0o644 << 16
+                # Bundles hold packs that are already compressed
+                info.compress_type = zipfile.ZIP_STORED if path else zipf.compression
+                info._compresslevel = zipf.compresslevel
+                info.file_size = os.path.getsize(path) if path else len(data)
+                with zipf.open(info, 'w') as dst:
+                    if path:
+                        with open(path, 'rb') as src:
+                            while True:
+                                chunk = src.read(self.COPY_CHUNK)
+                                if not chunk:
+                                    break
+                                dst.write(chunk)
+                    else:
+                        dst.write(data)
+                if on_member is not None:
+                    on_member()
+        finally:
+            os.remove(bundle_path)
+        kind = "incremental" if incremental else "full"
+        print(f"DEBUG: Stored {kind} git bundle" if created else "DEBUG: No new git history since the previous bundle")
+        return meta
+
+    def _create_zip_backup(self, source_dir, dest_file, excluded_files, excluded_folders, archive_rel,
+                           checkpoint_id=None, resume_from=None, backup_id=None, project_id=None, output_stream=None,
+                           git_mode=None, exclusion_rules=None, mirrors=None):
+        import os
+        import zipfile
+        import tkinter as tk
+        # Get the root window (assuming you pass it or have a reference)
+        root = None
+        if hasattr(self, 'root'):
+            root = self.root
+        elif hasattr(self, 'app') and hasattr(self.app, 'root'):
+            root = self.app.root
+        else:
+            # fallback: try to get root from any widget
+            try:
+                root = tk._default_root
+            except Exception:
+                pass
+        # Show progress popup
+        popup, label = self._show_progress_popup(root, "Starting backup...")
+        # Project folders on other machines are read by a BackupAgent running there
+        remote = RemoteAgentClient.from_url(source_dir)
+        if remote is None and not os.path.exists(source_dir):
+            popup.destroy()
+            print("DEBUG: Source directory not found:", source_dir)
+            return False, f"Source directory not found: {source_dir}"
+        if remote is not None and self.archive_format_for(dest_file) != "zip":
+            popup.destroy()
+            return False, "Backups from a remote agent are written as .zip archives"
+        files_added = 0
+        # source_bytes counts the files that go into the archive, after exclusions and rules
+        skip_counts = {'files_skipped': 0, 'folders_skipped': 0, 'source_bytes': 0}
+        cancelled = False
+        git_bundle = None
+        if git_mode and git_mode not in GitSource.MODES:
+            print(f"DEBUG: Unknown git mode {git_mode!r}, walking the folder")
+            git_mode = None
+        # Bundling resumes as a whole: skip it if the interrupted run already stored it
+        bundle_basis = None
+        if git_mode == "worktree+bundle":
+            bundle_basis = self._git_bundle_basis(project_id)
+        rules = ExclusionRules(exclusion_rules)
+        for line in rules.describe():
+            print(f"DEBUG: Exclusion rule {line}")
+        handler_stats = {}
+        governor = ResourceGovernor(**self.resource_limits)
+        governor.apply_process_priority()
+        profiler = BackupProfiler(**self.profile_options)
+        handlers = self.member_handlers
+        delta = None
+        if self.delta_options.get('enabled') and output_stream is not None:
+            # Signatures of a streamed archive could never serve as a delta base
+            print("DEBUG: Delta encoding skipped for a streamed archive")
+        elif self.delta_options.get('enabled') and backup_id and project_id and remote is None:
+            delta = DeltaEncoder(self.db, project_id, backup_id, self.delta_options)
+            if resume_from is not None:
+                delta.resume(resume_from.get('signatures', []))
+            # Deltas take precedence over sparse copies; snapshots of live databases still come first
+            handlers = self.member_handlers.copy()
+            handlers.register("*", delta.handle, name="delta", before="sparse")
+
+        def get_folder_size(path):
+            return ParallelTreeWalker(self.scan_workers).total_size(path)
+
+        print("\n========== DEBUG: STARTING BACKUP ==========")
+        print("DEBUG: Walking source folder:", source_dir)
+        print("DEBUG: Archive REL path:", archive_rel)
+        archive_format = self.archive_format_for(dest_file)
+        print("DEBUG: Archive format:", archive_format)
+        fanout = None
+        copies = None
+        pacer = None
+        if self.pace_options.get('deadline') is not None or self.pace_options.get('target_rate') is not None:
+            if archive_format != "zip" or remote is not None:
+                print("DEBUG: Adaptive compression only applies to local ZIP backups, using fixed levels")
+            else:
+                pacer = CompressionPacer(
+                    deadline=self.pace_options.get('deadline'),
+                    target_rate=self.pace_options.get('target_rate'),
+                    total_bytes=self._expected_source_bytes(source_dir, project_id, excluded_folders),
+                    done_bytes=self._written_source_bytes(source_dir, resume_from)
+                )
+                print(f"DEBUG: Adaptive compression for about {pacer.total_bytes/1024/1024:.2f} MB of source data")
+        if resume_from is not None:
+            zipf, resume_fp = self._reopen_zip_at_checkpoint(resume_from)
+            already_written = {member['name'] for member in resume_from['members']}
+            print(f"DEBUG: Resuming after {len(already_written)} members at offset {resume_from['zip_offset']}")
+        elif archive_format == "tar.zst":
+            dictionary = None
+            if self.archive_options.get('zstd_dictionary'):
+                dictionary = TarZstdWriter.train_dictionary(self._sample_dictionary_files(source_dir, excluded_folders))
+                print(f"DEBUG: Trained zstd dictionary: {len(dictionary) if dictionary else 0} bytes")
+            zipf = TarZstdWriter(
+                dest_file,
+                level=self.archive_options.get('zstd_level', 12),
+                threads=governor.workers,
+                dictionary=dictionary,
+                frame_size=self.archive_options.get('zstd_frame_size')
+            )
+            resume_fp = None
+            already_written = set()
+        else:
+            if mirrors:
+                # Compress once, write every destination in parallel
+                fanout = FanOutFile([dest_file] + list(mirrors))
+            # ZipFile switches to data descriptors by itself when the stream can't seek
+            zipf = self._open_zip_writer(fanout or output_stream or dest_file)
+            resume_fp = None
+            already_written = set()
+            if not zipf._seekable:
+                print("DEBUG: Streaming to a non-seekable output using data descriptors")
+        # Charge archive writes to the profiler's write phase
+        zipf.fp = TimedFile(zipf.fp, profiler)
+        archive_fp = zipf.fp
+        if checkpoint_id:
+            self.db.set_checkpoint_status(checkpoint_id, 'running')
+        pending_members = []
+        last_checkpoint = time.monotonic()
+
+        def save_checkpoint():
+            """Flush the archive to disk, then record the members it now holds"""
+            nonlocal last_checkpoint
+            checkpoint_started = time.perf_counter()
+            zipf.fp.flush()
+            os.fsync(zipf.fp.fileno())
+            self.db.save_checkpoint(checkpoint_id, zipf.fp.tell(), pending_members,
+                                    delta.uncheckpointed() if delta is not None else ())
+            pending_members.clear()
+            last_checkpoint = time.monotonic()
+            profiler.add('checkpoint', time.perf_counter() - checkpoint_started)
+
+        def show_folder(folder_display):
+            """Update the progress label for the current folder; returns True once the user cancelled"""
+            label.config(text=f"Backing up: {folder_display}")
+            popup.update_idletasks()
+            popup.update()
+            return getattr(popup, 'cancelled', False)
+
+        def member_written():
+            """Count the member just written and checkpoint when due"""
+            nonlocal files_added
+            files_added += 1
+            if checkpoint_id:
+                info = zipf.filelist[-1]
+                pending_members.append((info.filename, info.header_offset, info.external_attr))
+                if (len(pending_members) >= self.CHECKPOINT_EVERY_MEMBERS
+                        or time.monotonic() - last_checkpoint >= self.CHECKPOINT_EVERY_SECONDS):
+                    save_checkpoint()
+
+        profiler.start()
+        try:
+            with zipf:
+                if remote is not None:
+                    request = {
+                        'excluded_files': sorted(excluded_files),
+                        'excluded_folders': sorted(excluded_folders),
+                        'compresslevel': zipf.compresslevel,
+                        'skip': sorted(already_written),
+                        'resource_limits': self.resource_limits,
+                        'git_mode': git_mode,
+                        'exclusion_rules': exclusion_rules,
+                        'bundle': git_mode == "worktree+bundle" and GitSource.META_MEMBER not in already_written,
+                        'bundle_basis': bundle_basis,
+                        'backup_id': backup_id
+                    }
+                    with contextlib.closing(remote.stream_into(zipf, request, skip_counts)) as events:
+                        for folder_display, info in events:
+                            if info is None:
+                                if show_folder(folder_display):
+                                    print("DEBUG: Backup cancelled" + (", progress saved to checkpoint" if checkpoint_id else ""))
+                                    cancelled = True
+                                    break
+                                continue
+                            print(f"DEBUG: Received file: {info.filename}")
+                            member_written()
+                    files_added += skip_counts.get('already_written', 0)
+                    git_bundle = skip_counts.get('git_bundle')
+                else:
+                    walk, git = self._enumerate_source(source_dir, excluded_files, excluded_folders, archive_rel,
+                                                       skip_counts, profiler, git_mode, rules)
+                    for rootdir, file_path, rel_path, st in walk:
+                        if file_path is None:
+                            if show_folder(os.path.relpath(rootdir, source_dir)):
+                                print("DEBUG: Backup cancelled" + (", progress saved to checkpoint" if checkpoint_id else ""))
+                                cancelled = True
+                                break
+                            continue
+                        if st is None:
+                            st = os.stat(file_path)
+                        skip_counts['source_bytes'] += st.st_size
+                        if rel_path in already_written or DeltaEncoder.MEMBER_PREFIX + rel_path in already_written:
+                            files_added += 1
+                            continue
+                        print(f"DEBUG: Adding file: {rel_path}")
+                        if pacer is not None:
+                            pacer.apply(zipf, st.st_size)
+                        member_started = time.perf_counter()
+                        result = self._write_member(zipf, file_path, rel_path, handler_stats, governor, handlers, st)
+                        profiler.add('member', time.perf_counter() - member_started)
+                        if pacer is not None:
+                            # Only the default path deflates at the chosen level; handler time says nothing about it.
+                            # Skipped members are left out, as they are of source_bytes, which budgets later runs
+                            if result == MemberHandlerRegistry.COPIED:
+                                pacer.record(st.st_size, time.perf_counter() - member_started)
+                            elif result != MemberHandlerRegistry.SKIPPED:
+                                pacer.credit(st.st_size)
+                        if result == MemberHandlerRegistry.SKIPPED:
+                            skip_counts['files_skipped'] += 1
+                            skip_counts['source_bytes'] -= st.st_size
+                            continue
+                        member_written()
+                    if (git is not None and git_mode == "worktree+bundle" and not cancelled
+                            and GitSource.META_MEMBER not in already_written):
+                        git_bundle = self._write_git_bundle(zipf, git, bundle_basis, backup_id, on_member=member_written)
+                if checkpoint_id:
+                    # Final checkpoint before the central directory is written
+                    save_checkpoint()
+        except BaseException:
+            if checkpoint_id:
+                self.db.set_checkpoint_status(checkpoint_id, 'interrupted')
+            if backup_id:
+                self.db.finish_backup_record(backup_id, 'interrupted' if checkpoint_id else 'failed')
+            raise
+        finally:
+            profiler.stop()
+            if resume_fp is not None:
+                resume_fp.close()
+            if fanout is not None:
+                copies = fanout.close()
+                if backup_id:
+                    self.db.save_backup_copies(backup_id, copies)
+        popup.destroy()  # Close the progress window
+        if cancelled:
+            if checkpoint_id:
+                self.db.set_checkpoint_status(checkpoint_id, 'interrupted')
+            if backup_id:
+                # Without a checkpoint the run can't be resumed, as on the exception path above
+                self.db.finish_backup_record(backup_id, 'interrupted' if checkpoint_id else 'failed', files_added)
+            if not checkpoint_id:
+                return False, f"Backup cancelled after {files_added} files."
+            return False, (f"Backup cancelled after {files_added} files. "
+                           f"Resume it later with checkpoint ID {checkpoint_id}.")
+        if checkpoint_id:
+            self.db.set_checkpoint_status(checkpoint_id, 'complete')
+        files_skipped = skip_counts['files_skipped']
+        print("\n========== DEBUG: BACKUP SUMMARY ==========")
+        print(f"DEBUG: Files added: {files_added}")
+        print(f"DEBUG: Files skipped: {files_skipped}")
+        print(f"DEBUG: Folders skipped: {skip_counts['folders_skipped']}")
+        # Reading and compression happened on the agent, which reports its own figures
+        handler_stats = skip_counts.get('handler_stats', handler_stats)
+        rule_stats = skip_counts.get('rule_stats', rules.stats)
+        for line in ExclusionRules.format_stats(rule_stats):
+            print(f"DEBUG: Excluded by rule {line}")
+        if handler_stats:
+            print(f"DEBUG: SQLite snapshots: {handler_stats.get('sqlite_snapshots', 0)}")
+            print(f"DEBUG: Sparse files: {handler_stats.get('sparse_files', 0)} "
+                  f"({handler_stats.get('sparse_hole_bytes', 0)/1024:.2f} KB of holes not read)")
+        pace_note = ""
+        if pacer is not None:
+            pacer.finish()
+            for line in pacer.summary_lines():
+                print(f"DEBUG: {line}")
+                pace_note += line + "\n"
+        delta_saved = 0
+        if delta is not None:
+            for rel_path, file_size, stored in delta.savings:
+                delta_saved += file_size - stored
+                print(f"DEBUG: Delta {rel_path}: stored {stored/1024:.2f} KB of {file_size/1024:.2f} KB "
+                      f"(saved {(file_size - stored)/1024:.2f} KB, {100.0 * (file_size - stored) / file_size:.1f}%)")
+            print(f"DEBUG: Delta members: {len(delta.savings)}, saved {delta_saved/1024:.2f} KB in total")
+        throughput = skip_counts.get('throughput') or governor.summary()
+        print(f"DEBUG: Read {throughput['bytes_read']/1024:.2f} KB in {throughput['elapsed_seconds']:.2f} s "
+              f"({throughput['throughput']/1024/1024:.2f} MB/s, throttled {throughput['throttled_seconds']:.2f} s, "
+              f"{throughput['backoffs']} back-offs)")
+        phases = profiler.phase_summary(governor)
+        print("DEBUG: Phase times: " + ", ".join(f"{name} {seconds:.3f} s" for name, seconds in phases.items()))
+        # A stream's size is the number of bytes written to it
+        archive_size = archive_fp.tell() if output_stream is not None or fanout is not None else os.path.getsize(dest_file)
+        if output_stream is not None:
+            output_stream.flush()
+        if profiler.enabled:
+            report_files = profiler.write_report(
+                profiler.report_prefix or (dest_file if output_stream is None else "stream-backup"),
+                governor,
+                extra={
+                    'archive': dest_file,
+                    'archive_bytes': archive_size,
+                    'files_added': files_added,
+                    'files_skipped': files_skipped,
+                    'bytes_read': throughput['bytes_read']
+                }
+            )
+            for path in report_files:
+                print(f"DEBUG: Profile written to {path}")
+        # The catalog keeps what was archived, which is what the pacer budgets for next time
+        source_size = skip_counts['source_bytes']
+        print(f"DEBUG: Archive size: {archive_size/1024:.2f} KB")
+        if remote is None:
+            print(f"DEBUG: Source folder size: {get_folder_size(source_dir)/1024:.2f} KB")
+        print(f"DEBUG: Source data archived: {source_size/1024:.2f} KB")
+        copies_note = ""
+        if copies:
+            for copy in copies:
+                print(f"DEBUG: Destination {copy['path']}: " + ("complete" if copy['ok'] else f"failed ({copy['error']})"))
+            written = [copy['path'] for copy in copies if copy['ok']]
+            if not written:
+                if backup_id:
+                    self.db.finish_backup_record(backup_id, 'failed', files_added)
+                return False, "Backup failed: every destination failed, see console for details"
+            copies_note = f"Written to {len(written)} of {len(copies)} destinations\n"
+            if not copies[0]['ok']:
+                # The catalog entry follows a copy that made it
+                dest_file = written[0]
+                copies_note += f"Main destination failed, catalog now points at {dest_file}\n"
+                if backup_id:
+                    self.db.set_backup_archive_path(backup_id, dest_file)
+        if backup_id:
+            self.db.finish_backup_record(backup_id, 'complete', files_added, archive_size, source_size)
+            if delta is not None:
+                delta.commit()
+            if git_bundle is not None:
+                self.db.save_git_bundle(backup_id, project_id, git_bundle)
+                if git_bundle['base_backup_id']:
+                    self.db.add_backup_dependency(backup_id, git_bundle['base_backup_id'])
+        delta_note = (f"Delta encoding saved {delta_saved/1024/1024:.2f} MB across {len(delta.savings)} files\n"
+                      if delta is not None and delta.savings else "")
+        rules_note = "".join(f"Excluded by rule {line}\n" for line in ExclusionRules.format_stats(rule_stats))
+        return True, (f"Backup completed successfully. {files_added} files added to {dest_file}\n"
+                      f"Throughput: {throughput['throughput']/1024/1024:.2f} MB/s over {throughput['elapsed_seconds']:.1f} s\n"
+                      f"{pace_note}{delta_note}{rules_note}{copies_note}\n"
+                      "See console for debug info.")
+
+class _DiscardSink:
+    """Unseekable stream that drops everything, the consumer of perf-check's zip-stream mode"""
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+class PerfRegressionSuite:
+    """Runs a fixed synthetic tree through each backup engine and compares the results with a reference.
+
+    Every trial has two child processes: one builds the tree (and, for zip-delta, takes the base
+    backup), a fresh one times the backup itself, so peak RSS belongs to that backup alone. Timings
+    are never compared as absolute numbers. Each mode trial is paired with a trial of a reference
+    measured in the same job, alternating so both see the same machine load: either a calibration
+    workload that compresses the same tree with zlib alone (its ratio to each mode is what the
+    baseline file records), or the same mode run by the script of another commit. Metrics are
+    medians over several trials; a mode that looks slower is measured again before it counts, and
+    the time and memory limits widen with the spread of the samples.
+    """
+    FORMAT = "project-backup-utility/perf-baseline"
+    VERSION = 2
+    METRICS = ('wall_seconds', 'cpu_seconds', 'peak_rss_bytes', 'output_bytes')
+    # Metrics scaled by the calibration run before comparing with a recorded baseline
+    TIMINGS = ('wall_seconds', 'cpu_seconds')
+    # Allowed growth over the reference median, as a fraction
+    TOLERANCES = {'wall_seconds': 0.25, 'cpu_seconds': 0.25, 'peak_rss_bytes': 0.20, 'output_bytes': 0.02}
+    # Limits for timings and memory also grow by this many times the relative median absolute deviation
+    NOISE_FACTOR = 3.0
+    # Changing the tree invalidates recorded baselines
+    TREE = {
+        'seed': 1729,
+        'folders': 40,
+        'files_per_folder': 50,
+        'small_min': 256,
+        'small_max': 16 * 1024,
+        'large_files': 2,
+        'large_size': 12 * 1024 * 1024
+    }
+    MODES = ('zip', 'zip-delta', 'zip-stream', 'zip-fanout', 'zip-paced', 'tar.zst')
+    # Pseudo-mode timed alongside the others; it uses nothing but the standard library
+    CALIBRATION = "calibration"
+    # Extra destinations of zip-fanout
+    FANOUT_MIRRORS = 2
+    # Low enough that the pacer of zip-paced settles on the same levels on any machine
+    PACED_RATE = 1024 * 1024
+    DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf-baseline.json")
+    RESULT_PREFIX = "PERF-RESULT "
+
+    @classmethod
+    def available_modes(cls):
+        return [mode for mode in cls.MODES if mode != "tar.zst" or zstandard is not None]
+
+    @classmethod
+    def build_tree(cls, root):
+        """Write the fixed tree: many small text-like files and a few large, partly compressible ones"""
+        spec = cls.TREE
+        rng = random.Random(spec['seed'])
+        words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9))) for _ in range(2000)]
+        for folder in range(spec['folders']):
+            folder_path = os.path.join(root, f"pkg{folder // 10:02d}", f"mod{folder:03d}")
+            os.makedirs(folder_path, exist_ok=True)
+            for index in range(spec['files_per_folder']):
+                size = rng.randint(spec['small_min'], spec['small_max'])
+                text = " ".join(rng.choices(words, k=size // 5 + 1)).encode('ascii')[:size]
+                with open(os.path.join(folder_path, f"file{index:03d}.txt"), 'wb') as f:
+                    f.write(text)
+        os.makedirs(os.path.join(root, "assets"), exist_ok=True)
+        for index in range(spec['large_files']):
+            with open(os.path.join(root, "assets", f"blob{index}.bin"), 'wb') as f:
+                for offset in range(0, spec['large_size'], 1024 * 1024):
+                    size = min(1024 * 1024, spec['large_size'] - offset)
+                    # Alternate incompressible and repetitive megabytes
+                    if offset // (1024 * 1024) % 2:
+                        f.write(rng.randbytes(size))
+                    else:
+                        word = rng.choice(words).encode('ascii') + b" "
+                        f.write((word * (size // len(word) + 1))[:size])
+
+    @classmethod
+    def mutate_tree(cls, root):
+        """Change the tree the way a day of work would, for the incremental mode"""
+        rng = random.Random(cls.TREE['seed'] + 1)
+        for index in range(cls.TREE['large_files']):
+            with open(os.path.join(root, "assets", f"blob{index}.bin"), 'r+b') as f:
+                f.seek(cls.TREE['large_size'] // 3)
+                f.write(rng.randbytes(64 * 1024))
+                f.seek(0, os.SEEK_END)
+                f.write(rng.randbytes(256 * 1024))
+        for folder in range(0, cls.TREE['folders'], 4):
+            with open(os.path.join(root, f"pkg{folder // 10:02d}", f"mod{folder:03d}", "file000.txt"), 'ab') as f:
+                f.write(b" edited")
+
+    @classmethod
+    def _manager(cls, db, mode):
+        """A BackupManager set up the way mode backs up"""
+        manager = BackupManager(db)
+        if mode == "zip-delta":
+            manager.delta_options = {'enabled': True, 'min_size': 1024 * 1024,
+                                     'max_chain': DeltaEncoder.DEFAULT_OPTIONS['max_chain']}
+        elif mode == "zip-paced":
+            manager.pace_options = {'target_rate': cls.PACED_RATE}
+        return manager
+
+    @classmethod
+    def prepare_trial(cls, mode, workdir):
+        """Build the tree, catalog and (for zip-delta) base backup that a timed trial starts from"""
+        source = os.path.join(workdir, "src")
+        os.makedirs(os.path.join(workdir, "out"))
+        cls.build_tree(source)
+        if mode == cls.CALIBRATION:
+            return
+        db = Database(os.path.join(workdir, "perf.db"))
+        try:
+            project_id = db.add_project("perf", source)
+            if mode == "zip-delta":
+                ok, message = cls._manager(db, mode).create_backup(project_id, os.path.join(workdir, "out", "full.zip"))
+                if not ok:
+                    raise RuntimeError(f"Base backup failed: {message}")
+                cls.mutate_tree(source)
+        finally:
+            db.close()
+        with open(os.path.join(workdir, "perf-project.json"), 'w', encoding='utf-8') as f:
+            json.dump({'project_id': project_id}, f)
+
+    @classmethod
+    def _calibrate(cls, source, dest):
+        """The calibration workload: read the tree and deflate it into one file; returns bytes written"""
+        written = 0
+        with open(dest, 'wb') as out:
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    compressor = zlib.compressobj(6)
+                    with open(os.path.join(root, name), 'rb') as f:
+                        while chunk := f.read(1024 * 1024):
+                            written += out.write(compressor.compress(chunk))
+                    written += out.write(compressor.flush())
+        return written
+
+    @classmethod
+    def run_trial(cls, mode, workdir):
+        """Time the backup of a prepared trial in this process; returns its metrics"""
+        source = os.path.join(workdir, "src")
+        out_dir = os.path.join(workdir, "out")
+        dest = os.path.join(out_dir, "timed.tar.zst" if mode == "tar.zst" else "timed.zip")
+        if mode == cls.CALIBRATION:
+            started_wall = time.perf_counter()
+            started_cpu = time.process_time()
+            output_bytes = cls._calibrate(source, dest)
+            wall = time.perf_counter() - started_wall
+            cpu = time.process_time() - started_cpu
+        else:
+            with open(os.path.join(workdir, "perf-project.json"), 'r', encoding='utf-8') as f:
+                project_id = json.load(f)['project_id']
+            db = Database(os.path.join(workdir, "perf.db"))
+            try:
+                manager = cls._manager(db, mode)
+                started_wall = time.perf_counter()
+                started_cpu = time.process_time()
+                if mode == "zip-stream":
+                    ok, message = manager.create_backup(project_id, "-", output_stream=_DiscardSink(), mirrors=[])
+                else:
+                    mirrors = ([os.path.join(out_dir, f"mirror{index}.zip") for index in range(cls.FANOUT_MIRRORS)]
+                               if mode == "zip-fanout" else [])
+                    ok, message = manager.create_backup(project_id, dest, mirrors=mirrors)
+                wall = time.perf_counter() - started_wall
+                cpu = time.process_time() - started_cpu
+                # A streamed archive is gone; the catalog keeps its size
+                output_bytes = db.get_backups(project_id)[-1]['archive_bytes'] if mode == "zip-stream" else None
+            finally:
+                db.close()
+            if not ok:
+                raise RuntimeError(f"Backup failed: {message}")
+        if output_bytes is None:
+            output_bytes = os.path.getsize(dest)
+            if os.path.exists(dest + TarZstdWriter.INDEX_SUFFIX):
+                output_bytes += os.path.getsize(dest + TarZstdWriter.INDEX_SUFFIX)
+        peak_rss = None
+        if resource:
+            # ru_maxrss is in KB on Linux and bytes on macOS
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        return {'wall_seconds': wall, 'cpu_seconds': cpu, 'peak_rss_bytes': peak_rss, 'output_bytes': output_bytes}
+
+    @classmethod
+    def measure(cls, mode, script=None):
+        """Prepare and time one trial, each in its own child process of script (default: this one)"""
+        script = script or os.path.abspath(__file__)
+        with tempfile.TemporaryDirectory(prefix="pbu-perf-") as workdir:
+            for step in (["--prepare"], []):
+                result = subprocess.run(
+                    [sys.executable, script, "perf-run", mode, workdir] + step,
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+                )
+                if result.returncode:
+                    break
+        for line in reversed(result.stdout.splitlines()):
+            if line.startswith(cls.RESULT_PREFIX):
+                return json.loads(line[len(cls.RESULT_PREFIX):])
+        raise RuntimeError(f"Trial of {mode} failed: {(result.stderr or result.stdout).strip()[-2000:]}")
+
+    @classmethod
+    def summarize(cls, samples):
+        """Median and relative median absolute deviation of each metric"""
+        summary = {'samples': len(samples)}
+        for metric in cls.METRICS:
+            values = [sample[metric] for sample in samples if sample.get(metric) is not None]
+            if not values:
+                summary[metric] = None
+                continue
+            median = statistics.median(values)
+            summary[metric] = median
+            summary[metric + '_spread'] = statistics.median(abs(v - median) for v in values) / median if median else 0.0
+        return summary
+
+    @classmethod
+    def compare(cls, reference, current, tolerances):
+        """[(metric, expected, current, limit, ok)] for the metrics both summaries have.
+
+        When both carry the calibration run they were measured with, reference timings are scaled
+        by how much faster or slower the calibration ran this time.
+        """
+        rows = []
+        for metric in cls.METRICS:
+            if reference.get(metric) is None or current.get(metric) is None:
+                continue
+            expected = reference[metric]
+            allowance = tolerances[metric]
+            spreads = [reference.get(metric + '_spread', 0.0), current.get(metric + '_spread', 0.0)]
+            if metric in cls.TIMINGS and 'calibration' in reference and 'calibration' in current:
+                expected *= current['calibration'][metric] / reference['calibration'][metric]
+                spreads += [reference['calibration'].get(metric + '_spread', 0.0),
+                            current['calibration'].get(metric + '_spread', 0.0)]
+            if metric != 'output_bytes':
+                allowance += cls.NOISE_FACTOR * max(spreads)
+            limit = expected * (1 + allowance)
+            rows.append((metric, expected, current[metric], limit, current[metric] <= limit))
+        return rows
+
+    @classmethod
+    def load_baseline(cls, path):
+        """Read a baseline file; None when there is none yet"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            return None
+        if baseline.get('format') != cls.FORMAT or baseline.get('version') != cls.VERSION:
+            raise ValueError(f"{path} is not a version {cls.VERSION} performance baseline; run with --record to replace it")
+        return baseline
+
+    @classmethod
+    def save_baseline(cls, path, baseline, results):
+        """Merge fresh summaries into the baseline file, keeping modes that weren't run"""
+        if baseline is None or baseline.get('tree') != cls.TREE:
+            baseline = {'format': cls.FORMAT, 'version': cls.VERSION, 'tree': cls.TREE, 'modes': {}}
+        baseline['recorded'] = datetime.datetime.now().isoformat(timespec='seconds')
+        baseline['machine'] = {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()}
+        baseline['modes'].update(results)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    @classmethod
+    def reference_script(cls, revision):
+        """Write this script as of a git revision to a temporary file; the caller removes it"""
+        here = os.path.dirname(os.path.abspath(__file__))
+        result = subprocess.run(
+            ["git", "-C", here, "show", f"{revision}:./{os.path.basename(__file__)}"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        if result.returncode:
+            raise RuntimeError(f"Can't read the script at {revision}: {result.stderr.decode(errors='replace').strip()}")
+        fd, path = tempfile.mkstemp(prefix="pbu-perf-reference-", suffix=".py")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(result.stdout)
+        return path
+
+    @classmethod
+    def check(cls, baseline, modes, repeat=5, tolerances=None, progress=print, reference=None):
+        """Measure each mode against a reference run in the same job; returns {mode: (summary, rows)}.
+
+        The reference is the calibration workload, with rows comparing against the baseline, or the
+        same mode run by the script at path reference. rows is None for modes with nothing to
+        compare with. A mode with a failing metric gets a second round of trials, and the verdict
+        uses the median of both rounds.
+        """
+        tolerances = dict(cls.TOLERANCES, **(tolerances or {}))
+        recorded = (baseline or {}).get('modes', {}) if (baseline or {}).get('tree') == cls.TREE else {}
+        results = {}
+        for mode in modes:
+            samples, references = [], []
+            for attempt in range(2):
+                for trial in range(repeat):
+                    samples.append(cls.measure(mode))
+                    progress(f"{mode} trial {len(samples)}: {samples[-1]['wall_seconds']:.2f}s wall, "
+                             f"{samples[-1]['cpu_seconds']:.2f}s CPU")
+                    if references is None:
+                        continue
+                    try:
+                        references.append(cls.measure(mode, reference) if reference else cls.measure(cls.CALIBRATION))
+                    except RuntimeError as e:
+                        if not reference:
+                            raise
+                        progress(f"{mode} can't run at the reference revision: {str(e).splitlines()[-1]}")
+                        references = None
+                summary = cls.summarize(samples)
+                rows = None
+                if reference:
+                    if references:
+                        rows = cls.compare(cls.summarize(references), summary, tolerances)
+                else:
+                    summary['calibration'] = cls.summarize(references)
+                    if mode in recorded:
+                        rows = cls.compare(recorded[mode], summary, tolerances)
+                if rows is None or all(row[4] for row in rows) or attempt:
+                    break
+                progress(f"{mode} looks slower than the reference, measuring again")
+            results[mode] = (summary, rows)
+        return results
+
+class ExclusionRules:
+    """Attribute-based exclusion rules: extension, size, age and content type
+
+    Rules run in a fixed order, cheapest first: the extension needs only the name, size and age use
+    the file's stat (taken once and handed on to the writer), and type detection reads the first
+    bytes of the file. Files and bytes excluded are tallied per rule for the backup summary.
+    """
+    ORDER = ("extension", "max_size", "older_than", "newer_than", "type")
+    # Bytes read for type detection; NUL bytes in this prefix mark a file as binary, as git does
+    SNIFF_BYTES = 8000
+    # Signatures at offset 0, checked in this order; 'core' and 'binary' are detected separately
+    MAGIC = {
+        'elf': (b"\x7fELF",),
+        'pe': (b"MZ",),
+        'mach-o': (b"\xfe\xed\xfa\xce", b"\xfe\xed\xfa\xcf", b"\xce\xfa\xed\xfe", b"\xcf\xfa\xed\xfe"),
+        'archive': (b"PK\x03\x04", b"\x1f\x8b", b"\xfd7zXZ\x00", b"7z\xbc\xaf\x27\x1c", b"\x28\xb5\x2f\xfd",
+                    b"BZh", b"Rar!\x1a\x07", b"!<arch>\n"),
+        'sqlite': (SQLITE_MAGIC,),
+        'wasm': (b"\x00asm",)
+    }
+    TYPES = ("core",) + tuple(MAGIC) + ("binary",)
+    ELF_CORE = 4
+
+    def __init__(self, config=None):
+        """Build rules from a project's 'exclusion_rules' option"""
+        config = config or {}
+        self.config = config
+        self.extensions = {self._normalize_extension(e) for e in config.get('extensions') or ()}
+        self.max_size = config.get('max_size')
+        self.older_than_days = config.get('older_than_days')
+        self.newer_than_days = config.get('newer_than_days')
+        self.types = [t for t in self.TYPES if t in set(config.get('types') or ())]
+        unknown = set(config.get('types') or ()) - set(self.TYPES)
+        if unknown:
+            raise ValueError(f"Unknown file types: {', '.join(sorted(unknown))} (known: {', '.join(self.TYPES)})")
+        now = time.time()
+        self._older_cutoff = now - self.older_than_days * 86400 if self.older_than_days is not None else None
+        self._newer_cutoff = now - self.newer_than_days * 86400 if self.newer_than_days is not None else None
+        # rule -> [files, bytes]
+        self.stats = {}
+
+    @staticmethod
+    def _normalize_extension(extension):
+        extension = extension.strip().lower()
+        return extension if extension.startswith(".") else "." + extension
+
+    @property
+    def active(self):
+        return bool(self.extensions or self.max_size is not None or self._older_cutoff is not None
+                    or self._newer_cutoff is not None or self.types)
+
+    def _has_extension(self, name):
+        # Every suffix starting at a dot, so multi-part extensions such as .tar.gz match too
+        name = name.lower()
+        index = name.find(".", 1)
+        while index != -1:
+            if name[index:] in self.extensions:
+                return True
+            index = name.find(".", index + 1)
+        return False
+
+    def _detect_type(self, file_path):
+        """The first configured type the file's leading bytes match, or None"""
+        try:
+            with open(file_path, 'rb') as f:
+                head = f.read(self.SNIFF_BYTES)
+        except OSError:
+            return None
+        for file_type in self.types:
+            if file_type == "core":
+                if head.startswith(b"MDMP"):
+                    return file_type
+                if head.startswith(b"\x7fELF") and len(head) >= 18:
+                    byte_order = "<" if head[5] == 1 else ">"
+                    if struct.unpack(byte_order + "H", head[16:18])[0] == self.ELF_CORE:
+                        return file_type
+            elif file_type == "binary":
+                if b"\x00" in head:
+                    return file_type
+            elif head.startswith(self.MAGIC[file_type]):
+                return file_type
+        return None
+
+    def match(self, file_path, name, st=None):
+        """Return (rule, st): the first rule that excludes the file (or None) and its stat, if one was taken"""
+        rule = None
+        if self.extensions and self._has_extension(name):
+            rule = "extension"
+        if rule is None and (self.max_size is not None or self._older_cutoff is not None or self._newer_cutoff is not None):
+            if st is None:
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    return None, None
+            if self.max_size is not None and st.st_size > self.max_size:
+                rule = "max_size"
+            elif self._older_cutoff is not None and st.st_mtime < self._older_cutoff:
+                rule = "older_than"
+            elif self._newer_cutoff is not None and st.st_mtime > self._newer_cutoff:
+                rule = "newer_than"
+        if rule is None and self.types:
+            file_type = self._detect_type(file_path)
+            if file_type is not None:
+                rule = f"type:{file_type}"
+        if rule is not None:
+            if st is None:
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    st = None
+            tally = self.stats.setdefault(rule, [0, 0])
+            tally[0] += 1
+            tally[1] += st.st_size if st is not None else 0
+        return rule, st
+
+    def describe(self):
+        """One line per configured rule, in evaluation order"""
+        lines = []
+        if self.extensions:
+            lines.append(f"extension: {' '.join(sorted(self.extensions))}")
+        if self.max_size is not None:
+            lines.append(f"max_size: {ExclusionAnalyzer.format_size(self.max_size)}")
+        if self.older_than_days is not None:
+            lines.append(f"older_than: {self.older_than_days:g} days")
+        if self.newer_than_days is not None:
+            lines.append(f"newer_than: {self.newer_than_days:g} days")
+        if self.types:
+            lines.append(f"type: {' '.join(self.types)}")
+        return lines
+
+    @staticmethod
+    def format_stats(stats):
+        """Summary lines for per-rule tallies, in evaluation order"""
+        def order(rule):
+            base, _, file_type = rule.partition(":")
+            return (ExclusionRules.ORDER.index(base) if base in ExclusionRules.ORDER else len(ExclusionRules.ORDER),
+                    ExclusionRules.TYPES.index(file_type) if file_type in ExclusionRules.TYPES else -1)
+        return [f"{rule}: {files} files, {ExclusionAnalyzer.format_size(size)}"
+                for rule, (files, size) in sorted(stats.items(), key=lambda item: order(item[0]))]
+
+class ExclusionAnalyzer:
+    """Scans a project once and estimates what each exclusion rule saves, without writing an archive"""
+    # Files sampled (weighted by size) to estimate the deflate ratio and speed
+    SAMPLE_FILES = 48
+    SAMPLE_BYTES = 256 * 1024
+    # Local file header plus central directory entry, excluding the name stored in each
+    ZIP_MEMBER_OVERHEAD = 30 + 46
+    ZIP_END_RECORD = 22
+
+    def __init__(self):
+        """Initialize an empty scan cache"""
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def scan(self, project_path, refresh=False):
+        """Return the cached scan of a project, walking it only when needed; agent:// folders are walked by the agent"""
+        remote = RemoteAgentClient.from_url(project_path)
+        key = project_path if remote is not None else os.path.abspath(project_path)
+        with self._lock:
+            if not refresh and key in self._cache:
+                return self._cache[key]
+        if remote is not None:
+            result = remote.scan()
+            result['remote'] = True
+        else:
+            result = self._scan(key)
+        with self._lock:
+            self._cache[key] = result
+        return result
+
+    def invalidate(self, project_path):
+        """Drop a cached scan so the next call rescans"""
+        key = project_path if RemoteAgentClient.from_url(project_path) is not None else os.path.abspath(project_path)
+        with self._lock:
+            self._cache.pop(key, None)
+
+    @staticmethod
+    def list_scanned(scan, rel_dir):
+        """(name, is_dir, size) for the entries of one folder, taken from a scan instead of the file system"""
+        children = scan.get('children')
+        if children is None:
+            # Built once per scan, so expanding a folder doesn't go over the whole tree again
+            children = collections.defaultdict(list)
+            for path in scan['dir_totals']:
+                if path:
+                    parent, _, name = path.rpartition("/")
+                    children[parent].append((name, True, None))
+            for path, size in scan['files'].items():
+                parent, _, name = path.rpartition("/")
+                children[parent].append((name, False, size))
+            children = scan.setdefault('children', dict(children))
+        return list(children.get(rel_dir, ()))
+
+    def _scan(self, project_path):
+        """Walk the whole tree once, recording file sizes, mtimes and per-directory subtree totals"""
+        started = time.perf_counter()
+        files = {}
+        mtimes = {}
+        # rel_dir -> [bytes, files, name_bytes] for the whole subtree
+        dir_totals = {"": [0, 0, 0]}
+        for rootdir, dirs, names in os.walk(project_path):
+            dirs.sort()
+            rel_root = os.path.relpath(rootdir, project_path).replace("\\", "/")
+            rel_root = "" if rel_root == "." else rel_root
+            for d in dirs:
+                dir_totals[f"{rel_root}/{d}" if rel_root else d] = [0, 0, 0]
+            for name in names:
+                try:
+                    st = os.lstat(os.path.join(rootdir, name))
+                except OSError:
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                rel_path = f"{rel_root}/{name}" if rel_root else name
+                files[rel_path] = st.st_size
+                mtimes[rel_path] = st.st_mtime
+                name_bytes = len(rel_path.encode('utf-8'))
+                # Add the file to every ancestor directory's subtree totals
+                parent = rel_root
+                while True:
+                    totals = dir_totals[parent]
+                    totals[0] += st.st_size
+                    totals[1] += 1
+                    totals[2] += name_bytes
+                    if not parent:
+                        break
+                    parent = parent.rpartition("/")[0]
+        by_size = sorted(files.items(), key=lambda item: item[1], reverse=True)
+        samples = self._sample_compression(project_path, files)
+        return {
+            'project_path': project_path,
+            'files': files,
+            'mtimes': mtimes,
+            'dir_totals': dir_totals,
+            'by_size': by_size,
+            'samples': samples,
+            'scanned_at': datetime.datetime.now().isoformat(),
+            'scan_seconds': time.perf_counter() - started
+        }
+
+    def _sample_compression(self, project_path, files, cache=None):
+        """Deflate a size-weighted sample of files at level 9 to measure ratio and speed
+
+        Measurements are kept in cache (rel_path -> sample), so drawing again after the exclusions
+        change only reads the files that were not sampled before.
+        """
+        items = [(rel, size) for rel, size in files.items() if size > 0]
+        if not items:
+            return []
+        cumulative = []
+        total = 0
+        for _, size in items:
+            total += size
+            cumulative.append(total)
+        rng = random.Random(len(items))
+        chosen = sorted({bisect.bisect_right(cumulative, rng.randrange(total)) for _ in range(self.SAMPLE_FILES)})
+        samples = []
+        for index in chosen:
+            rel_path = items[index][0]
+            sample = cache.get(rel_path) if cache is not None else None
+            if sample is None:
+                sample = self._measure_compression(project_path, rel_path)
+                if sample is None:
+                    continue
+                if cache is not None:
+                    cache[rel_path] = sample
+            samples.append(sample)
+        return samples
+
+    def _measure_compression(self, project_path, rel_path):
+        """(rel_path, bytes read, compressed bytes, seconds) for one file, or None if it can't be read"""
+        try:
+            with open(os.path.join(project_path, rel_path), 'rb') as f:
+                data = f.read(self.SAMPLE_BYTES)
+        except OSError:
+            return None
+        if not data:
+            return None
+        start = time.perf_counter()
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+        compressed = len(compressor.compress(data)) + len(compressor.flush())
+        return (rel_path, len(data), compressed, time.perf_counter() - start)
+
+    @staticmethod
+    def _normalize(rules):
+        """Normalize rules the same way BackupManager.create_backup does"""
+        return sorted({os.path.normpath(r).replace("\\", "/").strip("/") for r in rules if r})
+
+    @staticmethod
+    def _under(path, folders):
+        """Check whether a path equals or lies beneath one of the given folders"""
+        return any(path == f or path.startswith(f + "/") for f in folders)
 
-    def _create_zip_backup(self, source_dir, dest_file, excluded_files, excluded_folders, archive_rel):
-        import os
-        import zipfile
-        import tkinter as tk
-        # Get the root window (assuming you pass it or have a reference)
-        root = None
-        if hasattr(self, 'root'):
-            root = self.root
-        elif hasattr(self, 'app') and hasattr(self.app, 'root'):
-            root = self.app.root
+    def analyze(self, scan, file_exclusions, folder_exclusions, top_n=10, exclusion_rules=None):
+        """Compute included totals, per-rule savings, top-N entries and estimates from a cached scan
+
+        exclusion_rules is the project's option of that name. Extension, size and age rules are applied
+        from the scan; type rules need each file's content, so their savings are not estimated.
+        """
+        files = scan['files']
+        dir_totals = scan['dir_totals']
+        excluded_files = self._normalize(file_exclusions)
+        excluded_folders = self._normalize(folder_exclusions)
+        # Nested folder rules and files inside excluded folders save nothing extra
+        effective_folders = []
+        for folder in excluded_folders:
+            if folder in dir_totals and not self._under(folder, effective_folders):
+                effective_folders.append(folder)
+        effective_files = [f for f in excluded_files if f in files and not self._under(f, effective_folders)]
+        rules = []
+        for folder in excluded_folders:
+            totals = dir_totals.get(folder, [0, 0, 0])
+            rules.append({
+                'kind': 'folder',
+                'rule': folder,
+                'bytes': totals[0],
+                'files': totals[1],
+                'redundant': folder in dir_totals and folder not in effective_folders,
+                'missing': folder not in dir_totals
+            })
+        for file in excluded_files:
+            rules.append({
+                'kind': 'file',
+                'rule': file,
+                'bytes': files.get(file, 0),
+                'files': 1 if file in files else 0,
+                'redundant': file in files and file not in effective_files,
+                'missing': file not in files
+            })
+        # Attribute rules apply to the files the path rules leave in, using the scanned size and mtime
+        attribute_rules = ExclusionRules({k: v for k, v in (exclusion_rules or {}).items() if k != 'types'})
+        unestimated = [f"type:{t}" for t in ExclusionRules(exclusion_rules).types]
+        rule_excluded = []
+        if attribute_rules.active:
+            path_excluded = set(effective_files)
+            mtimes = scan['mtimes']
+            for rel_path, size in files.items():
+                if rel_path in path_excluded or self._under(rel_path, effective_folders):
+                    continue
+                st = os.stat_result((0, 0, 0, 0, 0, 0, size, 0, mtimes[rel_path], 0))
+                rule, _ = attribute_rules.match(rel_path, rel_path.rpartition("/")[2], st)
+                if rule is not None:
+                    rule_excluded.append(rel_path)
+            for rule, (count, size) in sorted(attribute_rules.stats.items(), key=lambda item: ExclusionRules.ORDER.index(item[0])):
+                rules.append({'kind': 'attribute', 'rule': rule, 'bytes': size, 'files': count,
+                              'redundant': False, 'missing': False})
+        # Subtract excluded subtrees from their ancestors
+        removed = {}
+        for path, totals in [(f, dir_totals[f]) for f in effective_folders] + [
+                (f, [files[f], 1, len(f.encode('utf-8'))]) for f in effective_files + rule_excluded]:
+            parent = path.rpartition("/")[0]
+            while True:
+                acc = removed.setdefault(parent, [0, 0, 0])
+                acc[0] += totals[0]
+                acc[1] += totals[1]
+                acc[2] += totals[2]
+                if not parent:
+                    break
+                parent = parent.rpartition("/")[0]
+        root_removed = removed.get("", [0, 0, 0])
+        root_totals = dir_totals[""]
+        included_bytes = root_totals[0] - root_removed[0]
+        included_files = root_totals[1] - root_removed[1]
+        included_name_bytes = root_totals[2] - root_removed[2]
+        top_dirs = heapq.nlargest(
+            top_n,
+            (
+                (totals[0] - removed.get(path, (0,))[0], path)
+                for path, totals in dir_totals.items()
+                if path and not self._under(path, effective_folders)
+            )
+        )
+        excluded_file_set = set(effective_files) | set(rule_excluded)
+        top_files = []
+        for rel_path, size in scan['by_size']:
+            if len(top_files) >= top_n:
+                break
+            if rel_path in excluded_file_set or self._under(rel_path, effective_folders):
+                continue
+            top_files.append((size, rel_path))
+        # Estimates from samples drawn among the included files, so an excluded heavy folder
+        # doesn't leave the ratio resting on a handful of samples
+        included = {rel_path: size for rel_path, size in files.items()
+                    if rel_path not in excluded_file_set and not self._under(rel_path, effective_folders)}
+        if scan.get('remote'):
+            # The files live on the agent's machine: keep the samples it measured that are still included
+            kept = [s for s in scan['samples'] if s[0] in included]
         else:
-            # fallback: try to get root from any widget
-            try:
-                root = tk._default_root
-            except Exception:
-                pass
-        # Show progress popup
-        popup, label = self._show_progress_popup(root, "Starting backup...")
-        if not os.path.exists(source_dir):
-            popup.destroy()
-            print("DEBUG: Source directory not found:", source_dir)
-            return False, f"Source directory not found: {source_dir}"
-        files_added = 0
-        files_skipped = 0
-        folders_skipped = 0
+            cache = scan.setdefault('sample_cache', {s[0]: tuple(s) for s in scan['samples']})
+            kept = self._sample_compression(scan['project_path'], included, cache)
+        sampled_raw = sum(s[1] for s in kept)
+        sampled_compressed = sum(s[2] for s in kept)
+        sampled_seconds = sum(s[3] for s in kept)
+        ratio = sampled_compressed / sampled_raw if sampled_raw else 1.0
+        throughput = sampled_raw / sampled_seconds if sampled_seconds > 0 else None
+        estimated_size = int(
+            included_bytes * ratio
+            + included_files * self.ZIP_MEMBER_OVERHEAD
+            + 2 * included_name_bytes
+            + self.ZIP_END_RECORD
+        )
+        return {
+            'total_bytes': root_totals[0],
+            'total_files': root_totals[1],
+            'included_bytes': included_bytes,
+            'included_files': included_files,
+            'excluded_bytes': root_removed[0],
+            'excluded_files': root_removed[1],
+            'rules': rules,
+            'unestimated_rules': unestimated,
+            'top_dirs': [(path, size) for size, path in top_dirs],
+            'top_files': [(path, size) for size, path in top_files],
+            'compression_ratio': ratio,
+            'sampled_files': len(kept),
+            'deflate_bytes_per_second': throughput,
+            'estimated_archive_bytes': estimated_size,
+            'estimated_seconds': included_bytes / throughput if throughput else None,
+            'scan_seconds': scan['scan_seconds']
+        }
 
-        def get_folder_size(path):
-            total = 0
-            for dirpath, dirnames, filenames in os.walk(path):
-                for f in filenames:
-                    fp = os.path.join(dirpath, f)
-                    if os.path.isfile(fp):
-                        total += os.path.getsize(fp)
-            return total
+    @staticmethod
+    def format_size(num_bytes):
+        """Format a byte count for display"""
+        size = float(num_bytes)
+        for unit in ("B", "KB", "MB", "GB"):
+            if abs(size) < 1024:
+                return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+            size /= 1024
+        return f"{size:.1f} TB"
 
-        print("\n========== DEBUG: STARTING BACKUP ==========")
-        print("DEBUG: Walking source folder:", source_dir)
-        print("DEBUG: Archive REL path:", archive_rel)
-        with zipfile.ZipFile(dest_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zipf:
-            for rootdir, dirs, files in os.walk(source_dir):
-                rel_root = os.path.relpath(rootdir, source_dir).replace("\\", "/").strip(".")
-                rel_root = "" if rel_root == "." else rel_root
-                # Update the progress label for the current folder
-                folder_display = os.path.relpath(rootdir, source_dir)
-                label.config(text=f"Backing up: {folder_display}")
-                popup.update_idletasks()
-                popup.update()
-                # Filter out excluded directories
-                original_dirs = list(dirs)
-                keep_dirs = []
-                for d in dirs:
-                    folder_rel = os.path.join(rel_root, d).replace("\\", "/").strip("/")
-                    excluded = False
-                    for excl in excluded_folders:
-                        if folder_rel == excl or folder_rel.startswith(excl + "/"):
-                            print(f"DEBUG: Skipping excluded folder: {folder_rel}")
-                            folders_skipped += 1
-                            excluded = True
-                            break
-                    if not excluded:
-                        keep_dirs.append(d)
-                dirs[:] = keep_dirs
-                # Process files in current directory
-                for file in files:
-                    file_path = os.path.join(rootdir, file)
-                    rel_path = os.path.relpath(file_path, source_dir).replace("\\", "/").strip("/")
-                    if rel_path == archive_rel:
-                        print(f"DEBUG: Skipping output archive itself: {rel_path}")
-                        files_skipped += 1
-                        continue
-                    if rel_path in excluded_files:
-                        print(f"DEBUG: Skipping excluded file: {rel_path}")
-                        files_skipped += 1
-                        continue
-                    in_excluded_folder = False
-                    for excl in excluded_folders:
-                        if rel_path.startswith(excl + "/"):
-                            print(f"DEBUG: Skipping file in excluded folder: {rel_path} (excluded folder: {excl})")
-                            files_skipped += 1
-                            in_excluded_folder = True
-                            break
-                    if in_excluded_folder:
-                        continue
-                    print(f"DEBUG: Adding file: {rel_path}")
-                    zipf.write(file_path, rel_path)
-                    files_added += 1
-        popup.destroy()  # Close the progress window
-        print("\n========== DEBUG: BACKUP SUMMARY ==========")
-        print(f"DEBUG: Files added: {files_added}")
-        print(f"DEBUG: Files skipped: {files_skipped}")
-        print(f"DEBUG: Folders skipped: {folders_skipped}")
-        archive_size = os.path.getsize(dest_file)
-        source_size = get_folder_size(source_dir)
-        print(f"DEBUG: Archive size: {archive_size/1024:.2f} KB")
-        print(f"DEBUG: Source folder size: {source_size/1024:.2f} KB")
-        return True, f"Backup completed successfully. {files_added} files added to {dest_file}\n\nSee console for debug info."
+    def format_report(self, report, include_top=True):
+        """Render an analysis as plain text for the console or the exclusions dialog"""
+        fmt = self.format_size
+        lines = [
+            f"Included: {report['included_files']} files, {fmt(report['included_bytes'])} "
+            f"(of {report['total_files']} files, {fmt(report['total_bytes'])})",
+            f"Excluded: {report['excluded_files']} files, {fmt(report['excluded_bytes'])}",
+        ]
+        if report['estimated_seconds'] is not None:
+            lines.append(
+                f"Estimated archive: {fmt(report['estimated_archive_bytes'])} "
+                f"(ratio {report['compression_ratio']:.2f} from {report['sampled_files']} sampled files), "
+                f"~{report['estimated_seconds']:.1f} s at {fmt(report['deflate_bytes_per_second'])}/s"
+            )
+        else:
+            lines.append(f"Estimated archive: {fmt(report['estimated_archive_bytes'])}")
+        if report['rules']:
+            lines.append("")
+            lines.append("Savings per rule:")
+            for rule in report['rules']:
+                note = " (not found)" if rule['missing'] else " (already covered)" if rule['redundant'] else ""
+                lines.append(f"  [{rule['kind']}] {rule['rule']}: {fmt(rule['bytes'])}, {rule['files']} files{note}")
+        if report['unestimated_rules']:
+            lines.append(f"Not estimated (needs file contents): {', '.join(report['unestimated_rules'])}; "
+                         f"the figures above still include those files")
+        if include_top:
+            lines.append("")
+            lines.append("Largest included folders:")
+            lines.extend(f"  {fmt(size):>10}  {path}" for path, size in report['top_dirs'])
+            lines.append("Largest included files:")
+            lines.extend(f"  {fmt(size):>10}  {path}" for path, size in report['top_files'])
+        return "\n".join(lines)
 
 class ModernUITheme:
     """Defines colors and styles for the modern UI theme"""
@@ -522,6 +6380,28 @@ class ModernUITheme:
             foreground=cls.FG_COLOR,
             font=("Helvetica", 12)
         )
+        # Configure Treeview style
+        style.configure(
+            'Treeview',
+            background=cls.CARD_BG,
+            fieldbackground=cls.CARD_BG,
+            foreground=cls.FG_COLOR,
+            borderwidth=0,
+            rowheight=24,
+            font=("Helvetica", 11)
+        )
+        style.map(
+            'Treeview',
+            background=[('selected', cls.THEME_COLOR2)],
+            foreground=[('selected', cls.FG_COLOR)]
+        )
+        style.configure(
+            'Treeview.Heading',
+            background=cls.BG_COLOR,
+            foreground=cls.FG_COLOR,
+            relief="flat",
+            font=("Helvetica", 11, "bold")
+        )
 
 class ScrollableFrame(tk.Frame):
     """A scrollable frame widget"""
@@ -541,12 +6421,13 @@ class ScrollableFrame(tk.Frame):
 
 class ProjectCard(tk.Frame):
     """A card widget for displaying project information"""
-    def __init__(self, parent, project, on_delete, on_backup, database, **kwargs):
+    def __init__(self, parent, project, on_delete, on_backup, database, analyzer=None, **kwargs):
         super().__init__(parent, **ModernUITheme.CARD_FRAME_STYLE, **kwargs)
         self.project = project
         self.on_delete = on_delete
         self.on_backup = on_backup
         self.database = database
+        self.analyzer = analyzer or ExclusionAnalyzer()
         self.master = parent.master
         # Card padding
         self.padx = 15
@@ -603,6 +6484,14 @@ class ProjectCard(tk.Frame):
             **ModernUITheme.SECONDARY_BUTTON_STYLE
         )
         self.exclusions_btn.pack(side=tk.LEFT, padx=(0, 10))
+        # Browse Backups button
+        self.browse_btn = tk.Button(
+            self.btn_frame,
+            text="Browse Backups",
+            command=lambda: self._show_archive_browser(project['id']),
+            **ModernUITheme.SECONDARY_BUTTON_STYLE
+        )
+        self.browse_btn.pack(side=tk.LEFT, padx=(0, 10))
         # Delete button
         self.delete_btn = tk.Button(
             self.btn_frame,
@@ -633,8 +6522,52 @@ class ProjectCard(tk.Frame):
         if hasattr(self, 'desc_label'):
             self.desc_label.configure(background=ModernUITheme.CARD_BG)
 
+    # Rows inserted into the browser per idle callback, so huge folders stay responsive
+    TREE_INSERT_BATCH = 1000
+
+    @staticmethod
+    def _exclusion_status(rel_path, is_dir, file_exclusions, folder_exclusions):
+        """Return 'excluded' for a rule target, 'inherited' under an excluded folder, else ''"""
+        folders = ExclusionAnalyzer._normalize(folder_exclusions)
+        if (is_dir and rel_path in folders) or (not is_dir and rel_path in ExclusionAnalyzer._normalize(file_exclusions)):
+            return "excluded"
+        if ExclusionAnalyzer._under(rel_path, folders):
+            return "inherited"
+        return ""
+
+    @staticmethod
+    def _list_local_directory(full_dir):
+        """(name, is_dir, size) for a folder's entries, without following symlinks"""
+        entries = []
+        try:
+            with os.scandir(full_dir) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        size = None if is_dir else entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+                    entries.append((entry.name, is_dir, size))
+        except OSError as e:
+            print(f"DEBUG: Cannot list {full_dir}: {e}")
+        return entries
+
+    @staticmethod
+    def _browser_order(entries, rel_dir, scan):
+        """Sort entries in place: folders first, then the heaviest first once the scan has sizes"""
+        def sort_key(item):
+            name, is_dir, size = item
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            if is_dir:
+                totals = scan['dir_totals'].get(rel) if scan else None
+                return (0, -(totals[0] if totals else 0), name.lower())
+            return (1, -(size or 0), name.lower())
+
+        entries.sort(key=sort_key)
+        return entries
+
     def _show_exclusions_dialog(self, project_id):
-        """Show exclusions management dialog with scrollable content"""
+        """Show the exclusions browser: a lazy project tree annotated with sizes"""
         project = self.database.get_project(project_id)
         if not project:
             messagebox.showerror("Error", "Project not found")
@@ -642,213 +6575,243 @@ class ProjectCard(tk.Frame):
         # Create dialog
         dialog = tk.Toplevel(self.master)
         dialog.title(f"Manage Exclusions - {project['name']}")
-        dialog.geometry("700x600")
+        dialog.geometry("1000x720")
         dialog.configure(bg=ModernUITheme.BG_COLOR)
         dialog.transient(self.master)
         dialog.grab_set()
         dialog.focus_set()
         # Center the dialog
         dialog.geometry("+%d+%d" % (
-            self.master.winfo_rootx() + (self.master.winfo_width() // 2) - 350,
-            self.master.winfo_rooty() + (self.master.winfo_height() // 2) - 300
+            self.master.winfo_rootx() + (self.master.winfo_width() // 2) - 500,
+            self.master.winfo_rooty() + (self.master.winfo_height() // 2) - 360
         ))
         # Track changes
         file_exclusions = project['file_exclusions'].copy()
         folder_exclusions = project['folder_exclusions'].copy()
         project_path = project['folder_path']
+        # Folders served by an agent can't be listed from here; the agent's scan has the whole tree
+        remote = RemoteAgentClient.from_url(project_path)
+        scan_state = {'scan': None}
+        # iid -> True for directories whose children have been requested
+        loaded = {}
 
-        def relative_path(full_path):
-            """Convert absolute path to project-relative path"""
-            try:
-                return os.path.relpath(full_path, project_path).replace("\\", "/")
-            except ValueError:
-                return full_path  # Fallback if paths are on different drives
-
-        def is_within_project(path):
-            """Check if the path is within the project directory"""
-            return os.path.commonpath([os.path.abspath(path), os.path.abspath(project_path)]) == os.path.abspath(project_path)
-
-        # Main container with scrollbar
-        main_frame = ttk.Frame(dialog, style='TFrame')
-        main_frame.pack(fill=tk.BOTH, expand=True)
-        canvas = tk.Canvas(main_frame, bg=ModernUITheme.BG_COLOR, highlightthickness=0)
-        scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas, style='TFrame')
-        scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        def normalize(path):
+            """Normalize a rule the same way BackupManager.create_backup does"""
+            return os.path.normpath(path).replace("\\", "/").strip("/")
+
+        def exclusion_status(rel_path, is_dir):
+            """Status of a node under the dialog's current rules"""
+            return self._exclusion_status(rel_path, is_dir, file_exclusions, folder_exclusions)
+
+        # Buttons are packed first so they stay visible when the dialog is small
+        btn_frame = tk.Frame(dialog, **ModernUITheme.FRAME_STYLE)
+        btn_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(10, 20), padx=20)
+        tk.Label(
+            btn_frame,
+            text="Git repository:",
+            bg=ModernUITheme.BG_COLOR,
+            fg=ModernUITheme.FG_COLOR,
+            font=("Helvetica", 11)
+        ).pack(side=tk.LEFT)
+        git_mode_var = tk.StringVar(value=project['options'].get('git_mode', "walk"))
+        ttk.Combobox(
+            btn_frame,
+            textvariable=git_mode_var,
+            values=GitSource.MODES,
+            state="readonly",
+            width=16
+        ).pack(side=tk.LEFT, padx=(8, 0))
 
-        # ===================== File Exclusions Section =====================
-        file_frame = ttk.Frame(scrollable_frame, style='Card.TFrame')
-        file_frame.pack(fill=tk.X, padx=20, pady=(20, 10), ipady=10)
+        # Attribute rules sit just above the buttons
+        rules_config = project['options'].get('exclusion_rules') or {}
+        attribute_frame = tk.Frame(dialog, **ModernUITheme.FRAME_STYLE)
+        attribute_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=20)
+        rule_vars = {}
+        for key, label, value, width in (
+            ('max_size', "Max size:", rules_config.get('max_size', ""), 8),
+            ('older_than_days', "Older than (days):", rules_config.get('older_than_days', ""), 6),
+            ('extensions', "Skip extensions:", ", ".join(rules_config.get('extensions') or ()), 18),
+            ('types', "Skip types:", ", ".join(rules_config.get('types') or ()), 18)
+        ):
+            tk.Label(
+                attribute_frame,
+                text=label,
+                bg=ModernUITheme.BG_COLOR,
+                fg=ModernUITheme.FG_COLOR,
+                font=("Helvetica", 11)
+            ).pack(side=tk.LEFT, padx=(0 if key == 'max_size' else 12, 0))
+            rule_vars[key] = tk.StringVar(value=str(value))
+            tk.Entry(attribute_frame, textvariable=rule_vars[key], width=width).pack(side=tk.LEFT, padx=(6, 0))
+
+        def read_rules():
+            """Build the exclusion_rules option from the entries, keeping rules the dialog doesn't show"""
+            config = {k: v for k, v in rules_config.items() if k not in rule_vars}
+            max_size = rule_vars['max_size'].get().strip()
+            older_than = rule_vars['older_than_days'].get().strip()
+            if max_size:
+                config['max_size'] = parse_size(max_size)
+            if older_than:
+                config['older_than_days'] = float(older_than)
+            for key in ('extensions', 'types'):
+                items = [item.strip() for item in rule_vars[key].get().split(",") if item.strip()]
+                if items:
+                    config[key] = items
+            ExclusionRules(config)
+            return config or None
+
+        # ===================== Project Browser Section =====================
+        browser_frame = ttk.Frame(dialog, style='Card.TFrame')
+        browser_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(20, 10))
+        browser_header = ttk.Frame(browser_frame, style='Card.TFrame')
+        browser_header.pack(fill=tk.X)
         ttk.Label(
-            file_frame,
-            text="File Exclusions",
+            browser_header,
+            text="Project Browser",
             background=ModernUITheme.CARD_BG,
             font=("Helvetica", 14, "bold")
-        ).pack(anchor=tk.W, pady=8, padx=8)
+        ).pack(side=tk.LEFT, anchor=tk.W, pady=8, padx=8)
+        tree_container = ttk.Frame(browser_frame, style='Card.TFrame')
+        tree_container.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0, 8))
+        tree = ttk.Treeview(tree_container, columns=("size", "files", "status"), selectmode="extended")
+        tree.heading("#0", text="Name", anchor=tk.W)
+        tree.heading("size", text="Size", anchor=tk.E)
+        tree.heading("files", text="Files", anchor=tk.E)
+        tree.heading("status", text="Status", anchor=tk.W)
+        tree.column("#0", width=480, stretch=True)
+        tree.column("size", width=110, anchor=tk.E, stretch=False)
+        tree.column("files", width=90, anchor=tk.E, stretch=False)
+        tree.column("status", width=110, stretch=False)
+        tree.tag_configure("excluded", foreground="#6b6878")
+        tree.tag_configure("inherited", foreground="#4f4c5a")
+        tree_scroll = ttk.Scrollbar(tree_container, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=tree_scroll.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
 
-        # File List Container
-        file_list_container = ttk.Frame(file_frame, style='Card.TFrame')
-        file_list_container.pack(fill=tk.X, pady=(0, 10))
-
-        def refresh_file_list():
-            """Refresh file exclusion list display"""
-            for widget in file_list_container.winfo_children():
-                widget.destroy()
-            if not file_exclusions:
-                empty_label = ttk.Label(
-                    file_list_container,
-                    text="No file exclusions configured",
-                    style='TLabel',
-                    background=ModernUITheme.CARD_BG
-                )
-                empty_label.pack(fill=tk.X, pady=5)
+        def node_values(rel_path, is_dir, size):
+            """Size, file count and status columns for a node"""
+            scan = scan_state['scan']
+            if is_dir:
+                totals = scan['dir_totals'].get(rel_path) if scan else None
+                size_text = ExclusionAnalyzer.format_size(totals[0]) if totals else "…"
+                files_text = str(totals[1]) if totals else "…"
+            else:
+                size_text = ExclusionAnalyzer.format_size(size) if size is not None else ""
+                files_text = ""
+            return (size_text, files_text, exclusion_status(rel_path, is_dir))
+
+        def retag(iid):
+            """Refresh one loaded node's status column and grey-out tag"""
+            is_dir = "dir" in tree.item(iid, "tags")
+            status = exclusion_status(iid, is_dir)
+            tree.item(iid, tags=["dir" if is_dir else "file"] + ([status] if status else []))
+            tree.set(iid, "status", status)
+
+        def retag_subtree(iid):
+            """Refresh a node and every loaded descendant"""
+            stack = [iid]
+            while stack:
+                current = stack.pop()
+                if current and not current.endswith("/"):
+                    retag(current)
+                stack.extend(tree.get_children(current))
+
+        def list_directory(rel_dir):
+            """List a directory's entries, heaviest directories first once sizes are known"""
+            scan = scan_state['scan']
+            entries = []
+            if remote is not None:
+                try:
+                    entries = ExclusionAnalyzer.list_scanned(scan or self.analyzer.scan(project_path), rel_dir)
+                except (OSError, RuntimeError, ValueError) as e:
+                    print(f"DEBUG: Cannot list {rel_dir or '/'} on the agent: {e}")
+            else:
+                entries = self._list_local_directory(
+                    os.path.join(project_path, *rel_dir.split("/")) if rel_dir else project_path)
+            return self._browser_order(entries, rel_dir, scan)
+
+        def load_children(parent):
+            """List a directory in a background thread, then insert its rows in batches"""
+            if loaded.get(parent):
                 return
-            for excl in file_exclusions:
-                item_frame = ttk.Frame(file_list_container, style='Card.TFrame')
-                item_frame.pack(fill=tk.X, pady=2)
-                ttk.Label(
-                    item_frame,
-                    text=excl,
-                    style='TLabel',
-                    background=ModernUITheme.BG_COLOR,
-                    width=50,
-                    anchor=tk.W
-                ).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=ModernUITheme.INNER_PAD_X, pady=ModernUITheme.INNER_PAD_Y)
-                del_btn = tk.Button(
-                    item_frame,
-                    text="×",
-                    font=("Helvetica", 12, "bold"),
-                    fg=ModernUITheme.THEME_RED,
-                    bg=ModernUITheme.CARD_BG,
-                    activeforeground=ModernUITheme.THEME_RED_LIGHT,
-                    activebackground=ModernUITheme.CARD_BG,
-                    relief="flat",
-                    cursor="hand2",
-                    command=lambda e=excl: delete_file(e)
-                )
-                del_btn.pack(side=tk.RIGHT, padx=5)
-                del_btn.bind("<Enter>", lambda e: del_btn.config(fg=ModernUITheme.THEME_RED_LIGHT))
-                del_btn.bind("<Leave>", lambda e: del_btn.config(fg=ModernUITheme.THEME_RED))
-
-        # File Controls
-        file_control_frame = ttk.Frame(file_frame, style='TFrame')
-        file_control_frame.pack(fill=tk.X)
-        file_entry = tk.Entry(
-            file_control_frame,
-            bg=ModernUITheme.CARD_BG,
-            fg=ModernUITheme.FG_COLOR,
-            insertbackground=ModernUITheme.FG_COLOR,
-            font=("Helvetica", 12),
-            relief="flat",
-            highlightbackground=ModernUITheme.BORDER_COLOR,
-            highlightthickness=1
-        )
-        file_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10), ipady=4)
-
-        def add_file():
-            """Add file exclusion"""
-            path = file_entry.get().strip()
-            if not path:
-                selected = filedialog.askopenfilename(initialdir=project_path)
-                if selected:
-                    if is_within_project(selected):
-                        path = relative_path(selected)
-                        file_entry.delete(0, tk.END)
-                        file_entry.insert(0, path)
-                    else:
-                        messagebox.showerror("Error", "The selected file is outside the project folder.")
-                        return
-                else:
+            loaded[parent] = True
+            result = {}
+            thread = threading.Thread(target=lambda: result.setdefault('entries', list_directory(parent)), daemon=True)
+            thread.start()
+
+            def insert_batch(entries, start):
+                if not tree.winfo_exists():
                     return
-            if path not in file_exclusions:
-                file_exclusions.append(path)
-                refresh_file_list()
-                file_entry.delete(0, tk.END)
-
-        def delete_file(excl):
-            """Remove file exclusion with confirmation"""
-            confirm = messagebox.askyesno("Confirm Delete", f"Remove file exclusion?\n\n{excl}", parent=dialog)
-            if confirm:
-                file_exclusions.remove(excl)
-                refresh_file_list()
+                if start == 0:
+                    # Remove the placeholder that made the node expandable
+                    placeholder = parent + "/"
+                    if tree.exists(placeholder):
+                        tree.delete(placeholder)
+                for name, is_dir, size in entries[start:start + self.TREE_INSERT_BATCH]:
+                    rel = f"{parent}/{name}" if parent else name
+                    status = exclusion_status(rel, is_dir)
+                    tags = ["dir" if is_dir else "file"] + ([status] if status else [])
+                    tree.insert(
+                        parent, tk.END, iid=rel,
+                        text=(name + "/") if is_dir else name,
+                        values=node_values(rel, is_dir, size),
+                        tags=tags
+                    )
+                    if is_dir:
+                        # Placeholder child; "rel/" never collides with a real child's iid
+                        tree.insert(rel, tk.END, iid=rel + "/", text="Loading...")
+                if start + self.TREE_INSERT_BATCH < len(entries):
+                    dialog.after(1, insert_batch, entries, start + self.TREE_INSERT_BATCH)
 
-        tk.Button(
-            file_control_frame,
-            text="Add File",
-            command=add_file,
-            **ModernUITheme.SECONDARY_BUTTON_STYLE
-        ).pack(side=tk.LEFT, padx=(0, 5))
-        tk.Button(
-            file_control_frame,
-            text="Browse...",
-            command=lambda: file_entry.insert(0, filedialog.askopenfilename(initialdir=project_path)),
-            **ModernUITheme.SECONDARY_BUTTON_STYLE
-        ).pack(side=tk.LEFT, padx=(0, 5))
+            def poll():
+                if not tree.winfo_exists():
+                    return
+                if thread.is_alive():
+                    dialog.after(50, poll)
+                else:
+                    insert_batch(result.get('entries', []), 0)
 
-        # ===================== Folder Exclusions Section =====================
-        folder_frame = ttk.Frame(scrollable_frame, style='Card.TFrame')
-        folder_frame.pack(fill=tk.X, padx=20, pady=10, ipady=10)
+            poll()
+
+        tree.bind("<<TreeviewOpen>>", lambda e: load_children(tree.focus()))
+
+        # ===================== Rules and Estimate Section =====================
+        bottom_frame = ttk.Frame(dialog, style='TFrame')
+        bottom_frame.pack(fill=tk.X, padx=20)
+        rules_frame = ttk.Frame(bottom_frame, style='Card.TFrame')
+        rules_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10))
         ttk.Label(
-            folder_frame,
-            text="Folder Exclusions",
+            rules_frame,
+            text="Exclusion Rules",
             background=ModernUITheme.CARD_BG,
             font=("Helvetica", 14, "bold")
         ).pack(anchor=tk.W, pady=8, padx=8)
+        rules_list = tk.Listbox(
+            rules_frame,
+            height=7,
+            background=ModernUITheme.CARD_BG,
+            foreground=ModernUITheme.FG_COLOR,
+            selectbackground=ModernUITheme.THEME_COLOR1,
+            selectforeground=ModernUITheme.FG_COLOR,
+            font=("Helvetica", 11),
+            borderwidth=0,
+            highlightthickness=0
+        )
+        rules_list.pack(fill=tk.BOTH, expand=True, padx=8)
+        rule_entries = []
 
-        # Folder List Container
-        folder_list_container = ttk.Frame(folder_frame, style='Card.TFrame')
-        folder_list_container.pack(fill=tk.X, pady=(0, 10))
-
-        def refresh_folder_list():
-            """Refresh folder exclusion list display"""
-            for widget in folder_list_container.winfo_children():
-                widget.destroy()
-            if not folder_exclusions:
-                empty_label = ttk.Label(
-                    folder_list_container,
-                    text="No folder exclusions configured",
-                    style='TLabel',
-                    background=ModernUITheme.CARD_BG
-                )
-                empty_label.pack(fill=tk.X, pady=5)
-                return
-            for excl in folder_exclusions:
-                item_frame = ttk.Frame(folder_list_container, style='Card.TFrame')
-                item_frame.pack(fill=tk.X, pady=2)
-                ttk.Label(
-                    item_frame,
-                    text=excl,
-                    style='TLabel',
-                    background=ModernUITheme.BG_COLOR,
-                    width=50,
-                    anchor=tk.W
-                ).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=ModernUITheme.INNER_PAD_X, pady=ModernUITheme.INNER_PAD_Y)
-                del_btn = tk.Button(
-                    item_frame,
-                    text="×",
-                    font=("Helvetica", 12, "bold"),
-                    fg=ModernUITheme.THEME_RED,
-                    bg=ModernUITheme.CARD_BG,
-                    activeforeground=ModernUITheme.THEME_RED_LIGHT,
-                    activebackground=ModernUITheme.CARD_BG,
-                    relief="flat",
-                    cursor="hand2",
-                    command=lambda e=excl: delete_folder(e)
-                )
-                del_btn.pack(side=tk.RIGHT, padx=5)
-                del_btn.bind("<Enter>", lambda e: del_btn.config(fg=ModernUITheme.THEME_RED_LIGHT))
-                del_btn.bind("<Leave>", lambda e: del_btn.config(fg=ModernUITheme.THEME_RED))
-
-        # Folder Controls
-        folder_control_frame = ttk.Frame(folder_frame, style='TFrame')
-        folder_control_frame.pack(fill=tk.X)
-        folder_entry = tk.Entry(
-            folder_control_frame,
-            bg=ModernUITheme.CARD_BG,
+        def refresh_rules():
+            """Show the current rules; one Listbox is refilled instead of rebuilding row widgets"""
+            rule_entries[:] = [("folder", f) for f in folder_exclusions] + [("file", f) for f in file_exclusions]
+            rules_list.delete(0, tk.END)
+            for kind, rule in rule_entries:
+                rules_list.insert(tk.END, f"[{kind}] {rule}")
+
+        entry_frame = ttk.Frame(rules_frame, style='Card.TFrame')
+        entry_frame.pack(fill=tk.X, padx=8, pady=8)
+        rule_entry = tk.Entry(
+            entry_frame,
+            bg=ModernUITheme.BG_COLOR,
             fg=ModernUITheme.FG_COLOR,
             insertbackground=ModernUITheme.FG_COLOR,
             font=("Helvetica", 12),
@@ -856,55 +6819,176 @@ class ProjectCard(tk.Frame):
             highlightbackground=ModernUITheme.BORDER_COLOR,
             highlightthickness=1
         )
-        folder_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10), ipady=4)
-
-        def add_folder():
-            """Add folder exclusion"""
-            path = folder_entry.get().strip()
-            if not path:
-                selected = filedialog.askdirectory(initialdir=project_path)
-                if selected:
-                    if is_within_project(selected):
-                        path = relative_path(selected)
-                        folder_entry.delete(0, tk.END)
-                        folder_entry.insert(0, path)
-                    else:
-                        messagebox.showerror("Error", "The selected folder is outside the project folder.")
-                        return
+        rule_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10), ipady=4)
+
+        estimate_frame = ttk.Frame(bottom_frame, style='Card.TFrame')
+        estimate_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        estimate_header = ttk.Frame(estimate_frame, style='Card.TFrame')
+        estimate_header.pack(fill=tk.X)
+        ttk.Label(
+            estimate_header,
+            text="Dry Run Estimate",
+            background=ModernUITheme.CARD_BG,
+            font=("Helvetica", 14, "bold")
+        ).pack(side=tk.LEFT, anchor=tk.W, pady=8, padx=8)
+        estimate_label = tk.Label(
+            estimate_frame,
+            text="Scanning project...",
+            background=ModernUITheme.CARD_BG,
+            foreground="#cccccc",
+            font=("Courier", 10),
+            justify=tk.LEFT,
+            anchor="nw"
+        )
+        estimate_label.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0, 8))
+
+        def update_estimate():
+            """Recompute the estimate from the cached scan for the current rules"""
+            if scan_state['scan'] is None or not estimate_label.winfo_exists():
+                return
+            try:
+                exclusion_rules = read_rules()
+            except ValueError:
+                # Half-typed entries: estimate with the saved rules until they parse
+                exclusion_rules = rules_config
+            report = self.analyzer.analyze(scan_state['scan'], file_exclusions, folder_exclusions, top_n=5,
+                                           exclusion_rules=exclusion_rules)
+            estimate_label.config(text=self.analyzer.format_report(report, include_top=False))
+
+        for var in rule_vars.values():
+            var.trace_add('write', lambda *_: update_estimate())
+
+        def rules_changed(changed_paths):
+            """Update rules, greyed nodes and the estimate after a rule is added or removed"""
+            refresh_rules()
+            for path in changed_paths:
+                if tree.exists(path):
+                    retag_subtree(path)
+            update_estimate()
+
+        def toggle_selected():
+            """Exclude selected nodes, or include them again if they are already excluded"""
+            changed = []
+            for iid in tree.selection():
+                if iid.endswith("/"):
+                    continue
+                is_dir = "dir" in tree.item(iid, "tags")
+                rules = folder_exclusions if is_dir else file_exclusions
+                existing = [r for r in rules if normalize(r) == iid]
+                if existing:
+                    for r in existing:
+                        rules.remove(r)
+                elif exclusion_status(iid, is_dir) == "inherited":
+                    continue
                 else:
-                    return
-            if path not in folder_exclusions:
-                folder_exclusions.append(path)
-                refresh_folder_list()
-                folder_entry.delete(0, tk.END)
-
-        def delete_folder(excl):
-            """Remove folder exclusion with confirmation"""
-            confirm = messagebox.askyesno("Confirm Delete", f"Remove folder exclusion?\n\n{excl}", parent=dialog)
+                    rules.append(iid)
+                changed.append(iid)
+            if changed:
+                rules_changed(changed)
+
+        def add_rule(kind):
+            """Add a rule typed into the entry"""
+            path = normalize(rule_entry.get().strip())
+            if not path or path == ".":
+                return
+            rules = folder_exclusions if kind == "folder" else file_exclusions
+            if path not in rules:
+                rules.append(path)
+                rules_changed([path])
+            rule_entry.delete(0, tk.END)
+
+        def remove_rule():
+            """Remove the selected rule with confirmation"""
+            selection = rules_list.curselection()
+            if not selection:
+                return
+            kind, rule = rule_entries[selection[0]]
+            confirm = messagebox.askyesno("Confirm Delete", f"Remove {kind} exclusion?\n\n{rule}", parent=dialog)
             if confirm:
-                folder_exclusions.remove(excl)
-                refresh_folder_list()
+                (folder_exclusions if kind == "folder" else file_exclusions).remove(rule)
+                rules_changed([normalize(rule)])
+
+        def start_scan(refresh=False):
+            """Scan the project in a background thread, then fill in sizes and the estimate"""
+            scan_state['scan'] = None
+            estimate_label.config(text="Scanning project...")
+            result = {}
+
+            def worker():
+                try:
+                    result['scan'] = self.analyzer.scan(project_path, refresh=refresh)
+                except Exception as e:
+                    result['error'] = e
+
+            def poll():
+                if not estimate_label.winfo_exists():
+                    return
+                if thread.is_alive():
+                    dialog.after(100, poll)
+                elif 'error' in result:
+                    estimate_label.config(text=f"Scan failed: {result['error']}")
+                else:
+                    scan_state['scan'] = result['scan']
+                    if remote is not None:
+                        load_children("")
+                    # Only loaded directory rows need their size columns filled in
+                    for iid in loaded:
+                        for child in tree.get_children(iid):
+                            if "dir" in tree.item(child, "tags"):
+                                tree.item(child, values=node_values(child, True, None))
+                    update_estimate()
+
+            thread = threading.Thread(target=worker, daemon=True)
+            thread.start()
+            poll()
 
+        tree.bind("<Double-1>", lambda e: toggle_selected())
+        tree.bind("<Delete>", lambda e: toggle_selected())
+        tk.Button(
+            browser_header,
+            text="Rescan",
+            command=lambda: start_scan(refresh=True),
+            **ModernUITheme.SECONDARY_BUTTON_STYLE
+        ).pack(side=tk.RIGHT, padx=8)
         tk.Button(
-            folder_control_frame,
+            browser_header,
+            text="Exclude / Include Selected",
+            command=toggle_selected,
+            **ModernUITheme.SECONDARY_BUTTON_STYLE
+        ).pack(side=tk.RIGHT, padx=(8, 0))
+        tk.Button(
+            entry_frame,
             text="Add Folder",
-            command=add_folder,
+            command=lambda: add_rule("folder"),
             **ModernUITheme.SECONDARY_BUTTON_STYLE
         ).pack(side=tk.LEFT, padx=(0, 5))
         tk.Button(
-            folder_control_frame,
-            text="Browse...",
-            command=lambda: folder_entry.insert(0, filedialog.askdirectory(initialdir=project_path)),
+            entry_frame,
+            text="Add File",
+            command=lambda: add_rule("file"),
             **ModernUITheme.SECONDARY_BUTTON_STYLE
         ).pack(side=tk.LEFT, padx=(0, 5))
+        tk.Button(
+            entry_frame,
+            text="Remove",
+            command=remove_rule,
+            **ModernUITheme.DELETE_BUTTON_STYLE
+        ).pack(side=tk.LEFT)
 
         # Initial population
-        refresh_file_list()
-        refresh_folder_list()
+        refresh_rules()
+        if remote is None:
+            load_children("")
+        start_scan()
 
         # Save and Cancel buttons
         def save_changes():
-            """Save changes to the database"""
+            """Save changes to the database; invalid attribute rules keep the dialog open"""
+            try:
+                exclusion_rules = read_rules()
+            except ValueError as e:
+                messagebox.showerror("Invalid rule", str(e), parent=dialog)
+                return
             try:
                 self.database.update_project(
                     project_id,
@@ -914,14 +6998,15 @@ class ProjectCard(tk.Frame):
                     file_exclusions,
                     folder_exclusions
                 )
+                git_mode = git_mode_var.get()
+                self.database.set_project_option(project_id, 'git_mode', None if git_mode == "walk" else git_mode)
+                self.database.set_project_option(project_id, 'exclusion_rules', exclusion_rules)
                 messagebox.showinfo("Success", "Exclusions updated successfully")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to update exclusions: {str(e)}")
             dialog.destroy()
             self._load_projects()
 
-        btn_frame = tk.Frame(dialog, **ModernUITheme.FRAME_STYLE)
-        btn_frame.pack(fill=tk.X, pady=(10, 20), padx=20)
         tk.Button(
             btn_frame,
             text="Save Changes",
@@ -935,6 +7020,219 @@ class ProjectCard(tk.Frame):
             **ModernUITheme.SECONDARY_BUTTON_STYLE
         ).pack(side=tk.RIGHT, padx=(10, 0))
 
+    # Rows shown in the archive browser; searches narrow down larger listings
+    ARCHIVE_LIST_LIMIT = 2000
+
+    def _show_archive_browser(self, project_id):
+        """Show the members of a project's backups, with search and single-file extract"""
+        project = self.database.get_project(project_id)
+        if not project:
+            messagebox.showerror("Error", "Project not found")
+            return
+        dialog = tk.Toplevel(self.master)
+        dialog.title(f"Browse Backups - {project['name']}")
+        dialog.geometry("900x600")
+        dialog.configure(bg=ModernUITheme.BG_COLOR)
+        dialog.transient(self.master)
+        dialog.focus_set()
+        # Newest first; deleted or moved archives are still found through their copies
+        archives = []
+        for backup in reversed(self.database.get_backups(project_id)):
+            if backup['status'] != 'complete' or not RetentionPolicy.on_disk(backup):
+                continue
+            paths = [backup['archive_path']] + [
+                copy['path'] for copy in self.database.get_backup_copies(backup['id']) if copy['status'] == 'complete'
+            ]
+            path = next((path for path in paths if os.path.exists(path)), None)
+            if path:
+                size = ExclusionAnalyzer.format_size(backup['archive_bytes'] or os.path.getsize(path))
+                archives.append((f"{backup['started_at']}  {os.path.basename(path)}  ({size})", path))
+        state = {'index': None, 'search_job': None, 'load': 0}
+
+        top_frame = tk.Frame(dialog, **ModernUITheme.FRAME_STYLE)
+        top_frame.pack(fill=tk.X, padx=20, pady=(20, 10))
+        tk.Label(
+            top_frame,
+            text="Backup:",
+            bg=ModernUITheme.BG_COLOR,
+            fg=ModernUITheme.FG_COLOR,
+            font=("Helvetica", 11)
+        ).pack(side=tk.LEFT)
+        archive_var = tk.StringVar()
+        archive_box = ttk.Combobox(
+            top_frame,
+            textvariable=archive_var,
+            values=[label for label, _ in archives],
+            state="readonly",
+            width=70
+        )
+        archive_box.pack(side=tk.LEFT, padx=(8, 0), fill=tk.X, expand=True)
+        search_frame = tk.Frame(dialog, **ModernUITheme.FRAME_STYLE)
+        search_frame.pack(fill=tk.X, padx=20)
+        tk.Label(
+            search_frame,
+            text="Search:",
+            bg=ModernUITheme.BG_COLOR,
+            fg=ModernUITheme.FG_COLOR,
+            font=("Helvetica", 11)
+        ).pack(side=tk.LEFT)
+        search_var = tk.StringVar()
+        tk.Entry(search_frame, textvariable=search_var).pack(side=tk.LEFT, padx=(8, 0), fill=tk.X, expand=True)
+
+        btn_frame = tk.Frame(dialog, **ModernUITheme.FRAME_STYLE)
+        btn_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(10, 20), padx=20)
+        status_label = tk.Label(
+            btn_frame,
+            text="",
+            bg=ModernUITheme.BG_COLOR,
+            fg=ModernUITheme.FG_COLOR,
+            font=("Helvetica", 11)
+        )
+        status_label.pack(side=tk.LEFT)
+
+        tree_container = ttk.Frame(dialog, style='Card.TFrame')
+        tree_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=(10, 0))
+        tree = ttk.Treeview(tree_container, columns=("size", "modified"), selectmode="extended")
+        tree.heading("#0", text="Path", anchor=tk.W)
+        tree.heading("size", text="Size", anchor=tk.E)
+        tree.heading("modified", text="Modified", anchor=tk.W)
+        tree.column("#0", width=560, stretch=True)
+        tree.column("size", width=100, anchor=tk.E, stretch=False)
+        tree.column("modified", width=150, stretch=False)
+        tree_scroll = ttk.Scrollbar(tree_container, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=tree_scroll.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+
+        def display_name(name):
+            """Project path of a member; deltas are listed under the file they rebuild"""
+            return name[len(DeltaEncoder.MEMBER_PREFIX):] if name.startswith(DeltaEncoder.MEMBER_PREFIX) else name
+
+        def show_matches():
+            """Fill the list with the members matching the search box"""
+            state['search_job'] = None
+            index = state['index']
+            if index is None:
+                return
+            tree.delete(*tree.get_children())
+            positions, total = index.search(search_var.get(), self.ARCHIVE_LIST_LIMIT)
+            for i in positions:
+                name = index.names[i]
+                if name.endswith("/"):
+                    continue
+                modified = datetime.datetime.fromtimestamp(index.modified(i)).strftime("%Y-%m-%d %H:%M")
+                tree.insert("", tk.END, iid=name, text=display_name(name),
+                            values=(ExclusionAnalyzer.format_size(index.fields['size'][i]), modified))
+            shown = f"showing the first {len(positions):,} of " if total > len(positions) else ""
+            status_label.config(text=f"{shown}{total:,} matching of {len(index):,} members")
+
+        def schedule_search(*_):
+            if state['search_job'] is not None:
+                dialog.after_cancel(state['search_job'])
+            state['search_job'] = dialog.after(200, show_matches)
+
+        def open_archive(path):
+            """Load the archive listing in a background thread; cached listings come back at once"""
+            # A slower load of an earlier choice must not replace this one when it finishes
+            state['load'] += 1
+            load = state['load']
+            state['index'] = None
+            tree.delete(*tree.get_children())
+            status_label.config(text="Reading archive directory...")
+            result = {}
+            started = time.perf_counter()
+
+            def worker():
+                try:
+                    result['index'] = ArchiveIndex.load(path)
+                except Exception as e:
+                    result['error'] = e
+
+            def poll():
+                if not status_label.winfo_exists() or load != state['load']:
+                    return
+                if thread.is_alive():
+                    dialog.after(50, poll)
+                elif 'error' in result:
+                    status_label.config(text=f"Cannot read {os.path.basename(path)}: {result['error']}")
+                else:
+                    state['index'] = result['index']
+                    print(f"DEBUG: Listed {len(result['index'])} members of {path} from "
+                          f"{result['index'].source} in {time.perf_counter() - started:.3f}s")
+                    show_matches()
+
+            thread = threading.Thread(target=worker, daemon=True)
+            thread.start()
+            poll()
+
+        def choose_archive(*_):
+            selected = archive_box.current()
+            if selected >= 0:
+                open_archive(archives[selected][1])
+
+        def open_file():
+            path = filedialog.askopenfilename(
+                title="Open backup archive",
+                filetypes=[("Backup archives", "*.zip *.tar.zst"), ("All files", "*.*")]
+            )
+            if path:
+                archive_box.set("")
+                archives.append((path, path))
+                archive_box.configure(values=[label for label, _ in archives])
+                archive_box.current(len(archives) - 1)
+                open_archive(path)
+
+        def extract_selected():
+            """Extract the selected members, each read by seeking to its own data"""
+            index = state['index']
+            selection = tree.selection()
+            if index is None or not selection:
+                messagebox.showinfo("Extract", "Select one or more files to extract", parent=dialog)
+                return
+            dest_dir = filedialog.askdirectory(title="Extract to folder", parent=dialog)
+            if not dest_dir:
+                return
+            restorer = DeltaRestorer(self.database)
+            extracted = []
+            try:
+                for name in selection:
+                    extracted.append(restorer.extract(index.archive_path, display_name(name), dest_dir, index))
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to extract {display_name(name)}: {str(e)}", parent=dialog)
+                return
+            messagebox.showinfo(
+                "Extract",
+                extracted[0] if len(extracted) == 1 else f"Extracted {len(extracted)} files to {dest_dir}",
+                parent=dialog
+            )
+
+        archive_box.bind("<<ComboboxSelected>>", choose_archive)
+        search_var.trace_add("write", schedule_search)
+        tree.bind("<Double-1>", lambda e: extract_selected())
+        tk.Button(
+            top_frame,
+            text="Open File...",
+            command=open_file,
+            **ModernUITheme.SECONDARY_BUTTON_STYLE
+        ).pack(side=tk.LEFT, padx=(10, 0))
+        tk.Button(
+            btn_frame,
+            text="Close",
+            command=dialog.destroy,
+            **ModernUITheme.SECONDARY_BUTTON_STYLE
+        ).pack(side=tk.RIGHT, padx=(10, 0))
+        tk.Button(
+            btn_frame,
+            text="Extract Selected",
+            command=extract_selected,
+            **ModernUITheme.FIRST_BUTTON_STYLE
+        ).pack(side=tk.RIGHT, padx=(10, 0))
+        if archives:
+            archive_box.current(0)
+            open_archive(archives[0][1])
+        else:
+            status_label.config(text="No backups of this project yet; use Open File to browse any archive")
+
 class BackupUtilityApp:
     """Main application class for the Backup Utility"""
     def __init__(self, root):
@@ -947,12 +7245,16 @@ class BackupUtilityApp:
         self.db = Database()
         # Initialize backup manager
         self.backup_manager = BackupManager(self.db)
+        # Shared dry-run scan cache for the exclusions dialogs
+        self.analyzer = ExclusionAnalyzer()
         # Apply theme
         ModernUITheme.apply_theme(self.root)
         # Setup UI
         self._setup_ui()
         # Load projects
         self._load_projects()
+        # Offer to finish backups that were interrupted last time
+        self.root.after(200, self._offer_resume)
 
     def _setup_ui(self):
         """Setup the user interface"""
@@ -985,6 +7287,14 @@ class BackupUtilityApp:
             **ModernUITheme.FIRST_BUTTON_STYLE
         )
         self.add_project_btn.pack(side=tk.RIGHT, anchor=tk.E)
+        # Register every project under a folder at once
+        self.discover_btn = tk.Button(
+            self.header_frame,
+            text="Discover Projects",
+            command=self._discover_projects,
+            **ModernUITheme.SECONDARY_BUTTON_STYLE
+        )
+        self.discover_btn.pack(side=tk.RIGHT, anchor=tk.E, padx=(0, 10))
         # Projects list
         self.projects_frame = ScrollableFrame(self.projects_panel)
         self.projects_frame.pack(fill=tk.BOTH, expand=True)
@@ -1012,7 +7322,8 @@ class BackupUtilityApp:
                 project,
                 self._delete_project,
                 self._create_backup,
-                self.db  # Add database reference here
+                self.db,  # Add database reference here
+                self.analyzer
             )
             card.pack(fill=tk.X, pady=(0 if idx == 0 else 10, 0))
             # Add separator between cards
@@ -1020,6 +7331,29 @@ class BackupUtilityApp:
                 separator = tk.Frame(self.projects_frame.scrollable_frame, height=1, background=ModernUITheme.SEPARATOR_COLOR)
                 separator.pack(fill=tk.X, pady=(10, 0))
 
+    def _discover_projects(self):
+        """Find project roots under a chosen folder and register them in one go"""
+        parent = filedialog.askdirectory(title="Folder to search for projects")
+        if not parent:
+            return
+        discovery = ProjectDiscovery()
+        candidates = discovery.find(parent)
+        if not candidates:
+            messagebox.showinfo("Discover Projects", "No git, Node or Python projects found")
+            return
+        preview = "\n".join(c['folder_path'] for c in candidates[:15])
+        if len(candidates) > 15:
+            preview += f"\n... and {len(candidates) - 15} more"
+        if not messagebox.askyesno("Discover Projects", f"Register {len(candidates)} projects?\n\n{preview}"):
+            return
+        try:
+            added, skipped = discovery.register(self.db, candidates)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to register projects: {str(e)}")
+            return
+        self._load_projects()
+        messagebox.showinfo("Discover Projects", f"Registered {len(added)} projects ({skipped} already registered)")
+
     def _show_new_project_dialog(self):
         """Show dialog for creating a new project"""
         dialog = tk.Toplevel(self.root)
@@ -1153,7 +7487,8 @@ class BackupUtilityApp:
         # Confirm deletion
         confirm = messagebox.askyesno(
             "Confirm Delete",
-            f"Are you sure you want to delete the project '{project['name']}'?\n\nThis action cannot be undone."
+            f"Are you sure you want to delete the project '{project['name']}'?\n\n"
+            "Its backup history is removed from the catalog; archive files stay on disk. This action cannot be undone."
         )
         if confirm:
             # Delete from database
@@ -1176,12 +7511,681 @@ class BackupUtilityApp:
         else:
             messagebox.showerror("Backup Failed", message)
 
+    def _offer_resume(self):
+        """Ask whether to resume interrupted backups"""
+        for checkpoint in self.db.get_incomplete_checkpoints():
+            project = self.db.get_project(checkpoint['project_id'])
+            project_name = project['name'] if project else checkpoint['project_id']
+            answer = messagebox.askyesnocancel(
+                "Resume Backup",
+                f"The backup of '{project_name}' to\n{checkpoint['dest_file']}\n"
+                f"was interrupted on {checkpoint['updated_at'][:19].replace('T', ' ')}.\n\n"
+                "Yes: resume it now\nNo: discard the checkpoint\nCancel: ask again next time"
+            )
+            if answer is None:
+                continue
+            if not answer:
+                self.db.delete_checkpoint(checkpoint['id'])
+                continue
+            self.root.config(cursor="watch")
+            self.root.update()
+            success, message = self.backup_manager.resume_backup(checkpoint['id'])
+            self.root.config(cursor="")
+            if success:
+                messagebox.showinfo("Backup Complete", message)
+            else:
+                messagebox.showerror("Backup Failed", message)
+
     def on_closing(self):
         """Handle application closing"""
         self.db.close()
         self.root.destroy()
 
+def run_decrypt(args):
+    """The decrypt command: decrypt to a file or stdout, or through a temporary file into a restore
+
+    Only the last chunk carries the tag, so with --out - the plaintext reaches the pipe before it is
+    verified and must not be trusted unless the command exits 0. --out and --restore-to verify first.
+    """
+    read_key = PlumCaveDecryptor.read_key_material
+    try:
+        if args.file_key:
+            key = read_key(args.file_key)
+            make_decryptor = lambda src: PlumCaveDecryptor(key, hmac_key_end=224)
+        elif args.master_key and args.random_key and args.file_salt and args.iterations:
+            master_key, random_key, file_salt = read_key(args.master_key), read_key(args.random_key), read_key(args.file_salt)
+            make_decryptor = lambda src: PlumCaveDecryptor.for_backup(master_key, random_key, file_salt, args.iterations)
+        elif args.record_key and args.iterations:
+            record_key = read_key(args.record_key)
+            make_decryptor = lambda src: PlumCaveDecryptor.for_record(src, record_key, args.iterations, padded=not args.no_padding)
+        else:
+            print("Give --file-key, or --master-key, --random-key, --file-salt and --iterations, or --record-key and --iterations")
+            return 2
+    except OSError as e:
+        print(f"Cannot read key material: {e}")
+        return 2
+    src = sys.stdin.buffer if args.input == "-" else open(args.input, 'rb')
+    target = None
+    try:
+        if args.out == "-":
+            if sys.stdout.isatty():
+                print("Refusing to write decrypted data to a terminal; pipe or redirect stdout")
+                return 1
+            output_stream = sys.stdout.buffer
+            with contextlib.redirect_stdout(sys.stderr):
+                size = make_decryptor(src).decrypt(src, output_stream)
+                output_stream.flush()
+                print(f"Decrypted {size} bytes, integrity verified")
+            return 0
+        # Decrypt beside the target and keep the result only once the tag has been verified
+        if args.out:
+            target = args.out + ".part"
+        else:
+            os.makedirs(args.restore_to, exist_ok=True)
+            fd, target = tempfile.mkstemp(prefix=".plumcave-decrypt-", suffix=".zip", dir=args.restore_to)
+            os.close(fd)
+        started = time.monotonic()
+        with open(target, 'wb') as dst:
+            size = make_decryptor(src).decrypt(src, dst)
+        elapsed = max(time.monotonic() - started, 1e-9)
+        print(f"Decrypted {size} bytes in {elapsed:.1f} s ({size / elapsed / (1024 * 1024):.1f} MB/s), integrity verified")
+        if args.out:
+            os.replace(target, args.out)
+            target = None
+            return 0
+        with open(target, 'rb') as f:
+            magic = f.read(4)
+        if magic != b"PK\x03\x04":
+            # A .tar.zst backup can only be read with its index sidecar, which is not uploaded
+            print("The decrypted file is not a ZIP backup; use --out to save it")
+            return 1
+        count = DeltaRestorer().restore(target, args.restore_to)
+        print(f"Restored {count} files to {args.restore_to}")
+        return 0
+    except (ValueError, RuntimeError) as e:
+        if args.out == "-":
+            # Keep the message out of the pipe and tell the reader what it already received
+            print(f"{e}; the data written to stdout is not trustworthy", file=sys.stderr)
+        else:
+            print(e)
+        return 1
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+        if target is not None and os.path.exists(target):
+            os.remove(target)
+
+def run_perf_check(args):
+    """Measure the backup engines and check them against, or record, the baseline"""
+    tolerances = {}
+    for item in args.tolerance:
+        metric, _, fraction = item.rpartition("=")
+        if metric and metric not in PerfRegressionSuite.METRICS:
+            print(f"Unknown metric {metric!r}; choose from {', '.join(PerfRegressionSuite.METRICS)}")
+            return 2
+        try:
+            value = float(fraction)
+        except ValueError:
+            print(f"Invalid tolerance {item!r}")
+            return 2
+        tolerances.update({metric: value} if metric else dict.fromkeys(PerfRegressionSuite.METRICS, value))
+    available = PerfRegressionSuite.available_modes()
+    modes = args.mode or available
+    missing = [mode for mode in modes if mode not in available]
+    if missing:
+        print(f"Not available: {', '.join(missing)}")
+        return 2
+    if args.against and args.record:
+        print("--against compares with another revision; it can't be recorded")
+        return 2
+    baseline = reference = None
+    try:
+        if args.against:
+            reference = PerfRegressionSuite.reference_script(args.against)
+        else:
+            baseline = None if args.record else PerfRegressionSuite.load_baseline(args.baseline)
+            if baseline is not None and baseline.get('tree') != PerfRegressionSuite.TREE:
+                print(f"{args.baseline} was recorded on a different tree; run with --record to replace it")
+                return 2
+        results = PerfRegressionSuite.check(baseline, modes, args.repeat, tolerances, reference=reference)
+    except (ValueError, RuntimeError) as e:
+        print(e)
+        return 2
+    finally:
+        if reference:
+            os.remove(reference)
+    if args.record:
+        try:
+            baseline = PerfRegressionSuite.load_baseline(args.baseline)
+        except ValueError:
+            baseline = None
+        PerfRegressionSuite.save_baseline(args.baseline, baseline, {mode: summary for mode, (summary, _) in results.items()})
+        print(f"Recorded {', '.join(modes)} in {args.baseline}")
+        return 0
+    status = 0
+    print(f"{'mode':<10} {'metric':<15} {'expected':>12} {'current':>12} {'limit':>12}  result")
+    for mode, (summary, rows) in results.items():
+        if rows is None:
+            print(f"{mode:<10} " + (f"not measurable at {args.against}" if args.against else "no baseline recorded; run with --record"))
+            continue
+        for metric, base, current, limit, ok in rows:
+            if metric.endswith("_bytes"):
+                base, current, limit = (ExclusionAnalyzer.format_size(v) for v in (base, current, limit))
+            else:
+                base, current, limit = (f"{v:.2f}s" for v in (base, current, limit))
+            print(f"{mode:<10} {metric:<15} {base:>12} {current:>12} {limit:>12}  {'ok' if ok else 'REGRESSION'}")
+            if not ok:
+                status = 1
+    return status
+
+def run_cli(argv=None):
+    """Run a command line action; returns None when the GUI should start instead"""
+    parser = argparse.ArgumentParser(description="Project Backup Utility for Plum Cave")
+    parser.add_argument("--db", default="backup_projects.db", help="Path to the projects database")
+    subparsers = parser.add_subparsers(dest="command")
+    backup_parser = subparsers.add_parser("backup", help="Back up a project without the GUI")
+    backup_parser.add_argument("project_id", help="ID of the project to back up")
+    backup_parser.add_argument("--out", required=True, help="Archive path, destination folder, or - to stream a ZIP to stdout")
+    resume_parser = subparsers.add_parser("resume", help="Resume an interrupted backup from its checkpoint")
+    resume_parser.add_argument("checkpoint_id", nargs="?", help="Checkpoint ID (defaults to the most recent)")
+    backup_parser.add_argument("--zstd-level", type=int, default=12, help="Compression level for .tar.zst output")
+    for run_parser in (backup_parser, resume_parser):
+        run_parser.add_argument("--zip-level", type=int, default=BackupManager.ZIP_LEVEL,
+                                help="Deflate level for .zip output; give the same level when resuming")
+    backup_parser.add_argument("--mirror", action="append", metavar="PATH",
+                               help="Also write the archive to this file or folder, from the same pass (repeatable)")
+    backup_parser.add_argument("--prune", action="store_true", help="Apply the project's retention policy after a successful backup")
+    backup_parser.add_argument("--zstd-dict", action="store_true", help="Train and embed a zstd dictionary for .tar.zst output")
+    extract_parser = subparsers.add_parser("extract", help="Extract a single member from a backup archive")
+    extract_parser.add_argument("archive", help="Path to a .zip or .tar.zst backup")
+    extract_parser.add_argument("member", help="Member path inside the archive")
+    extract_parser.add_argument("--to", default=".", help="Destination folder")
+    list_parser = subparsers.add_parser("list", help="List the members of a backup archive from its directory or cached index")
+    list_parser.add_argument("archive", help="Path to a .zip or .tar.zst backup")
+    list_parser.add_argument("--search", default="", help="Only members whose path contains this text or matches this glob")
+    list_parser.add_argument("--limit", type=int, help="Print at most this many members")
+    restore_parser = subparsers.add_parser("restore", help="Extract a whole backup, applying delta chains")
+    restore_parser.add_argument("archive", help="Path to a .zip or .tar.zst backup")
+    restore_parser.add_argument("--to", required=True, help="Destination folder")
+    decrypt_parser = subparsers.add_parser("decrypt", help="Decrypt a file downloaded from Plum Cave, optionally restoring it")
+    decrypt_parser.add_argument("input", help="Encrypted file, or - for stdin")
+    decrypt_target = decrypt_parser.add_mutually_exclusive_group(required=True)
+    decrypt_target.add_argument("--out", help="Decrypted file, or - for stdout. Stdout output is unverified until the "
+                                              "command exits 0; use --restore-to to restore a backup")
+    decrypt_target.add_argument("--restore-to", help="Restore the decrypted ZIP backup into this folder")
+    decrypt_keys = decrypt_parser.add_argument_group("key material (files may hold raw bytes, hex or base64)")
+    decrypt_keys.add_argument("--file-key", help="The backup's 416-byte derived file key")
+    decrypt_keys.add_argument("--master-key", help="Master key, to derive the file key with Argon2id")
+    decrypt_keys.add_argument("--random-key", help="The backup's randomly generated file key")
+    decrypt_keys.add_argument("--file-salt", help="The backup's file salt")
+    decrypt_keys.add_argument("--record-key", help="Key a salted record was sealed with; the salt is read from the input")
+    decrypt_keys.add_argument("--iterations", type=int, help="Argon2id iterations")
+    decrypt_parser.add_argument("--no-padding", action="store_true", help="Salted record sealed without a padding block")
+    agent_parser = subparsers.add_parser("agent", help="Serve backups of local folders to a remote collector")
+    agent_parser.add_argument("--listen", default=f"127.0.0.1:{AgentProtocol.DEFAULT_PORT}", help="HOST:PORT to listen on")
+    agent_parser.add_argument("--root", required=True, help="Only folders below this path can be backed up")
+    agent_parser.add_argument("--token", default=os.environ.get(AgentProtocol.TOKEN_ENV),
+                              help=f"Shared secret collectors must present (default: ${AgentProtocol.TOKEN_ENV})")
+    agent_parser.add_argument("--nice", type=int, help="Increase the agent's niceness by this amount")
+    agent_parser.add_argument("--tls-cert", help="PEM certificate (chain) to serve TLS with; required unless --listen is a loopback address")
+    agent_parser.add_argument("--tls-key", help="PEM private key, if not in the --tls-cert file")
+    for run_parser in (backup_parser, resume_parser):
+        limits = run_parser.add_argument_group("resource limits")
+        limits.add_argument("--read-limit", type=parse_size, help="Maximum read rate, e.g. 20M per second")
+        limits.add_argument("--workers", type=int, help="Maximum compression workers")
+        limits.add_argument("--nice", type=int, help="Increase process niceness by this amount")
+        limits.add_argument("--ioprio", choices=sorted(ResourceGovernor.IOPRIO_CLASSES), help="Linux I/O scheduling class")
+        limits.add_argument("--ioprio-level", type=int, default=4, help="I/O priority level 0 (high) to 7 (low)")
+        limits.add_argument("--adaptive", action="store_true", help="Back off when load or read latency is high")
+        limits.add_argument("--load-threshold", type=float, default=1.0, help="1-minute load per CPU that triggers back-off")
+        limits.add_argument("--latency-ms", type=float, default=50.0, help="Average read latency that triggers back-off")
+        profiling = run_parser.add_argument_group("profiling")
+        profiling.add_argument("--profile", nargs="?", const="", metavar="PREFIX",
+                               help="Write a profile report (defaults to the archive path as prefix)")
+        profiling.add_argument("--profile-cprofile", action="store_true", help="Also run cProfile (with --profile)")
+        profiling.add_argument("--profile-memory", action="store_true", help="Also run tracemalloc (with --profile)")
+        deltas = run_parser.add_argument_group("delta encoding")
+        deltas.add_argument("--delta", action="store_true", help="Store large changed files as deltas against the previous backup")
+        deltas.add_argument("--delta-min-size", type=parse_size, default=DeltaEncoder.DEFAULT_OPTIONS['min_size'],
+                            help="Smallest file to delta-encode, e.g. 16M")
+        deltas.add_argument("--delta-max-chain", type=int, default=DeltaEncoder.DEFAULT_OPTIONS['max_chain'],
+                            help="Store a file whole once this many deltas depend on each other")
+        limits.add_argument("--scan-workers", type=int, default=ParallelTreeWalker.DEFAULT_WORKERS,
+                            help="Threads listing folders and stating files; raise for high-latency network shares")
+        pacing = run_parser.add_argument_group("adaptive compression")
+        pacing.add_argument("--deadline", type=parse_deadline,
+                            help="Finish within this time (90m, 2h30m) or by this clock time (06:00), lowering the level as needed")
+        pacing.add_argument("--target-rate", type=parse_size, help="Keep at least this many source bytes per second, e.g. 50M")
+    perf_parser = subparsers.add_parser("perf-check", help="Time each backup engine on a fixed tree and compare with the baseline")
+    perf_parser.add_argument("--baseline", default=PerfRegressionSuite.DEFAULT_BASELINE, help="Baseline JSON file")
+    perf_parser.add_argument("--mode", action="append", choices=PerfRegressionSuite.MODES,
+                             help="Engine to measure (repeatable; default all available)")
+    perf_parser.add_argument("--repeat", type=int, default=5, help="Trials per mode; each metric is the median")
+    perf_parser.add_argument("--tolerance", action="append", default=[], metavar="[METRIC=]FRACTION",
+                             help="Allowed growth, e.g. 0.3 for every metric or wall_seconds=0.4 (repeatable)")
+    perf_parser.add_argument("--record", action="store_true", help="Write the measurements to the baseline instead of checking")
+    perf_parser.add_argument("--against", metavar="REVISION",
+                             help="Compare with this git revision of the script (e.g. HEAD^) measured in the same run, not the baseline")
+    perf_run_parser = subparsers.add_parser("perf-run", help="Run a single perf-check trial and print its metrics")
+    perf_run_parser.add_argument("mode", choices=PerfRegressionSuite.MODES + (PerfRegressionSuite.CALIBRATION,))
+    perf_run_parser.add_argument("workdir", help="Empty scratch folder for the tree, catalog and archive")
+    perf_run_parser.add_argument("--prepare", action="store_true", help="Only build the tree and base backup the timed run starts from")
+    stream_bench_parser = subparsers.add_parser(
+        "stream-bench", help="Compare writing a backup then sending it with streaming it into a consumer")
+    stream_bench_parser.add_argument("project_id", help="ID of the project to back up")
+    stream_bench_parser.add_argument("--consumer-rate", type=parse_size, action="append",
+                                     help="Bytes per second the consumer drains, e.g. 5M (repeatable, default unlimited)")
+    format_bench_parser = subparsers.add_parser("format-bench", help="Compare a backup's time and size as .zip and .tar.zst")
+    format_bench_parser.add_argument("project_id", help="ID of the project to back up")
+    format_bench_parser.add_argument("--zip-level", type=int, action="append", help="Deflate level (repeatable, default 9)")
+    format_bench_parser.add_argument("--zstd-level", type=int, action="append", help="zstd level (repeatable, default 3, 12 and 19)")
+    subparsers.add_parser("checkpoints", help="List interrupted backups that can be resumed")
+    hash_parser = subparsers.add_parser(
+        "hash", help="Print content digests of files; over one chunk, sha256 and blake3 print a labelled tree digest")
+    hash_parser.add_argument("paths", nargs="+", help="Files to hash")
+    hash_bench_parser = subparsers.add_parser("hash-bench", help="Measure hashing throughput in GB/s")
+    hash_bench_parser.add_argument("--size", type=parse_size, default=256 * 1024 * 1024, help="Test file size, e.g. 1G")
+    hash_bench_parser.add_argument("--repeat", type=int, default=3, help="Runs per algorithm; the fastest is reported")
+    for hashing_parser in (hash_parser, hash_bench_parser):
+        hashing_parser.add_argument("--algorithm", action="append", choices=sorted(ContentHasher.ALGORITHMS),
+                                    help=f"Hash algorithm, repeatable for hash-bench (default: {ContentHasher.DEFAULT_ALGORITHM})")
+        hashing_parser.add_argument("--chunk-size", type=parse_size, default=ContentHasher.DEFAULT_CHUNK_SIZE,
+                                    help="Tree hashing chunk size, e.g. 4M")
+        hashing_parser.add_argument("--workers", type=int, help="Hashing threads (default: CPU count)")
+    hash_parser.add_argument("--chunks", action="store_true", help="Also print the digest of every chunk")
+    hash_parser.add_argument("--json", action="store_true", help="Print full results as JSON lines")
+    sparse_bench_parser = subparsers.add_parser("sparse-bench", help="Time archiving a sparse image with and without hole detection")
+    sparse_bench_parser.add_argument("--size", type=parse_size, action="append",
+                                     help="Image size, e.g. 4G (repeatable, default 1G and 8G)")
+    sparse_bench_parser.add_argument("--data", type=float, default=0.05, help="Fraction of the image holding data")
+    sparse_bench_parser.add_argument("--repeat", type=int, default=3, help="Runs per way; the fastest is reported")
+    walk_bench_parser = subparsers.add_parser("walk-bench", help="Compare the serial and parallel source scan of a folder")
+    walk_bench_parser.add_argument("path", help="Folder to scan")
+    walk_bench_parser.add_argument("--workers", type=int, default=ParallelTreeWalker.DEFAULT_WORKERS,
+                                   help="Threads for the parallel walk")
+    walk_bench_parser.add_argument("--latency-ms", type=float, action="append",
+                                   help="Delay added to every listing and stat to simulate a network share (repeatable, default 0 and 2)")
+    git_parser = subparsers.add_parser("git-mode", help="Show or set how a project's git repository is backed up")
+    git_parser.add_argument("project_id", help="ID of the project")
+    git_parser.add_argument("mode", nargs="?", choices=GitSource.MODES,
+                            help="New mode; raw also copies .git, where exclusions apply but attribute rules don't")
+    rules_parser = subparsers.add_parser("rules", help="Show or set a project's attribute-based exclusion rules")
+    rules_parser.add_argument("project_id", help="ID of the project")
+    rules_parser.add_argument("--max-size", type=parse_size, help="Skip files larger than this, e.g. 500M")
+    rules_parser.add_argument("--older-than", type=float, metavar="DAYS", help="Skip files last modified more than DAYS ago")
+    rules_parser.add_argument("--newer-than", type=float, metavar="DAYS", help="Skip files modified within the last DAYS")
+    rules_parser.add_argument("--ext", action="append", metavar="EXT", help="Skip files with this extension (repeatable)")
+    rules_parser.add_argument("--type", action="append", choices=ExclusionRules.TYPES, dest="types",
+                              help="Skip files detected as this type from their first bytes (repeatable)")
+    rules_parser.add_argument("--clear", action="store_true", help="Remove all rules before applying the others")
+    discover_parser = subparsers.add_parser("discover", help="Register every git, Node or Python project under a folder")
+    discover_parser.add_argument("parent", help="Folder to search")
+    discover_parser.add_argument("--max-depth", type=int, default=4, help="Folder levels to search below the parent")
+    discover_parser.add_argument("--dry-run", action="store_true", help="List what would be registered without saving")
+    export_parser = subparsers.add_parser("export-projects", help="Write all projects and their settings as JSON")
+    export_parser.add_argument("output", help="JSON file to write, or - for stdout")
+    import_parser = subparsers.add_parser("import-projects", help="Load projects from a JSON export")
+    import_parser.add_argument("input", help="JSON file to read, or - for stdin")
+    import_parser.add_argument("--new-ids", action="store_true",
+                               help="Add every project under a new ID instead of replacing projects with the same ID")
+    mirrors_parser = subparsers.add_parser("mirrors", help="Show or set the extra destinations every backup of a project goes to")
+    mirrors_parser.add_argument("project_id", help="ID of the project")
+    mirrors_parser.add_argument("paths", nargs="*", help="Files or folders that receive a copy of each archive")
+    mirrors_parser.add_argument("--clear", action="store_true", help="Remove all mirror destinations")
+    retention_parser = subparsers.add_parser("retention", help="Show or set how many of a project's backups are kept")
+    retention_parser.add_argument("project_id", help="ID of the project")
+    retention_parser.add_argument("--keep-last", type=int, metavar="N", help="Keep the N newest backups")
+    retention_parser.add_argument("--keep-daily", type=int, metavar="N", help="Keep the newest backup of each of the last N days with backups")
+    retention_parser.add_argument("--keep-weekly", type=int, metavar="N", help="Keep the newest backup of each of the last N weeks with backups")
+    retention_parser.add_argument("--keep-monthly", type=int, metavar="N", help="Keep the newest backup of each of the last N months with backups")
+    retention_parser.add_argument("--max-size", type=parse_size, help="Total size the kept archives may take, e.g. 50G")
+    retention_parser.add_argument("--clear", action="store_true", help="Remove the policy before applying the other options")
+    prune_parser = subparsers.add_parser("prune", help="Delete backups the project's retention policy no longer keeps")
+    prune_parser.add_argument("project_id", help="ID of the project")
+    prune_parser.add_argument("--dry-run", action="store_true", help="Show what would be deleted and the space reclaimed")
+    dry_run_parser = subparsers.add_parser("dry-run", help="Estimate a backup and the savings of each exclusion rule")
+    dry_run_parser.add_argument("project_id", help="ID of the project to analyze")
+    dry_run_parser.add_argument("--top", type=int, default=10, help="Number of largest folders and files to list")
+    args = parser.parse_args(argv)
+    if args.command is None:
+        return None
+    if args.command == "backup" and args.out == "-" and args.prune:
+        # The streamed archive isn't kept on disk, so pruning after it could remove the last local copies
+        backup_parser.error("--prune cannot be combined with --out -; prune separately with the prune command")
+    if args.command == "agent":
+        host, _, port = args.listen.rpartition(":")
+        try:
+            agent = BackupAgent(host or "127.0.0.1", int(port), args.root, args.token, args.tls_cert, args.tls_key)
+        except ValueError as e:
+            print(e)
+            return 2
+        ResourceGovernor(nice=args.nice).apply_process_priority()
+        try:
+            agent.serve_forever()
+        except KeyboardInterrupt:
+            agent.shutdown()
+        return 0
+    if args.command == "hash":
+        try:
+            hasher = ContentHasher(args.algorithm[-1] if args.algorithm else ContentHasher.DEFAULT_ALGORITHM,
+                                   chunk_size=args.chunk_size, workers=args.workers)
+        except ValueError as e:
+            print(e)
+            return 2
+        status = 0
+        with hasher:
+            for path in args.paths:
+                try:
+                    result = hasher.hash_file(path)
+                except OSError as e:
+                    print(f"{path}: {e}", file=sys.stderr)
+                    status = 1
+                    continue
+                if args.json:
+                    print(json.dumps(dict(result, path=path)))
+                    continue
+                if result['tree']:
+                    # Tagged so nothing takes it for the output of sha256sum or b3sum
+                    print(f"{ContentHasher.label(result)}:{result['digest']}  {path}")
+                else:
+                    print(f"{result['digest']}  {path}")
+                if args.chunks:
+                    for index, chunk_digest in enumerate(result['chunks']):
+                        print(f"  {index:>6}  {chunk_digest}")
+        return status
+    if args.command == "hash-bench":
+        missing = [name for name in args.algorithm or () if ContentHasher.ALGORITHMS[name] is None]
+        if missing:
+            print(f"Not available: {', '.join(missing)}")
+            return 2
+        results = ContentHasher.benchmark(args.size, args.algorithm, chunk_size=args.chunk_size,
+                                          workers=args.workers, repeat=args.repeat)
+        print(f"{'algorithm':<10} {'single GB/s':>12} {'tree GB/s':>10}  workers")
+        for row in results:
+            print(f"{row['algorithm']:<10} {row['single']:>12.2f} {row['tree']:>10.2f}  {row['workers']}")
+        unavailable = [name for name, factory in ContentHasher.ALGORITHMS.items() if factory is None]
+        if unavailable and not args.algorithm:
+            print(f"Not available: {', '.join(unavailable)}")
+        return 0
+    if args.command == "sparse-bench":
+        print(f"{'size':>8} {'data':>9} {'plain s':>8} {'sparse s':>9} {'plain read':>11} {'sparse read':>12} {'speedup':>8}")
+        for size in args.size or (1024 ** 3, 8 * 1024 ** 3):
+            row = benchmark_sparse(size, args.data, args.repeat)
+            print(f"{ExclusionAnalyzer.format_size(row['size']):>8} {ExclusionAnalyzer.format_size(row['allocated']):>9} "
+                  f"{row['plain_seconds']:>8.2f} {row['sparse_seconds']:>9.2f} "
+                  f"{ExclusionAnalyzer.format_size(row['plain_bytes_read']):>11} "
+                  f"{ExclusionAnalyzer.format_size(row['sparse_bytes_read']):>12} "
+                  f"{row['plain_seconds'] / max(row['sparse_seconds'], 1e-9):>7.1f}x")
+        return 0
+    if args.command == "walk-bench":
+        print(f"{'latency ms':>10} {'files':>8} {'serial s':>9} {'parallel s':>10} {'speedup':>8}  workers")
+        for latency_ms in args.latency_ms or (0.0, 2.0):
+            row = ParallelTreeWalker.benchmark(args.path, args.workers, latency_ms / 1000)
+            if not row['same_files']:
+                print("Parallel walk found different files than os.walk")
+                return 1
+            print(f"{row['latency_ms']:>10.1f} {row['files']:>8} {row['serial_seconds']:>9.2f} "
+                  f"{row['parallel_seconds']:>10.2f} {row['speedup']:>7.1f}x  {row['workers']}")
+        return 0
+    if args.command == "perf-run":
+        if args.prepare:
+            PerfRegressionSuite.prepare_trial(args.mode, args.workdir)
+            return 0
+        metrics = PerfRegressionSuite.run_trial(args.mode, args.workdir)
+        print(PerfRegressionSuite.RESULT_PREFIX + json.dumps(metrics))
+        return 0
+    if args.command == "perf-check":
+        return run_perf_check(args)
+    if args.command == "decrypt":
+        return run_decrypt(args)
+    if args.command == "list":
+        started = time.perf_counter()
+        try:
+            index = ArchiveIndex.load(args.archive)
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print(f"Cannot read {args.archive}: {e}")
+            return 1
+        loaded = time.perf_counter() - started
+        positions, total = index.search(args.search, args.limit)
+        for i in positions:
+            modified = datetime.datetime.fromtimestamp(index.modified(i)).strftime("%Y-%m-%d %H:%M")
+            print(f"{index.fields['size'][i]:>12} {modified}  {index.names[i]}")
+        print(f"{total} of {len(index)} members; listing read from {index.source} in {loaded:.3f}s")
+        return 0
+    if args.command in ("extract", "restore"):
+        # The catalog is only needed to find base archives that were moved
+        catalog = Database(args.db) if os.path.exists(args.db) else None
+        try:
+            restorer = DeltaRestorer(catalog)
+            if args.command == "restore":
+                count = restorer.restore(args.archive, args.to)
+                print(f"Restored {count} files to {args.to}")
+            else:
+                target = restorer.extract(args.archive, args.member, args.to)
+                print(f"Extracted {target}")
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"Cannot {args.command} {args.archive}: {e}")
+            return 1
+        finally:
+            if catalog is not None:
+                catalog.close()
+        return 0
+    db = Database(args.db)
+    try:
+        manager = BackupManager(db)
+        if args.command in ("backup", "resume"):
+            manager.resource_limits = {
+                'read_rate': args.read_limit,
+                'workers': args.workers,
+                'nice': args.nice,
+                'ioprio_class': args.ioprio,
+                'ioprio_level': args.ioprio_level,
+                'adaptive': args.adaptive,
+                'load_threshold': args.load_threshold,
+                'latency_threshold_ms': args.latency_ms
+            }
+            if args.profile is not None:
+                manager.profile_options = {
+                    'enabled': True,
+                    'cprofile': args.profile_cprofile,
+                    'tracemalloc': args.profile_memory,
+                    'report_prefix': args.profile or None
+                }
+            manager.scan_workers = args.scan_workers
+            if args.deadline is not None or args.target_rate is not None:
+                manager.pace_options = {'deadline': args.deadline, 'target_rate': args.target_rate}
+            if args.delta:
+                manager.delta_options = {
+                    'enabled': True,
+                    'min_size': args.delta_min_size,
+                    'max_chain': args.delta_max_chain
+                }
+        if args.command in ("backup", "resume"):
+            manager.archive_options = {'zip_level': args.zip_level}
+        if args.command == "backup":
+            manager.archive_options.update(zstd_level=args.zstd_level, zstd_dictionary=args.zstd_dict)
+        if args.command == "git-mode":
+            project = db.get_project(args.project_id)
+            if not project:
+                print("Project not found")
+                return 1
+            if args.mode:
+                db.set_project_option(args.project_id, 'git_mode', None if args.mode == "walk" else args.mode)
+            print(args.mode or project['options'].get('git_mode', "walk"))
+            return 0
+        if args.command == "rules":
+            project = db.get_project(args.project_id)
+            if not project:
+                print("Project not found")
+                return 1
+            config = {} if args.clear else dict(project['options'].get('exclusion_rules') or {})
+            updates = {
+                'max_size': args.max_size,
+                'older_than_days': args.older_than,
+                'newer_than_days': args.newer_than,
+                'extensions': args.ext,
+                'types': args.types
+            }
+            config.update({key: value for key, value in updates.items() if value is not None})
+            if args.clear or any(value is not None for value in updates.values()):
+                ExclusionRules(config)
+                db.set_project_option(args.project_id, 'exclusion_rules', config or None)
+            for line in ExclusionRules(config).describe() or ["no rules"]:
+                print(line)
+            return 0
+        if args.command == "discover":
+            discovery = ProjectDiscovery(max_depth=args.max_depth)
+            candidates = discovery.find(args.parent)
+            for candidate in candidates:
+                excluded = ", ".join(candidate['folder_exclusions']) or "-"
+                print(f"{candidate['folder_path']}  [{candidate['description']}]  excludes: {excluded}")
+            if args.dry_run:
+                print(f"{len(candidates)} projects found")
+                return 0
+            added, skipped = discovery.register(db, candidates)
+            print(f"Registered {len(added)} projects ({skipped} already registered)")
+            return 0
+        if args.command == "export-projects":
+            if args.output == "-":
+                count = ProjectDiscovery.export_json(db, sys.stdout)
+            else:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    count = ProjectDiscovery.export_json(db, f)
+            print(f"Exported {count} projects", file=sys.stderr)
+            return 0
+        if args.command == "import-projects":
+            try:
+                if args.input == "-":
+                    project_ids = ProjectDiscovery.import_json(db, sys.stdin, keep_ids=not args.new_ids)
+                else:
+                    with open(args.input, encoding='utf-8') as f:
+                        project_ids = ProjectDiscovery.import_json(db, f, keep_ids=not args.new_ids)
+            except (OSError, ValueError) as e:
+                print(f"Import failed: {e}")
+                return 1
+            print(f"Imported {len(project_ids)} projects")
+            return 0
+        if args.command == "mirrors":
+            project = db.get_project(args.project_id)
+            if not project:
+                print("Project not found")
+                return 1
+            mirrors = project['options'].get('mirrors') or []
+            if args.clear or args.paths:
+                mirrors = [os.path.abspath(path) for path in args.paths]
+                db.set_project_option(args.project_id, 'mirrors', mirrors or None)
+            for mirror in mirrors or ["no mirrors"]:
+                print(mirror)
+            return 0
+        if args.command == "retention":
+            project = db.get_project(args.project_id)
+            if not project:
+                print("Project not found")
+                return 1
+            config = {} if args.clear else dict(project['options'].get('retention') or {})
+            updates = {
+                'keep_last': args.keep_last,
+                'keep_daily': args.keep_daily,
+                'keep_weekly': args.keep_weekly,
+                'keep_monthly': args.keep_monthly,
+                'max_bytes': args.max_size
+            }
+            config.update({key: value for key, value in updates.items() if value is not None})
+            try:
+                policy = RetentionPolicy(config)
+            except ValueError as e:
+                print(e)
+                return 1
+            if args.clear or any(value is not None for value in updates.values()):
+                db.set_project_option(args.project_id, 'retention', policy.config or None)
+            for line in policy.describe() or ["keep everything"]:
+                print(line)
+            return 0
+        if args.command == "prune":
+            try:
+                plan, reclaimed = manager.prune_backups(args.project_id, dry_run=args.dry_run)
+            except ValueError as e:
+                print(e)
+                return 1
+            for backup, keep, reason in plan:
+                size = ExclusionAnalyzer.format_size(backup['archive_bytes'] or 0)
+                action = "missing" if reason == "archive missing" else "keep" if keep else "delete"
+                print(f"{action:<7}  {backup['id']}  {(backup['finished_at'] or '')[:19]}  "
+                      f"{size:>10}  {reason:<22}  {backup['archive_path']}")
+            verb = "Would reclaim" if args.dry_run else "Reclaimed"
+            print(f"{verb} {ExclusionAnalyzer.format_size(reclaimed)} from {sum(not keep for _, keep, _ in plan)} backups")
+            return 0
+        if args.command == "stream-bench":
+            print(f"{'consumer':>12} {'archive MB':>11} {'file+send s':>12} {'stream s':>9} {'saved s':>8}")
+            for rate in args.consumer_rate or (None,):
+                try:
+                    row = manager.benchmark_streaming(args.project_id, rate)
+                except RuntimeError as e:
+                    print(e)
+                    return 1
+                consumer = f"{rate / 1024 / 1024:.1f} MB/s" if rate else "unlimited"
+                print(f"{consumer:>12} {row['stream_bytes'] / 1024 / 1024:>11.2f} {row['file_seconds']:>12.2f} "
+                      f"{row['stream_seconds']:>9.2f} {row['saved_seconds']:>8.2f}")
+            return 0
+        if args.command == "format-bench":
+            if zstandard is None:
+                print("zstandard is not installed, timing ZIP only (pip install zstandard)")
+            print(f"{'format':>8} {'level':>6} {'archive MB':>11} {'seconds':>8}")
+            try:
+                rows = manager.benchmark_formats(args.project_id, args.zip_level or (9,), args.zstd_level or (3, 12, 19))
+            except RuntimeError as e:
+                print(e)
+                return 1
+            for row in rows:
+                print(f"{row['format']:>8} {row['level']:>6} {row['archive_bytes'] / 1024 / 1024:>11.2f} {row['seconds']:>8.2f}")
+            return 0
+        if args.command == "checkpoints":
+            for checkpoint in db.get_incomplete_checkpoints():
+                print(f"{checkpoint['id']}  {checkpoint['status']:<11}  {checkpoint['updated_at'][:19]}  {checkpoint['dest_file']}")
+            return 0
+        if args.command == "dry-run":
+            project = db.get_project(args.project_id)
+            if not project:
+                print("Project not found")
+                return 1
+            analyzer = ExclusionAnalyzer()
+            report = analyzer.analyze(
+                analyzer.scan(project['folder_path']),
+                project['file_exclusions'],
+                project['folder_exclusions'],
+                top_n=args.top,
+                exclusion_rules=project['options'].get('exclusion_rules')
+            )
+            print(analyzer.format_report(report))
+            print(f"\nScanned in {report['scan_seconds']:.2f} s")
+            return 0
+        if args.command == "backup" and args.out == "-":
+            if sys.stdout.isatty():
+                print("Refusing to write a ZIP archive to a terminal; pipe or redirect stdout")
+                return 1
+            # stdout carries the archive, so all messages go to stderr
+            output_stream = sys.stdout.buffer
+            with contextlib.redirect_stdout(sys.stderr):
+                success, message = manager.create_backup(args.project_id, save_path="-", output_stream=output_stream)
+                print(message)
+            return 0 if success else 1
+        if args.command == "backup":
+            success, message = manager.create_backup(args.project_id, save_path=args.out, mirrors=args.mirror)
+        else:
+            success, message = manager.resume_backup(args.checkpoint_id)
+        print(message)
+        if success and args.command == "backup" and args.prune:
+            plan, reclaimed = manager.prune_backups(args.project_id)
+            print(f"Pruned {sum(not keep for _, keep, _ in plan)} backups, reclaimed {ExclusionAnalyzer.format_size(reclaimed)}")
+        return 0 if success else 1
+    finally:
+        db.close()
+
 if __name__ == "__main__":
+    # Command line actions run headless; with no arguments start the GUI
+    exit_code = run_cli() if len(sys.argv) > 1 else None
+    if exit_code is not None:
+        sys.exit(exit_code)
     # Create root window
     root = tk.Tk()
     # Create application
@@ -0,0 +1,35 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "project-backup-utility.py")
+
+
+def _load_module():
+    spec = importlib.util.spec_from_file_location("project_backup_utility", MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def pbu():
+    """The utility script, imported as a module"""
+    return sys.modules.get("project_backup_utility") or _load_module()
+
+
+@pytest.fixture
+def zstandard():
+    """The optional zstandard package behind the tar.zst format"""
+    try:
+        import zstandard
+    except ImportError:
+        message = "zstandard is not installed; pip install -r requirements-test.txt"
+        # CI must exercise the format, a local run without the package may skip
+        if os.environ.get("CI") or os.environ.get("PBU_REQUIRE_ZSTD"):
+            pytest.fail(message)
+        pytest.skip(message)
+    return zstandard
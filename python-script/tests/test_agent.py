@@ -0,0 +1,151 @@
+import shutil
+import subprocess
+import threading
+import time
+import zipfile
+
+import pytest
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / "served"
+    (root / "src" / "pkg").mkdir(parents=True)
+    (root / "src" / "main.py").write_text("print('hello')\n")
+    (root / "src" / "pkg" / "util.py").write_text("VALUE = 1\n" * 50)
+    return root
+
+
+@pytest.fixture
+def certificate(tmp_path):
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is not installed")
+    cert, key = tmp_path / "agent.pem", tmp_path / "agent.key"
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+                    "-addext", "subjectAltName=DNS:localhost", "-keyout", str(key), "-out", str(cert)],
+                   check=True, capture_output=True)
+    return str(cert), str(key)
+
+
+def start(agent):
+    thread = threading.Thread(target=agent.serve_forever, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while agent._server is None or agent.port == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return agent
+
+
+def test_refuses_cleartext_on_non_loopback_addresses(pbu, source):
+    with pytest.raises(ValueError, match="without TLS"):
+        pbu.BackupAgent("0.0.0.0", 0, str(source), "secret")
+    with pytest.raises(ValueError, match="without TLS"):
+        pbu.BackupAgent("", 0, str(source), "secret")
+    pbu.BackupAgent("127.0.0.1", 0, str(source), "secret")
+    pbu.BackupAgent("localhost", 0, str(source), "secret")
+
+
+def test_tls_agent_serves_backups_and_scans(pbu, source, certificate, tmp_path, monkeypatch):
+    cert, key = certificate
+    agent = start(pbu.BackupAgent("127.0.0.1", 0, str(source), "secret", cert, key))
+    try:
+        monkeypatch.setenv(pbu.AgentProtocol.CAFILE_ENV, cert)
+        url = f"agent+tls://secret@localhost:{agent.port}{source / 'src'}"
+        scan = pbu.RemoteAgentClient.from_url(url).scan()
+        assert scan['files'] == {"main.py": 15, "pkg/util.py": 500}
+        db = pbu.Database(str(tmp_path / "catalog.db"))
+        try:
+            project_id = db.add_project("remote", url)
+            ok, message = pbu.BackupManager(db).create_backup(project_id, str(tmp_path / "remote.zip"))
+        finally:
+            db.close()
+        assert ok, message
+        with zipfile.ZipFile(tmp_path / "remote.zip") as zipf:
+            assert zipf.read("pkg/util.py") == b"VALUE = 1\n" * 50
+        # A cleartext collector never gets as far as sending its token
+        with pytest.raises((ConnectionError, OSError, ValueError)):
+            pbu.RemoteAgentClient.from_url(url.replace("agent+tls://", "agent://")).scan()
+    finally:
+        agent.shutdown()
+
+
+def test_dry_run_and_tree_listing_of_agent_project(pbu, source, tmp_path, capsys):
+    agent = start(pbu.BackupAgent("127.0.0.1", 0, str(source), "secret"))
+    try:
+        url = f"agent://secret@127.0.0.1:{agent.port}{source / 'src'}"
+        db_path = str(tmp_path / "catalog.db")
+        db = pbu.Database(db_path)
+        project_id = db.add_project("remote", url)
+        db.close()
+        assert pbu.run_cli(["--db", db_path, "dry-run", project_id]) == 0
+        assert "2 files" in capsys.readouterr().out.replace(",", "")
+        scan = pbu.ExclusionAnalyzer().scan(url)
+    finally:
+        agent.shutdown()
+    assert sorted(pbu.ExclusionAnalyzer.list_scanned(scan, "")) == [("main.py", False, 15), ("pkg", True, None)]
+    assert pbu.ExclusionAnalyzer.list_scanned(scan, "pkg") == [("util.py", False, 500)]
+
+
+class Unseekable:
+    """Write-only stream, like a pipe"""
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data.extend(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+@pytest.mark.parametrize("seekable", [True, False])
+@pytest.mark.parametrize("zip64", [False, True])
+def test_stream_into_seekable_and_unseekable_outputs(pbu, source, tmp_path, monkeypatch, seekable, zip64):
+    if zip64:
+        # Every member then gets ZIP64 headers and, when streamed, 64-bit data descriptors
+        monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 64)
+    agent = start(pbu.BackupAgent("127.0.0.1", 0, str(source), "secret"))
+    try:
+        client = pbu.RemoteAgentClient.from_url(f"agent://secret@127.0.0.1:{agent.port}{source / 'src'}")
+        out = tmp_path / "out.zip"
+        stream = open(out, 'wb') if seekable else Unseekable()
+        counts = {}
+        with zipfile.ZipFile(stream, 'w') as zipf:
+            members = [info.filename for _, info in client.stream_into(zipf, {}, counts) if info is not None]
+        if seekable:
+            stream.close()
+        else:
+            out.write_bytes(stream.data)
+    finally:
+        agent.shutdown()
+    assert sorted(members) == ["main.py", "pkg/util.py"]
+    assert counts['source_bytes'] == 515
+    with zipfile.ZipFile(out) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.read("pkg/util.py") == b"VALUE = 1\n" * 50
+        for info in zipf.infolist():
+            assert bool(info.flag_bits & pbu.RemoteAgentClient.DATA_DESCRIPTOR_FLAG) == (not seekable)
+
+
+def test_agent_does_not_follow_links_out_of_its_root(pbu, source, tmp_path):
+    secret = tmp_path / "secret.txt"
+    secret.write_text("not served\n")
+    (source / "src" / "leak.txt").symlink_to(secret)
+    (source / "src" / "alias.py").symlink_to(source / "src" / "main.py")
+    agent = start(pbu.BackupAgent("127.0.0.1", 0, str(source), "secret"))
+    try:
+        db = pbu.Database(str(tmp_path / "catalog.db"))
+        try:
+            project_id = db.add_project("remote", f"agent://secret@127.0.0.1:{agent.port}{source / 'src'}")
+            ok, message = pbu.BackupManager(db).create_backup(project_id, str(tmp_path / "remote.zip"))
+        finally:
+            db.close()
+    finally:
+        agent.shutdown()
+    assert ok, message
+    with zipfile.ZipFile(tmp_path / "remote.zip") as zipf:
+        names = set(zipf.namelist())
+        assert "leak.txt" not in names
+        assert zipf.read("alias.py") == b"print('hello')\n"
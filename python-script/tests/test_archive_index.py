@@ -0,0 +1,122 @@
+import collections
+import os
+import time
+import zipfile
+
+import pytest
+
+
+@pytest.fixture
+def index_cls(pbu, tmp_path, monkeypatch):
+    cls = pbu.ArchiveIndex
+    monkeypatch.setattr(cls, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cls, "_memory", collections.OrderedDict())
+    return cls
+
+
+def write_zip(path, members, mode='w'):
+    with zipfile.ZipFile(path, mode, zipfile.ZIP_DEFLATED) as zipf:
+        for name, data in members.items():
+            info = zipfile.ZipInfo(name, (2024, 5, 17, 12, 30, 10))
+            info.external_attr = 0o100640 << 16
+            info.compress_type = zipfile.ZIP_STORED if name.endswith(".bin") else zipfile.ZIP_DEFLATED
+            zipf.writestr(info, data)
+
+
+def read_all(index, name):
+    reader, size = index.open_member(name)
+    with reader:
+        data = reader.read(size)
+    assert len(data) == size
+    return data
+
+
+def check_against_zipfile(index, path):
+    with zipfile.ZipFile(path) as zipf:
+        infos = zipf.infolist()
+        assert list(index) == [info.filename for info in infos]
+        for i, info in enumerate(infos):
+            assert index.fields['size'][i] == info.file_size
+            assert index.fields['packed'][i] == info.compress_size
+            assert index.fields['crc'][i] == info.CRC
+            assert index.fields['method'][i] == info.compress_type
+            assert index.fields['offset'][i] == info.header_offset - index.concat
+            assert index[info.filename][1] == 0o640
+            assert read_all(index, info.filename) == zipf.read(info)
+
+
+MEMBERS = {
+    "src/main.py": b"print('hello')\n" * 200,
+    "assets/blob.bin": os.urandom(3000),
+    "docs/ünïcode.md": "naïve text\n".encode() * 50,
+    "empty.txt": b"",
+}
+
+
+def test_central_directory_matches_zipfile(index_cls, tmp_path):
+    path = tmp_path / "plain.zip"
+    write_zip(path, MEMBERS)
+    index = index_cls.load(str(path))
+    assert index.format == "zip" and index.concat == 0
+    check_against_zipfile(index, path)
+    mtime, _ = index["src/main.py"]
+    assert mtime == pytest.approx(time.mktime((2024, 5, 17, 12, 30, 10, 0, 0, -1)))
+    assert index.search("*.md")[1] == 1
+    with pytest.raises(KeyError):
+        index.open_member("missing")
+
+
+def test_zip64_extra_fields(index_cls, tmp_path, monkeypatch):
+    # A low limit makes zipfile write ZIP64 extras and end records, as for archives over 4 GB.
+    # Early members overflow only their sizes, later ones only their offsets.
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1024)
+    path = tmp_path / "zip64.zip"
+    write_zip(path, dict(MEMBERS, **{f"late{i}.txt": b"x" * 10 for i in range(3)}))
+    with open(path, 'rb') as f:
+        assert zipfile.stringEndArchive64 in f.read()
+    index = index_cls.load(str(path))
+    assert len(index) == len(MEMBERS) + 3
+    check_against_zipfile(index, path)
+
+
+def test_prepended_data_shifts_offsets(index_cls, tmp_path):
+    plain = tmp_path / "plain.zip"
+    write_zip(plain, MEMBERS)
+    stub = b"#!/bin/sh\nexec unzip \"$0\"\n" + bytes(100)
+    path = tmp_path / "sfx.zip"
+    path.write_bytes(stub + plain.read_bytes())
+    index = index_cls.load(str(path))
+    assert index.concat == len(stub)
+    check_against_zipfile(index, path)
+
+
+def test_disk_cache_is_invalidated_by_size_and_mtime(index_cls, tmp_path, monkeypatch):
+    monkeypatch.setattr(index_cls, "DISK_CACHE_MIN_MEMBERS", 1)
+    path = tmp_path / "cached.zip"
+    write_zip(path, MEMBERS)
+
+    def reload():
+        index_cls._memory.clear()
+        return index_cls.load(str(path))
+
+    assert index_cls.load(str(path)).source == 'archive'
+    assert index_cls.load(str(path)).source == 'memory'
+    cached = reload()
+    assert cached.source == 'disk'
+    check_against_zipfile(cached, path)
+    # Same size, new mtime
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+    assert reload().source == 'archive'
+    assert reload().source == 'disk'
+    # New size
+    write_zip(path, {"added.txt": b"new"}, mode='a')
+    index = reload()
+    assert index.source == 'archive'
+    assert "added.txt" in index
+    # A damaged cache file is ignored and the listing parsed again
+    cache_path = index_cls._cache_path(os.path.abspath(path))
+    data = open(cache_path, 'rb').read()
+    with open(cache_path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    assert reload().source == 'archive'
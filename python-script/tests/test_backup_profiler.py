@@ -0,0 +1,88 @@
+import io
+import json
+import time
+import types
+
+import pytest
+
+
+def test_timed_iter_charges_production_time(pbu):
+    profiler = pbu.BackupProfiler()
+
+    def slow():
+        for item in range(3):
+            time.sleep(0.01)
+            yield item
+
+    assert list(profiler.timed_iter(slow(), 'scan')) == [0, 1, 2]
+    assert profiler.times['scan'] >= 0.03
+    # Time spent by the consumer between items is not charged
+    for _ in profiler.timed_iter(range(2), 'exclude'):
+        time.sleep(0.02)
+    assert profiler.times['exclude'] < 0.02
+
+
+def test_timed_file_charges_writes(pbu):
+    profiler = pbu.BackupProfiler()
+    out = io.BytesIO()
+    timed = pbu.TimedFile(out, profiler)
+    assert timed.write(b"abc") == 3
+    assert timed.tell() == 3
+    assert profiler.times['write'] > 0
+    assert out.getvalue() == b"abc"
+
+
+def test_phase_summary_derives_compress_time(pbu):
+    profiler = pbu.BackupProfiler()
+    profiler.add('member', 5.0)
+    profiler.add('write', 1.0)
+    profiler.add('scan', 0.5)
+    profiler.wall_seconds = 8.0
+    governor = types.SimpleNamespace(read_seconds=1.5, sleep_seconds=0.5)
+    phases = profiler.phase_summary(governor)
+    assert phases['compress'] == pytest.approx(2.0)
+    assert phases['throttled'] == 0.5
+    assert phases['other'] == pytest.approx(8.0 - (0.5 + 1.5 + 2.0 + 1.0 + 0.5))
+    # Reads and writes that exceed the member time never make compression negative
+    profiler.add('write', 10.0)
+    assert profiler.phase_summary(governor)['compress'] == 0.0
+
+
+def test_enabled_profiler_writes_every_report(pbu, tmp_path):
+    profiler = pbu.BackupProfiler(enabled=True, cprofile=True, tracemalloc=True, sample_interval=0.001)
+    profiler.start()
+    deadline = time.perf_counter() + 0.05
+    blocks = []
+    while time.perf_counter() < deadline:
+        blocks.append(bytes(1024))
+    profiler.stop()
+    assert profiler.wall_seconds >= 0.05
+    assert profiler.tracemalloc_peak > 0
+    assert sum(profiler.stacks.values()) > 0
+    prefix = str(tmp_path / "run")
+    written = profiler.write_report(prefix, extra={'files_added': 3})
+    assert written == [prefix + suffix for suffix in (".profile.json", ".collapsed", ".pstats", ".profile.txt")]
+    report = json.loads((tmp_path / "run.profile.json").read_text())
+    assert report['files_added'] == 3
+    assert report['stack_samples'] == sum(profiler.stacks.values())
+    assert set(pbu.BackupProfiler.PHASES) <= set(report['phases'])
+    first = (tmp_path / "run.collapsed").read_text().splitlines()[0]
+    assert int(first.rsplit(" ", 1)[1]) >= 1
+
+
+def test_backup_writes_profile_report(pbu, tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    for i in range(3):
+        (src / f"f{i}.txt").write_text("profile me\n" * 100)
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    project_id = db.add_project("src", str(src))
+    manager = pbu.BackupManager(db)
+    manager.profile_options = {'enabled': True, 'report_prefix': str(tmp_path / "backup")}
+    ok, message = manager.create_backup(project_id, str(tmp_path / "out.zip"))
+    db.close()
+    assert ok, message
+    report = json.loads((tmp_path / "backup.profile.json").read_text())
+    assert report['files_added'] == 3
+    assert report['archive_bytes'] == (tmp_path / "out.zip").stat().st_size
+    assert report['phases']['write'] > 0
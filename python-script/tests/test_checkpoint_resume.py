@@ -0,0 +1,91 @@
+import io
+import struct
+import zipfile
+import zlib
+
+import pytest
+
+
+@pytest.fixture
+def project(pbu, tmp_path):
+    src = tmp_path / "src"
+    (src / "pkg").mkdir(parents=True)
+    for i in range(8):
+        (src / "pkg" / f"mod{i}.py").write_text(f"VALUE = {i}\n" * 600)
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    project_id = db.add_project("src", str(src))
+    yield db, project_id, src
+    db.close()
+
+
+def local_extra(archive, info):
+    with open(archive, 'rb') as f:
+        f.seek(info.header_offset)
+        header = struct.unpack(zipfile.structFileHeader, f.read(zipfile.sizeFileHeader))
+        f.seek(header[zipfile._FH_FILENAME_LENGTH], 1)
+        return f.read(header[zipfile._FH_EXTRA_FIELD_LENGTH])
+
+
+def test_resume_after_interrupt_writes_each_member_once(pbu, project, tmp_path, monkeypatch):
+    db, project_id, src = project
+    # Every member gets a ZIP64 local header, as files over 4 GB would
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1024)
+    monkeypatch.setattr(pbu.BackupManager, "CHECKPOINT_EVERY_MEMBERS", 1)
+    manager = pbu.BackupManager(db, archive_options={'zip_level': 1})
+    write_member = manager._write_member
+    written = []
+
+    def interrupted(*args, **kwargs):
+        if len(written) == 5:
+            raise KeyboardInterrupt
+        written.append(args[2])
+        return write_member(*args, **kwargs)
+
+    monkeypatch.setattr(manager, "_write_member", interrupted)
+    archive = tmp_path / "out.zip"
+    with pytest.raises(KeyboardInterrupt):
+        manager.create_backup(project_id, str(archive))
+    checkpoint = db.get_checkpoint(db.get_incomplete_checkpoints()[0]['id'])
+    assert len(checkpoint['members']) == 5
+
+    resumed = pbu.BackupManager(db, archive_options={'zip_level': 1})
+    opened = []
+    open_writer = resumed._open_zip_writer
+    monkeypatch.setattr(resumed, "_open_zip_writer", lambda target: opened.append(target) or open_writer(target))
+    ok, message = resumed.resume_backup(checkpoint['id'])
+    assert ok, message
+    assert len(opened) == 1
+    with zipfile.ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        names = zipf.namelist()
+        assert sorted(names) == sorted(f"pkg/mod{i}.py" for i in range(8))
+        assert len(names) == len(set(names))
+        for info in zipf.infolist():
+            # Members on both sides of the interruption use the configured level
+            compressor = zlib.compressobj(1, zlib.DEFLATED, -15)
+            data = (src / info.filename).read_bytes()
+            assert info.compress_size == len(compressor.compress(data) + compressor.flush())
+            assert struct.unpack('<H', local_extra(archive, info)[:2])[0] == 1
+            assert zipf.read(info) == data
+
+
+@pytest.mark.parametrize("target", ["streamed", "mirrored"])
+def test_cancelling_a_run_without_checkpoint(pbu, project, tmp_path, monkeypatch, target):
+    db, project_id, src = project
+    manager = pbu.BackupManager(db)
+
+    def cancelled_progress(root, initial_text=""):
+        progress = pbu.ConsoleProgress(initial_text)
+        progress.cancelled = True
+        return progress, progress
+
+    monkeypatch.setattr(manager, "_show_progress_popup", cancelled_progress)
+    if target == "streamed":
+        ok, message = manager.create_backup(project_id, str(tmp_path / "out.zip"), output_stream=io.BytesIO())
+    else:
+        (tmp_path / "mirror").mkdir()
+        ok, message = manager.create_backup(project_id, str(tmp_path / "out.zip"), mirrors=[str(tmp_path / "mirror")])
+    assert not ok
+    assert message == "Backup cancelled after 0 files."
+    assert db.get_incomplete_checkpoints() == []
+    assert [backup['status'] for backup in db.get_backups(project_id)] == ['failed']
@@ -0,0 +1,123 @@
+import pytest
+
+MB = 1024 * 1024
+
+
+def _run(pacer, sizes, speed):
+    """Feed members through the pacer, timing each one from a per-level speed in bytes per second"""
+    levels = []
+    for size in sizes:
+        pacer.level = pacer.choose(size)
+        levels.append(pacer.level)
+        pacer.record(size, size / speed[pacer.level])
+    return levels
+
+
+def test_tiny_first_member_does_not_pin_store(pbu):
+    pacer = pbu.CompressionPacer(target_rate=1 * MB)
+    speed = {level: 50 * MB for level in pbu.CompressionPacer.LEVELS}
+    # A 200-byte member written slowly, then 100 members of 1 MB at 50 MB/s
+    pacer.level = pacer.choose(200)
+    pacer.record(200, 0.01)
+    levels = _run(pacer, [MB] * 100, speed)
+    assert 0 not in levels
+    assert levels[-1] == 9
+
+
+def test_starts_at_start_level_until_deflate_is_measured(pbu):
+    pacer = pbu.CompressionPacer(target_rate=1 * MB)
+    speed = {level: 50 * MB for level in pbu.CompressionPacer.LEVELS}
+    levels = _run(pacer, [MB] * 3, speed)
+    assert levels == [pbu.CompressionPacer.START_LEVEL] * 3
+
+
+def test_probes_a_higher_level_after_a_slow_start(pbu):
+    pacer = pbu.CompressionPacer(target_rate=10 * MB)
+    # Level 6 looks slow at first; afterwards every level is fast
+    _run(pacer, [MB] * 8, {level: 2 * MB for level in pbu.CompressionPacer.LEVELS})
+    assert pacer.choose(MB) < pbu.CompressionPacer.START_LEVEL
+    levels = _run(pacer, [MB] * 400, {level: 200 * MB for level in pbu.CompressionPacer.LEVELS})
+    assert levels[-1] == 9
+
+
+def test_budget_leaves_out_excluded_folders(pbu, tmp_path):
+    source = tmp_path / "project"
+    (source / "src").mkdir(parents=True)
+    (source / "node_modules" / "dep").mkdir(parents=True)
+    (source / "src" / "app.js").write_bytes(b"x" * 10000)
+    (source / "node_modules" / "dep" / "index.js").write_bytes(b"y" * 4 * MB)
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    try:
+        project_id = db.add_project("web", str(source))
+        db.update_project(project_id, "web", str(source), folder_exclusions=["node_modules"])
+        manager = pbu.BackupManager(db)
+        # First run: nothing in the catalog, so the budget comes from a scan that skips the exclusions
+        assert manager._expected_source_bytes(str(source), project_id, {"node_modules"}) == 10000
+        manager.pace_options = {'target_rate': MB}
+        ok, message = manager.create_backup(project_id, str(tmp_path / "first.zip"))
+        assert ok, message
+        assert db.get_backups(project_id)[-1]['source_bytes'] == 10000
+        # Later runs budget for what the last run archived, not the whole folder
+        assert manager._expected_source_bytes(str(source), project_id, {"node_modules"}) == 10000
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def paced_project(pbu, tmp_path, monkeypatch):
+    """A project of eight 100 KB files, and the list every finished pacer is appended to"""
+    source = tmp_path / "project"
+    source.mkdir()
+    for i in range(8):
+        (source / f"part{i}.bin").write_bytes(bytes([i]) * 100000)
+    pacers = []
+    finish = pbu.CompressionPacer.finish
+    monkeypatch.setattr(pbu.CompressionPacer, "finish", lambda self: pacers.append(self) or finish(self))
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    yield db, db.add_project("paced", str(source)), pacers
+    db.close()
+
+
+def test_only_default_writes_are_measured(pbu, paced_project, tmp_path):
+    db, project_id, pacers = paced_project
+
+    def stored_as_is(zipf, file_path, rel_path, st, stats, governor):
+        zipf.write(file_path, rel_path, compress_type=pbu.zipfile.ZIP_STORED)
+        return pbu.MemberHandlerRegistry.WRITTEN
+
+    handlers = pbu.MEMBER_HANDLERS.copy()
+    handlers.register("part0.bin", stored_as_is)
+    handlers.register("part1.bin", lambda *args: pbu.MemberHandlerRegistry.SKIPPED)
+    manager = pbu.BackupManager(db, member_handlers=handlers)
+    manager.pace_options = {'target_rate': MB}
+    ok, message = manager.create_backup(project_id, str(tmp_path / "out.zip"))
+    assert ok, message
+    pacer, = pacers
+    # The handler's member counts towards progress but not the level mix; the skipped one towards neither
+    assert sum(members for members, _ in pacer.mix.values()) == 6
+    assert pacer.done_bytes == 7 * 100000
+
+
+def test_resumed_run_counts_members_written_before(pbu, paced_project, tmp_path, monkeypatch):
+    db, project_id, pacers = paced_project
+    monkeypatch.setattr(pbu.BackupManager, "CHECKPOINT_EVERY_MEMBERS", 1)
+    manager = pbu.BackupManager(db)
+    write_member = manager._write_member
+    written = []
+
+    def interrupted(*args, **kwargs):
+        if len(written) == 5:
+            raise KeyboardInterrupt
+        written.append(args[2])
+        return write_member(*args, **kwargs)
+
+    monkeypatch.setattr(manager, "_write_member", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        manager.create_backup(project_id, str(tmp_path / "out.zip"))
+    resumed = pbu.BackupManager(db)
+    resumed.pace_options = {'deadline': 60}
+    ok, message = resumed.resume_backup()
+    assert ok, message
+    pacer, = pacers
+    assert sum(members for members, _ in pacer.mix.values()) == 3
+    assert pacer.done_bytes == 8 * 100000
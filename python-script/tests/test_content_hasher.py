@@ -0,0 +1,45 @@
+import hashlib
+import zlib
+
+import pytest
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 40)
+    return path
+
+
+def test_small_file_gets_plain_sha256(pbu, data_file):
+    with pbu.ContentHasher("sha256", chunk_size=16384, workers=1) as hasher:
+        result = hasher.hash_file(str(data_file))
+    assert not result['tree']
+    assert pbu.ContentHasher.label(result) == "sha256"
+    assert result['digest'] == hashlib.sha256(data_file.read_bytes()).hexdigest()
+
+
+def test_large_file_gets_labelled_tree_root(pbu, data_file):
+    with pbu.ContentHasher("sha256", chunk_size=4096, workers=2) as hasher:
+        result = hasher.hash_file(str(data_file))
+        assert hasher.hash_bytes(data_file.read_bytes()) == result
+    assert result['tree']
+    assert len(result['chunks']) == 3
+    assert pbu.ContentHasher.label(result) == "sha256-tree:4K"
+    assert result['digest'] != hashlib.sha256(data_file.read_bytes()).hexdigest()
+
+
+def test_crc32_is_plain_across_chunks(pbu, data_file):
+    with pbu.ContentHasher("crc32", chunk_size=4096, workers=2) as hasher:
+        result = hasher.hash_file(str(data_file))
+    assert not result['tree']
+    assert result['digest'] == f"{zlib.crc32(data_file.read_bytes()):08x}"
+
+
+def test_cli_never_prints_tree_root_as_sha256sum(pbu, data_file, capsys):
+    assert pbu.run_cli(["hash", "--chunk-size", "4K", str(data_file)]) == 0
+    digest, path = capsys.readouterr().out.strip().split("  ")
+    assert path == str(data_file)
+    assert digest.startswith("sha256-tree:4K:")
+    assert pbu.run_cli(["hash", "--chunk-size", "16K", str(data_file)]) == 0
+    assert capsys.readouterr().out.strip() == f"{hashlib.sha256(data_file.read_bytes()).hexdigest()}  {data_file}"
@@ -0,0 +1,85 @@
+import subprocess
+import sys
+import threading
+
+from conftest import MODULE_PATH
+
+THREADS = 6
+ITERATIONS = 40
+PROCESSES = 3
+
+WORKER = r'''
+import importlib.util, sys, threading
+spec = importlib.util.spec_from_file_location("pbu", sys.argv[1])
+pbu = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pbu)
+db = pbu.Database(sys.argv[2])
+errors = []
+
+def work(tag):
+    try:
+        for i in range(int(sys.argv[4])):
+            project_id = db.add_project(f"{tag}-{i}", "/tmp/src")
+            db.update_project(project_id, f"{tag}-{i}-renamed", "/tmp/src", "description")
+            assert db.get_project(project_id)['name'] == f"{tag}-{i}-renamed"
+            checkpoint_id = db.create_checkpoint(project_id, "/tmp/src", "/tmp/out.zip", "", set(), set())
+            db.save_checkpoint(checkpoint_id, 100, [(f"file{n}", n * 10, 0) for n in range(20)])
+            with db.transaction():
+                with db.transaction():
+                    db.set_project_option(project_id, 'git_mode', "tracked")
+    except Exception as e:
+        errors.append(repr(e))
+
+threads = [threading.Thread(target=work, args=(f"{sys.argv[3]}-{t}",)) for t in range(int(sys.argv[5]))]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+db.close()
+print("\n".join(errors))
+sys.exit(1 if errors else 0)
+'''
+
+
+def test_threads_and_processes_share_one_database(pbu, tmp_path):
+    db_file = str(tmp_path / "shared.db")
+    pbu.Database(db_file).close()
+    processes = [
+        subprocess.Popen([sys.executable, "-c", WORKER, MODULE_PATH, db_file, f"p{n}", str(ITERATIONS), str(THREADS)],
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for n in range(PROCESSES)
+    ]
+    for process in processes:
+        output, _ = process.communicate(timeout=300)
+        assert process.returncode == 0, output
+    db = pbu.Database(db_file)
+    try:
+        assert len(db.get_all_projects()) == PROCESSES * THREADS * ITERATIONS
+        assert db.conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    finally:
+        db.close()
+
+
+def test_worker_thread_connections_are_closed_when_the_thread_ends(pbu, tmp_path):
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    try:
+        threads = [threading.Thread(target=db.get_all_projects) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert db._connections == [db.conn]
+    finally:
+        db.close()
+
+
+def test_release_closes_the_calling_threads_connection(pbu, tmp_path):
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    try:
+        first = db.conn
+        db.release()
+        assert db._connections == []
+        assert db.conn is not first
+        assert db.get_all_projects() == []
+    finally:
+        db.close()
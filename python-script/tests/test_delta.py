@@ -0,0 +1,97 @@
+import json
+import random
+import struct
+import zipfile
+
+import pytest
+
+
+def delta_header(archive, rel_path, pbu):
+    with zipfile.ZipFile(archive) as zipf:
+        data = zipf.read(pbu.DeltaEncoder.MEMBER_PREFIX + rel_path)
+    size, = struct.unpack('<I', data[len(pbu.DeltaEncoder.MAGIC):len(pbu.DeltaEncoder.MAGIC) + 4])
+    return json.loads(data[len(pbu.DeltaEncoder.MAGIC) + 4:len(pbu.DeltaEncoder.MAGIC) + 4 + size]), len(data)
+
+
+def test_unchanged_file_keeps_pointing_at_its_base(pbu, tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    data = bytearray(random.Random(7).randbytes(256 * 1024))
+    (src / "data.bin").write_bytes(data)
+    (src / "notes.txt").write_text("small files are always stored whole\n")
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    project_id = db.add_project("src", str(src))
+    manager = pbu.BackupManager(db)
+    manager.delta_options = {'enabled': True, 'min_size': 64 * 1024, 'block_size': 4096, 'max_chain': 2}
+    archives = []
+    signature_ids = []
+    for run in range(4):
+        if run == 3:
+            data[1000:1010] = b"x" * 10
+            (src / "data.bin").write_bytes(data)
+        archive = tmp_path / f"run{run}.zip"
+        ok, message = manager.create_backup(project_id, str(archive))
+        assert ok, message
+        archives.append((archive, bytes(data)))
+        signature_ids.append(db.get_file_signature(project_id, "data.bin")['backup_id'])
+    # Unchanged runs reference the first backup directly, however many runs pass
+    for archive, _ in archives[1:3]:
+        header, size = delta_header(archive, "data.bin", pbu)
+        assert header['base_member'] == "data.bin"
+        assert header['chain_depth'] == 1
+        assert size < 512
+    assert signature_ids[1] == signature_ids[2] == signature_ids[0]
+    # max_chain is 2, so a real change after the unchanged runs is still stored as a delta of the first
+    header, _ = delta_header(archives[3][0], "data.bin", pbu)
+    assert header['base_backup_id'] == signature_ids[0] and header['chain_depth'] == 1
+    assert signature_ids[3] != signature_ids[0]
+    for archive, expected in archives:
+        dest = tmp_path / f"restored-{archive.stem}"
+        pbu.DeltaRestorer(db).restore(str(archive), str(dest))
+        assert (dest / "data.bin").read_bytes() == expected
+        assert (dest / "notes.txt").read_text() == "small files are always stored whole\n"
+    db.close()
+
+
+def test_resumed_run_keeps_signatures_of_members_written_before(pbu, tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    src.mkdir()
+    files = {f"data{i}.bin": bytearray(random.Random(i).randbytes(96 * 1024)) for i in range(4)}
+    for name, data in files.items():
+        (src / name).write_bytes(data)
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    project_id = db.add_project("src", str(src))
+    monkeypatch.setattr(pbu.BackupManager, "CHECKPOINT_EVERY_MEMBERS", 1)
+    options = {'enabled': True, 'min_size': 64 * 1024, 'block_size': 4096}
+    manager = pbu.BackupManager(db)
+    manager.delta_options = options
+    write_member = manager._write_member
+    written = []
+
+    def interrupted(*args, **kwargs):
+        if len(written) == 2:
+            raise KeyboardInterrupt
+        written.append(args[2])
+        return write_member(*args, **kwargs)
+
+    monkeypatch.setattr(manager, "_write_member", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        manager.create_backup(project_id, str(tmp_path / "first.zip"))
+    checkpoint = db.get_checkpoint(db.get_incomplete_checkpoints()[0]['id'])
+    assert sorted(sig['rel_path'] for sig in checkpoint['signatures']) == sorted(written)
+    resumed = pbu.BackupManager(db)
+    resumed.delta_options = options
+    ok, message = resumed.resume_backup(checkpoint['id'])
+    assert ok, message
+    assert {name: db.get_file_signature(project_id, name)['backup_id'] for name in files} == dict.fromkeys(files, checkpoint['id'])
+    # Every file, including those written before the interruption, is now stored against the resumed backup
+    for data in files.values():
+        data[500:510] = b"y" * 10
+    for name, data in files.items():
+        (src / name).write_bytes(data)
+    ok, message = resumed.create_backup(project_id, str(tmp_path / "second.zip"))
+    assert ok, message
+    for name in files:
+        header, _ = delta_header(tmp_path / "second.zip", name, pbu)
+        assert header['base_backup_id'] == checkpoint['id']
+    db.close()
@@ -0,0 +1,64 @@
+import os
+
+
+def test_samples_are_drawn_from_included_files(pbu, tmp_path):
+    src = tmp_path / "project"
+    (src / "src").mkdir(parents=True)
+    (src / "node_modules" / "dep").mkdir(parents=True)
+    # Incompressible bytes dominate the tree, so a whole-tree sample would land almost only there
+    (src / "node_modules" / "dep" / "blob.bin").write_bytes(os.urandom(8 * 1024 * 1024))
+    for i in range(4):
+        (src / "src" / f"mod{i}.py").write_text("def handler(event):\n    return event\n" * 200)
+    analyzer = pbu.ExclusionAnalyzer()
+    scan = analyzer.scan(str(src))
+    report = analyzer.analyze(scan, [], ["node_modules"])
+    assert report['included_files'] == 4
+    assert report['sampled_files'] == 4
+    assert report['compression_ratio'] < 0.1
+    # Measurements are cached on the scan for the next draw
+    assert {f"src/mod{i}.py" for i in range(4)} <= set(scan['sample_cache'])
+    # Including the folder again brings the incompressible file back into the estimate
+    report = analyzer.analyze(scan, [], [])
+    assert report['compression_ratio'] > 0.9
+
+
+def test_attribute_rules_are_applied_and_type_rules_reported(pbu, tmp_path):
+    src = tmp_path / "project"
+    (src / "build").mkdir(parents=True)
+    (src / "main.c").write_text("int main(void) { return 0; }\n")
+    (src / "build" / "main.o").write_bytes(b"\x7fELF" + bytes(2000))
+    (src / "dump.bin").write_bytes(bytes(50000))
+    old = src / "old.txt"
+    old.write_text("stale\n")
+    os.utime(old, (1_000_000_000, 1_000_000_000))
+    analyzer = pbu.ExclusionAnalyzer()
+    scan = analyzer.scan(str(src))
+    report = analyzer.analyze(scan, [], [], exclusion_rules={
+        'extensions': ["o"], 'max_size': 10000, 'older_than_days': 365, 'types': ["core"]})
+    assert report['included_files'] == 1
+    assert report['included_bytes'] == (src / "main.c").stat().st_size
+    attribute = [(r['rule'], r['files'], r['bytes']) for r in report['rules'] if r['kind'] == 'attribute']
+    assert attribute == [("extension", 1, 2004), ("max_size", 1, 50000), ("older_than", 1, 6)]
+    assert report['unestimated_rules'] == ["type:core"]
+    assert "Not estimated" in analyzer.format_report(report)
+    # The samples come only from what is still included
+    assert report['sampled_files'] == 1
+
+
+def test_list_scanned_returns_direct_children(pbu, tmp_path):
+    src = tmp_path / "project"
+    (src / "a" / "b").mkdir(parents=True)
+    (src / "a" / "b" / "deep.txt").write_text("deep")
+    (src / "a" / "mid.txt").write_text("mid!!")
+    (src / "ab.txt").write_text("x")
+    (src / "empty").mkdir()
+    scan = pbu.ExclusionAnalyzer().scan(str(src))
+    list_scanned = pbu.ExclusionAnalyzer.list_scanned
+    assert sorted(list_scanned(scan, "")) == [("a", True, None), ("ab.txt", False, 1), ("empty", True, None)]
+    assert sorted(list_scanned(scan, "a")) == [("b", True, None), ("mid.txt", False, 5)]
+    assert list_scanned(scan, "a/b") == [("deep.txt", False, 4)]
+    assert list_scanned(scan, "empty") == []
+    assert list_scanned(scan, "missing") == []
+    # Callers may sort the listing without changing the scan's map
+    list_scanned(scan, "a").clear()
+    assert len(list_scanned(scan, "a")) == 2
@@ -0,0 +1,82 @@
+import os
+import struct
+import time
+
+import pytest
+
+
+def elf_header(e_type, little=True):
+    order = "<" if little else ">"
+    return b"\x7fELF" + bytes([2, 1 if little else 2, 1]) + bytes(9) + struct.pack(order + "H", e_type) + bytes(46)
+
+
+def match(rules, path, st=None):
+    return rules.match(str(path), path.name, st)[0]
+
+
+def test_extensions_match_every_suffix(pbu, tmp_path):
+    rules = pbu.ExclusionRules({'extensions': ["tar.gz", ".LOG", "o"]})
+    for name, expected in (("a.tar.gz", "extension"), ("server.log", "extension"), ("main.o", "extension"),
+                           ("b.gz", None), ("o", None), (".o", None), ("a.log.txt", None), ("x.min.O", "extension")):
+        path = tmp_path / name
+        path.write_text("x")
+        assert match(rules, path) == expected, name
+
+
+def test_rules_run_in_order_and_tally(pbu, tmp_path):
+    old = time.time() - 400 * 86400
+    rules = pbu.ExclusionRules({'extensions': ["bin"], 'max_size': 100, 'older_than_days': 365, 'types': ["binary"]})
+    files = {
+        "big.bin": (bytes(200), None),        # extension comes before size
+        "big.txt": (b"x" * 200, old),         # size comes before age
+        "old.txt": (b"old", old),
+        "blob.dat": (b"a\x00b", None),
+        "keep.txt": (b"keep", None),
+    }
+    results = {}
+    for name, (data, mtime) in files.items():
+        path = tmp_path / name
+        path.write_bytes(data)
+        if mtime:
+            os.utime(path, (mtime, mtime))
+        results[name] = match(rules, path)
+    assert results == {"big.bin": "extension", "big.txt": "max_size", "old.txt": "older_than",
+                       "blob.dat": "type:binary", "keep.txt": None}
+    assert rules.stats == {"extension": [1, 200], "max_size": [1, 200], "older_than": [1, 3], "type:binary": [1, 3]}
+    assert pbu.ExclusionRules.format_stats(rules.stats)[0].startswith("extension: 1 files")
+
+
+def test_stat_is_taken_once_and_passed_on(pbu, tmp_path, monkeypatch):
+    path = tmp_path / "a.txt"
+    path.write_text("hello")
+    rules = pbu.ExclusionRules({'max_size': 100})
+    rule, st = rules.match(str(path), path.name)
+    assert rule is None and st.st_size == 5
+    # A stat from the walker is used as is
+    monkeypatch.setattr(pbu.os, "stat", lambda *a, **k: pytest.fail("stat called again"))
+    assert rules.match(str(path), path.name, st) == (None, st)
+
+
+@pytest.mark.parametrize("little", [True, False])
+def test_elf_core_dumps_are_told_from_executables(pbu, tmp_path, little):
+    rules = pbu.ExclusionRules({'types': ["core"]})
+    core = tmp_path / "core"
+    core.write_bytes(elf_header(4, little))
+    exe = tmp_path / "app"
+    exe.write_bytes(elf_header(2, little))
+    assert match(rules, core) == "type:core"
+    assert match(rules, exe) is None
+    both = pbu.ExclusionRules({'types': ["elf", "core"]})
+    # core is checked first whatever order the config lists
+    assert match(both, core) == "type:core"
+    assert match(both, exe) == "type:elf"
+    minidump = tmp_path / "crash.dmp"
+    minidump.write_bytes(b"MDMP" + bytes(20))
+    assert match(rules, minidump) == "type:core"
+
+
+def test_unknown_type_is_rejected(pbu):
+    with pytest.raises(ValueError, match="Unknown file types"):
+        pbu.ExclusionRules({'types': ["elf", "movie"]})
+    assert not pbu.ExclusionRules(None).active
+    assert pbu.ExclusionRules({'newer_than_days': 1}).active
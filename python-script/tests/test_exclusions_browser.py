@@ -0,0 +1,37 @@
+import os
+
+
+def test_exclusion_status(pbu):
+    status = pbu.ProjectCard._exclusion_status
+    files = ["./docs/notes.txt"]
+    folders = ["node_modules/", "build\\out"]
+    assert status("node_modules", True, files, folders) == "excluded"
+    assert status("node_modules/dep/index.js", False, files, folders) == "inherited"
+    assert status("node_modules/dep", True, files, folders) == "inherited"
+    assert status("build/out", True, files, folders) == "excluded"
+    assert status("docs/notes.txt", False, files, folders) == "excluded"
+    # A file rule doesn't exclude a folder of the same name, and prefixes must end at a separator
+    assert status("docs/notes.txt", True, files, folders) == ""
+    assert status("node_modules_backup", True, files, folders) == ""
+    assert status("src/main.py", False, files, folders) == ""
+
+
+def test_list_local_directory_does_not_follow_symlinks(pbu, tmp_path):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "data.bin").write_bytes(bytes(300))
+    os.symlink(tmp_path / "pkg", tmp_path / "link")
+    entries = sorted(pbu.ProjectCard._list_local_directory(str(tmp_path)))
+    assert entries[0] == ("data.bin", False, 300)
+    assert entries[1][:2] == ("link", False)
+    assert entries[2] == ("pkg", True, None)
+    assert pbu.ProjectCard._list_local_directory(str(tmp_path / "missing")) == []
+
+
+def test_browser_order_uses_scan_sizes(pbu):
+    entries = [("b.txt", False, 10), ("small", True, None), ("a.txt", False, 10), ("big", True, None), ("z.bin", False, 99)]
+    # Before the scan finishes folders are sorted by name
+    assert [e[0] for e in pbu.ProjectCard._browser_order(list(entries), "src", None)] == [
+        "big", "small", "z.bin", "a.txt", "b.txt"]
+    scan = {'dir_totals': {"src/small": [500, 1, 0], "src/big": [20, 1, 0]}}
+    assert [e[0] for e in pbu.ProjectCard._browser_order(list(entries), "src", scan)] == [
+        "small", "big", "z.bin", "a.txt", "b.txt"]
@@ -0,0 +1,117 @@
+import threading
+
+import pytest
+
+
+class FailingFile:
+    """Real file whose writes start failing once `limit` bytes went through"""
+    def __init__(self, fileobj, limit):
+        self._fileobj = fileobj
+        self._limit = limit
+
+    def write(self, data):
+        if self._limit < len(data):
+            raise OSError(28, "No space left on device")
+        self._limit -= len(data)
+        return self._fileobj.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+
+class BlockingFile:
+    """Real file whose second write blocks until `release` is set"""
+    def __init__(self, fileobj, release):
+        self._fileobj = fileobj
+        self._release = release
+        self._writes = 0
+
+    def write(self, data):
+        self._writes += 1
+        if self._writes > 1:
+            self._release.wait()
+        return self._fileobj.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+
+@pytest.fixture
+def open_with(pbu, monkeypatch):
+    """Route the sinks' open() for some paths through a wrapper that gets the real opener"""
+    wrappers = {}
+
+    def fake_open(path, mode='r', *args, **kwargs):
+        if path in wrappers:
+            return wrappers[path](lambda: open(path, mode, *args, **kwargs))
+        return open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(pbu, "open", fake_open, raising=False)
+    return wrappers
+
+
+def write_all(fanout, chunks):
+    for chunk in chunks:
+        fanout.write(chunk)
+    fanout.flush()
+    return fanout.close()
+
+
+def test_failed_open_leaves_existing_file_alone(pbu, tmp_path, open_with):
+    good, victim = str(tmp_path / "good.zip"), str(tmp_path / "victim.zip")
+    with open(victim, "wb") as f:
+        f.write(b"someone else's archive")
+
+    def refuse(opener):
+        raise PermissionError(13, "Permission denied")
+
+    # The path exists, but this run never got to write it
+    open_with[victim] = refuse
+    results = write_all(pbu.FanOutFile([good, victim]), [b"data"] * 4)
+    assert [r['ok'] for r in results] == [True, False]
+    assert open(good, "rb").read() == b"data" * 4
+    assert open(victim, "rb").read() == b"someone else's archive"
+
+
+def test_failing_destination_is_dropped_and_removed(pbu, tmp_path, open_with):
+    good, full = str(tmp_path / "good.zip"), str(tmp_path / "full.zip")
+    open_with[full] = lambda opener: FailingFile(opener(), 10)
+    results = write_all(pbu.FanOutFile([good, full]), [b"x" * 8] * 4)
+    assert [r['ok'] for r in results] == [True, False]
+    assert "No space left" in results[1]['error']
+    assert open(good, "rb").read() == b"x" * 32
+    assert not (tmp_path / "full.zip").exists()
+
+
+def test_every_destination_failing_raises(pbu, tmp_path, open_with):
+    paths = [str(tmp_path / "a.zip"), str(tmp_path / "b.zip")]
+    for path in paths:
+        open_with[path] = lambda opener: FailingFile(opener(), 0)
+    fanout = pbu.FanOutFile(paths)
+    with pytest.raises(OSError):
+        for _ in range(100):
+            fanout.write(b"x")
+            fanout.flush()
+    fanout.close()
+    assert not any((tmp_path / name).exists() for name in ("a.zip", "b.zip"))
+
+
+def test_stalled_destination_is_dropped_and_removed(pbu, tmp_path, open_with):
+    good, slow = str(tmp_path / "good.zip"), str(tmp_path / "slow.zip")
+    release = threading.Event()
+    open_with[slow] = lambda opener: BlockingFile(opener(), release)
+    try:
+        fanout = pbu.FanOutFile([good, slow], max_buffer=16, stall_timeout=0.2)
+        results = write_all(fanout, [b"y" * 8] * 6)
+        assert [r['ok'] for r in results] == [True, False]
+        assert "stalled" in results[1]['error']
+        assert open(good, "rb").read() == b"y" * 48
+        # The writer is still stuck, yet its partial file is already gone
+        assert not (tmp_path / "slow.zip").exists()
+        # A later backup to the same path is not removed when the stuck writer finally finishes
+        with open(slow, "wb") as f:
+            f.write(b"next backup")
+    finally:
+        release.set()
+    fanout._sinks[1].thread.join(5)
+    assert open(slow, "rb").read() == b"next backup"
@@ -0,0 +1,65 @@
+import shutil
+import subprocess
+import zipfile
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def git(path, *args):
+    return subprocess.run(["git", "-C", str(path), *args], check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    path.mkdir()
+    git(path, "init", "-q", "-b", "main")
+    git(path, "config", "user.email", "dev@example.com")
+    git(path, "config", "user.name", "dev")
+    (path / "a.txt").write_text("one\n")
+    git(path, "add", "a.txt")
+    git(path, "commit", "-q", "-m", "one")
+    return path
+
+
+@pytest.fixture
+def manager(pbu, tmp_path):
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    yield pbu.BackupManager(db)
+    db.close()
+
+
+def test_restore_applies_rewritten_history(pbu, repo, manager, tmp_path):
+    project_id = manager.db.add_project("repo", str(repo))
+    manager.db.set_project_option(project_id, "git_mode", "worktree+bundle")
+    ok, message = manager.create_backup(project_id, str(tmp_path / "full.zip"))
+    assert ok, message
+    # Rewriting the branch makes the next incremental bundle a non-fast-forward update
+    (repo / "a.txt").write_text("two\n")
+    git(repo, "commit", "-q", "-a", "--amend", "-m", "amended")
+    ok, message = manager.create_backup(project_id, str(tmp_path / "incremental.zip"))
+    assert ok, message
+    dest = tmp_path / "restored"
+    pbu.DeltaRestorer().restore(str(tmp_path / "incremental.zip"), str(dest))
+    assert git(dest, "rev-parse", "refs/heads/main") == git(repo, "rev-parse", "HEAD")
+
+
+def test_raw_mode_applies_exclusions_to_git_dir_but_not_rules(pbu, repo, manager, tmp_path):
+    project_id = manager.db.add_project("repo", str(repo))
+    manager.db.set_project_option(project_id, "git_mode", "raw")
+    manager.db.set_project_option(project_id, "exclusion_rules", {"max_size": 1})
+    manager.db.update_project(project_id, "repo", str(repo), file_exclusions=[".git/description"],
+                              folder_exclusions=[".git/hooks"])
+    archive = tmp_path / "raw.zip"
+    ok, message = manager.create_backup(project_id, str(archive))
+    assert ok, message
+    with zipfile.ZipFile(archive) as zipf:
+        names = set(zipf.namelist())
+    # The size rule drops the working tree file but none of the repository's own files
+    assert "a.txt" not in names
+    assert ".git/HEAD" in names
+    assert any(name.startswith(".git/objects/") for name in names)
+    assert ".git/description" not in names
+    assert not any(name.startswith(".git/hooks/") for name in names)
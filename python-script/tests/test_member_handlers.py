@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import zipfile
+
+import pytest
+
+
+@pytest.fixture
+def live_database(tmp_path):
+    """A WAL database whose committed rows are still only in its -wal file"""
+    source = tmp_path / "we#ird?%dir"
+    source.mkdir()
+    path = str(source / "app.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA wal_autocheckpoint=0")
+    conn.execute("CREATE TABLE items (value TEXT)")
+    conn.executemany("INSERT INTO items VALUES (?)", [(str(i),) for i in range(100)])
+    conn.commit()
+    assert os.path.getsize(path + "-wal") > 0
+    yield source, path
+    conn.close()
+
+
+def _backup(pbu, tmp_path, source, file_exclusions=()):
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    try:
+        project_id = db.add_project("live", str(source))
+        db.update_project(project_id, "live", str(source), "", list(file_exclusions), [])
+        archive = str(tmp_path / "backup.zip")
+        success, message = pbu.BackupManager(db).create_backup(project_id, save_path=archive)
+        assert success, message
+        with zipfile.ZipFile(archive) as zipf:
+            return {name: zipf.read(name) for name in zipf.namelist()}
+    finally:
+        db.close()
+
+
+def test_snapshot_covers_sidecars(pbu, tmp_path, live_database):
+    source, _ = live_database
+    members = _backup(pbu, tmp_path, source)
+    assert "app.db-wal" not in members
+    restored = tmp_path / "restored.db"
+    restored.write_bytes(members["app.db"])
+    assert sqlite3.connect(str(restored)).execute("SELECT COUNT(*) FROM items").fetchone()[0] == 100
+
+
+def test_sidecar_kept_when_database_is_excluded(pbu, tmp_path, live_database):
+    source, _ = live_database
+    members = _backup(pbu, tmp_path, source, file_exclusions=["app.db"])
+    assert "app.db" not in members
+    assert "app.db-wal" in members
+
+
+def test_sidecar_kept_when_snapshot_fails(pbu, tmp_path, live_database, monkeypatch):
+    source, _ = live_database
+    missing = str(tmp_path / "missing.db")
+    monkeypatch.setattr(pbu, "_sqlite_readonly_uri", lambda file_path: f"file:{missing}?mode=ro")
+    members = _backup(pbu, tmp_path, source)
+    assert "app.db" in members and "app.db-wal" in members
+
+
+def test_benchmark_sparse_reads_only_data(pbu):
+    row = pbu.benchmark_sparse(size=64 * 1024 * 1024, data_fraction=0.1, repeat=1)
+    assert row['plain_bytes_read'] == 64 * 1024 * 1024
+    if row['allocated'] < row['size'] and hasattr(os, 'SEEK_DATA'):
+        assert row['sparse_bytes_read'] < row['plain_bytes_read'] / 2
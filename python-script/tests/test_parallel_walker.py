@@ -0,0 +1,79 @@
+import os
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for rel in ("b/z.txt", "b/a/1.txt", "a/x.txt", "a/c/d/deep.txt", "a/b/y.txt", "top.txt", "skip/big/file.txt"):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(rel)
+    return tmp_path
+
+
+def sorted_walk(top):
+    for rootdir, dirs, files in os.walk(top):
+        dirs.sort()
+        yield rootdir, list(dirs), sorted(files)
+
+
+def run_with_timeout(fn, timeout=10):
+    """Run fn on a thread so a hung walk fails the test instead of blocking the run"""
+    result = {}
+
+    def target():
+        try:
+            result['value'] = fn()
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "walk did not finish"
+    return result
+
+
+@pytest.mark.parametrize("workers", [1, 3, 8])
+def test_order_matches_sorted_os_walk(pbu, tree, workers):
+    walked = [(path, dirs, files) for path, dirs, files, _ in pbu.ParallelTreeWalker(workers).walk(str(tree))]
+    assert walked == list(sorted_walk(str(tree)))
+    for path, _, files, stats in pbu.ParallelTreeWalker(workers).walk(str(tree)):
+        assert sorted(stats) == files
+        assert all(stats[name].st_size == os.path.getsize(os.path.join(path, name)) for name in files)
+
+
+def test_pruned_folders_are_never_listed(pbu, tree, monkeypatch):
+    walker = pbu.ParallelTreeWalker(4)
+    listed = []
+    scandir = walker._scandir
+    monkeypatch.setattr(walker, "_scandir", lambda path: listed.append(path) or scandir(path))
+    paths = [path for path, _, _, _ in walker.walk(str(tree), lambda rel_dir: rel_dir == "skip")]
+    assert str(tree / "skip") not in paths
+    assert not any(path.startswith(str(tree / "skip")) for path in listed)
+    # The parent still reports the pruned folder by name, like os.walk after dirs.remove()
+    assert next(dirs for path, dirs, _, _ in walker.walk(str(tree), lambda rel_dir: rel_dir == "skip")
+                if path == str(tree)) == ["a", "b", "skip"]
+
+
+def test_prune_error_is_raised_in_the_consumer(pbu, tree):
+    def prune(rel_dir):
+        if rel_dir == "a/c":
+            raise RuntimeError("bad rule")
+        return False
+
+    result = run_with_timeout(lambda: list(pbu.ParallelTreeWalker(4).walk(str(tree), prune)))
+    assert isinstance(result.get('error'), RuntimeError)
+
+
+def test_stat_error_is_raised_in_the_consumer(pbu, tree, monkeypatch):
+    walker = pbu.ParallelTreeWalker(4)
+
+    def broken(paths):
+        raise ValueError("stat failed")
+
+    monkeypatch.setattr(walker, "_stat", broken)
+    result = run_with_timeout(lambda: list(walker.walk(str(tree))))
+    assert isinstance(result.get('error'), ValueError)
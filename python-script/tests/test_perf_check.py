@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+SMALL_TREE = {
+    'seed': 1729,
+    'folders': 4,
+    'files_per_folder': 5,
+    'small_min': 256,
+    'small_max': 2048,
+    'large_files': 1,
+    'large_size': 2 * 1024 * 1024
+}
+
+
+@pytest.fixture
+def suite(pbu, monkeypatch):
+    monkeypatch.setattr(pbu.PerfRegressionSuite, "TREE", SMALL_TREE)
+    return pbu.PerfRegressionSuite
+
+
+def summary(wall, output=1000, calibration=None):
+    result = {'wall_seconds': wall, 'wall_seconds_spread': 0.0, 'output_bytes': output, 'output_bytes_spread': 0.0}
+    if calibration is not None:
+        result['calibration'] = {'wall_seconds': calibration, 'wall_seconds_spread': 0.0}
+    return result
+
+
+def test_compare_scales_timings_by_calibration(suite):
+    tolerances = dict(suite.TOLERANCES)
+    # The machine is twice as slow today: the calibration and the mode both take twice as long
+    rows = {row[0]: row for row in suite.compare(summary(1.0, calibration=0.5), summary(2.0, calibration=1.0), tolerances)}
+    assert rows['wall_seconds'][1] == pytest.approx(2.0)
+    assert rows['wall_seconds'][4]
+    # Same machine speed, the mode itself got slower
+    rows = {row[0]: row for row in suite.compare(summary(1.0, calibration=0.5), summary(2.0, calibration=0.5), tolerances)}
+    assert not rows['wall_seconds'][4]
+    # Output size is never scaled
+    rows = {row[0]: row for row in suite.compare(summary(1.0, 1000, 0.5), summary(2.0, 1100, 1.0), tolerances)}
+    assert rows['output_bytes'][1] == 1000
+    assert not rows['output_bytes'][4]
+
+
+def test_compare_without_calibration_uses_reference_as_is(suite):
+    rows = {row[0]: row for row in suite.compare(summary(1.0), summary(1.2), dict(suite.TOLERANCES))}
+    assert rows['wall_seconds'][1] == 1.0
+    assert rows['wall_seconds'][4]
+
+
+@pytest.mark.parametrize("mode", ["zip-delta", "zip-stream", "zip-fanout", "zip-paced", "calibration"])
+def test_timed_trial_runs_only_the_backup(pbu, suite, tmp_path, mode):
+    suite.prepare_trial(mode, str(tmp_path))
+    if mode != suite.CALIBRATION:
+        db = pbu.Database(str(tmp_path / "perf.db"))
+        project_id = json.loads((tmp_path / "perf-project.json").read_text())['project_id']
+        prepared = len(db.get_backups(project_id))
+        db.close()
+        assert prepared == (1 if mode == "zip-delta" else 0)
+    metrics = suite.run_trial(mode, str(tmp_path))
+    assert metrics['output_bytes'] > 0
+    if mode != suite.CALIBRATION:
+        db = pbu.Database(str(tmp_path / "perf.db"))
+        assert len(db.get_backups(project_id)) == prepared + 1
+        db.close()
+    if mode == "zip-fanout":
+        assert sorted(p.name for p in (tmp_path / "out").iterdir()) == ["mirror0.zip", "mirror1.zip", "timed.zip"]
+    if mode == "zip-stream":
+        assert not (tmp_path / "out" / "timed.zip").exists()
@@ -0,0 +1,152 @@
+import base64
+import hashlib
+import hmac
+import io
+import json
+import os
+
+import pytest
+
+VECTORS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vectors", "plum-cave-vectors.json")
+
+
+def pattern(size):
+    """Same plaintext as generate_plum_cave_vectors.mjs"""
+    return bytes((i * 131 + 7) % 251 for i in range(size))
+
+
+def encrypt_file(pbu, file_key, data, iv=bytes(range(16)), hmac_key_end=224):
+    """Python port of encryptFileWithTwoCiphersCBC, for round trips"""
+    cls = pbu.PlumCaveDecryptor
+    tag = hmac.new(file_key[96:hmac_key_end], data, hashlib.sha3_512).digest()
+    inner, stream_key = tag + data, file_key[:64]
+    encrypted = bytearray()
+    for offset in range(0, len(inner), cls.STREAM_CHUNK):
+        stream_key = pbu.whirlpool(hashlib.sha512(stream_key.hex().encode("ascii")).digest())
+        encrypted += pbu.chacha20_xor(stream_key[:32], stream_key[32:40], inner[offset:offset + cls.STREAM_CHUNK])
+    padding = 16 - len(encrypted) % 16
+    encrypted += bytes([padding]) * padding
+    serpent = pbu._Serpent(file_key[64:96])
+    out, previous = bytearray(serpent.encrypt(iv)), iv
+    for offset in range(0, len(encrypted), 16):
+        previous = serpent.encrypt(bytes(a ^ b for a, b in zip(encrypted[offset:offset + 16], previous)))
+        out += previous
+    return bytes(out)
+
+
+_encrypted = {}
+
+
+def encrypted_pattern(pbu, file_key, size):
+    """Ciphertext of pattern(size), cached because the Python Serpent port is slow"""
+    if (file_key, size) not in _encrypted:
+        _encrypted[file_key, size] = encrypt_file(pbu, file_key, pattern(size))
+    return _encrypted[file_key, size]
+
+
+def decrypt(decryptor, ciphertext):
+    out = io.BytesIO()
+    decryptor.decrypt(io.BytesIO(ciphertext), out)
+    return out.getvalue()
+
+
+def tamper(ciphertext, position):
+    data = bytearray(ciphertext)
+    data[position] ^= 0x01
+    return bytes(data)
+
+
+def test_primitives_match_reference_vectors(pbu):
+    # NESSIE Serpent-256 set 1 vector 0, ISO Whirlpool("abc"), ChaCha20 keystream for a zero key and nonce
+    assert pbu._Serpent(b"\x80" + bytes(31)).encrypt(bytes(16)).hex() == "a223aa1288463c0e2be38ebd825616c0"
+    assert pbu.whirlpool(b"abc").hex().startswith("4e2448a4c6f486bb16b6562c73b4020b")
+    assert pbu.chacha20_xor(bytes(32), bytes(8), bytes(16)).hex() == "76b8e0ada0f13d90405d6ae55386bd28"
+
+
+@pytest.mark.parametrize("size", [0, 1, 48, 256 * 1024 - 64, 256 * 1024 + 100])
+@pytest.mark.parametrize("batch_size", [None, 4096 + 3])
+def test_round_trip(pbu, size, batch_size):
+    file_key = hashlib.sha512(b"key").digest() * 6 + bytes(32)
+    ciphertext = encrypted_pattern(pbu, file_key, size)
+    decryptor = pbu.PlumCaveDecryptor(file_key, hmac_key_end=224)
+    if batch_size:
+        decryptor.BATCH_SIZE = batch_size
+    assert decrypt(decryptor, ciphertext) == pattern(size)
+
+
+def test_round_trip_detects_tampering(pbu):
+    file_key = hashlib.sha512(b"key").digest() * 6 + bytes(32)
+    ciphertext = encrypt_file(pbu, file_key, pattern(1000))
+    with pytest.raises(ValueError, match="Integrity"):
+        decrypt(pbu.PlumCaveDecryptor(file_key, hmac_key_end=224), tamper(ciphertext, 16 + 5))
+
+
+
+def test_decrypt_to_stdout_keeps_integrity_failure_out_of_the_pipe(pbu, tmp_path, monkeypatch, capsys):
+    file_key = hashlib.sha512(b"key").digest() * 6 + bytes(32)
+    (tmp_path / "key").write_text(file_key.hex())
+    (tmp_path / "in").write_bytes(tamper(encrypted_pattern(pbu, file_key, 1000), 16 + 5))
+    pipe = io.TextIOWrapper(io.BytesIO())
+    monkeypatch.setattr(pbu.sys, "stdout", pipe)
+    args = pbu.argparse.Namespace(input=str(tmp_path / "in"), out="-", restore_to=None, file_key=str(tmp_path / "key"),
+                                  master_key=None, random_key=None, file_salt=None, iterations=None, record_key=None)
+    assert pbu.run_decrypt(args) == 1
+    pipe.flush()
+    assert b"Integrity" not in pipe.buffer.getvalue()
+    assert "not trustworthy" in capsys.readouterr().err
+
+@pytest.fixture(scope="module")
+def vectors():
+    if not os.path.exists(VECTORS):
+        message = "plum-cave-vectors.json not generated; run tests/vectors/generate_plum_cave_vectors.mjs"
+        # CI must check against the web app, a local run without node may skip
+        if os.environ.get("CI") or os.environ.get("PBU_REQUIRE_WEB_VECTORS"):
+            pytest.fail(message)
+        pytest.skip(message)
+    with open(VECTORS, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_web_app_file_vectors(pbu, vectors):
+    for vector in vectors['files']:
+        decryptor = pbu.PlumCaveDecryptor(bytes.fromhex(vector['file_key']), hmac_key_end=224)
+        assert decrypt(decryptor, base64.b64decode(vector['ciphertext'])) == pattern(vector['size'])
+
+
+def test_web_app_vectors_detect_tampered_tag(pbu, vectors):
+    for vector in vectors['files']:
+        ciphertext = base64.b64decode(vector['ciphertext'])
+        decryptor = pbu.PlumCaveDecryptor(bytes.fromhex(vector['file_key']), hmac_key_end=224)
+        # The block after the IV carries the start of the tag
+        with pytest.raises(ValueError):
+            decrypt(decryptor, tamper(ciphertext, 16 + 3))
+
+
+def test_web_app_backup_vector(pbu, vectors):
+    vector = vectors['backup']
+    if pbu.argon2_low_level is not None:
+        decryptor = pbu.PlumCaveDecryptor.for_backup(
+            bytes.fromhex(vector['master_key']), bytes.fromhex(vector['random_key']),
+            bytes.fromhex(vector['file_salt']), vector['iterations'])
+    else:
+        decryptor = pbu.PlumCaveDecryptor(bytes.fromhex(vector['file_key']), hmac_key_end=224)
+    assert decrypt(decryptor, base64.b64decode(vector['ciphertext'])) == pattern(vector['size'])
+
+
+def test_web_app_record_vectors(pbu, vectors):
+    for vector in vectors['records']:
+        ciphertext = base64.b64decode(vector['ciphertext'])
+        if pbu.argon2_low_level is not None:
+            src = io.BytesIO(ciphertext)
+            decryptor = pbu.PlumCaveDecryptor.for_record(src, bytes.fromhex(vector['password']),
+                                                         vector['iterations'], padded=vector['padded'])
+            out = io.BytesIO()
+            decryptor.decrypt(src, out)
+            plain = out.getvalue()
+        else:
+            decryptor = pbu.PlumCaveDecryptor(bytes.fromhex(vector['derived_key']), padded=vector['padded'])
+            plain = decrypt(decryptor, ciphertext[pbu.PlumCaveDecryptor.SALT_SIZE:])
+        assert plain == pattern(vector['size'])
+        with pytest.raises(ValueError):
+            decrypt(pbu.PlumCaveDecryptor(bytes.fromhex(vector['derived_key']), padded=vector['padded']),
+                    tamper(ciphertext[pbu.PlumCaveDecryptor.SALT_SIZE:], 16 + 3))
@@ -0,0 +1,124 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def db(pbu, tmp_path):
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    yield db
+    db.close()
+
+
+def make_tree(root, paths):
+    for rel in paths:
+        path = root / rel
+        if rel.endswith("/"):
+            path.mkdir(parents=True, exist_ok=True)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("{}")
+
+
+def test_discovery_finds_roots_with_ecosystem_exclusions(pbu, tmp_path):
+    make_tree(tmp_path, [
+        "web/package.json", "web/node_modules/dep/package.json", "web/dist/",
+        "tools/cli/pyproject.toml", "tools/cli/.venv/", "tools/cli/.git/",
+        "node_modules/stray/package.json", ".hidden/app/package.json", "a/b/c/d/e/pyproject.toml",
+    ])
+    found = pbu.ProjectDiscovery(max_depth=3).find(str(tmp_path))
+    assert [p['folder_path'] for p in found] == [str(tmp_path / "tools" / "cli"), str(tmp_path / "web")]
+    cli, web = found
+    assert cli['folder_exclusions'] == [".venv"]
+    assert cli['options'] == {'exclusion_rules': {'extensions': [".pyc", ".pyo"]}}
+    assert cli['description'] == "Discovered git + python project"
+    assert web['folder_exclusions'] == ["node_modules", "dist"]
+    assert web['options'] == {}
+
+
+def test_register_skips_known_folders(pbu, db, tmp_path):
+    make_tree(tmp_path, ["one/package.json", "two/pyproject.toml"])
+    db.add_project("one", str(tmp_path / "one"))
+    candidates = pbu.ProjectDiscovery().find(str(tmp_path))
+    added, skipped = pbu.ProjectDiscovery.register(db, candidates)
+    assert len(added) == 1 and skipped == 1
+    assert db.get_project(added[0])['options']['exclusion_rules'] == {'extensions': [".pyc", ".pyo"]}
+
+
+def test_export_import_round_trip(pbu, db, tmp_path):
+    project_id = db.add_project("app", "/srv/app", "Main app")
+    db.update_project(project_id, "app", "/srv/app", "Main app", ["secret.env"], ["node_modules"])
+    db.set_project_option(project_id, "exclusion_rules", {'max_size': 1024})
+    out = io.StringIO()
+    assert pbu.ProjectDiscovery.export_json(db, out) == 1
+    exported = json.loads(out.getvalue())
+    assert exported['format'] == pbu.ProjectDiscovery.EXPORT_FORMAT
+
+    other = pbu.Database(str(tmp_path / "other.db"))
+    try:
+        ids = pbu.ProjectDiscovery.import_json(other, io.StringIO(out.getvalue()))
+        assert ids == [project_id]
+        # Importing again replaces the same project instead of adding a copy
+        pbu.ProjectDiscovery.import_json(other, io.StringIO(out.getvalue()))
+        assert len(other.get_all_projects()) == 1
+        imported = other.get_project(project_id)
+        assert imported['file_exclusions'] == ["secret.env"]
+        assert imported['folder_exclusions'] == ["node_modules"]
+        assert imported['options'] == {'exclusion_rules': {'max_size': 1024}}
+        new_ids = pbu.ProjectDiscovery.import_json(other, io.StringIO(out.getvalue()), keep_ids=False)
+        assert new_ids[0] != project_id
+        assert len(other.get_all_projects()) == 2
+    finally:
+        other.close()
+
+
+@pytest.mark.parametrize("payload, message", [
+    ({'format': "something-else", 'projects': []}, "Not a project export"),
+    ({'format': "project-backup-utility/projects", 'version': 99, 'projects': []}, "newer"),
+    ({'format': "project-backup-utility/projects", 'projects': [{'name': "x"}]}, "without a name or folder"),
+])
+def test_import_rejects_bad_files_without_changes(pbu, db, payload, message):
+    with pytest.raises(ValueError, match=message):
+        pbu.ProjectDiscovery.import_json(db, io.StringIO(json.dumps(payload)))
+    assert db.get_all_projects() == []
+
+
+def test_delete_project_removes_its_catalog(pbu, db, tmp_path):
+    keep = db.add_project("keep", "/srv/keep")
+    gone = db.add_project("gone", "/srv/gone")
+    ids = {}
+    for project_id in (keep, gone):
+        first = db.create_backup_record(project_id, f"/out/{project_id}-1.zip", "zip")
+        second = db.create_backup_record(project_id, f"/out/{project_id}-2.zip", "zip")
+        db.add_backup_dependency(second, first)
+        db.save_file_signatures(project_id, first, [{
+            'rel_path': "big.bin", 'member_name': "big.bin", 'size': 1, 'mtime_ns': 0, 'sha256': "00",
+            'block_size': 1, 'chain_depth': 0, 'weak': b"", 'strong': b""}])
+        db.save_git_bundle(first, project_id, {'tips': {}, 'chain_depth': 0, 'base_backup_id': None})
+        checkpoint = db.create_checkpoint(project_id, "/src", "/out/x.zip", "", set(), set(), checkpoint_id=second)
+        db.save_checkpoint(checkpoint, 10, [("a.txt", 0, 0)])
+        # A run that never made it into the catalog
+        orphan = db.create_checkpoint(project_id, "/src", "/out/y.zip", "", set(), set())
+        db.save_checkpoint(orphan, 10, [("b.txt", 0, 0)])
+        ids[project_id] = (first, second, orphan)
+    db.delete_project(gone)
+
+    conn = sqlite3.connect(str(tmp_path / "catalog.db"))
+    try:
+        def count(table, column, values):
+            marks = ",".join("?" * len(values))
+            return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} IN ({marks})", values).fetchone()[0]
+
+        for project_id, expected in ((gone, 0), (keep, 1)):
+            first, second, orphan = ids[project_id]
+            assert count("backups", "id", (first, second)) == 2 * expected
+            assert count("backup_dependencies", "backup_id", (second,)) == expected
+            assert count("file_signatures", "backup_id", (first,)) == expected
+            assert count("git_bundles", "backup_id", (first,)) == expected
+            assert count("backup_checkpoints", "id", (second, orphan)) == 2 * expected
+            assert count("checkpoint_members", "checkpoint_id", (second, orphan)) == 2 * expected
+    finally:
+        conn.close()
+    assert db.get_project(gone) is None
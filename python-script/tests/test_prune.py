@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def catalog(pbu, tmp_path):
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    project_id = db.add_project("demo", str(tmp_path / "src"))
+    db.set_project_option(project_id, 'retention', {'keep_last': 1})
+    yield db, project_id
+    db.close()
+
+
+def _backup(db, project_id, path, size=1000):
+    backup_id = db.create_backup_record(project_id, path, "zip")
+    if path != "-":
+        with open(path, 'wb') as f:
+            f.write(b"x" * size)
+    db.finish_backup_record(backup_id, 'complete', 1, size, size)
+    return backup_id
+
+
+def test_streamed_backups_are_not_planned(pbu, catalog, tmp_path):
+    db, project_id = catalog
+    old = _backup(db, project_id, str(tmp_path / "b1.zip"))
+    new = _backup(db, project_id, str(tmp_path / "b2.zip"))
+    streamed = _backup(db, project_id, "-")
+    plan, reclaimed = pbu.BackupManager(db).prune_backups(project_id)
+    assert [(backup['id'], keep) for backup, keep, _ in plan] == [(new, True), (old, False)]
+    assert reclaimed == 1000
+    assert os.path.exists(tmp_path / "b2.zip") and not os.path.exists(tmp_path / "b1.zip")
+    assert db.get_backup_record(streamed) is not None
+
+
+def test_missing_archives_are_not_reclaimed(pbu, catalog, tmp_path):
+    db, project_id = catalog
+    gone = _backup(db, project_id, str(tmp_path / "b1.zip"))
+    relative = _backup(db, project_id, str(tmp_path / "b2.zip"))
+    db.set_backup_archive_path(relative, "b2.zip")
+    _backup(db, project_id, str(tmp_path / "b3.zip"))
+    os.remove(tmp_path / "b1.zip")
+    plan, reclaimed = pbu.BackupManager(db).prune_backups(project_id)
+    assert reclaimed == 0
+    assert {backup['id']: reason for backup, _, reason in plan if backup['id'] in (gone, relative)} == {
+        gone: "archive missing", relative: "archive missing"}
+    assert db.get_backup_record(gone) is not None and db.get_backup_record(relative) is not None
+    assert os.path.exists(tmp_path / "b2.zip")
+
+
+def test_prune_is_rejected_for_streamed_backups(pbu, catalog, tmp_path, capsys):
+    db, project_id = catalog
+    path = str(tmp_path / "old.zip")
+    _backup(db, project_id, path)
+    with pytest.raises(SystemExit) as exit_info:
+        pbu.run_cli(["--db", str(tmp_path / "catalog.db"), "backup", project_id, "--out", "-", "--prune"])
+    assert exit_info.value.code == 2
+    assert "--prune cannot be combined with --out -" in capsys.readouterr().err
+    assert os.path.exists(path)
+
+
+def test_bases_of_resumable_runs_are_kept(pbu, catalog, tmp_path):
+    db, project_id = catalog
+    base = _backup(db, project_id, str(tmp_path / "b1.zip"))
+    newest = _backup(db, project_id, str(tmp_path / "b2.zip"))
+    resumed = db.create_backup_record(project_id, str(tmp_path / "b3.zip"), "zip")
+    db.create_checkpoint(project_id, str(tmp_path / "src"), str(tmp_path / "b3.zip"), "src", [], [], checkpoint_id=resumed)
+    db.set_checkpoint_status(resumed, 'interrupted')
+    db.add_backup_dependency(resumed, base)
+    plan, reclaimed = pbu.BackupManager(db).prune_backups(project_id)
+    assert [(backup['id'], keep, reason) for backup, keep, reason in plan] == [
+        (newest, True, "last 1"), (base, True, f"base of {resumed}")]
+    assert reclaimed == 0 and os.path.exists(tmp_path / "b1.zip")
+
+
+def test_size_cap_drops_a_chain_before_a_newer_backup(pbu, catalog, tmp_path):
+    db, project_id = catalog
+    db.set_project_option(project_id, 'retention', {'max_bytes': 1000})
+    base = _backup(db, project_id, str(tmp_path / "b1.zip"))
+    delta = _backup(db, project_id, str(tmp_path / "b2.zip"))
+    db.add_backup_dependency(delta, base)
+    newest = _backup(db, project_id, str(tmp_path / "b3.zip"))
+    plan, reclaimed = pbu.BackupManager(db).prune_backups(project_id)
+    assert [(backup['id'], keep) for backup, keep, _ in plan] == [(newest, True), (delta, False), (base, False)]
+    assert reclaimed == 2000
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import MODULE_PATH
+
+# Runs in a child process so the test runner keeps its own niceness
+WORKER = r'''
+import importlib.util, os, sys, threading
+spec = importlib.util.spec_from_file_location("pbu", sys.argv[1])
+pbu = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pbu)
+base = os.nice(0)
+results = []
+
+def backup():
+    pbu.ResourceGovernor(nice=3).apply_process_priority()
+    results.append(os.nice(0) - base)
+
+# Like the GUI: one process, a fresh thread per backup, and the CLI-style call on the main thread
+for _ in range(3):
+    thread = threading.Thread(target=backup)
+    thread.start()
+    thread.join()
+for _ in range(3):
+    backup()
+print(" ".join(map(str, results)))
+'''
+
+
+@pytest.mark.skipif(not hasattr(os, "nice"), reason="os.nice is not available")
+def test_repeated_runs_do_not_accumulate_niceness():
+    if os.nice(0) > 19 - 3:
+        pytest.skip("already running too nice to raise further")
+    result = subprocess.run([sys.executable, "-c", WORKER, MODULE_PATH], capture_output=True, text=True, check=True)
+    assert result.stdout.split()[-6:] == ["3"] * 6
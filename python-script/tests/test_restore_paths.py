@@ -0,0 +1,36 @@
+import os
+import zipfile
+
+import pytest
+
+
+@pytest.mark.parametrize("name", ["../evil.txt", "a/../../evil.txt", "/abs/evil.txt", "a\\..\\..\\evil.txt"])
+def test_restore_refuses_members_outside_destination(pbu, tmp_path, name):
+    archive = tmp_path / "evil.zip"
+    with zipfile.ZipFile(archive, "w") as zipf:
+        zipf.writestr(name, b"owned")
+    dest = tmp_path / "slip" / "inner"
+    with pytest.raises(ValueError):
+        pbu.DeltaRestorer().restore(str(archive), str(dest))
+    assert not (tmp_path / "slip" / "evil.txt").exists()
+    assert not (tmp_path / "evil.txt").exists()
+
+
+def test_restore_writes_nested_members(pbu, tmp_path):
+    archive = tmp_path / "ok.zip"
+    with zipfile.ZipFile(archive, "w") as zipf:
+        zipf.writestr("src/./main.py", b"print()")
+    count = pbu.DeltaRestorer().restore(str(archive), str(tmp_path / "out"))
+    assert count == 1
+    assert (tmp_path / "out" / "src" / "main.py").read_bytes() == b"print()"
+
+
+def test_tar_zstd_extract_refuses_members_outside_destination(pbu, tmp_path, zstandard):
+    archive = str(tmp_path / "evil.tar.zst")
+    info = zipfile.ZipInfo("../evil.txt", (2024, 1, 1, 0, 0, 0))
+    info.file_size = 5
+    with pbu.TarZstdWriter(archive) as writer, writer.open(info) as stream:
+        stream.write(b"owned")
+    with pytest.raises(ValueError):
+        pbu.TarZstdReader(archive).extract("../evil.txt", str(tmp_path / "slip" / "inner"))
+    assert not os.path.exists(tmp_path / "slip" / "evil.txt")
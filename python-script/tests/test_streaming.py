@@ -0,0 +1,86 @@
+import io
+import os
+import threading
+import zipfile
+
+import pytest
+
+
+class Unseekable(io.RawIOBase):
+    """A write-only sink that can't seek or tell, like stdout piped into another tool"""
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+@pytest.fixture
+def project(pbu, tmp_path):
+    source = tmp_path / "src"
+    (source / "pkg" / "deep").mkdir(parents=True)
+    (source / "README.md").write_text("# demo\n" * 200)
+    (source / "pkg" / "module.py").write_bytes(os.urandom(300 * 1024))
+    (source / "pkg" / "deep" / "empty.txt").write_bytes(b"")
+    (source / "pkg" / "deep" / "zeros.bin").write_bytes(bytes(2 * 1024 * 1024))
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    project_id = db.add_project("demo", str(source))
+    yield pbu.BackupManager(db), project_id, tmp_path
+    db.close()
+
+
+def _contents(archive):
+    with zipfile.ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        return {info.filename: (info.CRC, zipf.read(info)) for info in zipf.infolist()}
+
+
+def test_streamed_archive_matches_regular_one(pbu, project):
+    manager, project_id, tmp_path = project
+    regular = str(tmp_path / "regular.zip")
+    assert manager.create_backup(project_id, save_path=regular)[0]
+    sink = Unseekable()
+    assert manager.create_backup(project_id, save_path="-", output_stream=sink)[0]
+    streamed = bytes(sink.data)
+    # Members written with data descriptors
+    assert zipfile.ZipFile(io.BytesIO(streamed)).infolist()[0].flag_bits & 0x08
+    assert _contents(io.BytesIO(streamed)) == _contents(regular)
+
+
+def test_fifo_target_is_streamed(pbu, project):
+    manager, project_id, tmp_path = project
+    regular = str(tmp_path / "regular.zip")
+    assert manager.create_backup(project_id, save_path=regular)[0]
+    fifo = str(tmp_path / "backup.zip")
+    os.mkfifo(fifo)
+    received = bytearray()
+
+    def drain():
+        with open(fifo, 'rb') as f:
+            received.extend(f.read())
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    success, message = manager.create_backup(project_id, save_path=fifo)
+    reader.join()
+    assert success, message
+    assert _contents(io.BytesIO(bytes(received))) == _contents(regular)
+
+
+def test_streamed_backups_are_cataloged_as_not_on_disk(pbu, project):
+    manager, project_id, _ = project
+    assert manager.create_backup(project_id, save_path="-", output_stream=Unseekable())[0]
+    backup, = manager.db.get_backups(project_id)
+    assert backup['format'] == pbu.BackupManager.STREAM_FORMAT
+    assert not pbu.RetentionPolicy.on_disk(backup)
+
+
+def test_benchmark_streaming_leaves_the_catalog_alone(pbu, project):
+    manager, project_id, _ = project
+    row = manager.benchmark_streaming(project_id)
+    assert row['file_bytes'] > 0 and row['stream_bytes'] > 0
+    assert manager.db.get_backups(project_id) == []
@@ -0,0 +1,111 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+
+def _write(pbu, archive, members, **options):
+    with pbu.TarZstdWriter(str(archive), level=3, **options) as writer:
+        for name, data in members.items():
+            info = zipfile.ZipInfo(name, (2024, 5, 17, 12, 30, 0))
+            info.file_size = len(data)
+            info.external_attr = 0o640 << 16
+            with writer.open(info) as stream:
+                stream.write(data)
+
+
+def _read_member(reader, name):
+    stream, size = reader.open_member(name)
+    with stream:
+        return _read_exact(stream, size)
+
+
+def _read_exact(stream, size):
+    """A zstd stream reader may return less than asked for"""
+    data = b""
+    while len(data) < size:
+        more = stream.read(size - len(data))
+        assert more, "archive ended inside a member"
+        data += more
+    return data
+
+
+@pytest.fixture
+def members():
+    return {f"dir{i % 3}/file{i}.txt": f"member {i}\n".encode() * (i * 700 + 1) for i in range(12)}
+
+
+@pytest.fixture
+def project(pbu, tmp_path):
+    src = tmp_path / "src"
+    (src / "pkg").mkdir(parents=True)
+    for i in range(6):
+        (src / "pkg" / f"mod{i}.py").write_text(f"VALUE = {i}\n" * 400)
+    db = pbu.Database(str(tmp_path / "catalog.db"))
+    yield db, db.add_project("src", str(src)), src
+    db.close()
+
+
+def test_round_trip(pbu, tmp_path, zstandard, members):
+    archive = tmp_path / "out.tar.zst"
+    _write(pbu, archive, members)
+    reader = pbu.TarZstdReader(str(archive))
+    assert reader.names() == list(members)
+    for name, data in members.items():
+        assert _read_member(reader, name) == data
+    target = reader.extract("dir1/file4.txt", str(tmp_path / "out"))
+    with open(target, 'rb') as f:
+        assert f.read() == members["dir1/file4.txt"]
+    assert os.stat(target).st_mode & 0o777 == 0o640
+
+
+def test_index_locates_members_in_later_frames(pbu, tmp_path, zstandard, members):
+    archive = tmp_path / "out.tar.zst"
+    # Small frames, so most members live in a frame of their own
+    _write(pbu, archive, members, frame_size=8 * 1024)
+    with open(str(archive) + pbu.TarZstdWriter.INDEX_SUFFIX, encoding='utf-8') as f:
+        index = json.load(f)
+    assert index['archive_size'] == os.path.getsize(archive)
+    assert len(index['frames']) > 3
+    # [archive offset, tar offset] of each frame, both rising
+    assert index['frames'] == sorted(index['frames'])
+    assert [member['name'] for member in index['members']] == list(members)
+    reader = pbu.TarZstdReader(str(archive))
+    for name in reversed(list(members)):
+        assert _read_member(reader, name) == members[name]
+
+
+def test_index_must_match_the_archive(pbu, tmp_path, zstandard, members):
+    archive = tmp_path / "out.tar.zst"
+    _write(pbu, archive, members)
+    with open(archive, 'ab') as f:
+        f.write(b"\0")
+    with pytest.raises(ValueError):
+        pbu.TarZstdReader(str(archive))
+
+
+def test_backup_as_tar_zstd(pbu, project, tmp_path, zstandard):
+    db, project_id, src = project
+    archive = tmp_path / "backup.tar.zst"
+    ok, message = pbu.BackupManager(db).create_backup(project_id, str(archive))
+    assert ok, message
+    reader = pbu.TarZstdReader(str(archive))
+    assert sorted(reader.names()) == sorted(f"pkg/mod{i}.py" for i in range(6))
+    reader.extract("pkg/mod3.py", str(tmp_path / "out"))
+    assert (tmp_path / "out" / "pkg" / "mod3.py").read_bytes() == (src / "pkg" / "mod3.py").read_bytes()
+
+
+def test_format_bench_leaves_the_catalog_alone(pbu, project):
+    db, project_id, src = project
+    rows = pbu.BackupManager(db).benchmark_formats(project_id, zip_levels=(1, 9), zstd_levels=())
+    assert [(row['format'], row['level']) for row in rows] == [("zip", 1), ("zip", 9)]
+    assert all(row['archive_bytes'] > 0 for row in rows)
+    assert db.get_backups(project_id) == []
+
+
+def test_format_bench_times_tar_zstd(pbu, project, zstandard):
+    db, project_id, src = project
+    rows = pbu.BackupManager(db).benchmark_formats(project_id, zip_levels=(), zstd_levels=(3,))
+    assert [(row['format'], row['level']) for row in rows] == [("tar.zst", 3)]
+    assert db.get_backups(project_id) == []
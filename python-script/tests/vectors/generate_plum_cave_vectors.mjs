@@ -0,0 +1,127 @@
+// Writes plum-cave-vectors.json next to this script from the web app's own encryption code,
+// so the Python decryptor is checked against mipher's Serpent and ChaCha20 rather than a port.
+//
+//   cd web-app/plum-cave && npm i
+//   node ../../python-script/tests/vectors/generate_plum_cave_vectors.mjs
+//
+// encryptFileWithTwoCiphersCBC lives inside the FileEncrypter component, so its source is cut out
+// of FileEncrypter.tsx and run with the React state setters stubbed. window.crypto is replaced by a
+// seeded generator, which makes the output reproducible.
+import { createHash } from 'node:crypto';
+import { createRequire } from 'node:module';
+import fs from 'node:fs';
+import path from 'node:path';
+import { fileURLToPath } from 'node:url';
+
+const scriptDir = path.dirname(fileURLToPath(import.meta.url));
+const webAppDir = path.resolve(scriptDir, '../../../web-app/plum-cave');
+const appRequire = createRequire(path.join(webAppDir, 'package.json'));
+const ts = appRequire('typescript');
+
+let counter = 0;
+function seededBytes(length) {
+  const out = new Uint8Array(length);
+  for (let filled = 0; filled < length;) {
+    const block = createHash('sha256').update(`plum-cave-vectors:${counter++}`).digest();
+    const n = Math.min(block.length, length - filled);
+    out.set(block.subarray(0, n), filled);
+    filled += n;
+  }
+  return out;
+}
+globalThis.window = { crypto: { getRandomValues: (array) => { array.set(seededBytes(array.length)); return array; } } };
+
+// Same pattern as tests/test_plum_cave_decryptor.py
+function pattern(size) {
+  const out = new Uint8Array(size);
+  for (let i = 0; i < size; i++) out[i] = (i * 131 + 7) % 251;
+  return out;
+}
+
+function load(fileName, source, modules = {}) {
+  const { outputText } = ts.transpileModule(source, {
+    fileName,
+    compilerOptions: { module: ts.ModuleKind.CommonJS, target: ts.ScriptTarget.ES2020, jsx: ts.JsxEmit.ReactJSX },
+  });
+  const module = { exports: {} };
+  const localRequire = (name) => (name in modules ? modules[name] : appRequire(name));
+  new Function('exports', 'require', 'module', outputText)(module.exports, localRequire, module);
+  return module.exports;
+}
+
+function readApp(relPath) {
+  return fs.readFileSync(path.join(webAppDir, relPath), 'utf8');
+}
+
+// A const declared at two-space indent inside the component, up to its closing line
+function componentFunction(source, name) {
+  const start = source.indexOf(`  const ${name} = `);
+  if (start < 0) throw new Error(`${name} not found in FileEncrypter.tsx`);
+  const end = source.indexOf('\n  }', start);
+  return source.slice(start, source.indexOf('\n', end + 1));
+}
+
+const serpent = load('serpent.js', readApp('app/cryptographicPrimitives/serpent.js'));
+const modules = { '@/app/cryptographicPrimitives/serpent': serpent };
+const silentMode = load('twoCiphersSilentMode.tsx', readApp('app/cryptographicPrimitives/twoCiphersSilentMode.tsx'), modules);
+const encrypterSource = readApp('components/FileEncrypter/FileEncrypter.tsx');
+const fileEncrypter = load('FileEncrypter.tsx', `
+import { createSHA3, createHMAC, whirlpool, sha512 } from 'hash-wasm';
+import { ChaCha20 } from 'mipher';
+import { encryptSerpent256ECB } from '@/app/cryptographicPrimitives/serpent';
+const useCallback = (fn: any, deps: any) => fn;
+const t = (key: string) => key;
+const toggleProgressAnimation = (isAnimating: boolean) => {};
+const setProcessingStep = (step: string) => {};
+const setProcessingStepDescription = (description: string) => {};
+const setProcessingProgress = (progress: number) => {};
+${componentFunction(encrypterSource, 'hexStringToArray')}
+${componentFunction(encrypterSource, 'computeTagForFileUsingHMACSHA512')}
+${componentFunction(encrypterSource, 'encryptFileWithTwoCiphersCBC')}
+export { encryptFileWithTwoCiphersCBC };
+`, modules);
+
+const hex = (bytes) => Buffer.from(bytes).toString('hex');
+const b64 = (bytes) => Buffer.from(bytes).toString('base64');
+
+// Sizes around the 16-byte padding and the 256 KB stream cipher chunk (the inner stream is 64 bytes longer)
+const FILE_SIZES = [0, 1, 15, 48, 1000, 256 * 1024 - 64, 256 * 1024 - 63, 256 * 1024 + 100];
+const files = [];
+for (const size of FILE_SIZES) {
+  const fileKey = seededBytes(416);
+  const [ciphertext] = await fileEncrypter.encryptFileWithTwoCiphersCBC(pattern(size), fileKey);
+  files.push({ size, file_key: hex(fileKey), ciphertext: b64(ciphertext) });
+}
+
+// One backup keyed from scratch, as FileEncrypter derives it
+const ITERATIONS = 2;
+const masterKey = seededBytes(272);
+const randomKey = seededBytes(302);
+const fileSalt = seededBytes(48);
+const merged = new Uint8Array(302 + 192);
+merged.set(randomKey.slice(0, 302));
+merged.set(masterKey.slice(0, 192), 302);
+const backupKey = await silentMode.deriveBytesUsingArgon2id(merged, fileSalt, ITERATIONS, 416);
+const [backupCiphertext] = await fileEncrypter.encryptFileWithTwoCiphersCBC(pattern(5000), backupKey);
+const backup = {
+  size: 5000, iterations: ITERATIONS, master_key: hex(masterKey), random_key: hex(randomKey),
+  file_salt: hex(fileSalt), file_key: hex(backupKey), ciphertext: b64(backupCiphertext),
+};
+
+const records = [];
+for (const [size, padded] of [[0, true], [13, true], [32, true], [32, false], [300, true]]) {
+  const password = seededBytes(64);
+  const encrypt = padded ? silentMode.silentlyEncryptDataWithTwoCiphersCBC : silentMode.silentlyEncryptDataWithTwoCiphersCBCnoPadding;
+  const ciphertext = await encrypt(pattern(size), password, ITERATIONS);
+  const derivedKey = await silentMode.deriveBytesUsingArgon2id(password, ciphertext.slice(0, 32), ITERATIONS, 416);
+  // The Dashboard reads records back through these; silentlyDecryptDataWithTwoCiphersCBC keeps the padding
+  const decrypt = padded ? silentMode.decryptFieldValueWithTwoCiphersCBC : silentMode.decryptFieldValueWithTwoCiphersCBCnoPadding;
+  const [plain, integrityPassed] = await decrypt(ciphertext, password, ITERATIONS);
+  if (!integrityPassed || hex(plain) !== hex(pattern(size))) throw new Error(`Web app cannot read back record of ${size} bytes`);
+  records.push({ size, padded, iterations: ITERATIONS, password: hex(password), derived_key: hex(derivedKey), ciphertext: b64(ciphertext) });
+}
+
+const mipherVersion = JSON.parse(readApp('node_modules/mipher/package.json')).version;
+const output = path.join(scriptDir, 'plum-cave-vectors.json');
+fs.writeFileSync(output, JSON.stringify({ mipher: mipherVersion, files, backup, records }, null, 1) + '\n');
+console.log(`Wrote ${files.length + 1 + records.length} vectors to ${output}`);